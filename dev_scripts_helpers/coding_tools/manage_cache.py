@@ -8,6 +8,7 @@ import dev_scripts_helpers.manage_cache as dscmacac
 import argparse
 
 import helpers.hcache as hcache
+import helpers.hcache_store as hcacstor
 import helpers.hdbg as hdbg
 import helpers.hparser as hparser
 
@@ -50,6 +51,24 @@ def _parse() -> argparse.ArgumentParser:
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("--action", required=True, type=str)
+    parser.add_argument(
+        "--blob_store_path",
+        action="store",
+        type=str,
+        help="Local dir or S3 path of a blob store",
+    )
+    parser.add_argument(
+        "--max_size_in_gb",
+        action="store",
+        type=float,
+        help="Size budget of the blob store to enforce with `gc_blob_store`",
+    )
+    parser.add_argument(
+        "--aws_profile",
+        action="store",
+        type=str,
+        help="AWS profile to use for a blob store on S3",
+    )
     hparser.add_verbosity_arg(parser)
     return parser
 
@@ -65,6 +84,8 @@ def _main(parser: argparse.ArgumentParser) -> None:
         "clear_global_disk_cache",
         "list",
         "print_cache_info",
+        "print_blob_store_stats",
+        "gc_blob_store",
         "test",
     ]
     hdbg.dassert_in(action, actions)
@@ -77,6 +98,18 @@ def _main(parser: argparse.ArgumentParser) -> None:
     elif action == "print_cache_info":
         txt = hcache.get_global_cache_info()
         print(txt)
+    elif action in ("print_blob_store_stats", "gc_blob_store"):
+        hdbg.dassert_is_not(args.blob_store_path, None)
+        blob_store = hcacstor.BlobStore(
+            args.blob_store_path, aws_profile=args.aws_profile
+        )
+        if action == "gc_blob_store":
+            hdbg.dassert_is_not(args.max_size_in_gb, None)
+            max_num_bytes = int(args.max_size_in_gb * 1024**3)
+            blob_store.garbage_collect(max_num_bytes)
+        # Report size, hit counts, and last access per function.
+        txt = hcacstor.stats_to_str(blob_store.get_stats())
+        print(txt)
     elif action == "test":
         _test2()
     elif action == "list":
@@ -7,17 +7,26 @@ import helpers.hcache as hcache
 """
 
 import atexit
+import collections
 import copy
 import functools
+import hashlib
 import logging
 import os
+import pickle
+import sys
+import threading
 import time
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union, cast
 
 import joblib
+import joblib._store_backends as jstoback
 import joblib.func_inspect as jfunci
 import joblib.memory as jmemor
+import numpy as np
+import pandas as pd
 
+import helpers.hcache_store as hcacstor
 import helpers.hdatetime as hdateti
 import helpers.hdbg as hdbg
 import helpers.hgit as hgit
@@ -96,6 +105,14 @@ def get_global_cache_info(
         description = f"global {cache_type}"
         cache_info = _get_cache_size(path, description)
         txt.append(cache_info)
+    txt.append(
+        "'object mem' cache: num_entries=%s, size=%s, max_size=%s"
+        % (
+            len(_OBJ_CACHE),
+            hintros.format_size(_OBJ_CACHE_NUM_BYTES),
+            hintros.format_size(_OBJ_CACHE_MAX_NUM_BYTES),
+        )
+    )
     txt = "\n".join(txt)
     return txt
 
@@ -285,6 +302,8 @@ def clear_global_cache(
     cache_path = _get_global_cache_path(cache_type, tag)
     if not _IS_CLEAR_CACHE_ENABLED:
         hdbg.dfatal(f"Trying to delete cache '{cache_path}'")
+    if cache_type == "mem":
+        _clear_obj_cache(tag)
     description = f"global {cache_type}"
     try:
         # TODO(ShaopengZ): in some test run outside CK infra, the
@@ -323,6 +342,157 @@ def clear_global_cache(
     _LOG.info("After clear_global_cache: %s", info_after)
 
 
+# #############################################################################
+# Object memory cache
+# #############################################################################
+
+# The memory cache stores the objects returned by the cached functions in the
+# memory of the process, so that a hit doesn't need to serialize, compress,
+# and deserialize the object (as the joblib cache on tmpfs does).
+# - The entries are kept in LRU order and the least recently used entries are
+#   evicted when the estimated size of the cached objects exceeds
+#   `_OBJ_CACHE_MAX_NUM_BYTES`
+# - The cache is shared by all the cached functions of the process and keyed by
+#   `(tag, func_id, func_code_digest, args_id)`
+
+# Map the key of an entry to `(obj, num_bytes)` in LRU order.
+_OBJ_CACHE: collections.OrderedDict = collections.OrderedDict()
+_OBJ_CACHE_NUM_BYTES = 0
+_OBJ_CACHE_MAX_NUM_BYTES = 4 * 1024**3
+_OBJ_CACHE_LOCK = threading.Lock()
+
+
+def set_mem_cache_max_num_bytes(max_num_bytes: int) -> None:
+    """
+    Set the max size of the objects stored in the object memory cache.
+    """
+    global _OBJ_CACHE_MAX_NUM_BYTES
+    hdbg.dassert_lte(0, max_num_bytes)
+    _LOG.debug(
+        "Setting max_num_bytes to %s -> %s",
+        _OBJ_CACHE_MAX_NUM_BYTES,
+        max_num_bytes,
+    )
+    _OBJ_CACHE_MAX_NUM_BYTES = max_num_bytes
+    with _OBJ_CACHE_LOCK:
+        _evict_from_obj_cache()
+
+
+def get_mem_cache_num_bytes() -> int:
+    """
+    Return the estimated size of the objects stored in the object memory cache.
+    """
+    return _OBJ_CACHE_NUM_BYTES
+
+
+def _get_obj_num_bytes(obj: Any) -> int:
+    """
+    Estimate the memory used by an object.
+    """
+    if isinstance(obj, np.ndarray):
+        num_bytes = obj.nbytes
+    elif isinstance(obj, pd.DataFrame):
+        num_bytes = int(obj.memory_usage(index=True, deep=True).sum())
+    elif isinstance(obj, pd.Series):
+        num_bytes = int(obj.memory_usage(index=True, deep=True))
+    elif isinstance(obj, (int, float, bool, str, bytes, type(None))):
+        num_bytes = sys.getsizeof(obj)
+    else:
+        # Use the size of the pickled object, without copying the large
+        # buffers (e.g., numpy arrays) that support out-of-band pickling.
+        buffers: List[pickle.PickleBuffer] = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        num_bytes = len(data) + sum(buffer.raw().nbytes for buffer in buffers)
+    return num_bytes
+
+
+def _make_read_only(obj: Any) -> None:
+    """
+    Make the numpy arrays backing an object read-only, if possible.
+    """
+    if isinstance(obj, np.ndarray):
+        obj.setflags(write=False)
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        # Pandas doesn't have a public API to freeze an object, so we make the
+        # arrays of its blocks read-only.
+        for block in obj._mgr.blocks:
+            if isinstance(block.values, np.ndarray):
+                block.values.setflags(write=False)
+
+
+def _copy_cached_obj(obj: Any, zero_copy: bool) -> Any:
+    """
+    Return an object stored in the object memory cache to the caller.
+
+    :param zero_copy: return the object without copying its data, assuming
+        that it was made read-only with `_make_read_only()`
+    """
+    if not zero_copy:
+        # Make a deep copy so that the caller can't modify the cached value.
+        return copy.deepcopy(obj)
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        # Make a shallow copy sharing the read-only data, so that the caller
+        # can still add or remove columns.
+        return obj.copy(deep=False)
+    return obj
+
+
+def _evict_from_obj_cache() -> None:
+    """
+    Evict the least recently used entries until the cache fits its max size.
+    """
+    global _OBJ_CACHE_NUM_BYTES
+    while _OBJ_CACHE and _OBJ_CACHE_NUM_BYTES > _OBJ_CACHE_MAX_NUM_BYTES:
+        key, (_, num_bytes) = _OBJ_CACHE.popitem(last=False)
+        _OBJ_CACHE_NUM_BYTES -= num_bytes
+        _LOG.debug("Evicted key=%s num_bytes=%s", key, num_bytes)
+
+
+def _get_from_obj_cache(key: Tuple) -> Tuple[bool, Any]:
+    """
+    Retrieve an object from the object memory cache.
+
+    :return: whether the object was found and the object
+    """
+    with _OBJ_CACHE_LOCK:
+        if key not in _OBJ_CACHE:
+            return False, None
+        _OBJ_CACHE.move_to_end(key)
+        obj, _ = _OBJ_CACHE[key]
+    return True, obj
+
+
+def _add_to_obj_cache(key: Tuple, obj: Any) -> None:
+    """
+    Store an object in the object memory cache, evicting other entries if
+    needed.
+    """
+    global _OBJ_CACHE_NUM_BYTES
+    num_bytes = _get_obj_num_bytes(obj)
+    if num_bytes > _OBJ_CACHE_MAX_NUM_BYTES:
+        _LOG.warning(
+            "Object of %s is larger than the memory cache: not caching it",
+            hintros.format_size(num_bytes),
+        )
+        return
+    with _OBJ_CACHE_LOCK:
+        if key in _OBJ_CACHE:
+            _OBJ_CACHE_NUM_BYTES -= _OBJ_CACHE.pop(key)[1]
+        _OBJ_CACHE[key] = (obj, num_bytes)
+        _OBJ_CACHE_NUM_BYTES += num_bytes
+        _evict_from_obj_cache()
+
+
+def _clear_obj_cache(tag: Optional[str]) -> None:
+    """
+    Remove the entries with the given tag from the object memory cache.
+    """
+    global _OBJ_CACHE_NUM_BYTES
+    with _OBJ_CACHE_LOCK:
+        for key in [key for key in _OBJ_CACHE if key[0] == tag]:
+            _OBJ_CACHE_NUM_BYTES -= _OBJ_CACHE.pop(key)[1]
+
+
 # #############################################################################
 
 
@@ -354,6 +524,9 @@ class _Cached:
     This class uses 2 levels of caching:
     - memory cache: useful for caching across multiple executions of a function in
       a process or in notebooks without resetting the state
+        - The objects are stored in the memory of the process (see
+          `_OBJ_CACHE`) and, optionally, in a joblib cache on a RAM disk that is
+          shared by the processes on the same machine
     - disk cache: useful for retrieving the state among different executions of a
       process or when a notebook is reset
     """
@@ -373,6 +546,11 @@ class _Cached:
         tag: Optional[str] = None,
         disk_cache_path: Optional[str] = None,
         aws_profile: Optional[str] = "am",
+        use_tmpfs_cache: bool = False,
+        zero_copy: bool = False,
+        blob_store_path: Optional[str] = None,
+        blob_store_max_num_bytes: Optional[int] = None,
+        use_type_serializers: bool = False,
     ):
         """
         Construct the class.
@@ -389,6 +567,31 @@ class _Cached:
             when running unit tests we want to use a different cache)
         :param disk_cache_path: path of the function-specific cache
         :param aws_profile: the AWS profile to use in case of S3 backend
+        :param use_tmpfs_cache: when the memory cache is enabled, use the joblib
+            cache on the RAM disk as a level between the object memory cache and
+            the disk cache
+        :param zero_copy: return the values from the memory cache without
+            copying them
+            - The numpy arrays backing the values are made read-only, so the
+              caller can't modify the cached values in place
+            - Otherwise a deep copy of the cached value is returned
+        :param blob_store_path: local dir or S3 path of a content-addressed
+            store (see `hcache_store.BlobStore`) to use as disk cache instead of
+            the joblib one
+            - The store deduplicates identical values and can be shared across
+              functions and machines
+        :param blob_store_max_num_bytes: size budget of the blob store, which
+            is garbage collected periodically to respect it, or `None` for no
+            budget
+        :param use_type_serializers: store the values in the local joblib
+            caches with the serializers of `hcache_store` (e.g., dataframes as
+            Arrow IPC and numpy arrays as `.npy` files, which are loaded
+            without decompressing and unpickling them), instead of joblib
+            compressed pickle
+            - The arrays are memory-mapped copy-on-write, while the dataframes
+              are copied from the memory-mapped file on each hit
+            - The values cached with either format can be loaded regardless
+              of this param, which only affects the values stored from now on
         """
         # Make the class have the same attributes (e.g., `__name__`, `__doc__`,
         # `__dict__`) as the called function.
@@ -405,6 +608,18 @@ class _Cached:
         self._tag = tag
         self._disk_cache_path = disk_cache_path
         self._aws_profile = aws_profile
+        self._use_tmpfs_cache = use_tmpfs_cache
+        self._zero_copy = zero_copy
+        self._use_type_serializers = use_type_serializers
+        # Digest of the function code, computed lazily.
+        self._func_code_digest: Optional[str] = None
+        self._blob_store: Optional[hcacstor.BlobStore] = None
+        if blob_store_path is not None:
+            self._blob_store = hcacstor.BlobStore(
+                blob_store_path,
+                aws_profile=aws_profile,
+                max_num_bytes=blob_store_max_num_bytes,
+            )
         #
         self._reset_cache_tracing()
         # Create the memory and disk cache objects for this function.
@@ -444,15 +659,14 @@ class _Cached:
         else:
             # Caching is allowed.
             self._reset_cache_tracing()
+            # The memory cache copies the returned value, if needed, so that
+            # the client can't modify a cached value.
             obj = self._execute_func(*args, **kwargs)
             _LOG.debug(
                 "%s: executed from '%s'",
                 self._func.__name__,
                 self.get_last_cache_accessed(),
             )
-            # TODO(gp): Not sure making a deep copy is a good idea. In the end,
-            #  the client should not modify a cached value.
-            obj = copy.deepcopy(obj)
         # Print caching info.
         if self._is_verbose:
             # Get time.
@@ -491,6 +705,8 @@ class _Cached:
             # Function-specific cache: print the paths of the local cache.
             cache_type = "disk"
             txt.append(f"local {cache_type} cache path={self._disk_cache_path}")
+        if self._blob_store is not None:
+            txt.append(f"blob store={self._blob_store}")
         txt = "\n".join(txt)
         return txt
 
@@ -824,6 +1040,11 @@ class _Cached:
         """
         if _TRACE:
             _LOG.trace("")
+        if cache_type == "disk" and self._blob_store is not None:
+            has_cached_version = self._blob_store.has_item(
+                func_id, args_id, version=self._get_func_code_digest()
+            )
+            return has_cached_version
         memorized_result = self._get_memorized_result(cache_type)
         has_cached_version = memorized_result.store_backend.contains_item(
             [func_id, args_id]
@@ -870,8 +1091,7 @@ class _Cached:
         func_code, _, first_line = jfunci.get_func_code(memorized_result.func)
         memorized_result._write_func_code(func_code, first_line)
         # Store the returned value into the cache.
-        memorized_result.store_backend.dump_item([func_id, args_id], obj)
-        #
+        self._dump_item(memorized_result, func_id, args_id, obj)
 
     # ///////////////////////////////////////////////////////////////////////////
 
@@ -886,22 +1106,125 @@ class _Cached:
         self._last_used_disk_cache = self._use_disk_cache
         self._last_used_mem_cache = self._use_mem_cache
 
-    def _execute_func_from_disk_cache(self, *args: Any, **kwargs: Any) -> Any:
+    def _load_cached_version(
+        self, cache_type: str, func_id: str, args_id: str
+    ) -> Any:
+        """
+        Load the value of a function invocation from the cache.
+
+        :param cache_type: type of a cache
+        :param func_id: digest of the function obtained from `_get_identifiers()`
+        :param args_id: digest of arguments obtained from `_get_identifiers()`
+        """
+        if _TRACE:
+            _LOG.trace("")
+        if cache_type == "disk" and self._blob_store is not None:
+            obj = self._blob_store.load_item(func_id, args_id)
+            return obj
+        memorized_result = self._get_memorized_result(cache_type)
+        obj = memorized_result._load_item([func_id, args_id])
+        if isinstance(obj, _SerializedObjRef):
+            # Load the object stored next to the reference.
+            item_path = os.path.join(
+                memorized_result.store_backend.location, func_id, args_id
+            )
+            file_name = os.path.join(item_path, obj.file_name)
+            obj = hcacstor.load_obj(file_name, obj.serializer_name)
+        return obj
+
+    def _dump_item(
+        self,
+        memorized_result: joblib.MemorizedResult,
+        func_id: str,
+        args_id: str,
+        obj: Any,
+    ) -> None:
+        """
+        Store a value in a joblib cache, using the type serializers if needed.
+        """
+        store_backend = memorized_result.store_backend
+        # The type serializers need a local file to memory-map the values.
+        if self._use_type_serializers and isinstance(
+            store_backend, jstoback.FileSystemStoreBackend
+        ):
+            item_path = os.path.join(store_backend.location, func_id, args_id)
+            hio.create_dir(item_path, incremental=True)
+            file_name = os.path.join(item_path, _SerializedObjRef.FILE_NAME)
+            # Write to a temporary file and rename it, so that concurrent
+            # readers never see a partial file.
+            tmp_file_name = (
+                f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            serializer_name = hcacstor.dump_obj(
+                obj, tmp_file_name, use_pickle=False
+            )
+            if serializer_name is None:
+                # Use joblib pickle.
+                if os.path.exists(tmp_file_name):
+                    os.remove(tmp_file_name)
+            else:
+                os.replace(tmp_file_name, file_name)
+                obj = _SerializedObjRef(
+                    _SerializedObjRef.FILE_NAME, serializer_name
+                )
+        store_backend.dump_item([func_id, args_id], obj)
+
+    def _execute_and_store_cached_version(
+        self,
+        cache_type: str,
+        func_id: str,
+        args_id: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Execute the intrinsic function and store its value in the cache.
+
+        This is equivalent to calling the joblib cached function, without
+        hashing the arguments again.
+        """
         if _TRACE:
             _LOG.trace("")
-        func_info = (
-            f"{self._func.__name__}(args={str(args)} kwargs={str(kwargs)})"
+        if cache_type == "disk" and self._blob_store is not None:
+            # The entries of a previous version of the function are not valid,
+            # and they are garbage collected eventually.
+            obj = self._func(*args, **kwargs)
+            self._blob_store.dump_item(
+                func_id, args_id, obj, version=self._get_func_code_digest()
+            )
+            return obj
+        memorized_result = self._get_memorized_result(cache_type)
+        # Check that the function code didn't change, clearing the values cached
+        # for a previous version of the function.
+        memorized_result._check_previous_func_code(stacklevel=4)
+        start_time = time.time()
+        obj = self._func(*args, **kwargs)
+        self._dump_item(memorized_result, func_id, args_id, obj)
+        # Store the metadata of the call, like joblib does.
+        duration = time.time() - start_time
+        memorized_result._persist_input(
+            duration, [func_id, args_id], args, kwargs
         )
-        # Get the function signature.
-        func_id, args_id = self._get_identifiers("disk", *args, **kwargs)
+        return obj
+
+    def _execute_func_from_disk_cache(
+        self,
+        func_info: "_FuncInfo",
+        func_id: str,
+        args_id: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        if _TRACE:
+            _LOG.trace("")
         if self._has_cached_version("disk", func_id, args_id):
             _LOG.debug("There is a disk cached version")
             with htimer.TimedScope(
                 logging.INFO, "Loading cached version from disk"
             ):
-                obj = self._disk_cached_func(*args, **kwargs)
+                obj = self._load_cached_version("disk", func_id, args_id)
             if self._check_only_if_present:
-                raise CachedValueException(func_info)
+                raise CachedValueException(str(func_info))
         else:
             # INV: we didn't hit neither memory nor the disk cache.
             self._last_used_disk_cache = False
@@ -917,34 +1240,64 @@ class _Cached:
             with htimer.TimedScope(
                 logging.INFO, "Updating cached version on disk"
             ):
-                obj = self._disk_cached_func(*args, **kwargs)
-            # obj = self._execute_intrinsic_function(*args, **kwargs)
-            # The function was not cached in disk, so now we need to update the
-            # memory cache.
-            # self._store_cached_version("disk", func_id, args_id, obj)
+                obj = self._execute_and_store_cached_version(
+                    "disk", func_id, args_id, *args, **kwargs
+                )
         return obj
 
-    def _execute_func_from_mem_cache(self, *args: Any, **kwargs: Any) -> Any:
+    def _get_func_code_digest(self) -> str:
+        """
+        Return the digest of the function code, computed once.
+        """
+        if self._func_code_digest is None:
+            func_code, _, _ = jmemor.get_func_code(self._func)
+            self._func_code_digest = hashlib.md5(
+                func_code.encode("utf-8")
+            ).hexdigest()
+        return self._func_code_digest
+
+    def _get_obj_cache_key(self, func_id: str, args_id: str) -> Tuple:
+        """
+        Return the key of a function invocation in the object memory cache.
+        """
+        # Include the function code, so that the cache is invalidated when the
+        # function changes (e.g., when redefined in a notebook).
+        key = (self._tag, func_id, self._get_func_code_digest(), args_id)
+        return key
+
+    def _execute_func_from_mem_cache(
+        self,
+        func_info: "_FuncInfo",
+        func_id: str,
+        args_id: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
         """
         Execute the function from memory cache and if not possible try the
         lower cache levels.
         """
         if _TRACE:
             _LOG.trace("")
-        func_info = (
-            f"{self._func.__name__}(args={str(args)} kwargs={str(kwargs)})"
-        )
-        # Get the function signature.
-        func_id, args_id = self._get_identifiers("mem", *args, **kwargs)
-        if self._has_cached_version("mem", func_id, args_id):
+        key = self._get_obj_cache_key(func_id, args_id)
+        found, obj = _get_from_obj_cache(key)
+        if found:
+            _LOG.debug("There is an object mem cached version")
+            if self._check_only_if_present:
+                raise CachedValueException(str(func_info))
+            obj = _copy_cached_obj(obj, self._zero_copy)
+            return obj
+        if self._use_tmpfs_cache and self._has_cached_version(
+            "mem", func_id, args_id
+        ):
             _LOG.debug("There is a mem cached version")
             if self._check_only_if_present:
-                raise CachedValueException(func_info)
+                raise CachedValueException(str(func_info))
             # The function execution was cached in the mem cache.
             with htimer.TimedScope(
                 logging.INFO, "Loading cached version from memory"
             ):
-                obj = self._memory_cached_func(*args, **kwargs)
+                obj = self._load_cached_version("mem", func_id, args_id)
         else:
             # INV: we know that we didn't hit the memory cache, but we don't know
             # about the disk cache.
@@ -956,22 +1309,28 @@ class _Cached:
                 _LOG.debug(
                     "Trying to retrieve from disk",
                 )
-                obj = self._execute_func_from_disk_cache(*args, **kwargs)
+                obj = self._execute_func_from_disk_cache(
+                    func_info, func_id, args_id, *args, **kwargs
+                )
             else:
                 _LOG.warning("Skipping disk cache")
-                obj = self._execute_intrinsic_function(*args, **kwargs)
+                obj = self._execute_intrinsic_function(func_info, *args, **kwargs)
             # The function was not cached in memory, so now we need to update the
             # memory cache.
-            self._store_cached_version("mem", func_id, args_id, obj)
+            if self._use_tmpfs_cache:
+                self._store_cached_version("mem", func_id, args_id, obj)
+        if self._zero_copy:
+            _make_read_only(obj)
+        _add_to_obj_cache(key, obj)
+        obj = _copy_cached_obj(obj, self._zero_copy)
         return obj
 
-    def _execute_intrinsic_function(self, *args: Any, **kwargs: Any) -> Any:
+    def _execute_intrinsic_function(
+        self, func_info: "_FuncInfo", *args: Any, **kwargs: Any
+    ) -> Any:
         if _TRACE:
             _LOG.trace("")
         with htimer.TimedScope(logging.INFO, "Executing intrinsic function"):
-            func_info = (
-                f"{self._func.__name__}(args={str(args)} kwargs={str(kwargs)})"
-            )
             _LOG.debug("%s: execute intrinsic function", func_info)
             if self._enable_read_only:
                 msg = f"{func_info}: trying to execute"
@@ -982,18 +1341,24 @@ class _Cached:
     def _execute_func(self, *args: Any, **kwargs: Any) -> Any:
         if _TRACE:
             _LOG.trace("")
-        func_info = (
-            f"{self._func.__name__}(args={str(args)} kwargs={str(kwargs)})"
-        )
+        # The description of the invocation is built only if it's used, since
+        # converting large arguments (e.g., dataframes) to string is slow.
+        func_info = _FuncInfo(self._func.__name__, args, kwargs)
         _LOG.debug(
             "%s: use_mem_cache=%s use_disk_cache=%s",
             func_info,
             self._use_mem_cache,
             self._use_disk_cache,
         )
+        if self._use_mem_cache or self._use_disk_cache:
+            # Hash the arguments once for all the cache levels, since it's
+            # expensive for large arguments.
+            func_id, args_id = self._get_identifiers("disk", *args, **kwargs)
         if self._use_mem_cache:
             _LOG.debug("Trying to retrieve from memory")
-            obj = self._execute_func_from_mem_cache(*args, **kwargs)
+            obj = self._execute_func_from_mem_cache(
+                func_info, func_id, args_id, *args, **kwargs
+            )
         else:
             if self.has_function_cache():
                 # For function-specific cache, skipping the memory cache is the
@@ -1005,14 +1370,46 @@ class _Cached:
                 _LOG.warning("Skipping memory cache")
             self._last_used_mem_cache = False
             if self._use_disk_cache:
-                obj = self._execute_func_from_disk_cache(*args, **kwargs)
+                obj = self._execute_func_from_disk_cache(
+                    func_info, func_id, args_id, *args, **kwargs
+                )
             else:
                 _LOG.warning("Skipping disk cache")
                 self._last_used_disk_cache = False
-                obj = self._execute_intrinsic_function(*args, **kwargs)
+                obj = self._execute_intrinsic_function(func_info, *args, **kwargs)
         return obj
 
 
+class _FuncInfo:
+    """
+    Describe an invocation of a cached function for logging and errors.
+
+    The string is built only when it's used, since converting large arguments
+    (e.g., dataframes) to string is slow.
+    """
+
+    def __init__(self, func_name: str, args: Tuple, kwargs: Dict[str, Any]):
+        self._func_name = func_name
+        self._args = args
+        self._kwargs = kwargs
+
+    def __str__(self) -> str:
+        return f"{self._func_name}(args={str(self._args)} kwargs={str(self._kwargs)})"
+
+
+class _SerializedObjRef:
+    """
+    Reference stored in a joblib cache in place of a value stored with
+    `hcache_store.dump_obj()` in the same dir.
+    """
+
+    FILE_NAME = "output.data"
+
+    def __init__(self, file_name: str, serializer_name: str):
+        self.file_name = file_name
+        self.serializer_name = serializer_name
+
+
 # #############################################################################
 # Decorator
 # #############################################################################
@@ -1025,6 +1422,11 @@ def cache(
     tag: Optional[str] = None,
     disk_cache_path: Optional[str] = None,
     aws_profile: Optional[str] = None,
+    use_tmpfs_cache: bool = False,
+    zero_copy: bool = False,
+    blob_store_path: Optional[str] = None,
+    blob_store_max_num_bytes: Optional[int] = None,
+    use_type_serializers: bool = False,
 ) -> Union[Callable, _Cached]:
     """
     Decorate a function with a cache.
@@ -1054,6 +1456,11 @@ def cache(
             tag=tag,
             disk_cache_path=disk_cache_path,
             aws_profile=aws_profile,
+            use_tmpfs_cache=use_tmpfs_cache,
+            zero_copy=zero_copy,
+            blob_store_path=blob_store_path,
+            blob_store_max_num_bytes=blob_store_max_num_bytes,
+            use_type_serializers=use_type_serializers,
         )
 
     return wrapper
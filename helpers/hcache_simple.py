@@ -1,12 +1,34 @@
+import asyncio
+import collections
+import contextlib
+import fcntl
 import functools
 import glob
+import hashlib
 import json
 import logging
 import os
 import pickle
 import re
-from typing import Any, Callable, Dict, List, Union, cast
-
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
 import pandas as pd
 
 import helpers.hdbg as hdbg
@@ -23,6 +45,73 @@ if "_CACHE" not in globals():
     _CACHE: _CacheType = {}
 
 
+# #############################################################################
+# Locks.
+# #############################################################################
+
+
+if "_CACHE_LOCKS" not in globals():
+    _LOG.debug("Creating _CACHE_LOCKS")
+    # func_name -> lock protecting the memory and disk cache of the function
+    # from concurrent threads.
+    _CACHE_LOCKS: Dict[str, threading.RLock] = {}
+    # Lock protecting `_CACHE_LOCKS`.
+    _CACHE_LOCKS_LOCK = threading.Lock()
+    # func_name -> number of nested acquisitions of the disk cache lock by the
+    # thread holding it.
+    _DISK_LOCK_DEPTH: Dict[str, int] = {}
+
+
+def _get_cache_lock(func_name: str) -> threading.RLock:
+    """
+    Return the lock for the cache of a function, creating it if needed.
+    """
+    with _CACHE_LOCKS_LOCK:
+        if func_name not in _CACHE_LOCKS:
+            _CACHE_LOCKS[func_name] = threading.RLock()
+        lock = _CACHE_LOCKS[func_name]
+    return lock
+
+
+@contextlib.contextmanager
+def _disk_cache_lock(func_name: str) -> Iterator[None]:
+    """
+    Lock the disk cache of a function across threads and processes.
+
+    The lock is an exclusive `flock()` on the file `cache.<func_name>.lock`,
+    which is separate from the cache file since that is replaced on every
+    write.
+    """
+    with _get_cache_lock(func_name):
+        if _DISK_LOCK_DEPTH.get(func_name, 0) > 0:
+            # The lock is already held by this thread.
+            _DISK_LOCK_DEPTH[func_name] += 1
+            try:
+                yield
+            finally:
+                _DISK_LOCK_DEPTH[func_name] -= 1
+            return
+        lock_file_name = f"cache.{func_name}.lock"
+        with open(lock_file_name, "w", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _DISK_LOCK_DEPTH[func_name] = 1
+            try:
+                yield
+            finally:
+                _DISK_LOCK_DEPTH[func_name] = 0
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_file_atomically(file_name: str, data: bytes) -> None:
+    """
+    Write a file so that readers see either the old or the new content.
+    """
+    tmp_file_name = f"{file_name}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_file_name, "wb") as file:
+        file.write(data)
+    os.replace(tmp_file_name, file_name)
+
+
 # #############################################################################
 # Cache performance.
 # #############################################################################
@@ -33,13 +122,16 @@ if "_CACHE_PERF" not in globals():
     # func_name -> perf properties.
     # perf properties: tot, hits, misses.
     _CACHE_PERF = {}
+    # Lock protecting the perf properties, which is separate from the cache
+    # locks since those are held while reading and writing the disk cache.
+    _CACHE_PERF_LOCK = threading.Lock()
 
 
 def enable_cache_perf(func_name: str) -> None:
     """
     Enable cache performance statistics for a given function.
     """
-    _CACHE_PERF[func_name] = {"tot": 0, "hits": 0, "misses": 0}
+    _CACHE_PERF[func_name] = {"tot": 0, "hits": 0, "misses": 0, "evictions": 0}
 
 
 def disable_cache_perf(func_name: str) -> None:
@@ -74,9 +166,11 @@ def get_cache_perf_stats(func_name: str) -> str:
     misses = perf["misses"]
     tot = perf["tot"]
     hit_rate = hits / tot if tot > 0 else 0
+    evictions = perf["evictions"]
+    num_bytes = get_mem_cache_num_bytes(func_name)
     txt = (
         f"{func_name}: hits={hits} misses={misses} tot={tot} hit_rate"
-        f"={hit_rate:.2f}"
+        f"={hit_rate:.2f} evictions={evictions} num_bytes={num_bytes}"
     )
     return txt
 
@@ -136,11 +230,24 @@ def _check_valid_cache_property(type_: str, property_name: str) -> None:
             "enable_perf",
             # Force to refresh the value.
             "force_refresh",
+            # Max number of entries in the memory cache, evicting the least
+            # recently used ones.
+            "max_entries",
+            # Max approximate size in bytes of the memory cache, evicting the
+            # least recently used entries.
+            "max_bytes",
+            # Number of seconds after which an entry is recomputed, counting
+            # from when it's computed or read from disk. The expired entries
+            # are not read back from the disk cache.
+            "ttl_seconds",
             # TODO(gp): "force_refresh_once"
         ]
     elif type_ == "system":
         valid_properties = [
+            # Format of the disk cache (e.g., "json", "pickle", "sqlite").
             "type",
+            # Whether the cache is shared by concurrent processes.
+            "concurrent",
         ]
     else:
         raise ValueError(f"Invalid type '{type_}'")
@@ -177,8 +284,7 @@ def set_cache_property(
     # Update values on the disk.
     file_name = get_cache_property_file(type_)
     _LOG.debug("Updating %s", file_name)
-    with open(file_name, "wb") as file:
-        pickle.dump(cache_property, file)
+    _write_file_atomically(file_name, pickle.dumps(cache_property))
 
 
 def get_cache_property(type_: str, func_name: str, property_name: str) -> bool:
@@ -209,8 +315,7 @@ def reset_cache_property(type_: str) -> None:
         raise ValueError(f"Invalid type '{type_}'")
     # Update values on the disk.
     _LOG.debug("Updating %s", file_name)
-    with open(file_name, "wb") as file:
-        pickle.dump(cache_property, file)
+    _write_file_atomically(file_name, pickle.dumps(cache_property))
 
 
 def cache_property_to_str(type_: str, func_name: str = "") -> str:
@@ -253,11 +358,141 @@ def _get_cache_file_name(func_name: str) -> str:
         file_name += ".pkl"
     elif cache_type == "json":
         file_name += ".json"
+    elif cache_type == "sqlite":
+        file_name += ".db"
     else:
         raise ValueError(f"Invalid cache type '{cache_type}'")
     return file_name
 
 
+# #############################################################################
+# SQLite disk cache.
+# #############################################################################
+
+
+# The "sqlite" cache type stores each entry as a row of a key-value table
+# indexed by the key. Unlike the "json" and "pickle" types, which need to
+# read and rewrite the entire file to persist a single entry, writing or
+# looking up an entry costs a single indexed access.
+
+# Number of writes to a SQLite disk cache after which it is compacted.
+_SQLITE_COMPACTION_INTERVAL = 100000
+
+
+# Seconds that a connection waits for a lock held by another process.
+_SQLITE_TIMEOUT_IN_SECS = 60
+
+
+if "_SQLITE_CONNECTIONS" not in globals():
+    _LOG.debug("Creating _SQLITE_CONNECTIONS")
+    # func_name -> connection to the SQLite disk cache.
+    _SQLITE_CONNECTIONS: Dict[str, sqlite3.Connection] = {}
+    # func_name -> number of writes since the last compaction.
+    _SQLITE_NUM_WRITES: Dict[str, int] = {}
+    # Process that opened the connections.
+    _SQLITE_PID = os.getpid()
+
+
+def _get_sqlite_connection(func_name: str) -> sqlite3.Connection:
+    """
+    Return the connection to the SQLite disk cache, creating it if needed.
+    """
+    global _SQLITE_PID
+    if _SQLITE_PID != os.getpid():
+        # A connection can't be used after a fork, so a child process opens
+        # its own connections.
+        _SQLITE_CONNECTIONS.clear()
+        _SQLITE_NUM_WRITES.clear()
+        _SQLITE_PID = os.getpid()
+    if func_name in _SQLITE_CONNECTIONS:
+        return _SQLITE_CONNECTIONS[func_name]
+    file_name = _get_cache_file_name(func_name)
+    _LOG.debug("Opening %s", file_name)
+    # The connection is shared by the threads, which are serialized by the
+    # cache lock.
+    conn = sqlite3.connect(
+        file_name, timeout=_SQLITE_TIMEOUT_IN_SECS, check_same_thread=False
+    )
+    # Use a write-ahead log so that a write appends to the log instead of
+    # rewriting the database pages.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)"
+    )
+    conn.commit()
+    _SQLITE_CONNECTIONS[func_name] = conn
+    _SQLITE_NUM_WRITES[func_name] = 0
+    return conn
+
+
+def close_sqlite_connections(func_name: str = "") -> None:
+    """
+    Close the connections to the SQLite disk caches.
+    """
+    if func_name == "":
+        for func_name_tmp in list(_SQLITE_CONNECTIONS.keys()):
+            close_sqlite_connections(func_name_tmp)
+        return
+    if func_name in _SQLITE_CONNECTIONS:
+        _LOG.debug("Closing connection for '%s'", func_name)
+        _SQLITE_CONNECTIONS[func_name].close()
+        del _SQLITE_CONNECTIONS[func_name]
+        del _SQLITE_NUM_WRITES[func_name]
+
+
+def _get_from_sqlite_cache(func_name: str, key: str) -> Tuple[bool, Any]:
+    """
+    Look up a key in the SQLite disk cache.
+
+    :return: whether the key was found and the corresponding value
+    """
+    conn = _get_sqlite_connection(func_name)
+    row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return False, None
+    value = pickle.loads(row[0])
+    return True, value
+
+
+def _write_to_sqlite_cache(func_name: str, data: Dict) -> None:
+    """
+    Insert or replace the entries of `data` in the SQLite disk cache.
+    """
+    conn = _get_sqlite_connection(func_name)
+    rows = [(key, pickle.dumps(value)) for key, value in data.items()]
+    conn.executemany(
+        "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", rows
+    )
+    conn.commit()
+    # Compact the disk cache periodically.
+    _SQLITE_NUM_WRITES[func_name] += len(rows)
+    if _SQLITE_NUM_WRITES[func_name] >= _SQLITE_COMPACTION_INTERVAL:
+        compact_disk_cache(func_name)
+
+
+def _get_sqlite_cache_size(func_name: str) -> int:
+    conn = _get_sqlite_connection(func_name)
+    (num_entries,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+    num_entries = cast(int, num_entries)
+    return num_entries
+
+
+def compact_disk_cache(func_name: str) -> None:
+    """
+    Compact a SQLite disk cache, reclaiming the space of replaced entries.
+    """
+    cache_type = get_cache_property("system", func_name, "type")
+    hdbg.dassert_eq(cache_type, "sqlite")
+    _LOG.debug("Compacting disk cache for '%s'", func_name)
+    conn = _get_sqlite_connection(func_name)
+    # Move the content of the write-ahead log into the database and rebuild
+    # it without unused pages.
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    _SQLITE_NUM_WRITES[func_name] = 0
+
+
 def _save_cache_dict_to_disk(func_name: str, data: Dict) -> None:
     """
     Save a cache dictionary into the disk cache.
@@ -267,11 +502,11 @@ def _save_cache_dict_to_disk(func_name: str, data: Dict) -> None:
     cache_type = get_cache_property("system", func_name, "type")
     _LOG.debug(hprint.to_str("file_name cache_type"))
     if cache_type == "pickle":
-        with open(file_name, "wb") as file:
-            pickle.dump(data, file)
+        _write_file_atomically(file_name, pickle.dumps(data))
     elif cache_type == "json":
-        with open(file_name, "w", encoding="utf-8") as file:
-            json.dump(data, file)
+        _write_file_atomically(file_name, json.dumps(data).encode("utf-8"))
+    elif cache_type == "sqlite":
+        _write_to_sqlite_cache(func_name, data)
     else:
         raise ValueError(f"Invalid cache type '{cache_type}'")
 
@@ -280,9 +515,12 @@ def get_disk_cache(func_name: str) -> Dict:
     file_name = _get_cache_file_name(func_name)
     # If the disk cache doesn't exist, create it.
     if not os.path.exists(file_name):
-        _LOG.debug("No cache from disk")
-        data: _CacheType = {}
-        _save_cache_dict_to_disk(func_name, data)
+        with _disk_cache_lock(func_name):
+            # Check again since another process might have created it.
+            if not os.path.exists(file_name):
+                _LOG.debug("No cache from disk")
+                data: _CacheType = {}
+                _save_cache_dict_to_disk(func_name, data)
     # Load data.
     cache_type = get_cache_property("system", func_name, "type")
     _LOG.debug(hprint.to_str("cache_type"))
@@ -292,6 +530,10 @@ def get_disk_cache(func_name: str) -> Dict:
     elif cache_type == "json":
         with open(file_name, "r", encoding="utf-8") as file:
             data = json.load(file)
+    elif cache_type == "sqlite":
+        conn = _get_sqlite_connection(func_name)
+        rows = conn.execute("SELECT key, value FROM cache").fetchall()
+        data = {key: pickle.loads(value) for key, value in rows}
     else:
         raise ValueError(f"Invalid cache type '{cache_type}'")
     return data
@@ -308,12 +550,54 @@ def force_cache_from_disk(func_name: str = "") -> None:
         _LOG.info("After:\n%s", cache_stats_to_str())
         return
     _LOG.debug("func_name='%s'", func_name)
-    # Get disk cache.
-    disk_cache = get_disk_cache(func_name)
-    _LOG.debug("disk_cache=%s", len(disk_cache))
-    # Update the memory cache.
-    global _CACHE
-    _CACHE[func_name] = disk_cache
+    with _get_cache_lock(func_name):
+        # Get disk cache.
+        disk_cache = get_disk_cache(func_name)
+        _LOG.debug("disk_cache=%s", len(disk_cache))
+        # Update the memory cache.
+        _set_mem_cache(func_name, disk_cache)
+        _pop_cache_delta(func_name)
+
+
+if "_CACHE_DELTA" not in globals():
+    _LOG.debug("Creating _CACHE_DELTA")
+    # func_name -> key -> value for the entries computed since the last flush,
+    # tracked only for the functions in concurrent mode.
+    _CACHE_DELTA: _CacheType = {}
+    # func_name -> approximate size in bytes of the entries in `_CACHE_DELTA`.
+    _CACHE_DELTA_NUM_BYTES: Dict[str, int] = {}
+
+
+def _pop_cache_delta(func_name: str) -> Dict:
+    """
+    Remove and return the entries computed since the last flush.
+    """
+    _CACHE_DELTA_NUM_BYTES.pop(func_name, None)
+    delta = _CACHE_DELTA.pop(func_name, {})
+    return delta
+
+
+def _add_to_cache_delta(func_name: str, key: str, value: Any) -> None:
+    """
+    Add an entry to the entries computed since the last flush.
+
+    The entries are kept until they are flushed, even if they are evicted from
+    the memory cache, so they are flushed when they exceed the limits of the
+    memory cache.
+    """
+    _CACHE_DELTA.setdefault(func_name, {})[key] = value
+    max_entries = _get_cache_limit(func_name, "max_entries")
+    max_bytes = _get_cache_limit(func_name, "max_bytes")
+    num_bytes = 0
+    if max_bytes is not None:
+        num_bytes = _CACHE_DELTA_NUM_BYTES.get(func_name, 0)
+        num_bytes += _get_entry_num_bytes(key, value)
+        _CACHE_DELTA_NUM_BYTES[func_name] = num_bytes
+    if (
+        max_entries is not None and len(_CACHE_DELTA[func_name]) > max_entries
+    ) or (max_bytes is not None and num_bytes > max_bytes):
+        _LOG.debug("Flushing the entries computed since the last flush")
+        flush_cache_to_disk(func_name)
 
 
 def flush_cache_to_disk(func_name: str = "") -> None:
@@ -327,19 +611,248 @@ def flush_cache_to_disk(func_name: str = "") -> None:
         _LOG.info("After:\n%s", cache_stats_to_str())
         return
     _LOG.debug("func_name='%s'", func_name)
-    # Get memory cache.
-    mem_cache = get_mem_cache(func_name)
-    _LOG.debug("mem_cache=%s", len(mem_cache))
-    # Get disk cache.
-    disk_cache = get_disk_cache(func_name)
-    _LOG.debug("disk_cache=%s", len(disk_cache))
-    # Merge disk cache with memory cache.
-    disk_cache.update(mem_cache)
-    # Save merged cache to disk.
-    _save_cache_dict_to_disk(func_name, disk_cache)
-    # Update the memory cache.
-    global _CACHE
-    _CACHE[func_name] = disk_cache
+    with _get_cache_lock(func_name):
+        # Get the entries to write: in concurrent mode only the ones computed
+        # by this process, so that they don't overwrite the entries written
+        # by other processes in the meantime.
+        if get_cache_property("system", func_name, "concurrent"):
+            mem_cache = _pop_cache_delta(func_name)
+        else:
+            mem_cache = get_mem_cache(func_name)
+        _LOG.debug("mem_cache=%s", len(mem_cache))
+        cache_type = get_cache_property("system", func_name, "type")
+        if cache_type == "sqlite":
+            # Write the memory cache without reading back the disk cache.
+            _save_cache_dict_to_disk(func_name, mem_cache)
+            return
+        with _disk_cache_lock(func_name):
+            # Get disk cache.
+            disk_cache = get_disk_cache(func_name)
+            _LOG.debug("disk_cache=%s", len(disk_cache))
+            # Merge disk cache with memory cache.
+            disk_cache.update(mem_cache)
+            # Save merged cache to disk.
+            _save_cache_dict_to_disk(func_name, disk_cache)
+        # Update the memory cache.
+        _set_mem_cache(func_name, disk_cache)
+
+
+# #############################################################################
+# Bounded memory cache.
+# #############################################################################
+
+
+# The memory cache of a function is an `OrderedDict` from the least to the most
+# recently used entry, so that enforcing the `max_entries` and `max_bytes`
+# properties evicts entries from the front in O(1). The insertion time and the
+# size of each entry are kept in a separate `OrderedDict` from the oldest to
+# the newest entry, so that expiring the entries older than `ttl_seconds`
+# also pops from the front.
+
+if "_CACHE_ENTRY_INFO" not in globals():
+    _LOG.debug("Creating _CACHE_ENTRY_INFO")
+    # func_name -> key -> (insertion time, size in bytes).
+    _CACHE_ENTRY_INFO: Dict[
+        str, "collections.OrderedDict[str, Tuple[float, int]]"
+    ] = {}
+    # func_name -> approximate size in bytes of the memory cache.
+    _CACHE_NUM_BYTES: Dict[str, int] = {}
+    # func_name -> keys evicted from the memory cache of a JSON or pickle
+    # cache, which can still be in the disk cache.
+    _CACHE_EVICTED_KEYS: Dict[str, Set[str]] = {}
+    # func_name -> keys expired from the memory cache, whose values in the disk
+    # cache are stale until they are recomputed.
+    _CACHE_EXPIRED_KEYS: Dict[str, Set[str]] = {}
+
+
+def _get_obj_num_bytes(obj: Any, seen_ids: Set[int]) -> int:
+    """
+    Return the approximate size in bytes of an object and of its content.
+
+    :param seen_ids: ids of the objects already accounted for, so that
+        shared and self-referencing objects are counted once
+    """
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        # Scalars are not shared, so they don't need to be tracked.
+        num_bytes = sys.getsizeof(obj)
+        return num_bytes
+    if id(obj) in seen_ids:
+        return 0
+    seen_ids.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        num_bytes = int(obj.memory_usage(index=True, deep=True).sum())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        num_bytes = int(obj.memory_usage(deep=True))
+    elif isinstance(obj, np.ndarray):
+        num_bytes = sys.getsizeof(obj)
+        if obj.base is not None:
+            # `getsizeof()` doesn't account for the data of a view.
+            num_bytes += obj.nbytes
+    elif isinstance(obj, dict):
+        num_bytes = sys.getsizeof(obj) + sum(
+            _get_obj_num_bytes(k, seen_ids) + _get_obj_num_bytes(v, seen_ids)
+            for k, v in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        num_bytes = sys.getsizeof(obj) + sum(
+            _get_obj_num_bytes(v, seen_ids) for v in obj
+        )
+    else:
+        num_bytes = sys.getsizeof(obj)
+    return num_bytes
+
+
+def _get_entry_num_bytes(key: str, value: Any) -> int:
+    """
+    Return the approximate size in bytes of a cache entry.
+
+    The size of the containers includes the size of their content, and the
+    size of the pandas objects includes the size of their Python objects.
+    """
+    num_bytes = sys.getsizeof(key) + _get_obj_num_bytes(value, set())
+    return num_bytes
+
+
+def _get_cache_limit(func_name: str, property_name: str) -> Optional[float]:
+    """
+    Return the value of a cache limit property or `None` if it is not set.
+    """
+    val = get_cache_property("user", func_name, property_name)
+    if val is False or val is None:
+        return None
+    hdbg.dassert_lte(0, val)
+    return val
+
+
+def _evict_entry(func_name: str, key: str, *, is_expired: bool = False) -> None:
+    """
+    Remove an entry from the memory cache.
+
+    :param is_expired: whether the entry is older than `ttl_seconds`, and so
+        it must not be read back from the disk cache
+    """
+    del _CACHE[func_name][key]
+    _, num_bytes = _CACHE_ENTRY_INFO[func_name].pop(key)
+    _CACHE_NUM_BYTES[func_name] -= num_bytes
+    if is_expired:
+        _CACHE_EXPIRED_KEYS.setdefault(func_name, set()).add(key)
+    elif get_cache_property("system", func_name, "type") != "sqlite":
+        # Remember the key, so that it's looked up in the disk cache.
+        _CACHE_EVICTED_KEYS.setdefault(func_name, set()).add(key)
+    cache_perf = get_cache_perf(func_name)
+    if cache_perf:
+        cache_perf["evictions"] += 1
+
+
+def _enforce_cache_limits(func_name: str) -> None:
+    """
+    Evict entries from the memory cache until it satisfies the cache limits.
+    """
+    cache = _CACHE[func_name]
+    entry_info = _CACHE_ENTRY_INFO[func_name]
+    # Expire the oldest entries.
+    ttl_seconds = _get_cache_limit(func_name, "ttl_seconds")
+    if ttl_seconds is not None:
+        min_timestamp = time.time() - ttl_seconds
+        while entry_info:
+            key, (timestamp, _) = next(iter(entry_info.items()))
+            if timestamp >= min_timestamp:
+                break
+            _LOG.debug("Expiring key='%s'", key)
+            _evict_entry(func_name, key, is_expired=True)
+    # Evict the least recently used entries.
+    max_entries = _get_cache_limit(func_name, "max_entries")
+    max_bytes = _get_cache_limit(func_name, "max_bytes")
+    while cache and (
+        (max_entries is not None and len(cache) > max_entries)
+        or (max_bytes is not None and _CACHE_NUM_BYTES[func_name] > max_bytes)
+    ):
+        key = next(iter(cache))
+        _LOG.debug("Evicting key='%s'", key)
+        _evict_entry(func_name, key)
+
+
+def _set_mem_cache(func_name: str, data: Dict) -> None:
+    """
+    Replace the memory cache of a function with the entries in `data`.
+
+    The entries already in the memory cache keep their insertion time and
+    their order of use, while the new entries are considered the least
+    recently used. The expired entries are skipped.
+    """
+    expired_keys = _CACHE_EXPIRED_KEYS.get(func_name, set())
+    data = {key: value for key, value in data.items() if key not in expired_keys}
+    old_cache = _CACHE.get(func_name, {})
+    old_entry_info = _CACHE_ENTRY_INFO.get(func_name, {})
+    now = time.time()
+    cache: _CacheType = collections.OrderedDict()
+    entry_info: "collections.OrderedDict[str, Tuple[float, int]]" = (
+        collections.OrderedDict()
+    )
+    # Add the new entries.
+    for key, value in data.items():
+        if key not in old_cache:
+            cache[key] = value
+    # Add the entries already in memory in the order of use.
+    for key in old_cache:
+        if key in data:
+            cache[key] = data[key]
+    # Keep the insertion times, from the oldest to the newest.
+    for key, (timestamp, _) in old_entry_info.items():
+        if key in data:
+            entry_info[key] = (timestamp, _get_entry_num_bytes(key, data[key]))
+    for key in cache:
+        if key not in entry_info:
+            entry_info[key] = (now, _get_entry_num_bytes(key, cache[key]))
+    _CACHE[func_name] = cache
+    _CACHE_ENTRY_INFO[func_name] = entry_info
+    _CACHE_NUM_BYTES[func_name] = sum(
+        num_bytes for _, num_bytes in entry_info.values()
+    )
+    _CACHE_EVICTED_KEYS.get(func_name, set()).difference_update(cache)
+    _enforce_cache_limits(func_name)
+
+
+def _add_to_mem_cache(func_name: str, key: str, value: Any) -> None:
+    """
+    Add an entry to the memory cache as the most recently used one.
+    """
+    cache = _CACHE[func_name]
+    entry_info = _CACHE_ENTRY_INFO[func_name]
+    if key in cache:
+        _, num_bytes = entry_info.pop(key)
+        _CACHE_NUM_BYTES[func_name] -= num_bytes
+    cache[key] = value
+    cache.move_to_end(key)
+    _CACHE_EVICTED_KEYS.get(func_name, set()).discard(key)
+    _CACHE_EXPIRED_KEYS.get(func_name, set()).discard(key)
+    num_bytes = _get_entry_num_bytes(key, value)
+    entry_info[key] = (time.time(), num_bytes)
+    _CACHE_NUM_BYTES[func_name] += num_bytes
+    _enforce_cache_limits(func_name)
+
+
+def _get_from_mem_cache(func_name: str, key: str) -> Tuple[bool, Any]:
+    """
+    Look up a key in the memory cache, marking it as the most recently used.
+
+    :return: whether the key was found and the corresponding value
+    """
+    _enforce_cache_limits(func_name)
+    cache = _CACHE[func_name]
+    if key not in cache:
+        return False, None
+    cache.move_to_end(key)
+    value = cache[key]
+    return True, value
+
+
+def get_mem_cache_num_bytes(func_name: str) -> int:
+    """
+    Return the approximate size in bytes of the memory cache of a function.
+    """
+    num_bytes = _CACHE_NUM_BYTES.get(func_name, 0)
+    return num_bytes
 
 
 # #############################################################################
@@ -363,9 +876,11 @@ def get_cache_func_names(type_: str) -> List[str]:
         val = mem_func_names
     elif type_ == "disk":
         disk_func_names = glob.glob("cache.*")
+        # Skip the auxiliary files of SQLite (e.g., `cache.func.db-wal`).
         disk_func_names = [
-            re.sub(r"cache\.(.*)\.(json|pkl)", r"\1", cache)
+            re.sub(r"cache\.(.*)\.(json|pkl|db)$", r"\1", cache)
             for cache in disk_func_names
+            if re.match(r"cache\.(.*)\.(json|pkl|db)$", cache)
         ]
         disk_func_names = sorted(disk_func_names)
         val = disk_func_names
@@ -386,14 +901,18 @@ def get_cache(func_name: str) -> _CacheType:
     :param func_name: The name of the function whose cache is to be retrieved.
     :return: A dictionary containing the cache data.
     """
-    global _CACHE
     if func_name in _CACHE:
         _LOG.debug("Loading mem cache for '%s'", func_name)
-        cache = get_mem_cache(func_name)
+    elif get_cache_property("system", func_name, "type") == "sqlite":
+        # The SQLite disk cache is accessed one key at a time on a memory
+        # cache miss, so we don't load it in memory.
+        _LOG.debug("Creating mem cache for '%s'", func_name)
+        _set_mem_cache(func_name, {})
     else:
         _LOG.debug("Loading disk cache for '%s'", func_name)
-        cache = get_disk_cache(func_name)
-        _CACHE[func_name] = cache
+        disk_cache = get_disk_cache(func_name)
+        _set_mem_cache(func_name, disk_cache)
+    cache = get_mem_cache(func_name)
     return cache
 
 
@@ -413,6 +932,9 @@ def cache_stats_to_str(func_name: str = "") -> pd.DataFrame:
     verify_email:
       memory: -
       disk: 2322
+
+    The memory cache also reports its approximate size in bytes and, when the
+    performance stats are enabled, the hit rate and the number of evictions.
     """
     if func_name == "":
         result = []
@@ -425,13 +947,27 @@ def cache_stats_to_str(func_name: str = "") -> pd.DataFrame:
     # Memory cache.
     if func_name in _CACHE:
         result["memory"] = len(_CACHE[func_name])
+        result["memory_bytes"] = get_mem_cache_num_bytes(func_name)
     else:
         result["memory"] = "-"
+        result["memory_bytes"] = "-"
+    cache_perf = get_cache_perf(func_name)
+    if cache_perf:
+        tot = cache_perf["tot"]
+        result["hit_rate"] = cache_perf["hits"] / tot if tot > 0 else 0
+        result["evictions"] = cache_perf["evictions"]
+    else:
+        result["hit_rate"] = "-"
+        result["evictions"] = "-"
     # Disk cache.
     file_name = _get_cache_file_name(func_name)
     if os.path.exists(file_name):
-        disk_cache = get_disk_cache(func_name)
-        result["disk"] = len(disk_cache)
+        cache_type = get_cache_property("system", func_name, "type")
+        if cache_type == "sqlite":
+            result["disk"] = _get_sqlite_cache_size(func_name)
+        else:
+            disk_cache = get_disk_cache(func_name)
+            result["disk"] = len(disk_cache)
     else:
         result["disk"] = "-"
     result = pd.Series(result).to_frame().T
@@ -451,8 +987,13 @@ def reset_mem_cache(func_name: str = "") -> None:
             reset_mem_cache(func_name_tmp)
         _LOG.info("After:\n%s", cache_stats_to_str())
         return
-    _CACHE[func_name] = {}
-    del _CACHE[func_name]
+    with _get_cache_lock(func_name):
+        _CACHE[func_name] = {}
+        del _CACHE[func_name]
+        _CACHE_ENTRY_INFO.pop(func_name, None)
+        _CACHE_NUM_BYTES.pop(func_name, None)
+        _CACHE_EVICTED_KEYS.pop(func_name, None)
+        _CACHE_EXPIRED_KEYS.pop(func_name, None)
 
 
 def reset_disk_cache(func_name: str = "") -> None:
@@ -471,81 +1012,407 @@ def reset_cache(func_name: str = "") -> None:
     reset_disk_cache(func_name)
 
 
+# #############################################################################
+# Cache key.
+# #############################################################################
+
+
+class _Digest:
+    """
+    Stand-in for an argument in a cache key, represented by its digest.
+    """
+
+    def __init__(self, type_name: str, digest: str):
+        self._type_name = type_name
+        self._digest = digest
+
+    def __repr__(self) -> str:
+        return f"<{self._type_name}:{self._digest}>"
+
+
+def _get_digest(data: bytes) -> str:
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return digest
+
+
+def _get_key_part(obj: Any) -> Any:
+    """
+    Return the object representing an argument in a cache key.
+
+    Numpy and pandas objects are represented by a digest of their content,
+    instead of their string representation, which is expensive to compute
+    and truncated for large objects. Other objects are represented by
+    themselves, and thus by their `repr()` in the key.
+    """
+    if isinstance(obj, np.ndarray):
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"{obj.dtype}{obj.shape}".encode())
+        if obj.dtype == object:
+            hasher.update(repr(obj.tolist()).encode())
+        else:
+            hasher.update(np.ascontiguousarray(obj).tobytes())
+        part = _Digest("ndarray", hasher.hexdigest())
+    elif isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        hasher = hashlib.blake2b(digest_size=16)
+        if isinstance(obj, pd.DataFrame):
+            hasher.update(repr(list(obj.columns)).encode())
+            hasher.update(repr(list(obj.dtypes)).encode())
+        else:
+            hasher.update(f"{obj.name}{obj.dtype}".encode())
+        hasher.update(pd.util.hash_pandas_object(obj).to_numpy().tobytes())
+        part = _Digest(type(obj).__name__, hasher.hexdigest())
+    elif isinstance(obj, tuple) and hasattr(obj, "_fields"):
+        # Build a namedtuple from its fields, since its constructor doesn't
+        # accept an iterable.
+        part = type(obj)(*(_get_key_part(v) for v in obj))
+    elif isinstance(obj, tuple):
+        part = tuple(_get_key_part(v) for v in obj)
+    elif isinstance(obj, list):
+        part = [_get_key_part(v) for v in obj]
+    elif isinstance(obj, dict):
+        part = {k: _get_key_part(v) for k, v in obj.items()}
+    else:
+        part = obj
+    return part
+
+
+def get_cache_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """
+    Build the cache key for the arguments of a function call.
+
+    E.g., `func(1, "a", b=2)` has key `(1, 'a') {'b': 2}`, while
+    `func(1, "a")` has key `(1, 'a')`.
+
+    :param args: positional arguments of the call
+    :param kwargs: keyword arguments of the call
+    :return: cache key
+    """
+    key = str(_get_key_part(args))
+    if kwargs:
+        # Sort the keyword arguments so that the key doesn't depend on their
+        # order in the call.
+        kwargs = dict(sorted(kwargs.items()))
+        key += " " + str(_get_key_part(kwargs))
+    return key
+
+
 # #############################################################################
 # Decorator
 # #############################################################################
 
 
+def _get_func_name(func: Callable[..., Any]) -> str:
+    """
+    Return the name of the cache of a function.
+    """
+    func_name = func.__name__
+    if func_name.endswith("_intrinsic"):
+        func_name = func_name[: -len("_intrinsic")]
+    return func_name
+
+
+def _get_key(
+    func_name: str,
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    key_func: Optional[Callable[[Tuple[Any, ...], Dict[str, Any]], str]],
+    use_digest: bool,
+) -> str:
+    """
+    Return the cache key of a function call.
+    """
+    if key_func is None:
+        key_func = get_cache_key
+    key = key_func(args, kwargs)
+    if use_digest:
+        key = _get_digest(key.encode())
+    _LOG.debug("func_name=%s key=%s", func_name, key)
+    return key
+
+
+def _get_from_disk_cache(
+    func_name: str, key: str, cache_type: str
+) -> Tuple[bool, Any]:
+    """
+    Look up a key that is not in the memory cache in the disk cache.
+
+    The SQLite disk cache is read one key at a time. The JSON and pickle disk
+    caches are read entirely, so they are read only for the keys evicted from
+    the memory cache, since the other keys on disk were loaded in memory. The
+    expired keys are never read, since their values on disk are stale.
+
+    :return: whether the key was found and the corresponding value
+    """
+    if key in _CACHE_EXPIRED_KEYS.get(func_name, set()):
+        return False, None
+    if cache_type == "sqlite":
+        is_hit, value = _get_from_sqlite_cache(func_name, key)
+        return is_hit, value
+    evicted_keys = _CACHE_EVICTED_KEYS.get(func_name, set())
+    if key not in evicted_keys:
+        return False, None
+    # Don't read the disk cache again for this key.
+    evicted_keys.discard(key)
+    if not os.path.exists(_get_cache_file_name(func_name)):
+        return False, None
+    disk_cache = get_disk_cache(func_name)
+    if key not in disk_cache:
+        return False, None
+    value = disk_cache[key]
+    return True, value
+
+
+def _get_cached_value(
+    func_name: str, key: str, cache_type: str
+) -> Tuple[bool, Any]:
+    """
+    Look up a key in the memory cache and then in the disk cache.
+
+    :return: whether the key was found and the corresponding value
+    """
+    with _get_cache_lock(func_name):
+        # Load the cache in memory, if needed.
+        get_cache(func_name)
+        # Handle a forced refresh.
+        force_refresh = get_cache_property("user", func_name, "force_refresh")
+        _LOG.debug("force_refresh=%s", force_refresh)
+        if force_refresh:
+            return False, None
+        is_hit, value = _get_from_mem_cache(func_name, key)
+        if not is_hit:
+            # Look up the key in the disk cache.
+            is_hit, value = _get_from_disk_cache(func_name, key, cache_type)
+            if is_hit:
+                _add_to_mem_cache(func_name, key, value)
+    return is_hit, value
+
+
+def _update_cache_perf(func_name: str, is_hit: bool) -> None:
+    """
+    Update the performance stats of a function, if they are enabled.
+    """
+    with _CACHE_PERF_LOCK:
+        cache_perf = get_cache_perf(func_name)
+        _LOG.debug("cache_perf is None=%s", cache_perf is None)
+        if cache_perf:
+            hdbg.dassert_in("tot", cache_perf)
+            cache_perf["tot"] += 1
+            if is_hit:
+                cache_perf["hits"] += 1
+            else:
+                cache_perf["misses"] += 1
+
+
+def _report_cache_miss(func_name: str, key: str) -> bool:
+    """
+    Handle the `abort_on_cache_miss` and `report_on_cache_miss` properties.
+
+    :return: whether to return `_cache_miss_` instead of calling the function
+    """
+    # Abort on cache miss.
+    abort_on_cache_miss = get_cache_property(
+        "user", func_name, "abort_on_cache_miss"
+    )
+    _LOG.debug("abort_on_cache_miss=%s", abort_on_cache_miss)
+    if abort_on_cache_miss:
+        raise ValueError(f"Cache miss for key='{key}'")
+    # Report on cache miss.
+    report_on_cache_miss = get_cache_property(
+        "user", func_name, "report_on_cache_miss"
+    )
+    _LOG.debug("report_on_cache_miss=%s", report_on_cache_miss)
+    if report_on_cache_miss:
+        _LOG.debug("Cache miss for key='%s'", key)
+    report_on_cache_miss = cast(bool, report_on_cache_miss)
+    return report_on_cache_miss
+
+
+def _add_to_cache(func_name: str, key: str, value: Any, concurrent: bool) -> None:
+    """
+    Add a computed value to the memory cache.
+    """
+    with _get_cache_lock(func_name):
+        _add_to_mem_cache(func_name, key, value)
+        if concurrent:
+            _add_to_cache_delta(func_name, key, value)
+        _LOG.debug("Updating cache with key='%s' value='%s'", key, value)
+
+
+def _write_through(func_name: str, key: str, value: Any, cache_type: str) -> None:
+    """
+    Write a computed value to the disk cache.
+    """
+    _LOG.debug("Writing through to disk")
+    with _get_cache_lock(func_name):
+        if cache_type == "sqlite":
+            # Write only the new entry.
+            _save_cache_dict_to_disk(func_name, {key: value})
+            _pop_cache_delta(func_name)
+        else:
+            flush_cache_to_disk(func_name)
+
+
 def simple_cache(
-    cache_type: str = "json", write_through: bool = False
+    cache_type: str = "json",
+    write_through: bool = False,
+    *,
+    key_func: Optional[Callable[[Tuple[Any, ...], Dict[str, Any]], str]] = None,
+    use_digest: bool = False,
+    concurrent: bool = False,
 ) -> Callable[..., Any]:
+    """
+    Cache the results of a function in memory and on disk.
+
+    :param cache_type: format of the disk cache
+        - "json": a JSON file with all the entries
+        - "pickle": a pickle file with all the entries
+        - "sqlite": a SQLite key-value table, which is read and written one
+          entry at a time, instead of loading and rewriting the entire cache
+    :param write_through: write each new entry to the disk cache
+    :param key_func: function building the cache key from the positional and
+        keyword arguments of a call (by default `get_cache_key()`)
+    :param use_digest: store a digest of the key instead of the key itself,
+        which keeps the cache small when the arguments are large
+    :param concurrent: share the disk cache among concurrent processes (e.g.,
+        the workers of `hjoblib.parallel_execute()`), so that flushing merges
+        only the entries computed by each process into the disk cache while
+        holding a file lock
+    """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
-        hdbg.dassert_in(cache_type, ("json", "pickle"))
-        func_name = func.__name__
-        if func_name.endswith("_intrinsic"):
-            func_name = func_name[: -len("_intrinsic")]
+        hdbg.dassert_in(cache_type, ("json", "pickle", "sqlite"))
+        func_name = _get_func_name(func)
         set_cache_property("system", func_name, "type", cache_type)
+        set_cache_property("system", func_name, "concurrent", concurrent)
 
         @functools.wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            # Get the function name.
-            func_name = func.__name__
-            if func_name.endswith("_intrinsic"):
-                func_name = func_name[: -len("_intrinsic")]
-            # Get the cache.
-            cache = get_cache(func_name)
-            # Get the key.
-            # key = (args, frozenset(kwargs.items()))
-            key = args
-            key = str(key)
-            _LOG.debug("key=%s", key)
-            # Get the cache properties.
-            cache_perf = get_cache_perf(func_name)
-            _LOG.debug("cache_perf is None=%s", cache_perf is None)
-            # Update the performance stats.
-            if cache_perf:
-                hdbg.dassert_in("tot", cache_perf)
-                cache_perf["tot"] += 1
-            # Handle a forced refresh.
-            force_refresh = get_cache_property("user", func_name, "force_refresh")
-            _LOG.debug("force_refresh=%s", force_refresh)
-            if not force_refresh and key in cache:
+            key = _get_key(func_name, args, kwargs, key_func, use_digest)
+            is_hit, value = _get_cached_value(func_name, key, cache_type)
+            _update_cache_perf(func_name, is_hit)
+            if is_hit:
                 _LOG.debug("Cache hit for key='%s'", key)
-                # Update the performance stats.
-                if cache_perf:
-                    cache_perf["hits"] += 1
-                # Retrieve the value from the cache.
-                value = cache[key]
-            else:
-                _LOG.debug("Cache miss for key='%s'", key)
-                # Update the performance stats.
-                if cache_perf:
-                    cache_perf["misses"] += 1
-                # Abort on cache miss.
-                abort_on_cache_miss = get_cache_property(
-                    "user", func_name, "abort_on_cache_miss"
-                )
-                _LOG.debug("abort_on_cache_miss=%s", abort_on_cache_miss)
-                if abort_on_cache_miss:
-                    raise ValueError(f"Cache miss for key='{key}'")
-                # Report on cache miss.
-                report_on_cache_miss = get_cache_property(
-                    "user", func_name, "report_on_cache_miss"
+                return value
+            _LOG.debug("Cache miss for key='%s'", key)
+            if _report_cache_miss(func_name, key):
+                return "_cache_miss_"
+            # Access the intrinsic function without holding the lock, so that
+            # the other threads can use the cache in the meantime.
+            value = func(*args, **kwargs)
+            # Update cache.
+            _add_to_cache(func_name, key, value, concurrent)
+            if write_through:
+                _write_through(func_name, key, value, cache_type)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def async_simple_cache(
+    cache_type: str = "json",
+    write_through: bool = False,
+    *,
+    key_func: Optional[Callable[[Tuple[Any, ...], Dict[str, Any]], str]] = None,
+    use_digest: bool = False,
+    concurrent: bool = False,
+    max_concurrency: Optional[int] = None,
+) -> Callable[..., Any]:
+    """
+    Cache the results of a coroutine function in memory and on disk.
+
+    The cache shares the properties, the stats, and the disk layout of
+    `simple_cache()`. Concurrent calls with the same key are coalesced so
+    that only the first one awaits the function, while the others await its
+    result and count as cache hits.
+
+    :param cache_type, write_through, key_func, use_digest, concurrent: same
+        as `simple_cache()`
+    :param max_concurrency: max number of calls of the function that can be
+        in progress at the same time in an event loop, or `None` for no limit
+    """
+    if max_concurrency is not None:
+        hdbg.dassert_lte(1, max_concurrency)
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        hdbg.dassert_in(cache_type, ("json", "pickle", "sqlite"))
+        hdbg.dassert(
+            asyncio.iscoroutinefunction(func),
+            "'%s' is not a coroutine function",
+            func.__name__,
+        )
+        func_name = _get_func_name(func)
+        set_cache_property("system", func_name, "type", cache_type)
+        set_cache_property("system", func_name, "concurrent", concurrent)
+        # Event loop -> key -> future with the result of the call in progress.
+        in_flight: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # Event loop -> semaphore bounding the calls in progress.
+        semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+        async def _call_func(*args: Any, **kwargs: Any) -> Any:
+            if max_concurrency is None:
+                value = await func(*args, **kwargs)
+                return value
+            loop = asyncio.get_running_loop()
+            if loop not in semaphores:
+                semaphores[loop] = asyncio.Semaphore(max_concurrency)
+            async with semaphores[loop]:
+                value = await func(*args, **kwargs)
+            return value
+
+        def _update_cache(key: str, value: Any) -> None:
+            _add_to_cache(func_name, key, value, concurrent)
+            if write_through:
+                _write_through(func_name, key, value, cache_type)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = _get_key(func_name, args, kwargs, key_func, use_digest)
+            loop = asyncio.get_running_loop()
+            loop_in_flight = in_flight.setdefault(loop, {})
+            is_hit, value = False, None
+            if key not in loop_in_flight:
+                # Access the cache in a worker thread, since its lock can be
+                # held by a thread flushing it to disk and a miss can read the
+                # disk cache.
+                is_hit, value = await asyncio.to_thread(
+                    _get_cached_value, func_name, key, cache_type
                 )
-                _LOG.debug("report_on_cache_miss=%s", report_on_cache_miss)
-                if report_on_cache_miss:
-                    _LOG.debug("Cache miss for key='%s'", key)
-                    return "_cache_miss_"
-                # Access the intrinsic function.
-                value = func(*args, **kwargs)
-                # Update cache.
-                cache[key] = value
-                _LOG.debug("Updating cache with key='%s' value='%s'", key, value)
-                #
-                if write_through:
-                    _LOG.debug("Writing through to disk")
-                    flush_cache_to_disk(func_name)
+            if not is_hit and key in loop_in_flight:
+                # Wait for the result of the call in progress with the same key.
+                _LOG.debug("Waiting for call in progress for key='%s'", key)
+                future = loop_in_flight[key]
+                _update_cache_perf(func_name, True)
+                # Don't cancel the shared call if this caller is cancelled.
+                value = await asyncio.shield(future)
+                return value
+            _update_cache_perf(func_name, is_hit)
+            if is_hit:
+                _LOG.debug("Cache hit for key='%s'", key)
+                return value
+            _LOG.debug("Cache miss for key='%s'", key)
+            if _report_cache_miss(func_name, key):
+                return "_cache_miss_"
+            future = loop.create_future()
+            loop_in_flight[key] = future
+            try:
+                value = await _call_func(*args, **kwargs)
+                # Update cache without blocking the event loop.
+                await asyncio.to_thread(_update_cache, key, value)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Mark the exception as retrieved, in case nobody else waits
+                # for it.
+                future.exception()
+                raise
+            else:
+                future.set_result(value)
+            finally:
+                del loop_in_flight[key]
             return value
 
         return wrapper
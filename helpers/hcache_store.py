@@ -0,0 +1,791 @@
+"""
+Content-addressed store for the values cached by `hcache`.
+
+The values are stored once per content digest, so that identical values
+returned by different functions or for different arguments are deduplicated.
+A small index maps each function invocation `(func_id, args_id)` to the digest
+of its value and tracks size, hit counts, and last access of the entries,
+which are used to garbage collect the store in LRU order to respect a size
+budget.
+
+The store is organized as:
+```
+<store_path>/
+  blobs/<digest[:2]>/<digest>
+  index/<func_id>/<args_id>.json
+```
+
+The values are stored with a type-aware serializer (see `register_serializer()`):
+- dataframes and series as uncompressed Arrow IPC files
+- numpy arrays as `.npy` files
+- any other object as compressed pickle
+so that loading a large dataframe or array reads the file directly instead of
+decompressing and unpickling it. The arrays are memory-mapped, while the
+dataframes are copied from the memory-mapped file into writable blocks, so
+each load of a dataframe allocates a copy of it. The serializers are also
+used by the joblib caches of `hcache`, when `use_type_serializers=True`.
+
+The store can be on the local disk or on S3, so that multiple machines can
+share it. Each entry and blob is a separate file, so that no lock is needed
+to update the store concurrently.
+
+Import as:
+
+import helpers.hcache_store as hcacstor
+"""
+
+import abc
+import atexit
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import helpers.hdbg as hdbg
+import helpers.hs3 as hs3
+
+_LOG = logging.getLogger(__name__)
+
+# Compression level used for the blobs, which is the same as joblib with
+# `compress=True`.
+_COMPRESSION_LEVEL = 3
+
+# Minimum age of an unreferenced blob before it can be deleted by the garbage
+# collector, to avoid deleting a blob that has been written by another process,
+# whose index entry hasn't been written yet.
+_GRACE_PERIOD_IN_SECS = 3600
+
+# Number of values stored between two automatic garbage collections.
+_NUM_DUMPS_BETWEEN_GCS = 100
+
+# Min time between two updates of the access stats of an entry on a hit.
+_ACCESS_STATS_INTERVAL_IN_SECS = 60.0
+
+
+# #############################################################################
+# Serializers
+# #############################################################################
+
+
+class Serializer(abc.ABC):
+    """
+    Interface for storing objects of certain types in files.
+    """
+
+    # Name used to record how an object was stored.
+    name = ""
+
+    @abc.abstractmethod
+    def can_serialize(self, obj: Any) -> bool:
+        """
+        Return whether the object can be stored and loaded back unchanged.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def dump(self, obj: Any, file_name: str) -> None:
+        """
+        Store the object in a file.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load(self, file_name: str) -> Any:
+        """
+        Load the object stored in a file.
+        """
+        raise NotImplementedError
+
+
+class _PickleSerializer(Serializer):
+    """
+    Store any object as compressed pickle.
+    """
+
+    name = "pickle"
+
+    def can_serialize(self, obj: Any) -> bool:
+        return True
+
+    def dump(self, obj: Any, file_name: str) -> None:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        data = zlib.compress(data, _COMPRESSION_LEVEL)
+        with open(file_name, "wb") as f:
+            f.write(data)
+
+    def load(self, file_name: str) -> Any:
+        with open(file_name, "rb") as f:
+            data = f.read()
+        obj = pickle.loads(zlib.decompress(data))
+        return obj
+
+
+class _NpySerializer(Serializer):
+    """
+    Store numpy arrays as `.npy` files, which are loaded memory-mapped.
+    """
+
+    name = "npy"
+
+    def can_serialize(self, obj: Any) -> bool:
+        ret = (
+            type(obj) in (np.ndarray, np.memmap)
+            and not obj.dtype.hasobject
+            # Empty arrays can't be memory-mapped.
+            and obj.size > 0
+        )
+        return ret
+
+    def dump(self, obj: Any, file_name: str) -> None:
+        # Pass a file, since `np.save()` adds the extension to a file name.
+        with open(file_name, "wb") as f:
+            np.save(f, obj, allow_pickle=False)
+
+    def load(self, file_name: str) -> Any:
+        # Map the file copy-on-write, so that the caller can modify the array
+        # without modifying the file.
+        obj = np.load(file_name, mmap_mode="c", allow_pickle=False)
+        return obj
+
+
+class _ArrowSerializer(Serializer):
+    """
+    Store dataframes and series as uncompressed Arrow IPC (Feather v2) files,
+    which are loaded without decoding them.
+
+    The file is memory-mapped, but the loaded object is a copy of its data,
+    since the pandas objects backed by the file would be read-only.
+    """
+
+    name = "arrow"
+    # Key of the schema metadata describing the stored object.
+    _METADATA_KEY = b"hcache"
+    # Name of the column storing a series.
+    _SERIES_COL_NAME = "series"
+
+    def can_serialize(self, obj: Any) -> bool:
+        if isinstance(obj, pd.Series):
+            if not (obj.name is None or isinstance(obj.name, str)):
+                return False
+            df = obj.to_frame(name=self._SERIES_COL_NAME)
+        elif isinstance(obj, pd.DataFrame):
+            df = obj
+        else:
+            return False
+        ret = (
+            type(df) is pd.DataFrame
+            and not df.empty
+            and df.columns.is_unique
+            and not df.attrs
+            # Arrow can convert some Python objects (e.g., lists to arrays), so
+            # only strings are allowed in object columns.
+            and all(
+                self._has_only_strings(df[col_name])
+                for col_name, dtype in df.dtypes.items()
+                if dtype == object
+            )
+            and all(
+                self._has_only_strings(df.index.get_level_values(level))
+                for level in range(df.index.nlevels)
+                if df.index.get_level_values(level).dtype == object
+            )
+        )
+        return ret
+
+    def dump(self, obj: Any, file_name: str) -> None:
+        if isinstance(obj, pd.Series):
+            metadata = {"type": "series", "name": obj.name}
+            df = obj.to_frame(name=self._SERIES_COL_NAME)
+        else:
+            metadata = {"type": "dataframe"}
+            df = obj
+        # Arrow doesn't store the frequency of the index.
+        freq = getattr(df.index, "freq", None)
+        metadata["index_freq"] = None if freq is None else freq.freqstr
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata(
+            {
+                **table.schema.metadata,
+                self._METADATA_KEY: json.dumps(metadata).encode("utf-8"),
+            }
+        )
+        with pa.OSFile(file_name, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def load(self, file_name: str) -> Any:
+        source = pa.memory_map(file_name, "r")
+        table = pa.ipc.open_file(source).read_all()
+        metadata = json.loads(table.schema.metadata[self._METADATA_KEY])
+        # Copy the columns into consolidated blocks, since the arrays backed
+        # by the memory-mapped file are read-only, while the caller can
+        # modify the value.
+        obj = table.to_pandas()
+        if metadata["index_freq"] is not None:
+            obj.index.freq = metadata["index_freq"]
+        if metadata["type"] == "series":
+            obj = obj[self._SERIES_COL_NAME].rename(metadata["name"])
+        return obj
+
+    @staticmethod
+    def _has_only_strings(srs: pd.Series) -> bool:
+        inferred_dtype = pd.api.types.infer_dtype(srs, skipna=True)
+        return inferred_dtype in ("string", "empty")
+
+
+# Serializers in order of priority.
+_SERIALIZERS: List[Serializer] = [
+    _ArrowSerializer(),
+    _NpySerializer(),
+    _PickleSerializer(),
+]
+
+
+def register_serializer(serializer: Serializer) -> None:
+    """
+    Register a serializer with priority over the ones already registered.
+    """
+    hdbg.dassert_isinstance(serializer, Serializer)
+    hdbg.dassert_not_in(
+        serializer.name, [serializer_.name for serializer_ in _SERIALIZERS]
+    )
+    _SERIALIZERS.insert(0, serializer)
+
+
+def dump_obj(
+    obj: Any, file_name: str, *, use_pickle: bool = True
+) -> Optional[str]:
+    """
+    Store an object with the serializer with highest priority that supports it.
+
+    :param use_pickle: whether to fall back to pickle
+    :return: name of the serializer used, needed to load the object, or `None`
+        if the object was not stored
+    """
+    for serializer in _SERIALIZERS:
+        if not serializer.can_serialize(obj):
+            continue
+        if serializer.name == _PickleSerializer.name:
+            if not use_pickle:
+                return None
+            # Pickle is the fallback, so its errors are propagated.
+            serializer.dump(obj, file_name)
+            break
+        try:
+            serializer.dump(obj, file_name)
+            break
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            _LOG.warning(
+                "Can't store object with serializer '%s': %s", serializer.name, e
+            )
+    else:
+        raise ValueError(f"No serializer for type '{type(obj)}'")
+    _LOG.debug("file_name=%s serializer=%s", file_name, serializer.name)
+    return serializer.name
+
+
+def load_obj(file_name: str, serializer_name: str) -> Any:
+    """
+    Load an object stored with `dump_obj()`.
+    """
+    for serializer in _SERIALIZERS:
+        if serializer.name == serializer_name:
+            break
+    else:
+        raise ValueError(f"Invalid serializer_name='{serializer_name}'")
+    obj = serializer.load(file_name)
+    return obj
+
+
+# #############################################################################
+# BlobStore
+# #############################################################################
+
+
+class BlobStore:
+    """
+    Store function results on local disk or S3 deduplicating by content.
+
+    The access stats of the entries (i.e., hit count and last access) are
+    accumulated in memory and written to the index at most once every
+    `access_stats_interval_in_secs` per entry, when the store is garbage
+    collected or its entries are read, and at exit, so that a cache hit
+    doesn't always cost a write (e.g., a PUT on S3). The stats are
+    approximate, since the updates from different processes are not
+    synchronized.
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        *,
+        aws_profile: Optional[str] = None,
+        max_num_bytes: Optional[int] = None,
+        access_stats_interval_in_secs: float = _ACCESS_STATS_INTERVAL_IN_SECS,
+    ) -> None:
+        """
+        Constructor.
+
+        :param store_path: local dir or S3 path of the store
+        :param aws_profile: the AWS profile to use in case of S3 store
+        :param max_num_bytes: size budget of the store, enforced with a garbage
+            collection every `_NUM_DUMPS_BETWEEN_GCS` values stored; `None`
+            for no budget
+        :param access_stats_interval_in_secs: min time between two writes of
+            the access stats of an entry on a hit
+        """
+        hdbg.dassert_isinstance(store_path, str)
+        hdbg.dassert_ne(store_path, "")
+        if max_num_bytes is not None:
+            hdbg.dassert_lte(0, max_num_bytes)
+        hdbg.dassert_lte(0, access_stats_interval_in_secs)
+        self._store_path = store_path
+        self._max_num_bytes = max_num_bytes
+        self._access_stats_interval_in_secs = access_stats_interval_in_secs
+        # Map `(func_id, args_id)` to the number of hits and the last access
+        # time not written to the index yet.
+        self._pending_access_stats: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        if hs3.is_s3_path(store_path):
+            self._fs = hs3.get_s3fs(aws_profile)
+            # `s3fs` uses paths without protocol, e.g., `bucket/dir`.
+            self._root = store_path[len("s3://") :].rstrip("/")
+            self._is_local = False
+        else:
+            self._fs = fsspec.filesystem("file")
+            self._root = os.path.abspath(store_path)
+            self._is_local = True
+        self._num_dumps = 0
+        self._lock = threading.Lock()
+        _BLOB_STORES.add(self)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(store_path='{self._store_path}')"
+
+    def has_item(self, func_id: str, args_id: str, *, version: str = "") -> bool:
+        """
+        Return whether the store contains the value of a function invocation.
+
+        :param func_id: id of the function, e.g., as computed by joblib
+        :param args_id: digest of the function arguments
+        :param version: version of the function (e.g., the digest of its
+            code); entries stored with a different version are not valid
+        """
+        entry = self._read_entry(func_id, args_id)
+        has_item = entry is not None and entry["version"] == version
+        if has_item:
+            # Check that the blob was not garbage collected.
+            has_item = self._fs.exists(self._get_blob_path(entry["digest"]))
+        _LOG.debug("func_id=%s args_id=%s -> %s", func_id, args_id, has_item)
+        return has_item
+
+    def load_item(self, func_id: str, args_id: str) -> Any:
+        """
+        Load the value of a function invocation and update its access stats.
+        """
+        entry = self._read_entry(func_id, args_id)
+        hdbg.dassert_is_not(
+            entry, None, "No entry for func_id=%s args_id=%s", func_id, args_id
+        )
+        blob_path = self._get_blob_path(entry["digest"])
+        if self._is_local:
+            obj = load_obj(blob_path, entry["serializer"])
+        else:
+            # Copy the blob to a local file, which can be deleted right after
+            # loading, since a memory-mapped file stays accessible until it's
+            # unmapped.
+            tmp_file_name = self._get_tmp_file_name()
+            try:
+                self._fs.get_file(blob_path, tmp_file_name)
+                obj = load_obj(tmp_file_name, entry["serializer"])
+            finally:
+                os.remove(tmp_file_name)
+        # Update the access stats, writing them only if the ones in the index
+        # are stale.
+        now = time.time()
+        key = (func_id, args_id)
+        with self._lock:
+            num_hits, _ = self._pending_access_stats.get(key, (0, now))
+            self._pending_access_stats[key] = (num_hits + 1, now)
+        if now - entry["last_access_time"] >= self._access_stats_interval_in_secs:
+            self._write_access_stats([key])
+        return obj
+
+    def flush_access_stats(self) -> None:
+        """
+        Write the access stats accumulated in memory to the index.
+        """
+        with self._lock:
+            keys = list(self._pending_access_stats)
+        self._write_access_stats(keys)
+
+    def dump_item(
+        self, func_id: str, args_id: str, obj: Any, *, version: str = ""
+    ) -> str:
+        """
+        Store the value of a function invocation.
+
+        :return: digest of the stored value
+        """
+        # Store the value in a local file to compute its digest.
+        tmp_file_name = self._get_tmp_file_name()
+        try:
+            serializer_name = dump_obj(obj, tmp_file_name)
+            digest = _get_file_digest(tmp_file_name)
+            blob_path = self._get_blob_path(digest)
+            if self._fs.exists(blob_path):
+                _LOG.debug("Reusing blob %s", digest)
+            elif self._is_local:
+                self._fs.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_file_name, blob_path)
+            else:
+                self._fs.put_file(tmp_file_name, blob_path)
+        finally:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+        num_bytes = self._fs.size(blob_path)
+        now = time.time()
+        entry = {
+            "func_id": func_id,
+            "args_id": args_id,
+            "version": version,
+            "digest": digest,
+            "serializer": serializer_name,
+            "num_bytes": num_bytes,
+            "creation_time": now,
+            "last_access_time": now,
+            "num_hits": 0,
+        }
+        self._write_entry(func_id, args_id, entry)
+        # Enforce the size budget, if needed.
+        with self._lock:
+            self._num_dumps += 1
+            run_gc = (
+                self._max_num_bytes is not None
+                and self._num_dumps % _NUM_DUMPS_BETWEEN_GCS == 0
+            )
+        if run_gc:
+            self.garbage_collect(self._max_num_bytes)
+        return digest
+
+    def get_entries(self) -> pd.DataFrame:
+        """
+        Return the index entries of the store, one row per function invocation.
+        """
+        columns = [
+            "func_id",
+            "args_id",
+            "version",
+            "digest",
+            "serializer",
+            "num_bytes",
+            "creation_time",
+            "last_access_time",
+            "num_hits",
+        ]
+        self.flush_access_stats()
+        index_dir = self._join(self._root, "index")
+        # Discard the listings cached by `s3fs`, since other processes can
+        # update the store.
+        self._fs.invalidate_cache()
+        if self._fs.exists(index_dir):
+            file_names = [
+                file_name
+                for file_name in self._fs.find(index_dir)
+                if file_name.endswith(".json")
+            ]
+        else:
+            file_names = []
+        entries = []
+        for file_name in sorted(file_names):
+            entry = self._read_json(file_name)
+            if entry is not None:
+                entries.append(entry)
+        df = pd.DataFrame(entries, columns=columns)
+        return df
+
+    def get_stats(self) -> pd.DataFrame:
+        """
+        Return size, hit counts, and last access of the store per function.
+
+        Deduplicated blobs are accounted to each function referencing them, so
+        the total size of the store can be smaller than the sum of the sizes.
+
+        :return: dataframe indexed by `func_id` with the columns
+            `num_entries`, `num_bytes`, `num_hits`, `last_access_time`
+        """
+        df = self.get_entries()
+        stats = df.groupby("func_id").agg(
+            num_entries=("args_id", "count"),
+            num_hits=("num_hits", "sum"),
+            last_access_time=("last_access_time", "max"),
+        )
+        # Count each blob only once per function.
+        num_bytes = (
+            df.drop_duplicates(subset=["func_id", "digest"])
+            .groupby("func_id")["num_bytes"]
+            .sum()
+        )
+        stats.insert(1, "num_bytes", num_bytes)
+        stats["last_access_time"] = pd.to_datetime(
+            stats["last_access_time"], unit="s", utc=True
+        )
+        stats = stats.sort_values("num_bytes", ascending=False)
+        return stats
+
+    def garbage_collect(
+        self,
+        max_num_bytes: int,
+        *,
+        grace_period_in_secs: float = _GRACE_PERIOD_IN_SECS,
+    ) -> Tuple[int, int]:
+        """
+        Evict the least recently used entries until the store fits the budget.
+
+        The blobs that are not referenced by any entry anymore are deleted, if
+        they are older than `grace_period_in_secs`.
+
+        :param max_num_bytes: size budget of the store
+        :param grace_period_in_secs: minimum age of an unreferenced blob to
+            delete it
+        :return: number of deleted entries and blobs
+        """
+        hdbg.dassert_lte(0, max_num_bytes)
+        entries = self.get_entries()
+        # Keep the most recently used entries within the budget.
+        entries = entries.sort_values("last_access_time", ascending=False)
+        referenced_digests = set()
+        num_bytes = 0
+        entries_to_delete = []
+        for entry in entries.itertuples():
+            if entry.digest in referenced_digests:
+                continue
+            if num_bytes + entry.num_bytes <= max_num_bytes:
+                referenced_digests.add(entry.digest)
+                num_bytes += entry.num_bytes
+            else:
+                entries_to_delete.append(entry)
+        # Entries pointing to a blob that is already kept are kept as well.
+        entries_to_delete = [
+            entry
+            for entry in entries_to_delete
+            if entry.digest not in referenced_digests
+        ]
+        for entry in entries_to_delete:
+            _LOG.debug(
+                "Evicting func_id=%s args_id=%s", entry.func_id, entry.args_id
+            )
+            self._fs.rm(self._get_entry_path(entry.func_id, entry.args_id))
+        # Delete the unreferenced blobs.
+        num_deleted_blobs = 0
+        now = time.time()
+        for blob_path, info in self._get_blob_infos().items():
+            digest = os.path.basename(blob_path)
+            if digest in referenced_digests:
+                continue
+            if now - self._get_mtime(info) < grace_period_in_secs:
+                _LOG.debug("Skipping recent blob %s", digest)
+                continue
+            _LOG.debug("Deleting blob %s", digest)
+            self._fs.rm(blob_path)
+            num_deleted_blobs += 1
+        _LOG.info(
+            "Deleted %s entries and %s blobs from %s",
+            len(entries_to_delete),
+            num_deleted_blobs,
+            self,
+        )
+        return len(entries_to_delete), num_deleted_blobs
+
+    def get_num_bytes(self) -> int:
+        """
+        Return the size of all the blobs in the store.
+        """
+        num_bytes = sum(info["size"] for info in self._get_blob_infos().values())
+        return num_bytes
+
+    def clear(self) -> None:
+        """
+        Delete all the entries and blobs from the store.
+        """
+        if self._fs.exists(self._root):
+            self._fs.rm(self._root, recursive=True)
+
+    # /////////////////////////////////////////////////////////////////////////
+
+    def _join(self, *paths: str) -> str:
+        # `s3fs` always uses `/` as separator.
+        path = "/".join(paths)
+        return path
+
+    def _get_blob_path(self, digest: str) -> str:
+        path = self._join(self._root, "blobs", digest[:2], digest)
+        return path
+
+    def _get_entry_path(self, func_id: str, args_id: str) -> str:
+        path = self._join(self._root, "index", func_id, f"{args_id}.json")
+        return path
+
+    def _get_tmp_file_name(self) -> str:
+        """
+        Return the name of a local temporary file to store a blob.
+        """
+        if self._is_local:
+            # Use the store dir, so that the file can be renamed atomically.
+            dir_name = self._join(self._root, "blobs")
+            self._fs.makedirs(dir_name, exist_ok=True)
+            file_name = os.path.join(
+                dir_name, f".{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+        else:
+            fd, file_name = tempfile.mkstemp(prefix="hcache_store.")
+            os.close(fd)
+        return file_name
+
+    def _get_blob_infos(self) -> Dict[str, Dict[str, Any]]:
+        blobs_dir = self._join(self._root, "blobs")
+        self._fs.invalidate_cache()
+        if not self._fs.exists(blobs_dir):
+            return {}
+        infos: Dict[str, Dict[str, Any]] = self._fs.find(blobs_dir, detail=True)
+        # Skip the temporary files of writes in progress.
+        infos = {
+            path: info
+            for path, info in infos.items()
+            if not os.path.basename(path).startswith(".")
+        }
+        return infos
+
+    @staticmethod
+    def _get_mtime(info: Dict[str, Any]) -> float:
+        """
+        Return the modification time of a file from its `fsspec` info.
+        """
+        if "mtime" in info:
+            # Local filesystem.
+            mtime = float(info["mtime"])
+        else:
+            # S3.
+            mtime = info["LastModified"].timestamp()
+        return mtime
+
+    def _read_json(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._fs.open(path, "r") as f:
+                entry: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            # The entry was deleted concurrently.
+            return None
+        return entry
+
+    def _write_access_stats(self, keys: List[Tuple[str, str]]) -> None:
+        """
+        Add the access stats accumulated in memory to the index entries.
+
+        Concurrent updates from different processes can be lost, since the
+        entries are updated without locking.
+        """
+        for func_id, args_id in keys:
+            with self._lock:
+                access_stats = self._pending_access_stats.pop(
+                    (func_id, args_id), None
+                )
+            if access_stats is None:
+                continue
+            num_hits, last_access_time = access_stats
+            # Read the entry again to reduce the updates lost.
+            entry = self._read_entry(func_id, args_id)
+            if entry is None:
+                # The entry was evicted.
+                continue
+            entry["num_hits"] += num_hits
+            entry["last_access_time"] = max(
+                entry["last_access_time"], last_access_time
+            )
+            self._write_entry(func_id, args_id, entry)
+
+    def _read_entry(self, func_id: str, args_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._read_json(self._get_entry_path(func_id, args_id))
+        return entry
+
+    def _write_entry(
+        self, func_id: str, args_id: str, entry: Dict[str, Any]
+    ) -> None:
+        data = json.dumps(entry).encode("utf-8")
+        self._write_bytes(self._get_entry_path(func_id, args_id), data)
+
+    def _write_bytes(self, path: str, data: bytes) -> None:
+        """
+        Write a file atomically, so that readers never see a partial file.
+        """
+        if self._is_local:
+            # Write to a temporary file in the same dir and rename it.
+            dir_name, file_name = os.path.split(path)
+            self._fs.makedirs(dir_name, exist_ok=True)
+            tmp_path = os.path.join(
+                dir_name,
+                f".{file_name}.{os.getpid()}.{threading.get_ident()}.tmp",
+            )
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        else:
+            # S3 writes are atomic.
+            self._fs.pipe_file(path, data)
+
+
+# Stores whose access stats are written at exit.
+_BLOB_STORES: "weakref.WeakSet[BlobStore]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_blob_stores() -> None:
+    for blob_store in list(_BLOB_STORES):
+        try:
+            blob_store.flush_access_stats()
+        except Exception as e:  # pylint: disable=broad-except
+            _LOG.warning("Can't write the access stats of %s: %s", blob_store, e)
+
+
+def _get_file_digest(file_name: str) -> str:
+    """
+    Return the sha256 digest of the content of a file.
+    """
+    hash_ = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1024**2), b""):
+            hash_.update(chunk)
+    digest = hash_.hexdigest()
+    return digest
+
+
+def stats_to_str(stats: pd.DataFrame) -> str:
+    """
+    Return a human-readable report of the store stats per function.
+
+    :param stats: as returned by `BlobStore.get_stats()`
+    """
+    txt: List[str] = []
+    txt.append(f"num_funcs={len(stats)}")
+    txt.append(f"num_entries={stats['num_entries'].sum()}")
+    num_mb = stats["num_bytes"].sum() / 1024**2
+    txt.append(f"num_bytes={num_mb:.3f} MB")
+    if not stats.empty:
+        stats = stats.copy()
+        stats["num_bytes"] = (stats["num_bytes"] / 1024**2).map(
+            lambda x: f"{x:.3f} MB"
+        )
+        txt.append(stats.to_string())
+    txt = "\n".join(txt)
+    return txt
@@ -5,14 +5,36 @@ import helpers.hcsv as hcsv
 """
 
 import ast
+import collections
+import contextlib
+import io
+import itertools
+import json
 import logging
 import os
-from typing import Any, Callable, Dict, List, Optional
+import tempfile
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 import helpers.hdbg as hdbg
 import helpers.hio as hio
+import helpers.hjoblib as hjoblib
 import helpers.hs3 as hs3
 
 _LOG = logging.getLogger(__name__)
@@ -37,6 +59,8 @@ def _read_csv_range(
     This function:
     - assumes the CSV file to have header, considered to be row 0.
     - reads [from_, to), e.g., (to - from_) lines following list slicing semantics.
+    - uses the row index built by `build_row_index()`, if available, to read
+      only the needed part of the file.
 
     :param csv_path: location of CSV file
     :param from_: first line to read (header is row 0 and is always read)
@@ -45,11 +69,20 @@ def _read_csv_range(
     """
     hdbg.dassert_lt(0, from_, msg="Row 0 assumed to be header row")
     hdbg.dassert_lt(from_, to, msg="Empty range requested!")
-    skiprows = range(1, from_)
     nrows = to - from_
-    df = pd.read_csv(csv_path, skiprows=skiprows, nrows=nrows, **kwargs)
-    if df.shape[0] < to:
-        _LOG.warning("Number of df rows = %i vs requested = %i", df.shape[0], to)
+    row_index = load_row_index(csv_path)
+    if row_index is not None:
+        # Seek to the closest row instead of parsing all the previous rows.
+        df = _read_csv_range_with_row_index(
+            csv_path, row_index, from_, to, **kwargs
+        )
+    else:
+        skiprows = range(1, from_)
+        df = pd.read_csv(csv_path, skiprows=skiprows, nrows=nrows, **kwargs)
+    if df.shape[0] < nrows:
+        _LOG.warning(
+            "Number of df rows = %i vs requested = %i", df.shape[0], nrows
+        )
     return df
 
 
@@ -126,10 +159,20 @@ def find_first_matching_row(
     :param csv_path: location of CSV file
     :param col_name: name of column whose values define chunks
     :param val: value to match on
+        - If the CSV file has a row index with the min and max values of
+          `col_name` (see `build_row_index()`), only the chunks of rows that can
+          contain `val` are read, using a binary search if the column is sorted
     :param start: first row (inclusive) to start search on
     :param nrows_at_a_time: size of chunks to process
     :return: line in CSV of first matching row at or past start
     """
+    row_index = load_row_index(csv_path)
+    if row_index is not None and row_index.attrs["key_col_name"] == col_name:
+        # Read only the chunks of rows that can contain the value.
+        ret = _find_first_matching_row_with_row_index(
+            csv_path, row_index, col_name, val, start, **kwargs
+        )
+        return ret
     curr = start
     while True:
         _LOG.debug("Start of current chunk = line %i", curr)
@@ -145,11 +188,448 @@ def find_first_matching_row(
     return None
 
 
+# #############################################################################
+# CSV row index
+# #############################################################################
+
+
+# Size of the blocks read to find the line offsets.
+_ROW_INDEX_BLOCK_SIZE_IN_BYTES = 64 * 1024**2
+# Key of the Parquet metadata of a row index.
+_ROW_INDEX_METADATA_KEY = b"hcsv.row_index"
+
+
+def get_row_index_path(csv_path: str) -> str:
+    """
+    Return the path of the sidecar file storing the row index of a CSV file.
+    """
+    return csv_path + ".row_index.pq"
+
+
+def build_row_index(
+    csv_path: str,
+    *,
+    step: int = 1000,
+    key_col_name: Optional[str] = None,
+    **kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Build and save the index of the byte offsets of the rows of a CSV file.
+
+    The index stores the offset of every `step`-th row, so that a range of rows
+    can be read by seeking to the closest indexed row instead of parsing all
+    the previous rows. The index is saved in the file `get_row_index_path()`
+    and it's used by `_read_csv_range()` and `find_first_matching_row()`.
+
+    The CSV file:
+    - must have a header, considered to be row 0
+    - must be uncompressed, so that it's possible to seek into it
+    - can't have newlines inside quoted values or empty lines
+
+    :param csv_path: location of CSV file
+    :param step: number of rows between two indexed rows
+    :param key_col_name: column whose min and max values are stored for each
+        chunk of `step` rows, to find rows by value
+    :param kwargs: params passed to `pd.read_csv()` to parse `key_col_name`
+    :return: the index with columns
+        - `row`: number of the indexed row (e.g., 1, 1 + step, ...)
+        - `offset`: byte offset of the row in the file
+        - `key_min`, `key_max`: min and max values of `key_col_name` in the
+          chunk of rows [row, row + step), if `key_col_name` is specified
+    """
+    hdbg.dassert_file_exists(csv_path)
+    hdbg.dassert(
+        not csv_path.endswith(".gz"), "Can't index compressed file '%s'", csv_path
+    )
+    hdbg.dassert_lte(1, step)
+    # Find the offsets of the indexed rows from the positions of the newlines.
+    rows: List[np.ndarray] = []
+    offsets: List[np.ndarray] = []
+    num_newlines = 0
+    file_size = 0
+    with open(csv_path, "rb") as f:
+        while True:
+            block = f.read(_ROW_INDEX_BLOCK_SIZE_IN_BYTES)
+            if not block:
+                break
+            newline_idxs = np.flatnonzero(
+                np.frombuffer(block, dtype=np.uint8) == ord("\n")
+            )
+            # The row following the k-th newline of the file is row k.
+            row_idxs = num_newlines + 1 + np.arange(len(newline_idxs))
+            mask = (row_idxs - 1) % step == 0
+            rows.append(row_idxs[mask])
+            offsets.append(file_size + newline_idxs[mask] + 1)
+            num_newlines += len(newline_idxs)
+            file_size += len(block)
+    row_index = pd.DataFrame(
+        {
+            "row": np.concatenate(rows) if rows else np.array([], np.int64),
+            "offset": (
+                np.concatenate(offsets) if offsets else np.array([], np.int64)
+            ),
+        }
+    )
+    # Remove the row after the last newline, if the file ends with a newline.
+    row_index = row_index[row_index["offset"] < file_size]
+    row_index = row_index.reset_index(drop=True)
+    if key_col_name is not None:
+        # Compute the min and max values of the key for each chunk of rows.
+        chunks = pd.read_csv(
+            csv_path, usecols=[key_col_name], chunksize=step, **kwargs
+        )
+        key_mins = []
+        key_maxs = []
+        for chunk in chunks:
+            key_mins.append(chunk[key_col_name].min())
+            key_maxs.append(chunk[key_col_name].max())
+        hdbg.dassert_eq(len(key_mins), len(row_index))
+        row_index["key_min"] = key_mins
+        row_index["key_max"] = key_maxs
+    # Save the index together with the info needed to detect if it's stale.
+    stat = os.stat(csv_path)
+    metadata = {
+        "step": step,
+        "key_col_name": key_col_name,
+        "csv_size": stat.st_size,
+        "csv_mtime_ns": stat.st_mtime_ns,
+    }
+    table = pa.Table.from_pandas(row_index, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **table.schema.metadata,
+            _ROW_INDEX_METADATA_KEY: json.dumps(metadata).encode("utf-8"),
+        }
+    )
+    pq.write_table(table, get_row_index_path(csv_path))
+    row_index.attrs = metadata
+    return row_index
+
+
+def load_row_index(csv_path: str) -> Optional[pd.DataFrame]:
+    """
+    Load the row index of a CSV file saved by `build_row_index()`.
+
+    :return: the row index with its metadata in `attrs`, or `None` if there is
+        no index or the CSV file has changed after the index was built
+    """
+    row_index_path = get_row_index_path(csv_path)
+    if not os.path.exists(row_index_path):
+        return None
+    table = pq.read_table(row_index_path)
+    metadata = json.loads(table.schema.metadata[_ROW_INDEX_METADATA_KEY])
+    stat = os.stat(csv_path)
+    if (stat.st_size, stat.st_mtime_ns) != (
+        metadata["csv_size"],
+        metadata["csv_mtime_ns"],
+    ):
+        _LOG.warning("Ignoring stale row index '%s'", row_index_path)
+        return None
+    row_index = table.to_pandas()
+    row_index.attrs = metadata
+    return row_index
+
+
+def _read_csv_range_with_row_index(
+    csv_path: str, row_index: pd.DataFrame, from_: int, to: int, **kwargs: Any
+) -> pd.DataFrame:
+    """
+    Read rows [from_, to) of a CSV file reading only the needed bytes.
+
+    :param row_index: as returned by `load_row_index()`
+    """
+    rows = row_index["row"].to_numpy()
+    offsets = row_index["offset"].to_numpy()
+    # Find the last indexed row before the range and the first indexed row
+    # after the range.
+    start_idx = int(np.searchsorted(rows, from_, side="right")) - 1
+    end_idx = int(np.searchsorted(rows, to, side="left"))
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        if start_idx < 0:
+            # The range starts before the first indexed row, e.g., with an
+            # empty index.
+            start_row = 1
+            start_offset = len(header)
+        else:
+            start_row = rows[start_idx]
+            start_offset = offsets[start_idx]
+        f.seek(start_offset)
+        if end_idx < len(rows):
+            data = f.read(offsets[end_idx] - start_offset)
+        else:
+            data = f.read()
+    # Parse the header and the rows from the closest indexed row.
+    skiprows = range(1, from_ - start_row + 1)
+    nrows = to - from_
+    df = pd.read_csv(
+        io.BytesIO(header + data), skiprows=skiprows, nrows=nrows, **kwargs
+    )
+    return df
+
+
+def _find_first_matching_row_with_row_index(
+    csv_path: str,
+    row_index: pd.DataFrame,
+    col_name: str,
+    val: Any,
+    start: int,
+    **kwargs: Any,
+) -> Optional[int]:
+    """
+    Implement `find_first_matching_row()` using the min and max values of
+    `col_name` in the row index.
+    """
+    step = row_index.attrs["step"]
+    rows = row_index["row"].to_numpy()
+    key_mins = row_index["key_min"].to_numpy()
+    key_maxs = row_index["key_max"].to_numpy()
+    # Find the chunk containing the start row.
+    first_idx = max(int(np.searchsorted(rows, start, side="right")) - 1, 0)
+    idxs: Iterable[int]
+    try:
+        is_sorted = bool(
+            (key_mins <= key_maxs).all() and (key_maxs[:-1] <= key_mins[1:]).all()
+        )
+        if is_sorted:
+            # Binary search the first chunk that can contain the value, and
+            # read the following chunks while they can contain it.
+            idx = first_idx + int(
+                np.searchsorted(key_maxs[first_idx:], val, side="left")
+            )
+            idxs = itertools.takewhile(
+                lambda idx_: bool(key_mins[idx_] <= val), range(idx, len(rows))
+            )
+        else:
+            # Skip the chunks that can't contain the value.
+            mask = (key_mins <= val) & (val <= key_maxs)
+            idxs = [int(idx) for idx in np.flatnonzero(mask) if idx >= first_idx]
+    except TypeError:
+        # The value can't be compared with the values in the column.
+        _LOG.warning("Can't compare '%s' with the values of '%s'", val, col_name)
+        idxs = range(first_idx, len(rows))
+    for idx in idxs:
+        from_ = max(int(rows[idx]), start)
+        to = int(rows[idx]) + step
+        _LOG.debug("Reading rows [%s, %s)", from_, to)
+        df = _read_csv_range_with_row_index(
+            csv_path, row_index, from_, to, **kwargs
+        )
+        matches = (df[col_name] == val).to_numpy()
+        if matches.any():
+            return from_ + int(matches.argmax())
+    _LOG.info("Value %s not found", val)
+    return None
+
+
 # #############################################################################
 # CSV to PQ conversion
 # #############################################################################
 
 
+class _KeyedWriter:
+    """
+    Append dataframes to one output per key, buffering the writes.
+
+    The dataframes of each key are buffered in memory and written when the
+    buffer of the key exceeds `max_buffer_num_bytes`, or all the buffers are
+    written when they exceed `max_total_buffer_num_bytes`. At most
+    `max_num_open_files` outputs are kept open, closing the least recently
+    used one.
+
+    The output of a key is:
+    - `out_dir/<key>.csv` without header, for `output_format="csv"`
+    - `out_dir/<key>/data.<nnnnn>.parquet` for `output_format="parquet"`, with a
+      new file each time the output of the key is reopened, since a Parquet
+      file can't be appended to after it's closed
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        *,
+        output_format: str = "csv",
+        max_buffer_num_bytes: int = 1024**2,
+        max_total_buffer_num_bytes: int = 256 * 1024**2,
+        max_num_open_files: int = 128,
+    ) -> None:
+        hdbg.dassert_in(output_format, ("csv", "parquet"))
+        hdbg.dassert_lte(1, max_num_open_files)
+        self._out_dir = out_dir
+        self._output_format = output_format
+        self._max_buffer_num_bytes = max_buffer_num_bytes
+        self._max_total_buffer_num_bytes = max_total_buffer_num_bytes
+        self._max_num_open_files = max_num_open_files
+        # Map each key to the buffered dfs and their size.
+        self._buffers: Dict[str, List[pd.DataFrame]] = collections.defaultdict(
+            list
+        )
+        self._buffer_num_bytes: Dict[str, int] = collections.defaultdict(int)
+        self._total_buffer_num_bytes = 0
+        # Map each key to its open file, in order of last use.
+        self._files: collections.OrderedDict = collections.OrderedDict()
+
+    def append(self, key: str, df: pd.DataFrame) -> None:
+        """
+        Append a df to the output of a key.
+        """
+        num_bytes = int(df.memory_usage(index=False).sum())
+        self._buffers[key].append(df)
+        self._buffer_num_bytes[key] += num_bytes
+        self._total_buffer_num_bytes += num_bytes
+        if self._buffer_num_bytes[key] >= self._max_buffer_num_bytes:
+            self._flush(key)
+        elif self._total_buffer_num_bytes >= self._max_total_buffer_num_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write all the buffered dfs.
+        """
+        for key in list(self._buffers.keys()):
+            self._flush(key)
+
+    def close(self) -> None:
+        """
+        Write all the buffered dfs and close all the outputs.
+        """
+        self.flush()
+        while self._files:
+            _, file = self._files.popitem(last=False)
+            file.close()
+
+    def _flush(self, key: str) -> None:
+        dfs = self._buffers.pop(key)
+        self._total_buffer_num_bytes -= self._buffer_num_bytes.pop(key)
+        df = pd.concat(dfs, axis=0) if len(dfs) > 1 else dfs[0]
+        file = self._get_file(key, df)
+        if self._output_format == "csv":
+            df.to_csv(file, header=False, index=False)
+        else:
+            # The types inferred for different chunks can differ, e.g., for a
+            # column with only NaNs.
+            table = pa.Table.from_pandas(
+                df, schema=file.schema, preserve_index=False
+            )
+            file.write_table(table)
+
+    def _get_file(self, key: str, df: pd.DataFrame) -> Any:
+        """
+        Return the open output of a key, opening it if needed.
+        """
+        if key in self._files:
+            self._files.move_to_end(key)
+            return self._files[key]
+        # Close the least recently used output.
+        if len(self._files) >= self._max_num_open_files:
+            _, file = self._files.popitem(last=False)
+            file.close()
+        if self._output_format == "csv":
+            file = open(os.path.join(self._out_dir, f"{key}.csv"), "a")
+        else:
+            dir_name = os.path.join(self._out_dir, key)
+            hio.create_dir(dir_name, incremental=True)
+            file_name = os.path.join(
+                dir_name, f"data.{len(os.listdir(dir_name)):05d}.parquet"
+            )
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            file = pq.ParquetWriter(file_name, schema)
+        self._files[key] = file
+        return file
+
+
+def _split_csv_in_byte_ranges(
+    csv_path: str, chunk_size_in_bytes: int
+) -> List[Tuple[int, int]]:
+    """
+    Split the rows of a CSV file with header in ranges of bytes.
+
+    The ranges are split at newlines, so the values of the CSV file can't
+    contain newlines, even if quoted.
+
+    :return: list of `[start, end)` byte offsets of the chunks, which start at
+        the beginning of a row
+    """
+    hdbg.dassert_lt(0, chunk_size_in_bytes)
+    file_size = os.path.getsize(csv_path)
+    byte_ranges = []
+    with open(csv_path, "rb") as f:
+        # Skip the header.
+        f.readline()
+        start = f.tell()
+        while start < file_size:
+            # Move the end of the chunk to the beginning of the next row.
+            f.seek(min(start + chunk_size_in_bytes, file_size))
+            if f.tell() < file_size:
+                f.readline()
+            end = f.tell()
+            byte_ranges.append((start, end))
+            start = end
+    return byte_ranges
+
+
+def _csv_mapreduce_map(
+    csv_path: str,
+    start: int,
+    end: int,
+    key_func: Callable,
+    chunk_preprocessor: Optional[Callable],
+    *,
+    incremental: bool,
+    num_attempts: int,
+) -> Tuple[List[Any], pd.DataFrame, List[int]]:
+    """
+    Parse the rows of a CSV file in a byte range and key them.
+
+    This is a task of `hjoblib.iter_parallel_execute()`.
+
+    The keyed groups are packed in a single DataFrame, which is cheaper to
+    transfer and to log than many small DataFrames.
+
+    :return: keys, concatenated groups, and end row of each group (see
+        `_unpack_keyed_groups()`)
+    """
+    _ = incremental, num_attempts
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    try:
+        df = pd.read_csv(io.BytesIO(header + data))
+    except pd.errors.ParserError as e:
+        # A quoted value with a newline is split across two ranges.
+        raise ValueError(
+            f"Can't parse bytes [{start}, {end}) of '{csv_path}', possibly "
+            "because of a quoted value with a newline: process the file with "
+            f"num_threads='serial': {e}"
+        ) from e
+    if chunk_preprocessor is not None:
+        df = chunk_preprocessor(df)
+    keys = []
+    dfs = []
+    for key, df_tmp in key_func(df):
+        keys.append(key)
+        dfs.append(df_tmp)
+    ends = list(itertools.accumulate(len(df_tmp) for df_tmp in dfs))
+    df_out = pd.concat(dfs) if dfs else df.iloc[:0]
+    return keys, df_out, ends
+
+
+def _unpack_keyed_groups(
+    packed_groups: Tuple[List[Any], pd.DataFrame, List[int]],
+) -> Iterator[Tuple[Any, pd.DataFrame]]:
+    """
+    Split the keyed groups packed by `_csv_mapreduce_map()`.
+
+    :return: iterator over `(key, df)`
+    """
+    keys, df, ends = packed_groups
+    start = 0
+    for key, end in zip(keys, ends):
+        yield key, df.iloc[start:end]
+        start = end
+
+
 def _csv_mapreduce(
     csv_path: str,
     out_dir: str,
@@ -157,6 +637,12 @@ def _csv_mapreduce(
     chunk_preprocessor: Optional[Callable],
     *,
     chunk_size: int = 1000000,
+    chunk_size_in_bytes: int = 64 * 1024**2,
+    num_threads: Union[str, int] = "serial",
+    output_format: str = "csv",
+    max_buffer_num_bytes: int = 1024**2,
+    max_total_buffer_num_bytes: int = 256 * 1024**2,
+    max_num_open_files: int = 128,
 ) -> None:
     """
     Map-reduce-type processing of CSV.
@@ -164,7 +650,18 @@ def _csv_mapreduce(
     The phases are:
       - Read the CSV in chunks as DataFrame
       - Key each row of the DataFrame using a `groupby`
-      - "Reduce" keyed groups by writing and appending to a CSV
+      - "Reduce" keyed groups by writing and appending to a file per key
+
+    With `num_threads="serial"`, the CSV is read sequentially in chunks of
+    `chunk_size` rows. Otherwise, the CSV is split in chunks of about
+    `chunk_size_in_bytes` bytes at the newlines, which are parsed and keyed in
+    parallel by `num_threads` processes, so the values of the CSV can't
+    contain newlines, even if quoted. In both cases, the keyed groups are
+    buffered and written in the order of the chunks by the caller process (see
+    `_KeyedWriter`).
+
+    The memory used is bounded by the chunks in flight and
+    `max_total_buffer_num_bytes`.
 
     :param csv_path: input CSV path
     :param out_dir: output dir for CSV with filenames corresponding to keys
@@ -172,20 +669,130 @@ def _csv_mapreduce(
         Should return an iterable with elements like (key, df)
     :param chunk_preprocessor: function to apply to each chunk DataFrame before
         applying key_func
-    :param chunk_size: chunk_size of input to process
+    :param chunk_size: number of rows of the chunks of input to process, when
+        reading serially
+    :param chunk_size_in_bytes: size of the chunks of input to process, when
+        reading in parallel
+    :param num_threads: number of processes parsing and keying the chunks, or
+        "serial"
+    :param output_format: "csv" or "parquet" (see `_KeyedWriter`)
+    :param max_buffer_num_bytes: size of the data of a key buffered before
+        writing it
+    :param max_total_buffer_num_bytes: size of the data of all keys buffered
+        before writing it
+    :param max_num_open_files: max number of outputs kept open
     """
-    # Read CSV data in chunks.
-    chunks = pd.read_csv(csv_path, chunksize=chunk_size)
-    # Preprocess chunk, if needed.
-    if chunk_preprocessor is not None:
-        chunks = map(chunk_preprocessor, chunks)
-    # Apply key_func to each chunk.
-    keyed_group_blocks = map(key_func, chunks)
-    # Append results.
-    for block in keyed_group_blocks:
-        for idx, df in block:
-            file_name = os.path.join(out_dir, idx + ".csv")
-            _append_csv(df, file_name)
+    hio.create_dir(out_dir, incremental=True)
+    writer = _KeyedWriter(
+        out_dir,
+        output_format=output_format,
+        max_buffer_num_bytes=max_buffer_num_bytes,
+        max_total_buffer_num_bytes=max_total_buffer_num_bytes,
+        max_num_open_files=max_num_open_files,
+    )
+    with contextlib.ExitStack() as stack:
+        stack.callback(writer.close)
+        if num_threads == "serial" or csv_path.endswith(".gz"):
+            if num_threads != "serial":
+                # A compressed file can't be split, so read it sequentially.
+                _LOG.warning("Processing compressed file '%s' serially", csv_path)
+            chunks = pd.read_csv(csv_path, chunksize=chunk_size)
+            if chunk_preprocessor is not None:
+                chunks = map(chunk_preprocessor, chunks)
+            keyed_group_blocks: Iterator = map(key_func, chunks)
+        else:
+            byte_ranges = _split_csv_in_byte_ranges(csv_path, chunk_size_in_bytes)
+            tasks: List[hjoblib.Task] = [
+                ((csv_path, start, end, key_func, chunk_preprocessor), {})
+                for start, end in byte_ranges
+            ]
+            workload = (_csv_mapreduce_map, "csv_mapreduce_map", tasks)
+            # Save the log of the tasks in a temporary dir, instead of adding
+            # it to the outputs.
+            tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            log_file = os.path.join(tmp_dir, "csv_mapreduce.log")
+            results = hjoblib.iter_parallel_execute(
+                workload,
+                num_threads,
+                incremental=False,
+                abort_on_error=True,
+                num_attempts=1,
+                log_file=log_file,
+                use_shared_memory=True,
+                ordered=True,
+            )
+            keyed_group_blocks = (_unpack_keyed_groups(res) for _, res in results)
+        # Append results.
+        for block in keyed_group_blocks:
+            for idx, df in block:
+                writer.append(idx, df)
+
+
+# Size of the blocks of CSV data parsed at once, which bounds the memory used by
+# the conversion.
+_BLOCK_SIZE_IN_BYTES = 64 * 1024**2
+
+
+def _iter_csv_tables(
+    csv_path: str,
+    *,
+    normalizer: Optional[Callable] = None,
+    header: Optional[int] = 0,
+    column_types: Optional[Dict[str, pa.DataType]] = None,
+    block_size_in_bytes: int = _BLOCK_SIZE_IN_BYTES,
+    aws_profile: hs3.AwsProfile = None,
+) -> Iterator[pa.Table]:
+    """
+    Read a CSV file in blocks with the multithreaded pyarrow CSV reader.
+
+    The types of the columns are inferred from the first block, unless
+    specified in `column_types`. All the blocks are cast to the schema of the
+    first one.
+
+    Params are the same as in `convert_csv_to_pq()`.
+
+    :return: iterator over the blocks of the CSV file
+    """
+    hdbg.dassert_lt(0, block_size_in_bytes)
+    read_options = pacsv.ReadOptions(
+        block_size=block_size_in_bytes,
+        use_threads=True,
+        # Skip the rows before the header, like `pd.read_csv()`.
+        skip_rows=0 if header is None else header,
+        autogenerate_column_names=header is None,
+    )
+    convert_options = pacsv.ConvertOptions(column_types=column_types)
+    with contextlib.ExitStack() as stack:
+        if hs3.is_s3_path(csv_path):
+            s3fs_ = hs3.get_s3fs(aws_profile)
+            f = stack.enter_context(s3fs_.open(csv_path, "rb"))
+            compression = "gzip" if csv_path.endswith(".gz") else None
+            src = pa.input_stream(f, compression=compression)
+        else:
+            hdbg.dassert_file_exists(csv_path)
+            # Pyarrow decompresses the file based on its extension.
+            src = csv_path
+        reader = pacsv.open_csv(
+            src, read_options=read_options, convert_options=convert_options
+        )
+        schema = None
+        for batch in reader:
+            if normalizer is None:
+                table = pa.Table.from_batches([batch])
+            else:
+                df = batch.to_pandas()
+                if header is None:
+                    # Use the same column names as `pd.read_csv()`.
+                    df.columns = range(df.shape[1])
+                df = normalizer(df)
+                table = pa.Table.from_pandas(df, schema=schema)
+            if schema is None:
+                schema = table.schema
+            else:
+                # Normalizing a block can lead to different types, e.g., a
+                # column with only NaNs.
+                table = table.cast(schema)
+            yield table
 
 
 def convert_csv_to_pq(
@@ -195,25 +802,78 @@ def convert_csv_to_pq(
     normalizer: Optional[Callable] = None,
     header: Optional[int] = 0,
     compression: Optional[str] = "gzip",
+    column_types: Optional[Dict[str, pa.DataType]] = None,
+    partition_columns: Optional[List[str]] = None,
+    block_size_in_bytes: int = _BLOCK_SIZE_IN_BYTES,
+    aws_profile: hs3.AwsProfile = None,
 ) -> None:
     """
     Convert CSV file to Parquet file.
 
+    The CSV file is converted one block at a time, writing a row group for each
+    block, so that the memory used doesn't depend on the size of the file.
+
     Output of `csv_map_reduce()` is typically header-less to support append mode,
     and so `normalizer` may be used to add appropriate headers. Note that Parquet
     requires string column names, whereas Pandas by default uses integer column
     names.
 
-    :param csv_path: full path of CSV
-    :param pq_path: full path of parquet
+    :param csv_path: full path of CSV (local or on S3)
+    :param pq_path: full path of parquet, or dir of the partitioned dataset if
+        `partition_columns` is specified
+    :param normalizer: function to apply to each block of the CSV as df before
+        writing to PQ, which can't depend on the other blocks
     :param header: header specification of CSV
-    :param normalizer: function to apply to df before writing to PQ
+    :param compression: compression of the Parquet file
+    :param column_types: map from column names to their types, to avoid
+        inferring the types from the first block of the CSV, e.g., when a
+        column of ints contains NaNs only after the first block
+    :param partition_columns: columns used to write a Hive-partitioned dataset
+        (e.g., `pq_path/year=2022/month=1/...`) instead of a single file
+    :param block_size_in_bytes: size of the CSV blocks converted at once
+    :param aws_profile: AWS profile to use if `csv_path` is on S3
     """
-    df = pd.read_csv(csv_path, header=header)
-    # TODO(Paul): Ensure that one of header, normalizer is not None.
-    if normalizer is not None:
-        df = normalizer(df)
-    df.to_parquet(pq_path, compression=compression)
+    tables = _iter_csv_tables(
+        csv_path,
+        normalizer=normalizer,
+        header=header,
+        column_types=column_types,
+        block_size_in_bytes=block_size_in_bytes,
+        aws_profile=aws_profile,
+    )
+    first_table = next(tables, None)
+    hdbg.dassert_is_not(first_table, None, "Empty CSV file '%s'", csv_path)
+    tables = itertools.chain([first_table], tables)
+    if partition_columns is None:
+        hio.create_enclosing_dir(pq_path, incremental=True)
+        with pq.ParquetWriter(
+            pq_path, first_table.schema, compression=compression
+        ) as writer:
+            for table in tables:
+                writer.write_table(table)
+    else:
+        hdbg.dassert_is_subset(partition_columns, first_table.column_names)
+        # Name the files after the CSV file, so that multiple CSV files can be
+        # converted into the same dataset.
+        csv_stem = _get_csv_stem(os.path.basename(csv_path))
+        if csv_stem is None:
+            csv_stem = os.path.basename(csv_path)
+        batches = itertools.chain.from_iterable(
+            table.to_batches() for table in tables
+        )
+        ds.write_dataset(
+            batches,
+            pq_path,
+            schema=first_table.schema,
+            format="parquet",
+            partitioning=partition_columns,
+            partitioning_flavor="hive",
+            basename_template=f"{csv_stem}.{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=compression
+            ),
+        )
 
 
 # TODO(gp): Promote to hio.
@@ -227,7 +887,6 @@ def _maybe_remove_extension(filename: str, extension: str) -> Optional[str]:
     """
     hdbg.dassert_isinstance(filename, str)
     hdbg.dassert(filename)
-    hdbg.dassert_file_exists(filename)
     #
     hdbg.dassert_isinstance(extension, str)
     hdbg.dassert(
@@ -242,54 +901,123 @@ def _maybe_remove_extension(filename: str, extension: str) -> Optional[str]:
     return ret
 
 
+def _get_csv_stem(filename: str) -> Optional[str]:
+    """
+    Remove the `.csv` or `.csv.gz` extension from `filename`.
+
+    :return: filename without extension, or `None` if it's not a CSV file
+    """
+    csv_stem = _maybe_remove_extension(filename, ".csv")
+    if csv_stem is None:
+        csv_stem = _maybe_remove_extension(filename, ".csv.gz")
+    return csv_stem
+
+
+def _convert_csv_to_pq_task(
+    csv_path: str,
+    pq_path: str,
+    convert_kwargs: Dict[str, Any],
+    *,
+    incremental: bool,
+    num_attempts: int,
+) -> str:
+    """
+    Run `convert_csv_to_pq()` as a task of `hjoblib.parallel_execute()`.
+    """
+    _ = num_attempts
+    if (
+        incremental
+        and convert_kwargs.get("partition_columns") is None
+        and os.path.exists(pq_path)
+    ):
+        _LOG.warning("Skipping '%s' since '%s' exists", csv_path, pq_path)
+    else:
+        convert_csv_to_pq(csv_path, pq_path, **convert_kwargs)
+    return pq_path
+
+
 def convert_csv_dir_to_pq_dir(
     csv_dir: str,
     pq_dir: str,
     *,
     normalizer: Optional[Callable] = None,
     header: Optional[int] = None,
+    column_types: Optional[Dict[str, pa.DataType]] = None,
+    partition_columns: Optional[List[str]] = None,
+    num_threads: Union[str, int] = "serial",
+    incremental: bool = False,
+    aws_profile: hs3.AwsProfile = "am",
 ) -> None:
     """
     Apply `convert_csv_to_pq()` to all files in `csv_dir`.
 
+    Each file is converted by a different task, so the memory used is bounded
+    by the number of threads times the memory used to convert a block of CSV.
+
     :param csv_dir: directory storing CSV files on S3 or local
     :param pq_dir: target directory to save PQ files (only local
         filesystem)
     :param header: header specification of CSV
     :param normalizer: function to apply to df before writing to PQ
+    :param column_types: same as in `convert_csv_to_pq()`
+    :param partition_columns: write all the files into a single Hive-partitioned
+        dataset in `pq_dir`, instead of one PQ file per CSV file
+    :param num_threads: number of files to convert in parallel (e.g., "serial",
+        or -1 to use all the CPUs)
+    :param incremental: skip the CSV files that have already been converted
+    :param aws_profile: AWS profile to use if `csv_dir` is on S3
     """
     # Get the filenames in `csv_dir`.
     if hs3.is_s3_path(csv_dir):
-        # TODO(gp): Pass aws_profile.
-        s3fs = hs3.get_s3fs("am")
-        filenames = s3fs.ls(csv_dir)
+        s3fs = hs3.get_s3fs(aws_profile)
+        filenames = [os.path.basename(path) for path in s3fs.ls(csv_dir)]
     else:
         # Local filesystem.
         hdbg.dassert_dir_exists(csv_dir)
         # TODO(Paul): check .endswith(".csv") or do glob(csv_dir + "/*.csv")
         filenames = os.listdir(csv_dir)
     hdbg.dassert(filenames, "No files in the directory '%s'", csv_dir)
-    # Process all the filenames.
-    # TODO(gp): Add tqdm.
-    # TODO(gp): Consider parallelizing.
-    for filename in filenames:
+    hio.create_dir(pq_dir, incremental=True)
+    convert_kwargs = {
+        "normalizer": normalizer,
+        "header": header,
+        "column_types": column_types,
+        "partition_columns": partition_columns,
+        "aws_profile": aws_profile,
+    }
+    # Prepare a task for each file.
+    tasks = []
+    for filename in sorted(filenames):
         # Remove .csv/.csv.gz.
-        csv_stem = _maybe_remove_extension(filename, ".csv")
-        if csv_stem is None:
-            csv_stem = _maybe_remove_extension(filename, ".csv.gz")
+        csv_stem = _get_csv_stem(filename)
         if csv_stem is None:
             _LOG.warning(
-                "Skipping filename=%s since it has invalid extension", csv_stem
+                "Skipping filename=%s since it has invalid extension", filename
             )
             continue
-        # Convert file to PQ.
-        pq_filename = csv_stem + ".pq"
-        convert_csv_to_pq(
-            os.path.join(csv_dir, filename),
-            os.path.join(pq_dir, pq_filename),
-            normalizer=normalizer,
-            header=header,
+        if partition_columns is None:
+            pq_path = os.path.join(pq_dir, csv_stem + ".pq")
+        else:
+            pq_path = pq_dir
+        task: hjoblib.Task = (
+            (os.path.join(csv_dir, filename), pq_path, convert_kwargs),
+            {},
         )
+        tasks.append(task)
+    hdbg.dassert(tasks, "No CSV files in the directory '%s'", csv_dir)
+    # Convert the files.
+    workload = (_convert_csv_to_pq_task, "convert_csv_to_pq", tasks)
+    # Save the log next to `pq_dir`, instead of adding it to the outputs.
+    log_file = f"{os.path.abspath(pq_dir)}.convert_csv_dir_to_pq_dir.log"
+    hjoblib.parallel_execute(
+        workload,
+        dry_run=False,
+        num_threads=num_threads,
+        incremental=incremental,
+        abort_on_error=True,
+        num_attempts=1,
+        log_file=log_file,
+    )
 
 
 # #############################################################################
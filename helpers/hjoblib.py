@@ -4,20 +4,46 @@ Import as:
 import helpers.hjoblib as hjoblib
 """
 
+import collections
 import concurrent.futures
+import functools
+import heapq
+import json
 import logging
 import math
+import mmap
 import os
+import pickle
 import pprint
+import queue
 import random
+import re
+import resource
 import sys
+import tempfile
+import threading
+import time
 import traceback
 from functools import wraps
 from multiprocessing import Process, Queue
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import joblib
+import numpy as np
+import pandas as pd
 from joblib._store_backends import StoreBackendBase, StoreBackendMixin
+from joblib.externals import loky
 from tqdm.autonotebook import tqdm
 
 import helpers.hdatetime as hdateti
@@ -80,6 +106,8 @@ def split_list_in_tasks(
     *,
     keep_order: bool = False,
     num_elems_per_task: Optional[int] = None,
+    costs: Optional[List[float]] = None,
+    num_tasks_per_thread: int = 1,
 ) -> List[List[Any]]:
     """
     Split a list in tasks based on the number of threads or elements per
@@ -89,6 +117,18 @@ def split_list_in_tasks(
     :param keep_order: split the list so that consecutive elements of the list
         are in different tasks. This favors executing the workload in order on `n`
         threads
+    :param costs: estimated cost (e.g., run time, number of rows) of each element
+        of the list
+        - If specified, the elements are bin-packed in tasks with similar total
+          cost, assigning the elements from the most to the least expensive one
+          to the task with the smallest total cost (i.e., longest processing time
+          first)
+        - The tasks are returned from the most to the least expensive
+    :param num_tasks_per_thread: number of tasks to create for each thread
+        - Using more, smaller tasks than threads allows idle threads to pick up
+          the remaining work (e.g., with `parallel_execute()`, which dispatches
+          a new task as soon as a thread is free), limiting the impact of
+          inaccurate cost estimates
     :return: list of lists of elements, where each list can be assigned to an
         execution thread
 
@@ -111,22 +151,37 @@ def split_list_in_tasks(
         2 -> [d, e]
         3 -> []
         ```
+    - For `costs=[1, 1, 1, 1, 4]` the allocation is:
+        ```
+        1 -> [e]
+        2 -> [a, c]
+        3 -> [b, d]
+        ```
     """
     hdbg.dassert_lte(1, n)
     hdbg.dassert_lte(n, len(list_in), "There are fewer tasks than threads")
-    if keep_order:
+    hdbg.dassert_lte(1, num_tasks_per_thread)
+    # Do not create more tasks than elements.
+    num_tasks = min(n * num_tasks_per_thread, len(list_in))
+    if costs is not None:
+        hdbg.dassert(
+            not keep_order and num_elems_per_task is None,
+            "Can't specify costs with keep_order or num_elems_per_task",
+        )
+        list_out = _split_list_in_tasks_by_cost(list_in, costs, num_tasks)
+    elif keep_order:
         hdbg.dassert_is(
             num_elems_per_task,
             None,
             "Can't specify num_elems_per_task with keep_order",
         )
-        list_out: List[list] = [[] for _ in range(n)]
+        list_out: List[list] = [[] for _ in range(num_tasks)]
         for i, elem in enumerate(list_in):
-            _LOG.debug("%s: %s -> %s", i, elem, i % n)
-            list_out[i % n].append(elem)
+            _LOG.debug("%s: %s -> %s", i, elem, i % num_tasks)
+            list_out[i % num_tasks].append(elem)
     else:
         if num_elems_per_task is None:
-            k = int(math.ceil(len(list_in) / n))
+            k = int(math.ceil(len(list_in) / num_tasks))
         else:
             k = num_elems_per_task
         hdbg.dassert_lte(1, k)
@@ -136,6 +191,37 @@ def split_list_in_tasks(
     return list_out
 
 
+def _split_list_in_tasks_by_cost(
+    list_in: List[Any], costs: List[float], num_tasks: int
+) -> List[List[Any]]:
+    """
+    Bin-pack the elements in `num_tasks` tasks using longest processing time
+    first.
+
+    The elements of each task are kept in the original order.
+    """
+    hdbg.dassert_eq(len(list_in), len(costs))
+    hdbg.dassert_lte(0, min(costs))
+    # Heap of `(total cost, task idx)` to find the least loaded task.
+    heap = [(0.0, task_idx) for task_idx in range(num_tasks)]
+    idxs_by_task: List[List[int]] = [[] for _ in range(num_tasks)]
+    # Assign the elements from the most to the least expensive, breaking ties
+    # by position to make the split deterministic.
+    idxs = sorted(range(len(list_in)), key=lambda i: (-costs[i], i))
+    for i in idxs:
+        tot_cost, task_idx = heapq.heappop(heap)
+        _LOG.debug("%s: %s -> %s", i, list_in[i], task_idx)
+        idxs_by_task[task_idx].append(i)
+        heapq.heappush(heap, (tot_cost + costs[i], task_idx))
+    # Return the tasks from the most to the least expensive, so that the
+    # expensive tasks are started first.
+    task_costs = [sum(costs[i] for i in idxs_) for idxs_ in idxs_by_task]
+    task_idxs = sorted(range(num_tasks), key=lambda t: (-task_costs[t], t))
+    _LOG.debug("task_costs=%s", [task_costs[t] for t in task_idxs])
+    list_out = [[list_in[i] for i in sorted(idxs_by_task[t])] for t in task_idxs]
+    return list_out
+
+
 def apply_incremental_mode(
     src_dst_file_name_map: List[Tuple[str, str]]
 ) -> List[Tuple[str, str]]:
@@ -288,6 +374,28 @@ def reverse_workload(
     return workload
 
 
+def sort_workload_by_cost(workload: Workload, costs: List[float]) -> Workload:
+    """
+    Sort the tasks of the workload from the most to the least expensive.
+
+    Starting the expensive tasks first reduces the chance that a long task
+    is started last, keeping one thread busy while the others are idle.
+
+    :param costs: estimated cost of each task (e.g., from `get_task_costs()`)
+    """
+    validate_workload(workload)
+    # Parse the workload.
+    workload_func, func_name, tasks = workload
+    hdbg.dassert_eq(len(tasks), len(costs))
+    # Sort, keeping the original order for tasks with the same cost.
+    idxs = sorted(range(len(tasks)), key=lambda i: -costs[i])
+    tasks = [tasks[i] for i in idxs]
+    # Build a new workload.
+    workload = (workload_func, func_name, tasks)
+    validate_workload(workload)
+    return workload
+
+
 def truncate_workload(
     workload: Workload,
     max_num: int,
@@ -407,17 +515,163 @@ def get_num_executing_threads(args_num_threads: Union[str, int]) -> int:
     return num_executing_threads
 
 
+# #############################################################################
+# Shared memory transfer.
+# #############################################################################
+
+# Process-based backends pickle the arguments and the result of each task,
+# copying large numpy / pandas / Arrow payloads through a pipe. With
+# `use_shared_memory=True`, objects with large payloads are pickled with
+# protocol 5 out-of-band buffers, the buffers are written once in a file in
+# shared memory (i.e., `/dev/shm`), and only a small handle crosses the process
+# boundary. The receiving process maps the file and unpickles the object on top
+# of the mapped memory without copying it.
+# The file is removed as soon as it is mapped, so the memory is released when the
+# last object referencing it is garbage collected. If a handle is never received
+# (e.g., the parent aborts), the file is left in the shared memory dir with the
+# prefix `_SHARED_MEMORY_PREFIX`.
+
+_SHARED_MEMORY_DIR = "/dev/shm"
+_SHARED_MEMORY_PREFIX = "hjoblib.shm."
+# Objects with fewer bytes in out-of-band buffers are transferred as usual.
+_SHARED_MEMORY_MIN_NUM_BYTES = 1024**2
+# Alignment of the buffers in the shared memory file.
+_SHARED_MEMORY_ALIGNMENT = 64
+# Backends executing the tasks in processes different from the caller.
+_PROCESS_BACKENDS = ("loky", "multiprocessing", "asyncio_multiprocessing")
+
+
+class _SharedMemoryHandle:
+    """
+    Handle to an object stored in shared memory.
+    """
+
+    def __init__(
+        self, file_name: str, data: bytes, buffer_offsets: List[Tuple[int, int]]
+    ) -> None:
+        """
+        Constructor.
+
+        :param file_name: file in shared memory storing the buffers
+        :param data: pickled object without the out-of-band buffers
+        :param buffer_offsets: offset and length of each buffer in the file
+        """
+        self.file_name = file_name
+        self.data = data
+        self.buffer_offsets = buffer_offsets
+
+
+def to_shared_memory(
+    obj: Any, *, min_num_bytes: int = _SHARED_MEMORY_MIN_NUM_BYTES
+) -> Any:
+    """
+    Store an object in shared memory, if it is large enough.
+
+    :param obj: object to store
+    :param min_num_bytes: min number of bytes of the object buffers to use
+        shared memory
+    :return: a handle to pass to `from_shared_memory()` in another process or
+        the object itself, if it is too small
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+    num_bytes = sum(raw_buffer.nbytes for raw_buffer in raw_buffers)
+    if num_bytes == 0 or num_bytes < min_num_bytes:
+        return obj
+    # Write the buffers in a file in shared memory.
+    dir_name = _SHARED_MEMORY_DIR
+    if not os.path.isdir(dir_name):
+        # Shared memory is not available (e.g., on macOS): fall back to the
+        # temp dir, which is typically cached in memory.
+        dir_name = tempfile.gettempdir()
+    fd, file_name = tempfile.mkstemp(prefix=_SHARED_MEMORY_PREFIX, dir=dir_name)
+    buffer_offsets = []
+    with os.fdopen(fd, "wb") as file:
+        offset = 0
+        for raw_buffer in raw_buffers:
+            # Align the buffers, since numpy is faster on aligned data.
+            padding = -offset % _SHARED_MEMORY_ALIGNMENT
+            file.write(b"\0" * padding)
+            offset += padding
+            file.write(raw_buffer)
+            buffer_offsets.append((offset, raw_buffer.nbytes))
+            offset += raw_buffer.nbytes
+    _LOG.debug("Saved %s bytes in '%s'", num_bytes, file_name)
+    handle = _SharedMemoryHandle(file_name, data, buffer_offsets)
+    return handle
+
+
+def from_shared_memory(obj: Any) -> Any:
+    """
+    Load an object stored with `to_shared_memory()`.
+
+    The returned object is backed by a copy-on-write mapping of the shared
+    memory, so it can be modified without affecting other processes.
+
+    :param obj: handle returned by `to_shared_memory()` or any other object,
+        which is returned as it is
+    """
+    if not isinstance(obj, _SharedMemoryHandle):
+        return obj
+    with open(obj.file_name, "rb") as file:
+        mmap_ = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    # The mapping keeps the memory alive after the file is removed.
+    os.remove(obj.file_name)
+    view = memoryview(mmap_)
+    buffers = [
+        view[offset : offset + length] for offset, length in obj.buffer_offsets
+    ]
+    obj = pickle.loads(obj.data, buffers=buffers)
+    return obj
+
+
+def _task_to_shared_memory(task: Task) -> Task:
+    """
+    Store the large arguments of a task in shared memory.
+    """
+    args, kwargs = task
+    args = tuple(to_shared_memory(arg) for arg in args)
+    kwargs = {key: to_shared_memory(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+def _task_from_shared_memory(task: Task) -> Task:
+    """
+    Load the arguments of a task stored with `_task_to_shared_memory()`.
+    """
+    args, kwargs = task
+    args = tuple(from_shared_memory(arg) for arg in args)
+    kwargs = {key: from_shared_memory(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+# #############################################################################
+# Processify.
+# #############################################################################
+
+
 # TODO(grisha): Add type hints, add unit test to understand the behavior.
 # From https://gist.github.com/schlamar/2311116
 # Note that this is not going to work with joblib.parallel with
 # backend="multiprocessing" returning an error
 # AssertionError: daemonic processes are not allowed to have children
-def processify(func):
+def processify(
+    func,
+    *,
+    use_shared_memory: bool = False,
+    timeout_in_secs: Optional[float] = None,
+):
     """
     Decorator to run a function as a process.
 
     Be sure that every argument and the return value is *pickable*. The
     created process is joined, so the code does not run in parallel.
+
+    :param use_shared_memory: return large results through shared memory (see
+        `to_shared_memory()`) instead of pickling them through the queue
+    :param timeout_in_secs: kill the process and raise `TimeoutError` if it
+        doesn't complete in the given time, `None` for no limit
     """
 
     def process_func(q: Queue, *args: Any, **kwargs: Any) -> None:
@@ -427,6 +681,8 @@ def processify(func):
         _LOG.debug("pid after processify=", os.getpid())
         try:
             ret = func(*args, **kwargs)
+            if use_shared_memory:
+                ret = to_shared_memory(ret)
         except Exception:
             # Store error logs in the queue.
             ex_type, ex_value, tb = sys.exc_info()
@@ -446,17 +702,417 @@ def processify(func):
         q = Queue()
         p = Process(target=process_func, args=[q] + list(args), kwargs=kwargs)
         p.start()
-        ret, error = q.get()
+        try:
+            ret, error = q.get(timeout=timeout_in_secs)
+        except queue.Empty as e:
+            p.terminate()
+            p.join()
+            raise TimeoutError(
+                f"Task didn't complete in {timeout_in_secs} secs"
+            ) from e
         p.join()
         if error:
             ex_type, ex_value, tb_str = error
             message = "%s (in subprocess)\n%s" % (ex_value.message, tb_str)
             raise ex_type(message)
+        ret = from_shared_memory(ret)
         return ret
 
     return wrapper
 
 
+# #############################################################################
+# Checkpointing of completed tasks.
+# #############################################################################
+
+# When a checkpoint dir is passed to `parallel_execute()`, the result of each
+# successful task is saved in `<checkpoint_dir>/<task_id>.pkl` as soon as the
+# task completes, so that re-running the same workload after a crash skips the
+# completed tasks and returns their saved results.
+# The `task_id` is a digest of the workload function name and of the task
+# parameters, so it doesn't depend on the order of the tasks in the workload.
+
+
+def get_task_id(func_name: str, task: Task) -> str:
+    """
+    Return an identifier of a task that is stable across runs.
+
+    The id is a digest of the content of the task parameters computed with
+    `joblib.hash()`, so that:
+    - tasks differing in any value (e.g., in one row of a dataframe) have
+      different ids, while the string representation of a large object is
+      truncated
+    - the id doesn't depend on the memory address in the default `repr()`
+      of an object
+
+    :return: digest of the function name and of the task parameters
+    """
+    hdbg.dassert(validate_task(task))
+    task_id = joblib.hash((func_name, task))
+    return task_id
+
+
+def _get_checkpoint_file_name(checkpoint_dir: str, task_id: str) -> str:
+    file_name = os.path.join(checkpoint_dir, f"{task_id}.pkl")
+    return file_name
+
+
+def _save_task_checkpoint(checkpoint_dir: str, task_id: str, res: Any) -> None:
+    """
+    Save the result of a completed task.
+    """
+    file_name = _get_checkpoint_file_name(checkpoint_dir, task_id)
+    # Write to a temporary file and rename it, so that a crash never leaves a
+    # partial checkpoint.
+    tmp_file_name = f"{file_name}.tmp.{os.getpid()}"
+    with open(tmp_file_name, "wb") as file:
+        pickle.dump(res, file)
+    os.replace(tmp_file_name, file_name)
+
+
+def load_task_checkpoints(
+    checkpoint_dir: str, task_ids: List[str]
+) -> Dict[str, Any]:
+    """
+    Load the results of the completed tasks.
+
+    :param checkpoint_dir: dir storing the results of the completed tasks
+    :param task_ids: ids of the tasks to load
+    :return: task id -> result for the tasks that are completed
+    """
+    res = {}
+    for task_id in task_ids:
+        file_name = _get_checkpoint_file_name(checkpoint_dir, task_id)
+        if os.path.exists(file_name):
+            with open(file_name, "rb") as file:
+                res[task_id] = pickle.load(file)
+    return res
+
+
+# #############################################################################
+# Retry and timeout.
+# #############################################################################
+
+
+def _dassert_is_valid_timeout(
+    timeout_in_secs: Optional[float], num_attempts: int, processify_func: bool
+) -> None:
+    """
+    Check that a timed out task is not retried while it's still running.
+
+    Without `processify` an attempt runs in a thread that can't be interrupted
+    (see `_run_with_timeout()`), so a retry would run the task again while the
+    timed out attempt is still running.
+    """
+    if timeout_in_secs is None:
+        return
+    hdbg.dassert_lt(0, timeout_in_secs)
+    hdbg.dassert(
+        processify_func or num_attempts == 1,
+        "Retrying timed out tasks requires the 'threading' backend, which "
+        "runs each attempt in a process that is killed after the timeout: "
+        "num_attempts=%s timeout_in_secs=%s",
+        num_attempts,
+        timeout_in_secs,
+    )
+
+
+def _run_with_timeout(
+    func: Callable, args: Any, kwargs: Any, timeout_in_secs: Optional[float]
+) -> Any:
+    """
+    Run `func(*args, **kwargs)` raising `TimeoutError` after a timeout.
+
+    The function runs in a separate thread that can't be interrupted, so after
+    a timeout the thread keeps running in the background until it completes.
+    The thread is a daemon, so that it doesn't prevent the interpreter from
+    exiting. Use `processify` to kill a timed out task.
+    """
+    if timeout_in_secs is None:
+        res = func(*args, **kwargs)
+        return res
+    outcome: Dict[str, Any] = {}
+
+    def _target() -> None:
+        try:
+            outcome["res"] = func(*args, **kwargs)
+        except BaseException as e:  # pylint: disable=broad-except
+            outcome["exception"] = e
+
+    thread = threading.Thread(target=_target, daemon=True)
+    thread.start()
+    thread.join(timeout_in_secs)
+    if thread.is_alive():
+        raise TimeoutError(f"Task didn't complete in {timeout_in_secs} secs")
+    if "exception" in outcome:
+        raise outcome["exception"]
+    res = outcome["res"]
+    return res
+
+
+def _run_with_retries(
+    func: Callable,
+    args: Any,
+    kwargs: Any,
+    num_attempts: int,
+    retry_delay_in_secs: float,
+    timeout_in_secs: Optional[float],
+) -> Tuple[Any, int]:
+    """
+    Run a function with a timeout, retrying up to `num_attempts` times.
+
+    The delay between attempts doubles after each failed attempt, starting
+    from `retry_delay_in_secs`.
+
+    :return: the result of the function and the number of attempts
+    """
+    for attempt in range(1, num_attempts + 1):
+        try:
+            res = _run_with_timeout(func, args, kwargs, timeout_in_secs)
+            break
+        except Exception as e:  # pylint: disable=broad-except
+            if attempt == num_attempts:
+                raise
+            delay_in_secs = retry_delay_in_secs * 2 ** (attempt - 1)
+            _LOG.warning(
+                "Attempt %d / %d failed with exception '%s': retrying in %.1f secs",
+                attempt,
+                num_attempts,
+                str(e),
+                delay_in_secs,
+            )
+            time.sleep(delay_in_secs)
+    return res, attempt
+
+
+# #############################################################################
+# Task stats.
+# #############################################################################
+
+# When `save_task_stats=True`, each task appends a JSON line with its resource
+# usage to a task stats file shared by all the workers, e.g.,
+# ```
+# {"task_idx": 3, "task_id": null, "func_name": "workload_function",
+#  "pid": 1234, "thread_id": 5678, "start_time": 1650000000.1,
+#  "end_time": 1650000002.3, "elapsed_time_in_secs": 2.2,
+#  "cpu_time_in_secs": 2.1, "peak_rss_in_bytes": 123456789,
+#  "num_attempts": 1, "error": null}
+# ```
+# - `cpu_time_in_secs` is the CPU time of the thread executing the task, so it
+#   doesn't include the time spent in children processes (e.g., with
+#   `processify`)
+# - `peak_rss_in_bytes` is the max resident memory of the worker process while
+#   executing the task
+#   - On Linux the peak is reset at the start of each task, so that a task
+#     doesn't report the peak of a previous task executed by the same worker
+#   - Otherwise, it's the peak of the worker process since it started
+#   - The peak of a process is shared by all its threads and the reset is
+#     process-wide, so the peak is reported only when each task runs alone in
+#     its process (i.e., serially or with the process backends), and it's
+#     `null` with the thread backends
+
+
+def get_task_stats_file_name(log_file: str) -> str:
+    """
+    Return the name of the task stats file corresponding to a log file.
+    """
+    file_name = os.path.splitext(log_file)[0] + ".task_stats.jsonl"
+    return file_name
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Reset the max resident memory of the current process, when supported.
+
+    On Linux, writing 5 to `/proc/self/clear_refs` resets the peak reported
+    by `/proc/self/status`.
+
+    :return: whether the peak was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="utf-8") as file:
+            file.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _get_peak_rss_in_bytes(is_reset: bool = False) -> int:
+    """
+    Return the max resident memory of the current process.
+
+    :param is_reset: return the peak since the last `_reset_peak_rss()`,
+        instead of since the process started
+    """
+    if is_reset:
+        with open("/proc/self/status", "r", encoding="utf-8") as file:
+            txt = file.read()
+        match = re.search(r"^VmHWM:\s+(\d+) kB$", txt, re.MULTILINE)
+        hdbg.dassert(match, "Can't find the peak memory in:\n%s", txt)
+        peak_rss = int(match.group(1)) * 1024
+        return peak_rss
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # `ru_maxrss` is in KB on Linux and in bytes on macOS.
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return peak_rss
+
+
+def _append_task_stats(task_stats_file: str, task_stats: Dict[str, Any]) -> None:
+    """
+    Append the stats of a task to the task stats file.
+    """
+    line = json.dumps(task_stats) + "\n"
+    # Write the line with a single `write()` on a file opened in append mode,
+    # so that lines from different workers are not interleaved.
+    fd = os.open(task_stats_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def load_task_stats(task_stats_file: str) -> pd.DataFrame:
+    """
+    Load the task stats file into a dataframe with one row per task.
+    """
+    hdbg.dassert_file_exists(task_stats_file)
+    with open(task_stats_file, "r", encoding="utf-8") as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+    df = pd.DataFrame(rows)
+    return df
+
+
+def get_task_costs(
+    workload: Workload, task_stats_files: List[str]
+) -> List[float]:
+    """
+    Estimate the cost of each task of a workload from previous runs.
+
+    The cost of a task is its mean elapsed time in the successful runs stored
+    in the task stats files. Tasks that were never run successfully are
+    assigned the median cost of the known tasks.
+
+    :param task_stats_files: task stats files from previous runs (see
+        `get_task_stats_file_name()`), saved with `save_task_stats=True`
+    :return: estimated cost in seconds of each task
+    """
+    validate_workload(workload)
+    _, func_name, tasks = workload
+    task_ids = [get_task_id(func_name, task) for task in tasks]
+    # Compute the mean elapsed time of each task.
+    dfs = [
+        load_task_stats(file_name)
+        for file_name in task_stats_files
+        if os.path.exists(file_name)
+    ]
+    dfs = [df for df in dfs if not df.empty]
+    cost_by_task_id: Dict[str, float] = {}
+    if dfs:
+        df = pd.concat(dfs)
+        df = df[df["error"].isnull() & df["task_id"].isin(task_ids)]
+        cost_by_task_id = (
+            df.groupby("task_id")["elapsed_time_in_secs"].mean().to_dict()
+        )
+    _LOG.debug(
+        "Found the cost of %s / %s tasks", len(cost_by_task_id), len(tasks)
+    )
+    # Use the median cost for the unknown tasks.
+    if cost_by_task_id:
+        default_cost = float(np.median(list(cost_by_task_id.values())))
+    else:
+        default_cost = 1.0
+    costs = [cost_by_task_id.get(task_id, default_cost) for task_id in task_ids]
+    return costs
+
+
+def _task_stats_df_to_str(df: pd.DataFrame) -> str:
+    if df.empty:
+        return "None"
+    return df.to_string(index=False)
+
+
+def task_stats_to_str(
+    df: pd.DataFrame,
+    *,
+    num_workers: Optional[int] = None,
+    top_k: int = 5,
+    outlier_factor: float = 2.0,
+) -> str:
+    """
+    Summarize the task stats to tune the number of threads and the tasks.
+
+    The summary reports:
+    - the parallel efficiency, i.e., the sum of the task elapsed times divided
+      by the wall-clock time times the number of workers
+    - the `top_k` slowest tasks
+    - the stragglers, i.e., the tasks taking more than `outlier_factor` times
+      the median elapsed time
+    - the memory outliers, i.e., the tasks with a peak memory larger than
+      `outlier_factor` times the median peak memory
+
+    :param df: task stats as returned by `load_task_stats()`
+    :param num_workers: number of workers executing the tasks (by default the
+        number of distinct threads in the stats)
+    """
+    hdbg.dassert_lt(0, df.shape[0])
+    if num_workers is None:
+        num_workers = df[["pid", "thread_id"]].drop_duplicates().shape[0]
+    hdbg.dassert_lte(1, num_workers)
+    txt = []
+    # Report the overall stats.
+    wall_time = df["end_time"].max() - df["start_time"].min()
+    tot_task_time = df["elapsed_time_in_secs"].sum()
+    efficiency = tot_task_time / (wall_time * num_workers) if wall_time > 0 else 0
+    num_errors = df["error"].notnull().sum()
+    txt.append(
+        f"num_tasks={df.shape[0]} num_errors={num_errors} "
+        f"num_workers={num_workers}"
+    )
+    txt.append(
+        f"wall_time_in_secs={wall_time:.3f} "
+        f"tot_task_time_in_secs={tot_task_time:.3f} "
+        f"parallel_efficiency={efficiency:.2f}"
+    )
+    txt.append(
+        "cpu_time_in_secs={:.3f} max_peak_rss_in_bytes={}".format(
+            df["cpu_time_in_secs"].sum(), df["peak_rss_in_bytes"].max()
+        )
+    )
+    columns = [
+        "task_idx",
+        "elapsed_time_in_secs",
+        "cpu_time_in_secs",
+        "peak_rss_in_bytes",
+        "num_attempts",
+        "pid",
+    ]
+    # Report the slowest tasks.
+    df_tmp = df.nlargest(top_k, "elapsed_time_in_secs")[columns]
+    txt.append(hprint.frame(f"Slowest {top_k} tasks"))
+    txt.append(_task_stats_df_to_str(df_tmp))
+    # Report the stragglers.
+    median_time = df["elapsed_time_in_secs"].median()
+    mask = df["elapsed_time_in_secs"] > outlier_factor * median_time
+    txt.append(
+        hprint.frame(
+            f"Stragglers (elapsed time > {outlier_factor} x {median_time:.3f})"
+        )
+    )
+    txt.append(_task_stats_df_to_str(df[mask][columns]))
+    # Report the memory outliers.
+    median_rss = df["peak_rss_in_bytes"].median()
+    mask = df["peak_rss_in_bytes"] > outlier_factor * median_rss
+    txt.append(
+        hprint.frame(
+            f"Memory outliers (peak rss > {outlier_factor} x {median_rss:.0f})"
+        )
+    )
+    txt.append(_task_stats_df_to_str(df[mask][columns]))
+    txt = "\n".join(txt)
+    return txt
+
+
 def _parallel_execute_decorator(
     task_idx: int,
     task_len: int,
@@ -469,6 +1125,14 @@ def _parallel_execute_decorator(
     func_name: str,
     processify_func: bool,
     task: Task,
+    *,
+    retry_delay_in_secs: float = 0.0,
+    timeout_in_secs: Optional[float] = None,
+    checkpoint_dir: Optional[str] = None,
+    task_id: Optional[str] = None,
+    use_shared_memory: bool = False,
+    save_task_stats: bool = False,
+    report_peak_rss: bool = True,
 ) -> Any:
     """
     Parameters have the same meaning as in `parallel_execute()`.
@@ -481,6 +1145,13 @@ def _parallel_execute_decorator(
             - if `abort_on_error=False` the exception is not propagated, but the
               return value is the string representation of the exception
     :param processify_func: switch to enable wrapping a function into a process
+    :param task_id: id of the task used to save its result in `checkpoint_dir`
+        and its stats (by default computed from the task)
+    :param use_shared_memory: load the task arguments from shared memory and
+        return the result through shared memory, when running in a different
+        process from the caller (see `to_shared_memory()`)
+    :param report_peak_rss: save the peak memory in the task stats, when the
+        task runs alone in its process
     :return: the return value of the workload function or the exception string
     """
     # Validate very carefully all the parameters.
@@ -493,6 +1164,8 @@ def _parallel_execute_decorator(
     hdbg.dassert_isinstance(workload_func, Callable)
     hdbg.dassert_isinstance(func_name, str)
     hdbg.dassert(validate_task(task))
+    if use_shared_memory:
+        task = _task_from_shared_memory(task)
     # Redirect the logging output of each task to a different file.
     # TODO(gp): This file should go in the `task_dst_dir`.
     # log_to_file = True
@@ -520,7 +1193,13 @@ def _parallel_execute_decorator(
     txt.append(task_to_string(task))
     # Run the workload.
     args, kwargs = task
-    kwargs.update({"incremental": incremental, "num_attempts": num_attempts})
+    # Copy the params to avoid modifying the task in place. The attempts are
+    # made by `_run_with_retries()`, so the function is run once per attempt.
+    kwargs = {**kwargs, "incremental": incremental, "num_attempts": 1}
+    start_time = time.time()
+    start_cpu_time = time.thread_time()
+    is_peak_rss_reset = save_task_stats and report_peak_rss and _reset_peak_rss()
+    num_attempts_used = num_attempts
     with htimer.TimedScope(
         logging.DEBUG, f"Execute '{workload_func.__name__}'"
     ) as ts:
@@ -531,8 +1210,24 @@ def _parallel_execute_decorator(
                 # memory at the end of the execution (see
                 # CmampTask5854: Resolve backtest memory leakage).
                 _LOG.debug("pid before processify=%s", os.getpid())
-                workload_func = processify(workload_func)
-            res = workload_func(*args, **kwargs)
+                # The process is killed after the timeout, so that a retry
+                # doesn't run at the same time as the timed out attempt.
+                workload_func = processify(
+                    workload_func,
+                    use_shared_memory=use_shared_memory,
+                    timeout_in_secs=timeout_in_secs,
+                )
+                attempt_timeout_in_secs = None
+            else:
+                attempt_timeout_in_secs = timeout_in_secs
+            res, num_attempts_used = _run_with_retries(
+                workload_func,
+                args,
+                kwargs,
+                num_attempts,
+                retry_delay_in_secs,
+                attempt_timeout_in_secs,
+            )
             error = False
         except Exception as e:  # pylint: disable=broad-except
             exception = e
@@ -553,6 +1248,33 @@ def _parallel_execute_decorator(
     txt = "\n".join(txt)
     _LOG.debug("txt=\n%s", hprint.indent(txt))
     hio.to_file(log_file, txt, mode="a")
+    # Update the task stats.
+    if save_task_stats:
+        if task_id is None:
+            try:
+                task_id = get_task_id(func_name, task)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # The task can't be hashed (e.g., a lambda run by the threading
+                # backend), so its stats can't be matched across runs.
+                _LOG.debug("Can't compute the task id: %s", e)
+        peak_rss = None
+        if report_peak_rss:
+            peak_rss = _get_peak_rss_in_bytes(is_peak_rss_reset)
+        task_stats = {
+            "task_idx": task_idx,
+            "task_id": task_id,
+            "func_name": func_name,
+            "pid": os.getpid(),
+            "thread_id": threading.get_ident(),
+            "start_time": start_time,
+            "end_time": time.time(),
+            "elapsed_time_in_secs": elapsed_time,
+            "cpu_time_in_secs": time.thread_time() - start_cpu_time,
+            "peak_rss_in_bytes": peak_rss,
+            "num_attempts": num_attempts_used,
+            "error": str(exception) if error else None,
+        }
+        _append_task_stats(get_task_stats_file_name(log_file), task_stats)
     if error:
         # The execution wasn't successful.
         _LOG.error(txt)
@@ -563,7 +1285,216 @@ def _parallel_execute_decorator(
         res = str(exception)
     else:
         # The execution was successful.
-        pass
+        if checkpoint_dir is not None:
+            hdbg.dassert_is_not(task_id, None)
+            _save_task_checkpoint(checkpoint_dir, task_id, res)
+        if use_shared_memory and not processify_func:
+            # With `processify` the caller runs in the same process.
+            res = to_shared_memory(res)
+    return res
+
+
+def _iter_executor_results(
+    executor: concurrent.futures.Executor,
+    func: Callable,
+    args: Iterable[Tuple[int, Task]],
+    max_num_in_flight: int,
+    *,
+    ordered: bool = False,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Execute `func(task_idx, task)` for each element of `args` in an executor.
+
+    At most `max_num_in_flight` calls are submitted to the executor at once,
+    and a new call is submitted as soon as one completes.
+
+    :param ordered: yield the results in the order of `args` instead of in
+        order of completion. The results completed before the ones of the
+        previous calls are held and count as in flight, so that at most
+        `max_num_in_flight` results are held
+    :return: iterator over `(task_idx, result)`
+    """
+    hdbg.dassert_lte(1, max_num_in_flight)
+    args_iter = iter(args)
+    # Map the futures in flight to the corresponding task index.
+    futures: Dict[concurrent.futures.Future, int] = {}
+    # Task indices in order of submission and results held, when the results
+    # are yielded in order.
+    submitted: Deque[int] = collections.deque()
+    completed: Dict[int, Any] = {}
+    try:
+        while True:
+            # Fill the tasks in flight.
+            while len(futures) + len(completed) < max_num_in_flight:
+                arg = next(args_iter, None)
+                if arg is None:
+                    break
+                task_idx, task = arg
+                futures[executor.submit(func, task_idx, task)] = task_idx
+                if ordered:
+                    submitted.append(task_idx)
+            if not futures:
+                break
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                task_idx = futures.pop(future)
+                if ordered:
+                    completed[task_idx] = future.result()
+                else:
+                    yield task_idx, future.result()
+            # Yield the results of the calls whose previous calls completed.
+            while submitted and submitted[0] in completed:
+                task_idx = submitted.popleft()
+                yield task_idx, completed.pop(task_idx)
+    finally:
+        # Cancel the tasks not started yet, e.g., when a task fails or the
+        # caller stops iterating.
+        for future in futures:
+            future.cancel()
+
+
+def iter_parallel_execute(
+    workload: Workload,
+    num_threads: Union[str, int],
+    incremental: bool,
+    abort_on_error: bool,
+    num_attempts: int,
+    log_file: str,
+    *,
+    backend: str = "loky",
+    max_num_in_flight: Optional[int] = None,
+    retry_delay_in_secs: float = 0.0,
+    timeout_in_secs: Optional[float] = None,
+    checkpoint_dir: Optional[str] = None,
+    use_shared_memory: bool = False,
+    save_task_stats: bool = False,
+    ordered: bool = False,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Run a workload in parallel, yielding the results as the tasks complete.
+
+    Unlike `parallel_execute()`, the results are not accumulated, so the
+    caller can process each result (e.g., save it to disk) and release it
+    before the other tasks complete.
+
+    The params have the same meaning as in `parallel_execute()`, besides:
+
+    :param backend: `loky`, `threading`, `multiprocessing`, `asyncio_threading`,
+        `asyncio_multiprocessing`
+    :param max_num_in_flight: max number of tasks submitted to the workers at
+        once (by default twice the number of threads)
+    :param ordered: yield the results in order of `task_idx`, holding at most
+        `max_num_in_flight` results completed before the previous tasks
+    :return: iterator over `(task_idx, result)` in order of completion (unless
+        `ordered`), where `task_idx` is the index of the task in the workload
+    """
+    validate_workload(workload)
+    # The results of the tasks completed in a previous run are yielded first.
+    hdbg.dassert(
+        not (ordered and checkpoint_dir is not None),
+        "Checkpointing doesn't support yielding the results in order",
+    )
+    workload_func, func_name, tasks = workload
+    task_len = len(tasks)
+    # Yield the results of the tasks completed in a previous run.
+    task_ids: List[Optional[str]] = [None] * task_len
+    completed_res: Dict[str, Any] = {}
+    if checkpoint_dir is not None:
+        hio.create_dir(checkpoint_dir, incremental=True)
+        task_ids = [get_task_id(func_name, task) for task in tasks]
+        completed_res = load_task_checkpoints(checkpoint_dir, task_ids)
+    # Pair each task with its id, so that only the id of the task is sent to
+    # the worker executing it.
+    args = []
+    for task_idx, task in enumerate(tasks):
+        if task_ids[task_idx] in completed_res:
+            yield task_idx, completed_res.pop(task_ids[task_idx])
+        else:
+            args.append((task_idx, (task, task_ids[task_idx])))
+    # Prepare the function executing a task.
+    processify_func = backend == "threading"
+    _dassert_is_valid_timeout(timeout_in_secs, num_attempts, processify_func)
+    transfer_tasks = (
+        use_shared_memory
+        and num_threads != "serial"
+        and backend in _PROCESS_BACKENDS
+    )
+    use_shared_memory = transfer_tasks or (use_shared_memory and processify_func)
+    # The peak memory of a process is shared by its threads.
+    report_peak_rss = not processify_func and (
+        num_threads == "serial" or backend in _PROCESS_BACKENDS
+    )
+    func = functools.partial(
+        _execute_task,
+        task_len=task_len,
+        incremental=incremental,
+        abort_on_error=abort_on_error,
+        num_attempts=num_attempts,
+        log_file=log_file,
+        workload_func=workload_func,
+        func_name=func_name,
+        processify_func=processify_func,
+        retry_delay_in_secs=retry_delay_in_secs,
+        timeout_in_secs=timeout_in_secs,
+        checkpoint_dir=checkpoint_dir,
+        use_shared_memory=use_shared_memory,
+        save_task_stats=save_task_stats,
+        report_peak_rss=report_peak_rss,
+    )
+    if num_threads == "serial":
+        for task_idx, task in args:
+            yield task_idx, func(task_idx, task)
+        return
+    num_threads = get_num_executing_threads(num_threads)
+    if max_num_in_flight is None:
+        max_num_in_flight = 2 * num_threads
+    _LOG.info(
+        "Using %d threads, backend='%s', max_num_in_flight=%s",
+        num_threads,
+        backend,
+        max_num_in_flight,
+    )
+    if backend in ("threading", "asyncio_threading"):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+    elif backend in ("multiprocessing", "asyncio_multiprocessing"):
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_threads)
+    elif backend == "loky":
+        executor = loky.ProcessPoolExecutor(max_workers=num_threads)
+    else:
+        raise ValueError(f"Invalid backend='{backend}'")
+    if transfer_tasks:
+        # Store the arguments in shared memory only when the tasks are
+        # submitted, to bound the shared memory used.
+        args = (
+            (task_idx, (_task_to_shared_memory(task), task_id))
+            for task_idx, (task, task_id) in args
+        )
+    with executor:
+        for task_idx, res in _iter_executor_results(
+            executor, func, args, max_num_in_flight, ordered=ordered
+        ):
+            yield task_idx, from_shared_memory(res)
+
+
+def _execute_task(
+    task_idx: int,
+    task_with_id: Tuple[Task, Optional[str]],
+    **kwargs: Any,
+) -> Any:
+    """
+    Execute a task with `_parallel_execute_decorator()`.
+
+    This is a module-level function so that it can be pickled by the process
+    executors.
+
+    :param task_with_id: task and its id
+    """
+    task, task_id = task_with_id
+    res = _parallel_execute_decorator(
+        task_idx=task_idx, task=task, task_id=task_id, **kwargs
+    )
     return res
 
 
@@ -581,6 +1512,11 @@ def parallel_execute(
     log_file: str,
     *,
     backend: str = "loky",
+    retry_delay_in_secs: float = 0.0,
+    timeout_in_secs: Optional[float] = None,
+    checkpoint_dir: Optional[str] = None,
+    use_shared_memory: bool = False,
+    save_task_stats: bool = False,
 ) -> Optional[List[Any]]:
     """
     Run a workload in parallel using joblib or asyncio.
@@ -595,9 +1531,35 @@ def parallel_execute(
         - If False, the execution continues
     :param num_attempts: number of times to attempt running a function before
         declaring an error
+        - The function to execute is passed `num_attempts=1`, since the
+          attempts are made by `parallel_execute()`, so that a function
+          retrying internally doesn't multiply the number of attempts
     :param log_file: file used to log information about the execution
     :param backend: specify the backend type (e.g., joblib `loky` or
         `asyncio_process_executor`)
+    :param retry_delay_in_secs: delay before retrying a failed task, which
+        doubles after each failed attempt
+    :param timeout_in_secs: max wall-clock time for an attempt of a task before
+        declaring it failed, or `None` for no limit
+        - With the `threading` backend each attempt runs in a process (see
+          `processify`), which is killed after the timeout
+        - With the other backends an attempt can't be interrupted and keeps
+          running in the background after the timeout, so a timeout requires
+          `num_attempts=1`, to avoid running a task twice at the same time
+    :param checkpoint_dir: dir where to save the result of each successful task,
+        so that re-running the same workload skips the tasks already completed
+        and returns their saved results, or `None` to disable checkpointing
+    :param use_shared_memory: transfer large numpy / pandas / Arrow arguments
+        and results between processes through shared memory instead of
+        pickling them (see `to_shared_memory()`)
+        - This applies to the process-based backends and to `processify` with
+          the `threading` backend
+    :param save_task_stats: save the resource usage of each task as a JSON
+        line in the file returned by `get_task_stats_file_name(log_file)`,
+        besides the record in `log_file`, and summarize it at the end of the
+        execution
+        - The peak memory of the tasks is reported only when they run serially
+          or with the process backends
 
     :return: list with the results from executing `func` or the exception of the
         failing function
@@ -611,7 +1573,9 @@ def parallel_execute(
     # print(workload_to_string(workload, use_pprint=False))
     _LOG.info(
         hprint.to_str(
-            "dry_run num_threads incremental num_attempts abort_on_error"
+            "dry_run num_threads incremental num_attempts abort_on_error "
+            "retry_delay_in_secs timeout_in_secs checkpoint_dir "
+            "use_shared_memory save_task_stats"
         )
     )
     # Parse the workload.
@@ -632,12 +1596,30 @@ def parallel_execute(
         _LOG.warning("Workload saved at '%s'", file_name)
         _LOG.warning("Exiting without executing workload, as per user request")
         return None
-    # Run.
+    # Skip the tasks completed in a previous run.
     task_len = len(tasks)
+    task_ids: List[Optional[str]] = [None] * task_len
+    completed_res: Dict[str, Any] = {}
+    if checkpoint_dir is not None:
+        hio.create_dir(checkpoint_dir, incremental=True)
+        task_ids = [get_task_id(func_name, task) for task in tasks]
+        completed_res = load_task_checkpoints(checkpoint_dir, task_ids)
+        _LOG.info(
+            "Found %s / %s completed tasks in '%s'",
+            len(completed_res),
+            task_len,
+            checkpoint_dir,
+        )
+    task_idxs = [
+        task_idx
+        for task_idx in range(task_len)
+        if task_ids[task_idx] not in completed_res
+    ]
+    # Run.
     tqdm_out = htqdm.TqdmToLogger(_LOG, level=logging.INFO)
     tqdm_iter = tqdm(
-        enumerate(tasks),
-        total=task_len,
+        [(task_idx, tasks[task_idx]) for task_idx in task_idxs],
+        total=len(task_idxs),
         file=tqdm_out,
         desc=f"num_threads={num_threads} backend={backend}",
     )
@@ -651,26 +1633,47 @@ def parallel_execute(
         processify_func = True
     else:
         processify_func = False
+    _dassert_is_valid_timeout(timeout_in_secs, num_attempts, processify_func)
+    # Shared memory is used to transfer the tasks to other processes and to
+    # return the results from `processify`.
+    transfer_tasks = (
+        use_shared_memory
+        and num_threads != "serial"
+        and backend in _PROCESS_BACKENDS
+    )
+    use_shared_memory = transfer_tasks or (use_shared_memory and processify_func)
+    # The peak memory of a process is shared by its threads.
+    report_peak_rss = not processify_func and (
+        num_threads == "serial" or backend in _PROCESS_BACKENDS
+    )
+    # Use a partial of a module-level function, instead of a lambda, so that it
+    # can be pickled by the process executors.
+    func = functools.partial(
+        _execute_task,
+        task_len=task_len,
+        incremental=incremental,
+        abort_on_error=abort_on_error,
+        num_attempts=num_attempts,
+        log_file=log_file,
+        workload_func=workload_func,
+        func_name=func_name,
+        processify_func=processify_func,
+        retry_delay_in_secs=retry_delay_in_secs,
+        timeout_in_secs=timeout_in_secs,
+        checkpoint_dir=checkpoint_dir,
+        use_shared_memory=use_shared_memory,
+        save_task_stats=save_task_stats,
+        report_peak_rss=report_peak_rss,
+    )
+    # Map task index to the result of the task.
+    res_by_idx: Dict[int, Any] = {}
+    run_start_time = time.time()
     if num_threads == "serial":
         # Execute the tasks serially.
-        res = []
         for task_idx, task in tqdm_iter:
             _LOG.debug("\n%s", hprint.frame(f"Task {task_idx + 1} / {task_len}"))
             # Execute.
-            res_tmp = _parallel_execute_decorator(
-                task_idx,
-                task_len,
-                incremental,
-                abort_on_error,
-                num_attempts,
-                log_file,
-                #
-                workload_func,
-                func_name,
-                processify_func,
-                task,
-            )
-            res.append(res_tmp)
+            res_by_idx[task_idx] = func(task_idx, (task, task_ids[task_idx]))
     else:
         # Execute the tasks in parallel.
         num_threads = int(num_threads)
@@ -679,7 +1682,7 @@ def parallel_execute(
         if backend in ("loky", "threading", "multiprocessing"):
             # from joblib.externals.loky import set_loky_pickler
             # set_loky_pickler('cloudpickle')
-            res = joblib.Parallel(
+            res_tmp = joblib.Parallel(
                 n_jobs=num_threads, backend=backend, verbose=200
             )(
                 joblib.delayed(_parallel_execute_decorator)(
@@ -693,12 +1696,25 @@ def parallel_execute(
                     workload_func,
                     func_name,
                     processify_func,
-                    task,
+                    (
+                        _task_to_shared_memory(tasks[task_idx])
+                        if transfer_tasks
+                        else tasks[task_idx]
+                    ),
+                    retry_delay_in_secs=retry_delay_in_secs,
+                    timeout_in_secs=timeout_in_secs,
+                    checkpoint_dir=checkpoint_dir,
+                    task_id=task_ids[task_idx],
+                    use_shared_memory=use_shared_memory,
+                    save_task_stats=save_task_stats,
+                    report_peak_rss=report_peak_rss,
                 )
                 # We can't use `tqdm_iter` since this only shows the submission of
                 # the jobs but not their completion.
-                for task_idx, task in enumerate(tasks)
+                for task_idx in task_idxs
             )
+            res_tmp = [from_shared_memory(res_) for res_ in res_tmp]
+            res_by_idx = dict(zip(task_idxs, res_tmp))
         elif backend in ("asyncio_threading", "asyncio_multiprocessing"):
             if backend == "asyncio_threading":
                 executor = concurrent.futures.ThreadPoolExecutor
@@ -706,41 +1722,60 @@ def parallel_execute(
                 executor = concurrent.futures.ProcessPoolExecutor
             else:
                 raise ValueError(f"Invalid backend='{backend}'")
-            func = lambda args_: _parallel_execute_decorator(
-                args_[0],
-                task_len,
-                incremental,
-                abort_on_error,
-                num_attempts,
-                log_file,
-                #
-                workload_func,
-                func_name,
-                processify_func,
-                args_[1],
-            )
-            args = list(enumerate(tasks))
+            # Pair each task with its id, so that only the id of the task is
+            # sent to the worker executing it.
+            args = [
+                (task_idx, (tasks[task_idx], task_ids[task_idx]))
+                for task_idx in task_idxs
+            ]
+            if transfer_tasks:
+                # Store the arguments in shared memory only when the tasks are
+                # submitted, to bound the shared memory used.
+                args = (
+                    (task_idx, (_task_to_shared_memory(task), task_id))
+                    for task_idx, (task, task_id) in args
+                )
             use_progress_bar = True
             if not use_progress_bar:
                 # Implementation without progress bar.
                 with executor(max_workers=num_threads) as executor_:
-                    res = list(executor_.map(func, args))
+                    res_tmp = list(executor_.map(func, *zip(*args)))
+                res_by_idx = dict(zip(task_idxs, res_tmp))
             else:
                 # Implementation with progress bar.
-                res = []
                 with tqdm_iter as pbar:
                     with executor(max_workers=num_threads) as executor_:
-                        futures = {
-                            executor_.submit(func, arg): arg for arg in args
-                        }
-                        _LOG.debug("done submitting")
-                        for future in concurrent.futures.as_completed(futures):
-                            res_tmp = future.result()
-                            res.append(res_tmp)
+                        # Submit only a bounded number of tasks at once,
+                        # instead of holding a future for each task.
+                        max_num_in_flight = 2 * num_threads
+                        for task_idx, res_tmp in _iter_executor_results(
+                            executor_, func, args, max_num_in_flight
+                        ):
+                            res_by_idx[task_idx] = from_shared_memory(res_tmp)
                             pbar.update(1)
         else:
             raise ValueError(f"Invalid backend='{backend}'")
+    # Merge the results of the tasks completed in previous runs.
+    res = []
+    for task_idx in range(task_len):
+        if task_idx in res_by_idx:
+            res.append(res_by_idx[task_idx])
+        else:
+            res.append(completed_res[task_ids[task_idx]])
     _LOG.info("Saved log info in '%s'", log_file)
+    task_stats_file = get_task_stats_file_name(log_file)
+    if save_task_stats and res_by_idx and os.path.exists(task_stats_file):
+        # The task stats file accumulates stats across runs, so summarize only
+        # the tasks from this run.
+        task_stats = load_task_stats(task_stats_file)
+        task_stats = task_stats[task_stats["start_time"] >= run_start_time]
+        _LOG.info(
+            "Task stats saved in '%s':\n%s",
+            task_stats_file,
+            task_stats_to_str(
+                task_stats, num_workers=get_num_executing_threads(num_threads)
+            ),
+        )
     return res
 
 
@@ -85,3 +85,5 @@ class S3Mock_TestCase(hunitest.TestCase):
         # Stop moto.
         self.mock_aws_credentials_patch.stop()
         self.mock_s3.stop()
+        # Don't reuse the clients, and their cached listings, in other tests.
+        hs3.clear_s3_client_cache()
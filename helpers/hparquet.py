@@ -9,24 +9,28 @@ import datetime
 import glob
 import logging
 import os
-from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
+import queue
+import tempfile
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.dataset as ds
 import pyarrow.fs as pafs
 import pyarrow.parquet as pq
 from tqdm.autonotebook import tqdm
 
-import helpers.hdataframe as hdatafr
 import helpers.hdatetime as hdateti
 import helpers.hdbg as hdbg
 import helpers.hintrospection as hintros
+import helpers.hjoblib as hjoblib
 import helpers.hpandas as hpandas
 import helpers.hprint as hprint
 import helpers.hs3 as hs3
-import helpers.hserver as hserver
 import helpers.htimer as htimer
 
 _LOG = logging.getLogger(__name__)
@@ -284,22 +288,9 @@ def get_pyarrow_s3fs(*args: Any, **kwargs: Any) -> pafs.S3FileSystem:
     Return an Pyarrow S3Fs object from a given AWS profile.
 
     Same as `hs3.get_s3fs`, used specifically for accessing Parquet
-    datasets.
-    """
-    # When deploying jobs via ECS the container obtains credentials based on passed
-    #  task role specified in the ECS task-definition, refer to:
-    #  https://docs.aws.amazon.com/AmazonECS/latest/developerguide/task-iam-roles.html
-    if hserver.is_inside_ecs_container():
-        _LOG.info("Fetching credentials from task IAM role")
-        s3fs_ = pafs.S3FileSystem()
-    else:
-        aws_credentials = hs3.get_aws_credentials(*args, **kwargs)
-        s3fs_ = pafs.S3FileSystem(
-            access_key=aws_credentials["aws_access_key_id"],
-            secret_key=aws_credentials["aws_secret_access_key"],
-            session_token=aws_credentials["aws_session_token"],
-            region=aws_credentials["aws_region"],
-        )
+    datasets. See `hs3.get_pyarrow_s3fs()`.
+    """
+    s3fs_ = hs3.get_pyarrow_s3fs(*args, **kwargs)
     return s3fs_
 
 
@@ -335,6 +326,7 @@ def from_parquet(
     log_level: int = logging.DEBUG,
     report_stats: bool = False,
     aws_profile: hs3.AwsProfile = None,
+    use_catalog: bool = False,
 ) -> pd.DataFrame:
     """
     Load a dataframe from a Parquet file.
@@ -353,11 +345,21 @@ def from_parquet(
     :param report_stats: whether to report Parquet file size or not
     :param aws_profile: AWS profile to use if and only if using an S3 path,
         otherwise `None` for local path
+    :param use_catalog: if the dataset has a catalog (see
+        `build_parquet_catalog()`), read only the files that can satisfy
+        `filters` without listing the dataset
+        - the files written outside the writers of this module are not in the
+          catalog and are skipped
     :return: data from Parquet dataset
     """
     _LOG.debug(hprint.to_str("file_name columns filters schema"))
     hdbg.dassert_isinstance(file_name, str)
     hs3.dassert_is_valid_aws_profile(file_name, aws_profile)
+    catalog = None
+    if use_catalog and not n_rows:
+        catalog = load_parquet_catalog(file_name, aws_profile=aws_profile)
+        if catalog is not None and catalog.num_rows == 0:
+            catalog = None
     if hs3.is_s3_path(file_name):
         if isinstance(aws_profile, str):
             filesystem = get_pyarrow_s3fs(aws_profile)
@@ -389,7 +391,7 @@ def from_parquet(
                 .head(n_rows)
             )
             if columns:
-                # Note: `schema.names` also includes and index.
+                # Note: `schema.names` also includes the index.
                 hdbg.dassert_is_subset(columns, parquet_file.schema.names)
                 df = df[columns]
             # Hacky way to append tile values lost when obtaining particular .pq file.
@@ -401,15 +403,27 @@ def from_parquet(
                 # Pass partition columns types explicitly.
                 schema = pa.schema(schema)
             partitioning = ds.partitioning(schema, flavor="hive")
-            dataset = pq.ParquetDataset(
-                # Replace URI with path.
-                file_name,
-                filesystem=filesystem,
-                filters=filters,
-                partitioning=partitioning,
-            )
+            if catalog is not None:
+                # Read only the files that can contain the requested rows,
+                # referring to them relatively to the dataset root, so that
+                # only their paths are used for partitioning.
+                paths = _get_catalog_paths_to_read(catalog, filters)
+                dataset = pq.ParquetDataset(
+                    paths,
+                    filesystem=_get_sub_tree_filesystem(file_name, filesystem),
+                    filters=filters,
+                    partitioning=partitioning,
+                )
+            else:
+                dataset = pq.ParquetDataset(
+                    # Replace URI with path.
+                    file_name,
+                    filesystem=filesystem,
+                    filters=filters,
+                    partitioning=partitioning,
+                )
             if columns:
-                # Note: `schema.names` also includes and index.
+                # Note: `schema.names` also includes the index.
                 hdbg.dassert_is_subset(columns, dataset.schema.names)
             # To read also the index we need to use `read_pandas()`, instead of
             # `read_table()`.
@@ -442,6 +456,26 @@ def from_parquet(
     return df
 
 
+def _get_sub_tree_filesystem(
+    root_dir: str, filesystem: Optional[Any]
+) -> pafs.SubTreeFileSystem:
+    """
+    Return a pyarrow filesystem with paths relative to `root_dir`.
+
+    :param filesystem: pyarrow or s3fs filesystem, or `None` for the local
+        filesystem
+    """
+    if filesystem is None:
+        base_filesystem = pafs.LocalFileSystem()
+        root_dir = os.path.abspath(root_dir)
+    elif isinstance(filesystem, pafs.FileSystem):
+        base_filesystem = filesystem
+    else:
+        base_filesystem = pafs.PyFileSystem(pafs.FSSpecHandler(filesystem))
+    sub_tree_filesystem = pafs.SubTreeFileSystem(root_dir, base_filesystem)
+    return sub_tree_filesystem
+
+
 # Copied from `hio.create_enclosing_dir()` to avoid circular dependencies.
 def _create_enclosing_dir(file_name: str) -> Optional[str]:
     dir_name = os.path.dirname(file_name)
@@ -536,16 +570,262 @@ def to_parquet(
 
 
 # #############################################################################
+# Streaming read
+# #############################################################################
 
 
-def _yield_parquet_tile(
+def _get_catalog_paths_to_read(
+    catalog: pa.Table, filters: Optional[List[Any]]
+) -> List[str]:
+    """
+    Return the files of a dataset to read according to its catalog.
+    """
+    paths = prune_parquet_catalog(catalog, filters)
+    _LOG.debug(
+        "Reading %s / %s files from the catalog", len(paths), catalog.num_rows
+    )
+    if not paths:
+        # No row can satisfy the filters: read a file anyway to get an empty
+        # result with the proper schema.
+        paths = catalog["path"].to_pylist()[:1]
+    return paths
+
+
+def _open_parquet_dataset(
     file_name: str,
-    columns: List[str],
-    filters: List[Any],
-    asset_id_col: str,
-) -> Iterator[pd.DataFrame]:
+    *,
+    filters: Optional[List[Any]] = None,
+    schema: Optional[List[Tuple[str, pa.DataType]]] = None,
+    aws_profile: hs3.AwsProfile = None,
+    use_catalog: bool = False,
+) -> ds.Dataset:
     """
-    Yield Parquet data in a single tile given the filters.
+    Open a Parquet dataset to scan it.
+
+    The params have the same meaning as in `from_parquet()`. `filters` are only
+    used to select the files to scan from the catalog.
+    """
+    hdbg.dassert_isinstance(file_name, str)
+    hs3.dassert_is_valid_aws_profile(file_name, aws_profile)
+    catalog = None
+    if use_catalog:
+        catalog = load_parquet_catalog(file_name, aws_profile=aws_profile)
+        if catalog is not None and catalog.num_rows == 0:
+            catalog = None
+    if hs3.is_s3_path(file_name):
+        if isinstance(aws_profile, str):
+            filesystem = get_pyarrow_s3fs(aws_profile)
+        else:
+            filesystem = aws_profile
+        # Replace URI with path.
+        file_name = file_name[len("s3://") :]
+    else:
+        filesystem = None
+        hdbg.dassert_path_exists(file_name)
+    if schema is not None:
+        # Pass partition columns types explicitly.
+        schema = pa.schema(schema)
+    partitioning = ds.partitioning(schema, flavor="hive")
+    if catalog is not None:
+        paths = _get_catalog_paths_to_read(catalog, filters)
+        dataset = ds.dataset(
+            paths,
+            filesystem=_get_sub_tree_filesystem(file_name, filesystem),
+            format="parquet",
+            partitioning=partitioning,
+        )
+    else:
+        dataset = ds.dataset(
+            file_name,
+            filesystem=filesystem,
+            format="parquet",
+            partitioning=partitioning,
+        )
+    return dataset
+
+
+def _get_columns_to_scan(
+    dataset: ds.Dataset, columns: Optional[List[str]]
+) -> Optional[List[str]]:
+    """
+    Add the columns of the index to the requested ones, like
+    `pq.ParquetDataset.read_pandas()` does.
+    """
+    if columns is None:
+        return None
+    # Note: `schema.names` also includes the index.
+    hdbg.dassert_is_subset(columns, dataset.schema.names)
+    index_columns = [
+        col
+        for col in _get_pandas_index_columns(dataset.schema)
+        if col not in columns and col in dataset.schema.names
+    ]
+    return columns + index_columns
+
+
+def _table_to_df(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert a table read from Parquet to a dataframe, like `from_parquet()`.
+    """
+    # See `from_parquet()` for the time unit conversion.
+    df = table.to_pandas(coerce_temporal_nanoseconds=True)
+    if isinstance(df.index, pd.DatetimeIndex):
+        df.index = df.index.as_unit("ns")
+    return df
+
+
+def _iter_tables_of_size(
+    batches: Iterator[pa.RecordBatch], schema: pa.Schema, num_rows: int
+) -> Iterator[pa.Table]:
+    """
+    Regroup record batches of any size in tables of `num_rows` rows.
+
+    The last table can have less rows.
+    """
+    buffer: List[pa.RecordBatch] = []
+    buffer_num_rows = 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        buffer.append(batch)
+        buffer_num_rows += batch.num_rows
+        while buffer_num_rows >= num_rows:
+            table = pa.Table.from_batches(buffer, schema=schema)
+            yield table.slice(0, num_rows)
+            table = table.slice(num_rows)
+            buffer = table.to_batches()
+            buffer_num_rows = table.num_rows
+    if buffer_num_rows > 0:
+        yield pa.Table.from_batches(buffer, schema=schema)
+
+
+def _prefetch(iterator: Iterator[Any], num_items: int) -> Iterator[Any]:
+    """
+    Iterate over `iterator`, computing up to `num_items` next items in a
+    thread while the caller processes the current one.
+
+    The thread is stopped when the returned generator is closed, e.g., when
+    the caller stops iterating.
+    """
+    if num_items == 0:
+        yield from iterator
+        return
+    queue_: queue.Queue = queue.Queue(maxsize=num_items)
+    stop_event = threading.Event()
+    # Sentinel marking the end of the iteration.
+    end = object()
+
+    def _put(item: Tuple[Any, Optional[BaseException]]) -> bool:
+        # Wait for a free slot, unless the caller has stopped iterating.
+        while not stop_event.is_set():
+            try:
+                queue_.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in iterator:
+                if not _put((item, None)):
+                    return
+        except BaseException as e:  # pylint: disable=broad-except
+            # Propagate the exception to the caller.
+            _put((end, e))
+            return
+        _put((end, None))
+
+    thread = threading.Thread(target=_produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exception = queue_.get()
+            if item is end:
+                if exception is not None:
+                    raise exception
+                break
+            yield item
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def iter_parquet_batches(
+    file_name: str,
+    *,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Any]] = None,
+    schema: Optional[List[Tuple[str, pa.DataType]]] = None,
+    batch_size: int = 1024**2,
+    output_format: str = "pandas",
+    num_prefetched_batches: int = 1,
+    aws_profile: hs3.AwsProfile = None,
+    use_catalog: bool = False,
+) -> Iterator[Union[pd.DataFrame, pa.RecordBatch]]:
+    """
+    Read a Parquet dataset in batches of rows.
+
+    Unlike `from_parquet()` the data is never loaded entirely in memory:
+    - the files whose partitions don't satisfy `filters` are skipped
+    - the rows are filtered while scanning the files, skipping the row groups
+      whose statistics don't satisfy `filters`
+    - the next `num_prefetched_batches` batches are read in a thread while
+      the caller processes the current one, so the memory used is about
+      `num_prefetched_batches + 2` batches
+
+    :param file_name: path to a Parquet dataset
+    :param columns: columns to return, like in `from_parquet()`
+    :param filters: Parquet query, like in `from_parquet()`
+    :param schema: types of the partition columns, like in `from_parquet()`
+    :param batch_size: number of rows of each batch, except the last one
+    :param output_format: "pandas" to return dataframes, "arrow" to return
+        record batches
+    :param num_prefetched_batches: number of batches read ahead, 0 to read
+        them on demand
+    :param aws_profile: AWS profile to use if and only if using an S3 path,
+        otherwise `None` for local path
+    :param use_catalog: use the catalog of the dataset to select the files to
+        read, like in `from_parquet()`
+    :return: iterator over the batches in the order of the dataset
+    """
+    hdbg.dassert_lte(1, batch_size)
+    hdbg.dassert_lte(0, num_prefetched_batches)
+    hdbg.dassert_in(output_format, ("pandas", "arrow"))
+    dataset = _open_parquet_dataset(
+        file_name,
+        filters=filters,
+        schema=schema,
+        aws_profile=aws_profile,
+        use_catalog=use_catalog,
+    )
+    filter_ = pq.filters_to_expression(filters) if filters else None
+    # Read one batch of one file at a time, since `_prefetch()` takes care of
+    # reading ahead.
+    scanner = dataset.scanner(
+        columns=_get_columns_to_scan(dataset, columns),
+        filter=filter_,
+        batch_size=batch_size,
+        batch_readahead=1,
+        fragment_readahead=1,
+    )
+    tables = _iter_tables_of_size(
+        scanner.to_batches(), scanner.projected_schema, batch_size
+    )
+    if output_format == "pandas":
+        batches = map(_table_to_df, tables)
+    else:
+        batches = (table.combine_chunks().to_batches()[0] for table in tables)
+    # Convert the batches in the thread as well.
+    yield from _prefetch(batches, num_prefetched_batches)
+
+
+# #############################################################################
+
+
+def _open_parquet_tiles(file_name: str, asset_id_col: str) -> ds.Dataset:
+    """
+    Open a Parquet dataset partitioned by asset_id, year and month.
 
     It is assumed that data is partitioned by asset_id, year and month, i.e.
     the file layout is:
@@ -570,30 +850,47 @@ def _yield_parquet_tile(
     ```
 
     :param file_name: see `from_parquet()`
-    :param columns: see `from_parquet()`
-    :param filters: see `from_parquet()`
     :param asset_id_col: name of the column with asset ids
-    :return: a generator of `from_parquet()` dataframe
     """
     # Without the schema being provided `pyarrow` incorrectly infers
     # type of the asset id column, i.e. `pyarrow` reads assets as
     # strings instead of integers. See the related discussion at
     # `https://issues.apache.org/jira/browse/ARROW-6114`.
-    int_type = np.int64
-    pyarrow_int_type = pa.from_numpy_dtype(int_type)
+    pyarrow_int_type = pa.from_numpy_dtype(np.int64)
     schema = [
         (asset_id_col, pyarrow_int_type),
         # TODO(Grisha): consider passing year and month column names as params.
         ("year", pyarrow_int_type),
         ("month", pyarrow_int_type),
     ]
-    tile = from_parquet(
-        file_name,
-        columns=columns,
-        filters=filters,
-        schema=schema,
+    dataset = _open_parquet_dataset(file_name, schema=schema)
+    return dataset
+
+
+def _yield_parquet_tile(
+    dataset: ds.Dataset,
+    columns: Optional[List[str]],
+    filters: List[Any],
+    asset_id_col: str,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield Parquet data in a single tile given the filters.
+
+    The dataset is opened once with `_open_parquet_tiles()` and scanned for
+    each tile, instead of being discovered again.
+
+    :param dataset: dataset returned by `_open_parquet_tiles()`
+    :param columns: see `from_parquet()`
+    :param filters: see `from_parquet()`
+    :param asset_id_col: name of the column with asset ids
+    :return: a generator of `from_parquet()` dataframe
+    """
+    table = dataset.to_table(
+        columns=_get_columns_to_scan(dataset, columns),
+        filter=pq.filters_to_expression(filters),
     )
-    hpandas.dassert_series_type_is(tile[asset_id_col], int_type)
+    tile = _table_to_df(table)
+    hpandas.dassert_series_type_is(tile[asset_id_col], np.int64)
     yield tile
 
 
@@ -614,7 +911,7 @@ def yield_parquet_tiles_by_year(
     :param end_date: last date to load; day is ignored
     :param cols: if an `int` is supplied, it is cast to a string before reading
     :param asset_ids: asset ids to load
-    :param asset_id_col: see `_yield_parquet_tile()`
+    :param asset_id_col: see `_open_parquet_tiles()`
     :return: a generator of `from_parquet()` dataframes
     """
     time_filters = build_year_month_filter(start_date, end_date)
@@ -627,6 +924,7 @@ def yield_parquet_tiles_by_year(
     if asset_ids is None:
         asset_ids = []
     asset_id_filter = build_asset_id_filter(asset_ids, asset_id_col)
+    dataset = _open_parquet_tiles(file_name, asset_id_col)
     for time_filter in time_filters:
         if asset_id_filter:
             combined_filter = [
@@ -635,7 +933,7 @@ def yield_parquet_tiles_by_year(
         else:
             combined_filter = time_filter
         yield from _yield_parquet_tile(
-            file_name, columns, combined_filter, asset_id_col
+            dataset, columns, combined_filter, asset_id_col
         )
 
 
@@ -662,7 +960,7 @@ def yield_parquet_tiles_by_assets(
 
     :param file_name: as in `from_parquet()`
     :param asset_ids: asset ids to load
-    :param asset_id_col: see `_yield_parquet_tile()`
+    :param asset_id_col: see `_open_parquet_tiles()`
     :param asset_batch_size: the number of asset to load in a single batch
     :param cols: if an `int` is supplied, it is cast to a string before reading
     :return: a generator of `from_parquet()` dataframes
@@ -676,10 +974,11 @@ def yield_parquet_tiles_by_assets(
     columns: Optional[List[str]] = None
     if cols:
         columns = [str(col) for col in cols]
+    dataset = _open_parquet_tiles(file_name, asset_id_col)
     for batch in tqdm(batches):
         _LOG.debug("assets=%s", batch)
         filter_ = build_asset_id_filter(batch, asset_id_col)
-        yield from _yield_parquet_tile(file_name, columns, filter_, asset_id_col)
+        yield from _yield_parquet_tile(dataset, columns, filter_, asset_id_col)
 
 
 def build_year_month_filter(
@@ -770,6 +1069,8 @@ def build_filter_with_only_equalities(
 
 def collate_parquet_tile_metadata(
     path: str,
+    *,
+    use_catalog: bool = False,
 ) -> pd.DataFrame:
     """
     Report stats in a dataframe on Parquet file partitions.
@@ -778,6 +1079,8 @@ def collate_parquet_tile_metadata(
     representation of an `int`.
 
     :param path: path to top-level Parquet directory
+    :param use_catalog: use the catalog of the dataset, if it exists, instead
+        of walking the path
     :return: dataframe with two file size columns and a multiindex reflecting
         the Parquet path structure.
     """
@@ -786,32 +1089,47 @@ def collate_parquet_tile_metadata(
     if path.endswith("/"):
         path = path[:-1]
     hdbg.dassert(not path.endswith("/"))
-    # Walk the path.
-    # os.walk() yields a 3-tuple of the form
-    #  (dirpath: str, dirnames: List[str], filenames: List[str])
-    start_depth = len(path.split("/"))
     headers_set = set()
     dict_ = collections.OrderedDict()
-    for triple in os.walk(path):
-        # If the walk has taken us to, e.g.,
-        #     asset_id=100/year=2010/month=1/data.parquet
-        # then we expect
-        #     lhs = ("asset_id", "year", "month")
-        #     rhs = (100, 2010, 1)
-        lhs, rhs = _process_walk_triple(triple, start_depth)
-        # If the walkabout has not yet taken us to a file, continue.
-        if not lhs:
-            continue
-        # The tuple `lhs` is to become the index headers. We check later
-        # for uniqueness.
-        headers_set.add(lhs)
-        # Get the file name and full path.
-        file_name = triple[2][0]
-        file_path = os.path.join(triple[0], file_name)
-        # Record the size of the file. We keep this in bytes for easy
-        # join aggregations.
-        size_in_bytes = os.path.getsize(file_path)
-        dict_[rhs] = size_in_bytes
+    catalog = None
+    if use_catalog:
+        catalog = load_parquet_catalog(path)
+    if catalog is not None:
+        # Use the catalog of the dataset instead of walking the path, summing
+        # the sizes of the files in each partition.
+        for file_path, size_in_bytes in zip(
+            catalog["path"].to_pylist(), catalog["num_bytes"].to_pylist()
+        ):
+            tiles = _get_parquet_tiles_from_file_path(file_path)
+            lhs = tuple(col for col, _ in tiles)
+            rhs = tuple(val for _, val in tiles)
+            headers_set.add(lhs)
+            dict_[rhs] = dict_.get(rhs, 0) + size_in_bytes
+    else:
+        # Walk the path.
+        # os.walk() yields a 3-tuple of the form
+        #  (dirpath: str, dirnames: List[str], filenames: List[str])
+        start_depth = len(path.split("/"))
+        for triple in os.walk(path):
+            # If the walk has taken us to, e.g.,
+            #     asset_id=100/year=2010/month=1/data.parquet
+            # then we expect
+            #     lhs = ("asset_id", "year", "month")
+            #     rhs = (100, 2010, 1)
+            lhs, rhs = _process_walk_triple(triple, start_depth)
+            # If the walkabout has not yet taken us to a file, continue.
+            if not lhs:
+                continue
+            # The tuple `lhs` is to become the index headers. We check later
+            # for uniqueness.
+            headers_set.add(lhs)
+            # Get the file name and full path.
+            file_name = triple[2][0]
+            file_path = os.path.join(triple[0], file_name)
+            # Record the size of the file. We keep this in bytes for easy
+            # join aggregations.
+            size_in_bytes = os.path.getsize(file_path)
+            dict_[rhs] = size_in_bytes
     # Ensure that headers are unambiguous.
     hdbg.dassert_eq(len(headers_set), 1)
     # Convert to a multiindexed dataframe.
@@ -1131,12 +1449,923 @@ def to_partitioned_parquet(
         #  how to do it. Either setting permissions to read-only before writing.
         #  Or having a list of files that will be written and ensure that none of
         #  those files already existing.
+        file_names: List[str] = []
         pq.write_to_dataset(
             table,
             dst_dir,
             partition_cols=partition_columns,
             filesystem=filesystem,
+            file_visitor=lambda written_file: file_names.append(
+                written_file.path
+            ),
+        )
+    update_parquet_catalog(
+        dst_dir, added_file_names=file_names, aws_profile=aws_profile
+    )
+
+
+# #############################################################################
+# Catalog
+# #############################################################################
+
+# Name of the sidecar file with the catalog of a dataset, which is ignored by
+# the readers since it starts with "_".
+_CATALOG_FILE_NAME = "_catalog.parquet"
+
+
+def _get_filesystem(aws_profile: hs3.AwsProfile) -> Optional[Any]:
+    """
+    Return the s3fs filesystem for `aws_profile` or `None` for the local one.
+    """
+    filesystem = None
+    if aws_profile is not None:
+        filesystem = hs3.get_s3fs(aws_profile)
+    return filesystem
+
+
+def _get_relative_path(file_name: str, root_dir: str) -> str:
+    """
+    Return the path of a file of a dataset relative to the dataset root.
+
+    The paths can have the "s3://" prefix or not, like the paths returned by
+    s3fs.
+    """
+    prefix = "s3://"
+    if file_name.startswith(prefix):
+        file_name = file_name[len(prefix) :]
+    if root_dir.startswith(prefix):
+        root_dir = root_dir[len(prefix) :]
+    root_dir = root_dir.rstrip("/") + "/"
+    hdbg.dassert(
+        file_name.startswith(root_dir),
+        "File '%s' is not in '%s'",
+        file_name,
+        root_dir,
+    )
+    return file_name[len(root_dir) :]
+
+
+def _get_catalog_path(root_dir: str) -> str:
+    return f"{root_dir.rstrip('/')}/{_CATALOG_FILE_NAME}"
+
+
+def _list_parquet_files(
+    root_dir: str, filesystem: Optional[Any], *, use_catalog: bool = False
+) -> List[str]:
+    """
+    List the Parquet files of a dataset, skipping the files ignored by readers.
+
+    :param use_catalog: use the catalog of the dataset, if it exists, instead
+        of listing the files, skipping the files that are not in the catalog
+    """
+    catalog = None
+    if use_catalog:
+        catalog = _load_catalog(root_dir, filesystem)
+    if catalog is not None:
+        parquet_files = [
+            f"{root_dir.rstrip('/')}/{path}"
+            for path in catalog["path"].to_pylist()
+        ]
+        return parquet_files
+    # Get full paths to each Parquet file inside root dir.
+    if filesystem:
+        # Use specialized S3 filesystem function to list Parquet files efficiently.
+        # since glob.glob() is very slow as it does a lot of accesses to S3.
+        # The extra `**/*` is needed by `pyarrow` >= 17.
+        parquet_files = filesystem.glob(f"{root_dir}/**/*.parquet")
+    else:
+        # For local filesystem, use glob.glob
+        parquet_files = glob.glob(f"{root_dir}/**/*.parquet", recursive=True)
+    # Skip the files ignored by the readers.
+    parquet_files = [
+        file_name
+        for file_name in sorted(parquet_files)
+        if not any(
+            part.startswith(("_", "."))
+            for part in _get_relative_path(file_name, root_dir).split("/")
+        )
+    ]
+    return parquet_files
+
+
+def _get_catalog_entry(
+    root_dir: str, file_name: str, filesystem: Optional[Any]
+) -> pa.Table:
+    """
+    Compute the catalog entry of a Parquet file from its footer.
+
+    :return: a table with a row like the ones described in
+        `build_parquet_catalog()`
+    """
+    if filesystem is None:
+        metadata = pq.read_metadata(file_name)
+        num_bytes = os.path.getsize(file_name)
+    else:
+        with filesystem.open(file_name, "rb") as f:
+            metadata = pq.read_metadata(f)
+        num_bytes = filesystem.size(file_name)
+    path = _get_relative_path(file_name, root_dir)
+    entry = {
+        "path": pa.array([path], pa.string()),
+        "num_rows": pa.array([metadata.num_rows], pa.int64()),
+        "num_bytes": pa.array([num_bytes], pa.int64()),
+    }
+    for col, value in _get_parquet_tiles_from_file_path(path):
+        entry[col] = pa.array([value])
+    # Merge the statistics of the row groups.
+    stats: Dict[str, Optional[Tuple[Any, Any]]] = {}
+    for row_group_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(row_group_idx)
+        if row_group.num_rows == 0:
+            continue
+        for col_idx in range(row_group.num_columns):
+            column = row_group.column(col_idx)
+            col = column.path_in_schema
+            statistics = column.statistics
+            if statistics is None or not statistics.has_min_max:
+                # Without statistics for all the row groups the column can't be
+                # used for pruning.
+                stats[col] = None
+            elif col not in stats:
+                stats[col] = (statistics.min, statistics.max)
+            elif stats[col] is not None:
+                min_, max_ = stats[col]
+                stats[col] = (
+                    min(min_, statistics.min),
+                    max(max_, statistics.max),
+                )
+    schema = metadata.schema.to_arrow_schema()
+    for col, min_max in stats.items():
+        # Skip nested columns.
+        if min_max is None or col not in schema.names:
+            continue
+        type_ = schema.field(col).type
+        if pa.types.is_dictionary(type_):
+            type_ = type_.value_type
+        try:
+            min_ = pa.array([min_max[0]], type_)
+            max_ = pa.array([min_max[1]], type_)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+            _LOG.debug("Can't store the statistics of column '%s'", col)
+            continue
+        entry[f"min.{col}"] = min_
+        entry[f"max.{col}"] = max_
+    entry = pa.table(entry)
+    return entry
+
+
+def _concat_catalog_entries(entries: List[pa.Table]) -> pa.Table:
+    if not entries:
+        schema = pa.schema(
+            [
+                ("path", pa.string()),
+                ("num_rows", pa.int64()),
+                ("num_bytes", pa.int64()),
+            ]
         )
+        return schema.empty_table()
+    # Files with different columns or types have different entries.
+    catalog = pa.concat_tables(entries, promote_options="permissive")
+    catalog = catalog.sort_by("path")
+    return catalog
+
+
+def _load_catalog(root_dir: str, filesystem: Optional[Any]) -> Optional[pa.Table]:
+    catalog_path = _get_catalog_path(root_dir)
+    if filesystem is None:
+        exists = os.path.exists(catalog_path)
+    else:
+        exists = filesystem.exists(catalog_path)
+    if not exists:
+        return None
+    catalog = pq.read_table(
+        catalog_path, filesystem=filesystem, partitioning=None
+    )
+    return catalog
+
+
+def _save_catalog(
+    root_dir: str, catalog: pa.Table, filesystem: Optional[Any]
+) -> None:
+    catalog_path = _get_catalog_path(root_dir)
+    if filesystem is None:
+        # Replace the catalog atomically.
+        tmp_path = catalog_path + ".tmp"
+        pq.write_table(catalog, tmp_path)
+        os.replace(tmp_path, catalog_path)
+    else:
+        # Writing an S3 object is atomic.
+        pq.write_table(catalog, catalog_path, filesystem=filesystem)
+
+
+def build_parquet_catalog(
+    root_dir: str, *, aws_profile: hs3.AwsProfile = None
+) -> pa.Table:
+    """
+    Build the catalog of a Parquet dataset and save it in `root_dir`.
+
+    The catalog is stored in the sidecar file `root_dir/_catalog.parquet` and
+    has a row for each Parquet file of the dataset with:
+    - `path`: path of the file relative to `root_dir`
+    - the value of each partitioning column (e.g., `year`)
+    - `num_rows`, `num_bytes`: number of rows and size of the file
+    - `min.<col>`, `max.<col>`: min and max value of each column, when the
+      file has statistics for it
+
+    The writers in this module update the catalog of a dataset, if it exists.
+    The readers use it to prune the files to read without listing the dataset
+    only when passing `use_catalog=True`, since the files written in other
+    ways (e.g., with `to_parquet()`) are not in the catalog. The updates are
+    not synchronized, so a dataset with a catalog should be written by one
+    process at a time.
+
+    :param root_dir: root directory of Parquet dataset
+    :param aws_profile: the name of an AWS profile or a s3fs filesystem
+    :return: the catalog
+    """
+    filesystem = _get_filesystem(aws_profile)
+    file_names = _list_parquet_files(root_dir, filesystem, use_catalog=False)
+    _LOG.debug("Cataloging %s files in '%s'", len(file_names), root_dir)
+    entries = [
+        _get_catalog_entry(root_dir, file_name, filesystem)
+        for file_name in file_names
+    ]
+    catalog = _concat_catalog_entries(entries)
+    _save_catalog(root_dir, catalog, filesystem)
+    return catalog
+
+
+def load_parquet_catalog(
+    root_dir: str, *, aws_profile: hs3.AwsProfile = None
+) -> Optional[pa.Table]:
+    """
+    Load the catalog of a Parquet dataset (see `build_parquet_catalog()`).
+
+    :return: the catalog or `None` if the dataset has no catalog
+    """
+    filesystem = _get_filesystem(aws_profile)
+    catalog = _load_catalog(root_dir, filesystem)
+    return catalog
+
+
+def update_parquet_catalog(
+    root_dir: str,
+    *,
+    added_file_names: Optional[List[str]] = None,
+    removed_file_names: Optional[List[str]] = None,
+    aws_profile: hs3.AwsProfile = None,
+) -> bool:
+    """
+    Update the catalog of a Parquet dataset, if it exists.
+
+    :param root_dir: root directory of Parquet dataset
+    :param added_file_names: paths of the files written, including the
+        overwritten ones
+    :param removed_file_names: paths of the files removed
+    :param aws_profile: the name of an AWS profile or a s3fs filesystem
+    :return: whether the dataset has a catalog
+    """
+    filesystem = _get_filesystem(aws_profile)
+    catalog = _load_catalog(root_dir, filesystem)
+    if catalog is None:
+        return False
+    added_file_names = added_file_names or []
+    removed_file_names = removed_file_names or []
+    _LOG.debug(
+        "Updating the catalog of '%s' with %s added and %s removed files",
+        root_dir,
+        len(added_file_names),
+        len(removed_file_names),
+    )
+    # Remove the entries of the removed and overwritten files.
+    paths = [
+        _get_relative_path(file_name, root_dir)
+        for file_name in removed_file_names + added_file_names
+    ]
+    is_removed = pc.is_in(
+        catalog["path"], value_set=pa.array(paths, catalog["path"].type)
+    )
+    catalog = catalog.filter(pc.invert(is_removed))
+    entries = [catalog] + [
+        _get_catalog_entry(root_dir, file_name, filesystem)
+        for file_name in added_file_names
+    ]
+    catalog = _concat_catalog_entries(entries)
+    _save_catalog(root_dir, catalog, filesystem)
+    return True
+
+
+def _get_catalog_filter_expression(
+    schema: pa.Schema, col: str, op: str, value: Any
+) -> pc.Expression:
+    """
+    Return an expression on the catalog that is false only for the files that
+    have no row satisfying a filtering condition.
+
+    :param schema: schema of the catalog
+    :param col, op, value: filtering condition, e.g., `("year", "=", 2022)`
+    """
+    true = pc.scalar(True)
+
+    def _to_scalar(name: str, value: Any) -> pc.Expression:
+        return pc.scalar(pa.scalar(value, schema.field(name).type))
+
+    min_col = f"min.{col}"
+    max_col = f"max.{col}"
+    try:
+        if col in schema.names:
+            # The values of a partitioning column are known exactly.
+            field = pc.field(col)
+            if op in ("=", "=="):
+                expr = field == _to_scalar(col, value)
+            elif op == "!=":
+                expr = field != _to_scalar(col, value)
+            elif op == "<":
+                expr = field < _to_scalar(col, value)
+            elif op == "<=":
+                expr = field <= _to_scalar(col, value)
+            elif op == ">":
+                expr = field > _to_scalar(col, value)
+            elif op == ">=":
+                expr = field >= _to_scalar(col, value)
+            elif op in ("in", "not in"):
+                expr = field.isin(pa.array(list(value), schema.field(col).type))
+                if op == "not in":
+                    expr = ~expr
+            else:
+                return true
+        elif min_col in schema.names:
+            # Check if the range of values of the column can satisfy the
+            # condition.
+            min_ = pc.field(min_col)
+            max_ = pc.field(max_col)
+            if op in ("=", "=="):
+                expr = (min_ <= _to_scalar(min_col, value)) & (
+                    max_ >= _to_scalar(max_col, value)
+                )
+            elif op == "<":
+                expr = min_ < _to_scalar(min_col, value)
+            elif op == "<=":
+                expr = min_ <= _to_scalar(min_col, value)
+            elif op == ">":
+                expr = max_ > _to_scalar(max_col, value)
+            elif op == ">=":
+                expr = max_ >= _to_scalar(max_col, value)
+            elif op == "in":
+                expr = pc.scalar(False)
+                for value_tmp in value:
+                    expr = expr | (
+                        (min_ <= _to_scalar(min_col, value_tmp))
+                        & (max_ >= _to_scalar(max_col, value_tmp))
+                    )
+            else:
+                # E.g., "!=" can't be checked with the range of values.
+                return true
+            # Keep the files without statistics for the column.
+            expr = expr | min_.is_null()
+        else:
+            return true
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        # The value can't be compared with the column.
+        _LOG.debug("Can't prune with condition %s", (col, op, value))
+        return true
+    return expr
+
+
+def prune_parquet_catalog(
+    catalog: pa.Table, filters: Optional[List[Any]]
+) -> List[str]:
+    """
+    Return the files of a catalog that can contain rows satisfying filters.
+
+    The filters are checked against the partitioning columns and the min and
+    max values of the columns of each file.
+
+    :param catalog: catalog of a dataset (see `build_parquet_catalog()`)
+    :param filters: Parquet query in the format used by `from_parquet()`, i.e.,
+        a list of conditions like `("year", "=", 2022)` in AND or a list of
+        lists of conditions in OR
+    :return: paths of the files relative to the dataset root
+    """
+    if filters:
+        if not isinstance(filters[0], list):
+            filters = [filters]
+        expr = None
+        for and_filter in filters:
+            and_expr = pc.scalar(True)
+            for col, op, value in and_filter:
+                and_expr = and_expr & _get_catalog_filter_expression(
+                    catalog.schema, col, op, value
+                )
+            expr = and_expr if expr is None else expr | and_expr
+        catalog = catalog.filter(expr)
+    paths: List[str] = catalog["path"].to_pylist()
+    return paths
+
+
+# #############################################################################
+# PartitionedParquetWriter
+# #############################################################################
+
+
+class PartitionedParquetWriter:
+    """
+    Write DataFrames to a partitioned Parquet dataset incrementally.
+
+    Unlike `to_partitioned_parquet()`, which writes a new file in each
+    partition for every call, the rows appended during a session of the writer
+    are buffered per partition and written as row groups of `row_group_size`
+    rows in a single file per partition, e.g.,
+    ```
+    dst_dir/
+        asset=A/
+            year=2022/
+                <session_id>-0.parquet
+    ```
+
+    A partition gets a new file only when its file is closed to keep at most
+    `max_num_open_files` files open. The files of a partition can be merged
+    with `compact_partitioned_parquet()`.
+
+    The readers see a file only once it's closed: a local file is written
+    with a name starting with `.`, which is ignored by the readers, and
+    renamed when it's closed, while an S3 object is created when its upload
+    is completed.
+
+    Usage:
+    ```
+    with PartitionedParquetWriter(dst_dir, ["asset", "year"]) as writer:
+        for df in dfs:
+            writer.append(df)
+            ...
+            # Make the data written so far visible to readers.
+            writer.flush()
+    ```
+
+    If the block raises, the rows appended since the last flush are discarded,
+    instead of being written.
+    """
+
+    def __init__(
+        self,
+        dst_dir: str,
+        partition_columns: List[str],
+        *,
+        row_group_size: int = 1024**2,
+        max_buffer_num_bytes: int = 256 * 1024**2,
+        max_num_open_files: int = 128,
+        aws_profile: hs3.AwsProfile = None,
+    ) -> None:
+        """
+        Constructor.
+
+        :param dst_dir: location of the partitioned dataset
+        :param partition_columns: partitioning columns
+        :param row_group_size: number of rows of the row groups
+        :param max_buffer_num_bytes: size of the rows buffered across all the
+            partitions, after which the largest buffers are written even if
+            they don't fill a row group
+        :param max_num_open_files: max number of partition files kept open
+        :param aws_profile: the name of an AWS profile or a s3fs filesystem
+        """
+        hdbg.dassert_lte(1, len(partition_columns))
+        hdbg.dassert_lte(1, row_group_size)
+        hdbg.dassert_lte(1, max_num_open_files)
+        self._filesystem = None
+        if aws_profile is not None:
+            self._filesystem = hs3.get_s3fs(aws_profile)
+            dst_dir = dst_dir.rstrip("/")
+        self._dst_dir = dst_dir
+        self._aws_profile = aws_profile
+        self._partition_columns = partition_columns
+        self._row_group_size = row_group_size
+        self._max_buffer_num_bytes = max_buffer_num_bytes
+        self._max_num_open_files = max_num_open_files
+        # All the files written by this session have this prefix.
+        self._session_id = uuid.uuid4().hex
+        # Schema of the tables written, which is fixed by the first append.
+        self._schema: Optional[pa.Schema] = None
+        # Map a partition dir (e.g., `asset=A/year=2022`) to the buffered
+        # tables and their size.
+        self._buffers: Dict[str, List[pa.Table]] = collections.defaultdict(list)
+        self._buffer_num_rows: Dict[str, int] = collections.defaultdict(int)
+        self._buffer_num_bytes: Dict[str, int] = collections.defaultdict(int)
+        self._total_buffer_num_bytes = 0
+        # Map a partition dir to its open writer, output stream, and file,
+        # from the least recently used.
+        self._writers: collections.OrderedDict = collections.OrderedDict()
+        # Files closed since the last flush, to add to the catalog.
+        self._closed_file_names: List[str] = []
+        # Map a partition dir to the number of files written in it.
+        self._num_files: Dict[str, int] = collections.defaultdict(int)
+
+    def __enter__(self) -> "PartitionedParquetWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, df: pd.DataFrame) -> None:
+        """
+        Buffer the rows of `df` and write the partitions with full row groups.
+        """
+        hdbg.dassert_isinstance(df, pd.DataFrame)
+        hdbg.dassert_is_subset(self._partition_columns, df.columns)
+        hdbg.dassert(
+            not df[self._partition_columns].isna().any().any(),
+            "Partition columns %s can't contain NaNs",
+            self._partition_columns,
+        )
+        if df.empty:
+            return
+        # A `RangeIndex` is not stored, since the rows of different appends
+        # are concatenated.
+        preserve_index = not isinstance(df.index, pd.RangeIndex)
+        table = pa.Table.from_pandas(df, preserve_index=preserve_index)
+        table = table.drop_columns(self._partition_columns)
+        if self._schema is None:
+            self._schema = table.schema
+        else:
+            hdbg.dassert_eq_all(table.schema.names, self._schema.names)
+            table = table.cast(self._schema)
+        groups = df.groupby(self._partition_columns, sort=False).indices
+        for key, idxs in groups.items():
+            if not isinstance(key, tuple):
+                key = (key,)
+            partition_dir = "/".join(
+                f"{col}={val}" for col, val in zip(self._partition_columns, key)
+            )
+            table_tmp = table.take(pa.array(idxs))
+            self._buffers[partition_dir].append(table_tmp)
+            self._buffer_num_rows[partition_dir] += table_tmp.num_rows
+            self._buffer_num_bytes[partition_dir] += table_tmp.nbytes
+            self._total_buffer_num_bytes += table_tmp.nbytes
+            if self._buffer_num_rows[partition_dir] >= self._row_group_size:
+                self._write(partition_dir, only_full_row_groups=True)
+        if self._total_buffer_num_bytes > self._max_buffer_num_bytes:
+            # Write the largest buffers until half of the budget is free.
+            partition_dirs = sorted(
+                self._buffers,
+                key=lambda partition_dir: self._buffer_num_bytes[partition_dir],
+                reverse=True,
+            )
+            for partition_dir in partition_dirs:
+                if self._total_buffer_num_bytes <= self._max_buffer_num_bytes / 2:
+                    break
+                self._write(partition_dir, only_full_row_groups=False)
+
+    def flush(self) -> None:
+        """
+        Write all the buffered rows and close the files, so that they can be
+        read, adding them to the catalog of the dataset, if it exists.
+        """
+        for partition_dir in list(self._buffers):
+            self._write(partition_dir, only_full_row_groups=False)
+        while self._writers:
+            self._close_least_recently_used_file()
+        if self._closed_file_names:
+            update_parquet_catalog(
+                self._dst_dir,
+                added_file_names=self._closed_file_names,
+                aws_profile=self._aws_profile,
+            )
+            self._closed_file_names = []
+
+    def close(self) -> None:
+        self.flush()
+
+    def abort(self) -> None:
+        """
+        Discard the rows appended since the last flush.
+
+        The buffered rows and the open files are discarded, and the files
+        closed to respect `max_num_open_files` are removed.
+        """
+        self._buffers.clear()
+        self._buffer_num_rows.clear()
+        self._buffer_num_bytes.clear()
+        self._total_buffer_num_bytes = 0
+        while self._writers:
+            _, (writer, sink, file_name) = self._writers.popitem(last=False)
+            _LOG.debug("Discarding '%s'", file_name)
+            if self._filesystem is None:
+                writer.close()
+                sink.close()
+                os.remove(self._get_tmp_file_name(file_name))
+            else:
+                # Abort the upload, so that the object is not created.
+                sink.discard()
+                sink.closed = True
+        for file_name in self._closed_file_names:
+            _LOG.debug("Removing '%s'", file_name)
+            if self._filesystem is None:
+                os.remove(file_name)
+            else:
+                self._filesystem.rm(file_name)
+        self._closed_file_names = []
+
+    @staticmethod
+    def _get_tmp_file_name(file_name: str) -> str:
+        """
+        Return the name of a local file while it's written.
+        """
+        dir_name, base_name = os.path.split(file_name)
+        tmp_file_name = os.path.join(dir_name, f".{base_name}.tmp")
+        return tmp_file_name
+
+    def _write(self, partition_dir: str, *, only_full_row_groups: bool) -> None:
+        """
+        Write the rows buffered for a partition.
+
+        :param only_full_row_groups: write only the rows filling row groups
+            and keep the rest in the buffer
+        """
+        table = pa.concat_tables(self._buffers.pop(partition_dir))
+        self._total_buffer_num_bytes -= self._buffer_num_bytes.pop(partition_dir)
+        del self._buffer_num_rows[partition_dir]
+        num_rows = table.num_rows
+        if only_full_row_groups:
+            num_rows -= num_rows % self._row_group_size
+        if num_rows > 0:
+            writer = self._get_writer(partition_dir)
+            writer.write_table(
+                table.slice(0, num_rows), row_group_size=self._row_group_size
+            )
+        if num_rows < table.num_rows:
+            # Buffer the rest of the rows.
+            table = table.slice(num_rows)
+            self._buffers[partition_dir].append(table)
+            self._buffer_num_rows[partition_dir] = table.num_rows
+            self._buffer_num_bytes[partition_dir] = table.nbytes
+            self._total_buffer_num_bytes += table.nbytes
+
+    def _get_writer(self, partition_dir: str) -> pq.ParquetWriter:
+        """
+        Get the writer of a partition, opening a new file if needed.
+        """
+        if partition_dir in self._writers:
+            self._writers.move_to_end(partition_dir)
+            writer, _, _ = self._writers[partition_dir]
+            return writer
+        if len(self._writers) >= self._max_num_open_files:
+            self._close_least_recently_used_file()
+        file_idx = self._num_files[partition_dir]
+        self._num_files[partition_dir] += 1
+        file_name = "/".join(
+            [
+                self._dst_dir,
+                partition_dir,
+                f"{self._session_id}-{file_idx}.parquet",
+            ]
+        )
+        _LOG.debug("Opening '%s'", file_name)
+        if self._filesystem is None:
+            _create_enclosing_dir(file_name)
+            sink = open(self._get_tmp_file_name(file_name), "wb")
+        else:
+            sink = self._filesystem.open(file_name, "wb")
+        writer = pq.ParquetWriter(sink, self._schema)
+        self._writers[partition_dir] = (writer, sink, file_name)
+        return writer
+
+    def _close_least_recently_used_file(self) -> None:
+        _, (writer, sink, file_name) = self._writers.popitem(last=False)
+        # The writer doesn't close an output stream that it didn't open.
+        writer.close()
+        sink.close()
+        if self._filesystem is None:
+            os.replace(self._get_tmp_file_name(file_name), file_name)
+        self._closed_file_names.append(file_name)
+
+
+# #############################################################################
+# Compaction
+# #############################################################################
+
+
+def _get_pandas_index_columns(schema: pa.Schema) -> List[str]:
+    """
+    Return the columns storing the index of the DataFrame saved in a table.
+    """
+    pandas_metadata = schema.pandas_metadata or {}
+    # A `RangeIndex` is described by a dict and it's not stored in a column.
+    index_columns = [
+        col
+        for col in pandas_metadata.get("index_columns", [])
+        if isinstance(col, str)
+    ]
+    return index_columns
+
+
+def _drop_duplicates_in_table(
+    table: pa.Table,
+    duplicate_columns: List[str],
+    control_column: Optional[str],
+) -> pa.Table:
+    """
+    Remove duplicated rows from a table without converting it to pandas.
+
+    :param duplicate_columns: columns used to identify duplicated rows
+    :param control_column: column whose max value determines the kept row,
+        otherwise the first row is kept
+    :return: table with the kept rows in the original order
+    """
+    hdbg.dassert_lte(1, len(duplicate_columns))
+    keys = table.select(duplicate_columns)
+    keys = keys.append_column("_row_idx", pa.array(np.arange(table.num_rows)))
+    if control_column is not None:
+        # Move the rows to keep first and pick the first row of each group.
+        keys = keys.append_column("_control", table[control_column])
+        keys = keys.sort_by(
+            [("_control", "descending"), ("_row_idx", "ascending")]
+        )
+        keys = keys.append_column("_pos", pa.array(np.arange(table.num_rows)))
+        groups = keys.group_by(duplicate_columns, use_threads=False).aggregate(
+            [("_pos", "min")]
+        )
+        kept_idxs = keys["_row_idx"].take(groups["_pos_min"])
+    else:
+        groups = keys.group_by(duplicate_columns, use_threads=False).aggregate(
+            [("_row_idx", "min")]
+        )
+        kept_idxs = groups["_row_idx_min"]
+    kept_idxs = np.sort(kept_idxs.to_numpy())
+    table = table.take(pa.array(kept_idxs))
+    return table
+
+
+def _compact_partition_dir(
+    dir_name: str,
+    file_names: List[str],
+    dst_file_name: str,
+    drop_duplicates: bool,
+    duplicate_columns: Optional[List[str]],
+    metadata_columns: Optional[List[str]],
+    control_column: Optional[str],
+    row_group_size: int,
+    aws_profile: hs3.AwsProfile,
+    *,
+    incremental: bool,
+    num_attempts: int,
+) -> str:
+    """
+    Merge the files of a partition into a single file.
+
+    This is a task of `hjoblib.parallel_execute()`, see
+    `compact_partitioned_parquet()` for the params.
+
+    :return: path of the merged file
+    """
+    _ = incremental, num_attempts
+    filesystem = None
+    if aws_profile is not None:
+        filesystem = hs3.get_s3fs(aws_profile)
+    # Read and concatenate the files, promoting types if needed (e.g., a
+    # timestamp in `us` and one in `ns`).
+    # `partitioning=None` is required to read the files without partitioning
+    # columns. See CmTask7324 for details.
+    # https://github.com/cryptokaizen/cmamp/issues/7324
+    tables = [
+        pq.read_table(file_name, filesystem=filesystem, partitioning=None)
+        for file_name in file_names
+    ]
+    table = pa.concat_tables(tables, promote_options="permissive")
+    num_rows = table.num_rows
+    index_columns = _get_pandas_index_columns(table.schema)
+    if drop_duplicates:
+        if duplicate_columns is None:
+            # Use all the columns, except the index and the metadata.
+            excluded_columns = index_columns + (metadata_columns or [])
+            duplicate_columns = [
+                col for col in table.column_names if col not in excluded_columns
+            ]
+        hdbg.dassert_is_subset(duplicate_columns, table.column_names)
+        table = _drop_duplicates_in_table(
+            table, duplicate_columns, control_column
+        )
+    if index_columns:
+        # Sort by index, like `hdataframe.remove_duplicates()` does.
+        table = table.sort_by([(col, "ascending") for col in index_columns])
+    # Write the merged file with a name ignored by readers and replace the
+    # old files with it. The old files are removed only after the merged file
+    # is in place, so that the data is never lost.
+    dst_path = f"{dir_name}/{dst_file_name}"
+    tmp_path = f"{dir_name}/_tmp.{dst_file_name}"
+    pq.write_table(
+        table, tmp_path, filesystem=filesystem, row_group_size=row_group_size
+    )
+    if filesystem is None:
+        os.replace(tmp_path, dst_path)
+    else:
+        filesystem.mv(tmp_path, dst_path)
+    for file_name in file_names:
+        if file_name == dst_path:
+            # The file has been overwritten by the merged file.
+            continue
+        if filesystem is None:
+            os.remove(file_name)
+        else:
+            filesystem.rm(file_name)
+    _LOG.debug(
+        "Merged %s files with %s rows into '%s' with %s rows",
+        len(file_names),
+        num_rows,
+        dst_path,
+        table.num_rows,
+    )
+    return dst_path
+
+
+def compact_partitioned_parquet(
+    root_dir: str,
+    *,
+    file_name: str = "data.parquet",
+    drop_duplicates: bool = False,
+    duplicate_columns: Optional[List[str]] = None,
+    metadata_columns: Optional[List[str]] = None,
+    control_column: Optional[str] = None,
+    row_group_size: int = 1024**2,
+    num_threads: Union[str, int] = "serial",
+    aws_profile: hs3.AwsProfile = None,
+) -> int:
+    """
+    Merge the Parquet files of each partition of a dataset into a single file.
+
+    The files are concatenated and deduplicated as Arrow tables, without
+    converting them to pandas, and the partitions are processed in parallel.
+    The rows of a DataFrame saved with an index are sorted by index.
+
+    :param root_dir: root directory of Parquet dataset
+    :param file_name: name of the single resulting file in each partition
+    :param drop_duplicates: whether to remove the duplicated rows
+    :param duplicate_columns: columns used to identify duplicated rows
+        - `None` means all the columns except the index and `metadata_columns`
+    :param metadata_columns: columns ignored when identifying duplicated rows
+        (e.g., the download timestamp)
+    :param control_column: column whose max value determines the kept row
+        among duplicates, otherwise the first row is kept
+    :param row_group_size: number of rows of the row groups
+    :param num_threads: number of partitions to process in parallel, or
+        "serial"
+    :param aws_profile: the name of an AWS profile or a s3fs filesystem
+    :return: number of merged partitions
+    """
+    filesystem = _get_filesystem(aws_profile)
+    parquet_files = _list_parquet_files(root_dir, filesystem)
+    _LOG.debug("Parquet files: '%s'", parquet_files)
+    # Group the files by the lowest level of dataset folders.
+    folder_files: Dict[str, List[str]] = collections.defaultdict(list)
+    for file in parquet_files:
+        folder = file.rsplit("/", 1)[0]
+        folder_files[folder].append(file)
+    tasks = []
+    for folder, file_names in folder_files.items():
+        if len(file_names) == 1 and file_names[0].endswith(f"/{file_name}"):
+            # If there is already a single file, no action is required.
+            continue
+        task: hjoblib.Task = (
+            (
+                folder,
+                file_names,
+                file_name,
+                drop_duplicates,
+                duplicate_columns,
+                metadata_columns,
+                control_column,
+                row_group_size,
+                aws_profile,
+            ),
+            {},
+        )
+        tasks.append(task)
+    _LOG.debug("Merging %s partitions", len(tasks))
+    if not tasks:
+        return 0
+    workload = (_compact_partition_dir, "compact_partition_dir", tasks)
+    # Save the log in a temporary dir of this run, instead of adding it to the
+    # dataset.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = os.path.join(tmp_dir, "compact_partitioned_parquet.log")
+        dst_file_names = hjoblib.parallel_execute(
+            workload,
+            dry_run=False,
+            num_threads=num_threads,
+            incremental=False,
+            abort_on_error=True,
+            num_attempts=1,
+            log_file=log_file,
+        )
+    removed_file_names = [file_name for task in tasks for file_name in task[0][1]]
+    update_parquet_catalog(
+        root_dir,
+        added_file_names=dst_file_names,
+        removed_file_names=removed_file_names,
+        aws_profile=aws_profile,
+    )
+    return len(tasks)
 
 
 def list_and_merge_pq_files(
@@ -1145,6 +2374,7 @@ def list_and_merge_pq_files(
     file_name: str = "data.parquet",
     aws_profile: hs3.AwsProfile = None,
     drop_duplicates_mode: Optional[str] = None,
+    num_threads: Union[str, int] = "serial",
 ) -> None:
     """
     Merge all files of the Parquet dataset.
@@ -1175,78 +2405,40 @@ def list_and_merge_pq_files(
     :param root_dir: root directory of Parquet dataset
     :param file_name: name of the single resulting file
     :param aws_profile: the name of an AWS profile or a s3fs filesystem
+    :param drop_duplicates_mode: how to identify the duplicated rows
+        - `None`: all the columns except the download timestamps
+        - "bid_ask": same timestamp and exchange
+        - "ohlcv": same timestamp and exchange, keeping the max volume
+    :param num_threads: see `compact_partitioned_parquet()`
     """
-    if aws_profile is not None:
-        filesystem = hs3.get_s3fs(aws_profile)
-    else:
-        filesystem = None
-    # Get full paths to each Parquet file inside root dir.
-    if filesystem:
-        # Use specialized S3 filesystem function to list Parquet files efficiently.
-        # since glob.glob() is very slow as it does a lot of accesses to S3.
-        # The extra `**/*` is needed by `pyarrow` >= 17.
-        parquet_files = filesystem.glob(f"{root_dir}/**/*.parquet")
+    # Drop duplicates on all non-metadata columns.
+    # TODO(gp): hparquet is general and we should pass the columns to remove
+    #  or perform the transform after.
+    metadata_columns = None
+    if drop_duplicates_mode is None:
+        duplicate_columns = None
+        metadata_columns = ["knowledge_timestamp", "end_download_timestamp"]
+        control_column = None
+    elif drop_duplicates_mode == "bid_ask":
+        # Drop duplicates on timestamp index.
+        duplicate_columns = ["timestamp", "exchange_id"]
+        control_column = None
+    elif drop_duplicates_mode == "ohlcv":
+        # Drop duplicates on timestamp and keep one with largest volume.
+        duplicate_columns = ["timestamp", "exchange_id"]
+        control_column = "volume"
     else:
-        # For local filesystem, use glob.glob
-        parquet_files = glob.glob(f"{root_dir}/**/*.parquet", recursive=True)
-    _LOG.debug("Parquet files: '%s'", parquet_files)
-    # Get paths only to the lowest level of dataset folders.
-    dataset_folders = set(f.rsplit("/", 1)[0] for f in parquet_files)
-    for folder in dataset_folders:
-        # Get files per folder and merge if there are multiple ones.
-        if filesystem:
-            # Use specialized S3 filesystem function to list Parquet files efficiently.
-            folder_files = filesystem.ls(folder)
-        else:
-            # For local filesystem, use os.listdir
-            folder_files = [os.path.join(folder, f) for f in os.listdir(folder)]
-        hdbg.dassert_ne(
-            len(folder_files), 0, msg=f"Empty folder `{folder}` detected!"
-        )
-        if len(folder_files) == 1 and folder_files[0].endswith("/data.parquet"):
-            # If there is already single `data.parquet` file, no action is required.
-            continue
-        # Read all files in target folder.
-        # `partitioning=None` is required to read the dataset without
-        # partitioning columns. See CmTask7324 for details.
-        # https://github.com/cryptokaizen/cmamp/issues/7324
-        data = pq.ParquetDataset(
-            folder_files, filesystem=filesystem, partitioning=None
-        ).read()
-        data = data.to_pandas()
-        # Drop duplicates on all non-metadata columns.
-        # TODO(gp): hparquet is general and we should pass the columns to remove
-        #  or perform the transform after.
-        if drop_duplicates_mode is None:
-            duplicate_columns = data.columns.to_list()
-            for col_name in ["knowledge_timestamp", "end_download_timestamp"]:
-                if col_name in duplicate_columns:
-                    duplicate_columns.remove(col_name)
-            control_column = None
-        elif drop_duplicates_mode == "bid_ask":
-            # Drop duplicates on timestamp index.
-            duplicate_columns = ["timestamp", "exchange_id"]
-            control_column = None
-        elif drop_duplicates_mode == "ohlcv":
-            # Drop duplicates on timestamp and keep one with largest volume.
-            duplicate_columns = ["timestamp", "exchange_id"]
-            control_column = "volume"
-        else:
-            hdbg.dfatal("Supported drop duplicates modes: ohlcv, bid_ask")
-        data = hdatafr.remove_duplicates(data, duplicate_columns, control_column)
-        # Remove all old files and write the new, merged one.
-        if filesystem:
-            filesystem.rm(folder, recursive=True)
-            pq.write_table(
-                pa.Table.from_pandas(data),
-                folder + "/" + file_name,
-                filesystem=filesystem,
-            )
-        else:
-            # Use os.remove for local filesystem to remove files.
-            for file_path in folder_files:
-                os.remove(file_path)
-            data.to_parquet(os.path.join(folder, file_name))
+        hdbg.dfatal("Supported drop duplicates modes: ohlcv, bid_ask")
+    compact_partitioned_parquet(
+        root_dir,
+        file_name=file_name,
+        drop_duplicates=True,
+        duplicate_columns=duplicate_columns,
+        metadata_columns=metadata_columns,
+        control_column=control_column,
+        num_threads=num_threads,
+        aws_profile=aws_profile,
+    )
 
 
 def maybe_cast_to_int(string: str) -> Union[str, int]:
@@ -9,12 +9,14 @@ import configparser
 import copy
 import functools
 import gzip
+import hashlib
 import logging
 import os
 import pathlib
 import pprint
 import re
-from typing import Any, Dict, List, Optional, Tuple, Union
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 _WARNING = "\033[33mWARNING\033[0m"
 
@@ -509,6 +511,13 @@ def get_latest_pq_in_s3_dir(s3_path: str, aws_profile: str) -> str:
     s3fs_ = get_s3fs(aws_profile)
     dir_name = f"{s3_path}/**/*.parquet"
     pq_files = s3fs_.glob(dir_name, detail=True)
+    # Skip the files ignored by the Parquet readers (e.g., the catalog of the
+    # dataset).
+    pq_files = {
+        path: info
+        for path, info in pq_files.items()
+        if not os.path.basename(path).startswith(("_", "."))
+    }
     hdbg.dassert_lte(1, len(pq_files), "dir_name=%s", dir_name)
     _LOG.debug("pq_files=%s", pq_files)
     # Sort the files by the date they were modified for the last time.
@@ -838,18 +847,182 @@ def get_aws_credentials(
 
 # ///////////////////////////////////////////////////////////////////////////////
 
+# Settings of the S3 clients returned by `get_s3fs()` and `get_pyarrow_s3fs()`.
+# `None` means using the default of the library.
+_S3_CLIENT_CONFIG: Dict[str, Any] = {
+    # Max number of HTTP connections of a `s3fs` client.
+    "max_pool_connections": None,
+    # Max number of attempts of a request, including the first one.
+    "max_attempts": None,
+    # Retry mode of `botocore` for `s3fs`, i.e., "legacy", "standard", or
+    # "adaptive".
+    "retry_mode": None,
+    # Time after which the listings cached by `s3fs` expire, `None` to never
+    # expire them.
+    "listings_expiry_time_in_secs": None,
+}
+
+# Clients shared by the threads of a process, keyed by type of client, AWS
+# profile, region, process id, digest of the credentials, and client settings.
+_S3_CLIENTS: Dict[Tuple[Any, ...], Any] = {}
+_S3_CLIENTS_LOCK = threading.Lock()
+
+
+def configure_s3_clients(
+    *,
+    max_pool_connections: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+    retry_mode: Optional[str] = None,
+    listings_expiry_time_in_secs: Optional[float] = None,
+) -> None:
+    """
+    Set the settings of the S3 clients created from now on.
+
+    The clients created with different settings are not reused.
+
+    :param max_pool_connections: max number of HTTP connections of a `s3fs`
+        client; the connections of the `pyarrow` clients are not configurable
+    :param max_attempts: max number of attempts of a request
+    :param retry_mode: retry mode of the `s3fs` clients, i.e., "legacy",
+        "standard", or "adaptive"
+    :param listings_expiry_time_in_secs: time after which the directory
+        listings cached by the `s3fs` clients expire
+    """
+    hdbg.dassert_in(retry_mode, (None, "legacy", "standard", "adaptive"))
+    with _S3_CLIENTS_LOCK:
+        _S3_CLIENT_CONFIG.update(
+            max_pool_connections=max_pool_connections,
+            max_attempts=max_attempts,
+            retry_mode=retry_mode,
+            listings_expiry_time_in_secs=listings_expiry_time_in_secs,
+        )
+
+
+def clear_s3_client_cache() -> None:
+    """
+    Forget the cached S3 clients, e.g., to close their connections.
+    """
+    with _S3_CLIENTS_LOCK:
+        _S3_CLIENTS.clear()
+
+
+def _get_aws_credentials_digest(
+    aws_credentials: Optional[Dict[str, Optional[str]]],
+) -> Optional[str]:
+    """
+    Return a digest of the credentials to key the clients without storing the
+    secrets.
+    """
+    if aws_credentials is None:
+        return None
+    txt = repr(sorted(aws_credentials.items()))
+    digest = hashlib.sha256(txt.encode("utf-8")).hexdigest()
+    return digest
+
+
+def _get_cached_s3_client(
+    client_type: str,
+    aws_profile: Optional[str],
+    aws_credentials: Optional[Dict[str, Optional[str]]],
+    create_client: Callable[
+        [Optional[Dict[str, Optional[str]]], Dict[str, Any]], Any
+    ],
+) -> Any:
+    """
+    Return the cached client for the key or create it with `create_client()`.
+
+    A new client is created when the credentials change (e.g., temporary
+    credentials are renewed), since they are part of the key.
+
+    :param client_type: type of the client, e.g., "s3fs"
+    :param aws_profile: AWS profile, `None` if the credentials are inferred
+        from the environment
+    :param aws_credentials: credentials returned by `get_aws_credentials()`,
+        `None` to infer them from the environment
+    :param create_client: function building the client from the credentials
+        and the client settings
+    """
+    pid = os.getpid()
+    region = None
+    if aws_credentials is not None:
+        region = aws_credentials["aws_region"]
+    credentials_digest = _get_aws_credentials_digest(aws_credentials)
+    with _S3_CLIENTS_LOCK:
+        config = dict(_S3_CLIENT_CONFIG)
+        key = (
+            client_type,
+            aws_profile,
+            region,
+            pid,
+            credentials_digest,
+            tuple(sorted(config.items())),
+        )
+        client = _S3_CLIENTS.get(key)
+        if client is None:
+            # Drop the clients inherited from the parent process after a fork,
+            # since their connections can't be shared.
+            for key_ in [key_ for key_ in _S3_CLIENTS if key_[3] != pid]:
+                del _S3_CLIENTS[key_]
+            _LOG.debug("Creating %s client for key=%s", client_type, key[:4])
+            client = create_client(aws_credentials, config)
+            _S3_CLIENTS[key] = client
+    return client
+
+
+def _create_s3fs(
+    aws_credentials: Optional[Dict[str, Optional[str]]], config: Dict[str, Any]
+) -> s3fs.core.S3FileSystem:
+    """
+    Create a `s3fs` client.
+
+    :param aws_credentials: credentials returned by `get_aws_credentials()`,
+        `None` to infer them from the environment
+    :param config: client settings, like `_S3_CLIENT_CONFIG`
+    """
+    kwargs: Dict[str, Any] = {}
+    if aws_credentials is not None:
+        kwargs.update(
+            anon=False,
+            key=aws_credentials["aws_access_key_id"],
+            secret=aws_credentials["aws_secret_access_key"],
+            token=aws_credentials["aws_session_token"],
+            client_kwargs={"region_name": aws_credentials["aws_region"]},
+        )
+    # Configure `botocore`.
+    config_kwargs: Dict[str, Any] = {}
+    if config["max_pool_connections"] is not None:
+        config_kwargs["max_pool_connections"] = config["max_pool_connections"]
+    retries = {}
+    if config["max_attempts"] is not None:
+        retries["max_attempts"] = config["max_attempts"]
+    if config["retry_mode"] is not None:
+        retries["mode"] = config["retry_mode"]
+    if retries:
+        config_kwargs["retries"] = retries
+    if config_kwargs:
+        kwargs["config_kwargs"] = config_kwargs
+    if config["listings_expiry_time_in_secs"] is not None:
+        kwargs["listings_expiry_time"] = config["listings_expiry_time_in_secs"]
+    s3fs_ = s3fs.core.S3FileSystem(**kwargs)
+    return s3fs_
+
 
 def get_s3fs(aws_profile: AwsProfile) -> s3fs.core.S3FileSystem:
     """
     Return a `s3fs` object from a given AWS profile.
 
+    The object is created once per process for each profile, region, and
+    credentials, and then shared by all the callers, so that they reuse the
+    credentials, the connections, and the listings cache. See `configure_s3_clients()` to tune
+    the objects.
+
     :param aws_profile: the name of an AWS profile or a s3fs filesystem
     """
     if hserver.is_ig_prod():
         # On IG prod machines we let the Docker container infer the right AWS
         # account.
         _LOG.warning("Not using AWS profile='%s'", aws_profile)
-        s3fs_ = s3fs.core.S3FileSystem()
+        s3fs_ = _get_cached_s3_client("s3fs", None, None, _create_s3fs)
     else:
         if isinstance(aws_profile, str):
             # When deploying jobs via ECS the container obtains credentials
@@ -858,17 +1031,13 @@ def get_s3fs(aws_profile: AwsProfile) -> s3fs.core.S3FileSystem:
             # https://docs.aws.amazon.com/AmazonECS/latest/developerguide/task-iam-roles.html
             if aws_profile == "ck" and hserver.is_inside_ecs_container():
                 _LOG.info("Fetching credentials from task IAM role")
-                s3fs_ = s3fs.core.S3FileSystem()
+                s3fs_ = _get_cached_s3_client("s3fs", None, None, _create_s3fs)
             else:
                 # From https://stackoverflow.com/questions/62562945
                 aws_credentials = get_aws_credentials(aws_profile)
                 _LOG.debug("%s", pprint.pformat(aws_credentials))
-                s3fs_ = s3fs.core.S3FileSystem(
-                    anon=False,
-                    key=aws_credentials["aws_access_key_id"],
-                    secret=aws_credentials["aws_secret_access_key"],
-                    token=aws_credentials["aws_session_token"],
-                    client_kwargs={"region_name": aws_credentials["aws_region"]},
+                s3fs_ = _get_cached_s3_client(
+                    "s3fs", aws_profile, aws_credentials, _create_s3fs
                 )
         elif isinstance(aws_profile, s3fs.core.S3FileSystem):
             s3fs_ = aws_profile
@@ -877,6 +1046,57 @@ def get_s3fs(aws_profile: AwsProfile) -> s3fs.core.S3FileSystem:
     return s3fs_
 
 
+def _create_pyarrow_s3fs(
+    aws_credentials: Optional[Dict[str, Optional[str]]], config: Dict[str, Any]
+) -> Any:
+    """
+    Create a `pyarrow` S3 filesystem.
+
+    Same interface as `_create_s3fs()`.
+    """
+    # Import here to avoid the dependency from `pyarrow` in the thin
+    # environment.
+    import pyarrow.fs as pafs
+
+    kwargs: Dict[str, Any] = {}
+    if aws_credentials is not None:
+        kwargs.update(
+            access_key=aws_credentials["aws_access_key_id"],
+            secret_key=aws_credentials["aws_secret_access_key"],
+            session_token=aws_credentials["aws_session_token"],
+            region=aws_credentials["aws_region"],
+        )
+    if config["max_attempts"] is not None:
+        kwargs["retry_strategy"] = pafs.AwsStandardS3RetryStrategy(
+            max_attempts=config["max_attempts"]
+        )
+    s3fs_ = pafs.S3FileSystem(**kwargs)
+    return s3fs_
+
+
+def get_pyarrow_s3fs(aws_profile: str) -> Any:
+    """
+    Return a `pyarrow` S3 filesystem from a given AWS profile.
+
+    Same as `get_s3fs()`, but for the `pyarrow` functions reading and writing
+    Parquet.
+
+    :param aws_profile: the name of an AWS profile
+    """
+    # When deploying jobs via ECS the container obtains credentials based on passed
+    #  task role specified in the ECS task-definition, refer to:
+    #  https://docs.aws.amazon.com/AmazonECS/latest/developerguide/task-iam-roles.html
+    if hserver.is_inside_ecs_container():
+        _LOG.info("Fetching credentials from task IAM role")
+        s3fs_ = _get_cached_s3_client("pyarrow", None, None, _create_pyarrow_s3fs)
+    else:
+        aws_credentials = get_aws_credentials(aws_profile)
+        s3fs_ = _get_cached_s3_client(
+            "pyarrow", aws_profile, aws_credentials, _create_pyarrow_s3fs
+        )
+    return s3fs_
+
+
 # #############################################################################
 # Archive and retrieve data from S3.
 # #############################################################################
@@ -4,19 +4,37 @@ Import as:
 import helpers.hsql_implementation as hsqlimpl
 """
 
+import asyncio
 import collections
-import io
+import concurrent.futures
+import contextlib
+import functools
 import logging
 import os
 import re
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple, Union, cast
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 import numpy as np
 import pandas as pd
 import psycopg2 as psycop
 import psycopg2.extras as extras
+import psycopg2.pool as pspool
 import psycopg2.sql as psql
+import pyarrow as pa
 
 import helpers.hasyncio as hasynci
 import helpers.hdatetime as hdateti
@@ -63,20 +81,48 @@ def get_connection(
     return connection
 
 
-def get_connection_from_aws_secret(
+# Secrets fetched from AWS SecretsManager by name, with the time when they
+# expire, according to `time.monotonic()`.
+_SECRET_CACHE: Dict[str, Tuple[Dict[str, Any], float]] = {}
+_SECRET_CACHE_LOCK = threading.Lock()
+
+
+def _get_secret_with_ttl(secret_name: str, ttl_in_secs: float) -> Dict[str, Any]:
+    """
+    Fetch a secret, reusing the value fetched less than `ttl_in_secs` ago.
+    """
+    hdbg.dassert_lte(0, ttl_in_secs)
+    now = time.monotonic()
+    with _SECRET_CACHE_LOCK:
+        if secret_name in _SECRET_CACHE:
+            secret, expiration_time = _SECRET_CACHE[secret_name]
+            if now < expiration_time:
+                _LOG.debug("Using cached secret: %s", secret_name)
+                return secret
+    _LOG.info("Fetching secret: %s", secret_name)
+    secret = hsecret.get_secret(secret_name)
+    with _SECRET_CACHE_LOCK:
+        _SECRET_CACHE[secret_name] = (secret, now + ttl_in_secs)
+    return secret
+
+
+def get_connection_info_from_aws_secret(
     aws_region: str,
     *,
     stage: str = "prod",
-) -> DbConnection:
+    credentials_ttl_in_secs: float = 300.0,
+) -> DbConnectionInfo:
     """
-    Create an SQL connection using credentials obtained from AWS
-    SecretsManager.
+    Get the connection parameters from AWS SecretsManager.
 
-    The function uses `ck` AWS profile on the backend.
-    The intended usage is obtaining connection to a DB on RDS instances.
+    The credentials are fetched at most once every `credentials_ttl_in_secs`,
+    so that they are refreshed when rotated without calling SecretsManager for
+    each connection.
 
-    :param aws_region: AWS DB region, e.g. "eu-north-1", "ap-northeast-1"
-    :param stage: DB stage to connect to. For "prod" stage it is only possible to obtain a read-only connection via this method.
+    :param aws_region: see `get_connection_from_aws_secret()`
+    :param stage: see `get_connection_from_aws_secret()`
+    :param credentials_ttl_in_secs: time after which the credentials are
+        fetched again, 0 to always fetch them
     """
     hdbg.dassert_in(stage, ["prod", "preprod", "test"])
     hdbg.dassert_in(aws_region, hs3.AWS_REGIONS)
@@ -89,15 +135,38 @@ def get_connection_from_aws_secret(
             if aws_region == hs3.AWS_EUROPE_REGION_1
             else f"{dbname}.{aws_region}"
         )
-    _LOG.info("Fetching secret: %s", secret_name)
-    db_creds = hsecret.get_secret(secret_name)
-    connection = get_connection(
+    db_creds = _get_secret_with_ttl(secret_name, credentials_ttl_in_secs)
+    connection_info = DbConnectionInfo(
         host=db_creds["host"],
         dbname=dbname,
         port=db_creds["port"],
         user=db_creds["username"],
         password=db_creds["password"],
     )
+    return connection_info
+
+
+def get_connection_from_aws_secret(
+    aws_region: str,
+    *,
+    stage: str = "prod",
+    credentials_ttl_in_secs: float = 300.0,
+) -> DbConnection:
+    """
+    Create an SQL connection using credentials obtained from AWS
+    SecretsManager.
+
+    The function uses `ck` AWS profile on the backend.
+    The intended usage is obtaining connection to a DB on RDS instances.
+
+    :param aws_region: AWS DB region, e.g. "eu-north-1", "ap-northeast-1"
+    :param stage: DB stage to connect to. For "prod" stage it is only possible to obtain a read-only connection via this method.
+    :param credentials_ttl_in_secs: see `get_connection_info_from_aws_secret()`
+    """
+    connection_info = get_connection_info_from_aws_secret(
+        aws_region, stage=stage, credentials_ttl_in_secs=credentials_ttl_in_secs
+    )
+    connection = get_connection(*connection_info)
     return connection
 
 
@@ -249,6 +318,428 @@ def db_connection_to_tuple(connection: DbConnection) -> DbConnectionInfo:
     return ret
 
 
+# #############################################################################
+# Connection pool
+# #############################################################################
+
+
+class DbConnectionPoolMetrics:
+    """
+    Collect the metrics of a `DbConnectionPool`.
+
+    The metrics are updated by multiple threads. The distributions of the wait
+    and query times are computed over the last `max_num_samples` samples.
+    """
+
+    def __init__(self, *, max_num_samples: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = collections.defaultdict(float)
+        self._wait_times_in_secs: Deque[float] = collections.deque(
+            maxlen=max_num_samples
+        )
+        self._query_times_in_secs: Deque[float] = collections.deque(
+            maxlen=max_num_samples
+        )
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def add_checkout(self, wait_time_in_secs: float) -> None:
+        """
+        Record that a connection was checked out after waiting for it.
+        """
+        with self._lock:
+            self._counters["num_checkouts"] += 1
+            self._counters["total_wait_time_in_secs"] += wait_time_in_secs
+            self._wait_times_in_secs.append(wait_time_in_secs)
+
+    def add_query(self, query_time_in_secs: float) -> None:
+        """
+        Record the latency of a query executed on a pooled connection.
+        """
+        with self._lock:
+            self._counters["num_queries"] += 1
+            self._counters["total_query_time_in_secs"] += query_time_in_secs
+            self._query_times_in_secs.append(query_time_in_secs)
+
+    def get_stats(self) -> pd.Series:
+        """
+        Return the counters and the distributions of the wait and query times.
+
+        E.g.,
+        ```
+        num_checkouts                    12.0
+        num_opened_connections            2.0
+        total_wait_time_in_secs           0.1
+        p50_wait_time_in_secs             0.0
+        ...
+        ```
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            samples = {
+                "wait_time_in_secs": list(self._wait_times_in_secs),
+                "query_time_in_secs": list(self._query_times_in_secs),
+            }
+        for tag, values in samples.items():
+            for percentile in (50, 95):
+                stats[f"p{percentile}_{tag}"] = (
+                    np.percentile(values, percentile) if values else np.nan
+                )
+            stats[f"max_{tag}"] = max(values) if values else np.nan
+        srs = pd.Series(stats, dtype=float)
+        return srs
+
+
+class _TimedCursor(psycop.extensions.cursor):
+    """
+    Cursor recording the latency of its queries in the pool metrics.
+    """
+
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        start_time = time.monotonic()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._add_query(time.monotonic() - start_time)
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        start_time = time.monotonic()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._add_query(time.monotonic() - start_time)
+
+    def _add_query(self, query_time_in_secs: float) -> None:
+        metrics = getattr(self.connection, "pool_metrics", None)
+        if metrics is not None:
+            metrics.add_query(query_time_in_secs)
+
+
+class _PooledConnection(psycop.extensions.connection):
+    """
+    Connection whose cursors record the latency of the queries.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = _TimedCursor
+        self.pool_metrics: Optional[DbConnectionPoolMetrics] = None
+
+
+class DbConnectionPool:
+    """
+    Share a bounded number of connections to a DB across threads.
+
+    - Connections are opened on demand, up to `max_num_connections`; a caller
+      waits for a connection to be returned when all of them are in use
+    - A connection idle for more than `check_after_idle_in_secs` is checked
+      before being handed out and it is replaced if it's broken
+    - A connection that fails with a connection error while in use is closed
+      instead of being returned to the pool
+
+    E.g.,
+    ```
+    pool = hsql.get_connection_pool(connection_info)
+    with pool.connection() as connection:
+        df = hsql.execute_query_to_df(connection, query)
+    ```
+    """
+
+    def __init__(
+        self,
+        connection_info: Union[DbConnectionInfo, Callable[[], DbConnectionInfo]],
+        *,
+        max_num_connections: int = 8,
+        autocommit: bool = True,
+        timeout_in_secs: float = 30.0,
+        check_after_idle_in_secs: float = 10.0,
+    ) -> None:
+        """
+        Constructor.
+
+        :param connection_info: connection parameters or a function returning
+            them, called each time a connection is opened, e.g., to use
+            credentials that are rotated
+        :param max_num_connections: max number of connections open at the same
+            time
+        :param autocommit: same as in `get_connection()`
+        :param timeout_in_secs: max time to wait for a connection before
+            raising `PoolError`
+        :param check_after_idle_in_secs: check that a connection is alive
+            before handing it out if it was idle longer than this
+        """
+        hdbg.dassert_lte(1, max_num_connections)
+        hdbg.dassert_lte(0, timeout_in_secs)
+        hdbg.dassert_lte(0, check_after_idle_in_secs)
+        if isinstance(connection_info, DbConnectionInfo):
+            self._get_connection_info = lambda: connection_info
+        else:
+            hdbg.dassert(callable(connection_info))
+            self._get_connection_info = connection_info
+        self._max_num_connections = max_num_connections
+        self._autocommit = autocommit
+        self._timeout_in_secs = timeout_in_secs
+        self._check_after_idle_in_secs = check_after_idle_in_secs
+        self.metrics = DbConnectionPoolMetrics()
+        # The idle connections with the time they were returned, used as a
+        # stack to reuse the most recently used connection.
+        self._idle_connections: List[Tuple[DbConnection, float]] = []
+        # Number of connections that are idle, in use, or being opened.
+        self._num_connections = 0
+        self._is_closed = False
+        self._condition = threading.Condition()
+
+    def __enter__(self) -> "DbConnectionPool":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def is_closed(self) -> bool:
+        return self._is_closed
+
+    @property
+    def max_num_connections(self) -> int:
+        return self._max_num_connections
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[DbConnection]:
+        """
+        Check out a connection and return it to the pool on exit.
+        """
+        connection = self.get_connection()
+        discard = False
+        try:
+            yield connection
+        except (psycop.OperationalError, psycop.InterfaceError):
+            # The connection is likely broken, so don't reuse it.
+            discard = True
+            raise
+        finally:
+            self.put_connection(connection, discard=discard)
+
+    def get_connection(self) -> DbConnection:
+        """
+        Check out a connection, which must be returned with `put_connection()`.
+        """
+        start_time = time.monotonic()
+        deadline = start_time + self._timeout_in_secs
+        while True:
+            connection = None
+            with self._condition:
+                hdbg.dassert(not self._is_closed, "The pool is closed")
+                while (
+                    not self._idle_connections
+                    and self._num_connections >= self._max_num_connections
+                ):
+                    remaining_time_in_secs = deadline - time.monotonic()
+                    if remaining_time_in_secs <= 0:
+                        self.metrics.increment("num_timeouts")
+                        raise pspool.PoolError(
+                            f"No connection available after {self._timeout_in_secs} secs"
+                        )
+                    self._condition.wait(remaining_time_in_secs)
+                if self._idle_connections:
+                    connection, idle_since = self._idle_connections.pop()
+                else:
+                    # Reserve the slot for the new connection.
+                    self._num_connections += 1
+            if connection is None:
+                connection = self._open_connection()
+                break
+            if self._is_alive(connection, idle_since):
+                break
+            # Replace the broken connection.
+            _LOG.warning("Discarding a broken connection")
+            self._discard_connection(connection)
+        self.metrics.add_checkout(time.monotonic() - start_time)
+        return connection
+
+    def put_connection(
+        self, connection: DbConnection, *, discard: bool = False
+    ) -> None:
+        """
+        Return a connection to the pool.
+
+        :param discard: close the connection instead of reusing it
+        """
+        if not discard and not connection.closed and not self._autocommit:
+            # Don't leak an open transaction to the next user.
+            try:
+                connection.rollback()
+            except psycop.Error:
+                discard = True
+        if discard or connection.closed:
+            self._discard_connection(connection)
+            return
+        with self._condition:
+            if not self._is_closed:
+                self._idle_connections.append((connection, time.monotonic()))
+                self._condition.notify()
+                return
+        # The pool was closed while the connection was in use.
+        self._discard_connection(connection)
+
+    def close(self) -> None:
+        """
+        Close the idle connections and the ones in use once returned.
+        """
+        with self._condition:
+            self._is_closed = True
+            idle_connections = [conn for conn, _ in self._idle_connections]
+            self._idle_connections = []
+        for connection in idle_connections:
+            self._discard_connection(connection)
+
+    def _open_connection(self) -> DbConnection:
+        try:
+            connection_info = self._get_connection_info()
+            _LOG.debug(
+                hprint.to_str("connection_info.host connection_info.dbname")
+            )
+            connection = psycop.connect(
+                host=connection_info.host,
+                dbname=connection_info.dbname,
+                port=connection_info.port,
+                user=connection_info.user,
+                password=connection_info.password,
+                connection_factory=_PooledConnection,
+            )
+        except BaseException:
+            # Release the slot reserved for the connection.
+            with self._condition:
+                self._num_connections -= 1
+                self._condition.notify()
+            raise
+        connection.pool_metrics = self.metrics
+        if self._autocommit:
+            connection.autocommit = True
+        self.metrics.increment("num_opened_connections")
+        return connection
+
+    def _is_alive(self, connection: DbConnection, idle_since: float) -> bool:
+        if connection.closed:
+            return False
+        if time.monotonic() - idle_since < self._check_after_idle_in_secs:
+            return True
+        self.metrics.increment("num_liveness_checks")
+        try:
+            # Use a plain cursor so that the check is not counted as a query.
+            with connection.cursor(
+                cursor_factory=psycop.extensions.cursor
+            ) as cursor:
+                cursor.execute("SELECT 1")
+            if not self._autocommit:
+                connection.rollback()
+        except (psycop.OperationalError, psycop.InterfaceError) as e:
+            _LOG.debug("Liveness check failed: %s", e)
+            return False
+        return True
+
+    def _discard_connection(self, connection: DbConnection) -> None:
+        try:
+            connection.close()
+        except psycop.Error as e:
+            _LOG.debug("Closing the connection failed: %s", e)
+        self.metrics.increment("num_discarded_connections")
+        with self._condition:
+            self._num_connections -= 1
+            self._condition.notify()
+
+
+# Pools shared by all the callers with the same key.
+_CONNECTION_POOLS: Dict[Any, DbConnectionPool] = {}
+_CONNECTION_POOLS_LOCK = threading.Lock()
+
+
+def _get_shared_connection_pool(
+    key: Any,
+    connection_info: Union[DbConnectionInfo, Callable[[], DbConnectionInfo]],
+    pool_kwargs: Dict[str, Any],
+) -> DbConnectionPool:
+    key = (key, tuple(sorted(pool_kwargs.items())))
+    with _CONNECTION_POOLS_LOCK:
+        pool = _CONNECTION_POOLS.get(key)
+        if pool is None or pool.is_closed:
+            _LOG.debug("Creating connection pool for key=%s", key[0])
+            pool = DbConnectionPool(connection_info, **pool_kwargs)
+            _CONNECTION_POOLS[key] = pool
+    return pool
+
+
+def get_connection_pool(
+    connection_info: DbConnectionInfo, **pool_kwargs: Any
+) -> DbConnectionPool:
+    """
+    Return the pool shared by the callers using the same connection info.
+
+    :param connection_info: connection parameters
+    :param pool_kwargs: params of `DbConnectionPool`
+    """
+    hdbg.dassert_isinstance(connection_info, DbConnectionInfo)
+    pool = _get_shared_connection_pool(
+        connection_info, connection_info, pool_kwargs
+    )
+    return pool
+
+
+def get_connection_pool_from_aws_secret(
+    aws_region: str,
+    *,
+    stage: str = "prod",
+    credentials_ttl_in_secs: float = 300.0,
+    **pool_kwargs: Any,
+) -> DbConnectionPool:
+    """
+    Return the pool shared by the callers connecting to the same DB on RDS.
+
+    The credentials are refreshed from AWS SecretsManager according to
+    `credentials_ttl_in_secs` when a new connection is opened.
+
+    :param aws_region: see `get_connection_from_aws_secret()`
+    :param stage: see `get_connection_from_aws_secret()`
+    :param credentials_ttl_in_secs: see `get_connection_info_from_aws_secret()`
+    :param pool_kwargs: params of `DbConnectionPool`
+    """
+    get_connection_info = functools.partial(
+        get_connection_info_from_aws_secret,
+        aws_region,
+        stage=stage,
+        credentials_ttl_in_secs=credentials_ttl_in_secs,
+    )
+    key = ("aws_secret", aws_region, stage, credentials_ttl_in_secs)
+    pool = _get_shared_connection_pool(key, get_connection_info, pool_kwargs)
+    return pool
+
+
+def close_connection_pools() -> None:
+    """
+    Close all the shared pools.
+    """
+    with _CONNECTION_POOLS_LOCK:
+        pools = list(_CONNECTION_POOLS.values())
+        _CONNECTION_POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+@contextlib.contextmanager
+def _use_connection(
+    db_connection: Union[DbConnection, DbConnectionPool],
+) -> Iterator[DbConnection]:
+    """
+    Check out a connection from a pool or use the passed connection.
+    """
+    if isinstance(db_connection, DbConnectionPool):
+        with db_connection.connection() as connection:
+            yield connection
+    else:
+        yield db_connection
+
+
 # #############################################################################
 # State of the whole DB
 # #############################################################################
@@ -605,6 +1096,180 @@ def execute_query_to_df(
     return df
 
 
+# Arrow types of the results of the Postgres types, by OID, from
+# `SELECT oid, typname FROM pg_type`. The columns of the other types are
+# inferred from the values of the first chunk with a non-null value.
+_PG_OID_TO_ARROW_TYPE = {
+    # bool.
+    16: pa.bool_(),
+    # bytea.
+    17: pa.binary(),
+    # name, text, varchar, bpchar.
+    19: pa.string(),
+    25: pa.string(),
+    1043: pa.string(),
+    1042: pa.string(),
+    # int8, int2, int4.
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    # float4, float8, numeric.
+    700: pa.float32(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    # date, timestamp, timestamptz.
+    1082: pa.date32(),
+    1114: pa.timestamp("ns"),
+    1184: pa.timestamp("ns", tz="UTC"),
+}
+
+
+def _get_arrow_schema_from_cursor(
+    cursor: Any, rows: List[tuple], *, schema: Optional[pa.Schema] = None
+) -> pa.Schema:
+    """
+    Get the schema of the results of a query from the column types.
+
+    The type of a column without a known Postgres type is `null` until a chunk
+    has a non-null value for it.
+
+    :param cursor: cursor that executed the query
+    :param rows: rows of the current chunk of results, used to infer the
+        types of the columns without a known Postgres type
+    :param schema: schema of the previous chunks, whose non-null types are
+        kept
+    """
+    fields = []
+    for idx, column in enumerate(cursor.description):
+        type_ = _PG_OID_TO_ARROW_TYPE.get(column.type_code)
+        if type_ is None and schema is not None:
+            type_ = schema.field(idx).type
+            if pa.types.is_null(type_):
+                type_ = None
+        if type_ is None:
+            type_ = pa.array([row[idx] for row in rows]).type
+            _LOG.debug(
+                "Inferred type of column '%s' with OID=%s: %s",
+                column.name,
+                column.type_code,
+                type_,
+            )
+        fields.append(pa.field(column.name, type_))
+    schema = pa.schema(fields)
+    return schema
+
+
+def _rows_to_record_batch(rows: List[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Convert rows of values to a record batch with the given schema.
+    """
+    arrays = []
+    for idx, field in enumerate(schema):
+        values = [row[idx] for row in rows]
+        if pa.types.is_floating(field.type):
+            # `numeric` values are returned as `Decimal`.
+            values = [None if val is None else float(val) for val in values]
+        arrays.append(pa.array(values, type=field.type))
+    batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+    return batch
+
+
+# Pandas types of the Arrow types whose conversion depends on the presence of
+# nulls, e.g., `int64` becomes `float64` with nulls, so that the types of the
+# chunks don't depend on their values.
+_ARROW_TO_PANDAS_NULLABLE_TYPE = {
+    pa.bool_(): pd.BooleanDtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def execute_query_to_df_chunks(
+    connection: Union[DbConnection, DbConnectionPool],
+    query: str,
+    *,
+    chunk_size: int = 100_000,
+    output_format: str = "pandas",
+    schema: Optional[pa.Schema] = None,
+) -> Iterator[Union[pd.DataFrame, pa.RecordBatch]]:
+    """
+    Execute a query and stream the results in chunks of rows.
+
+    Unlike `execute_query_to_df()`, the results are kept on the server through
+    a named cursor and transferred `chunk_size` rows at a time, so that only
+    one chunk is in memory.
+
+    The types of the columns are fixed before converting the first chunk,
+    from the Postgres types of the columns, so that all the chunks have the
+    same types and can be concatenated or written to Parquet, e.g.,
+    ```
+    with hparque.PartitionedParquetWriter(dst_dir, ["currency_pair"]) as writer:
+        for df in hsql.execute_query_to_df_chunks(connection, query):
+            writer.append(df)
+    ```
+    - `numeric` columns are converted to `float64`
+    - the types of the columns without a known Postgres type (e.g., `jsonb`)
+      are inferred from their values, so they are `null` in the chunks
+      before the first non-null value
+    - with `output_format="pandas"`, integer and boolean columns use the
+      nullable Pandas types (e.g., `Int64`), since a `NULL` would turn them
+      into floats only in some chunks
+
+    :param connection: connection to the DB or pool to check out a connection
+        from for the duration of the iteration
+    :param query: query to execute
+    :param chunk_size: number of rows of each chunk, except the last one
+    :param output_format: "pandas" to return dataframes, "arrow" to return
+        record batches
+    :param schema: types of the columns to use instead of the ones derived
+        from the Postgres types
+    :return: iterator over the chunks of results; no chunk is returned if the
+        query has no results
+    """
+    hdbg.dassert_lte(1, chunk_size)
+    hdbg.dassert_in(output_format, ("pandas", "arrow"))
+    _LOG.debug(hprint.to_str("query chunk_size"))
+    with _use_connection(connection) as connection_:
+        # A named cursor keeps the results on the server. In autocommit mode
+        # the cursor needs to be declared `WITH HOLD` to outlive the implicit
+        # transaction, which makes the server store the results until the
+        # cursor is closed.
+        cursor_name = f"stream_{uuid.uuid4().hex}"
+        cursor = connection_.cursor(
+            name=cursor_name, withhold=connection_.autocommit
+        )
+        cursor.itersize = chunk_size
+        is_schema_inferred = schema is None
+        try:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if is_schema_inferred and (
+                    schema is None
+                    or any(pa.types.is_null(field.type) for field in schema)
+                ):
+                    # Infer the types of the columns that had only nulls.
+                    schema = _get_arrow_schema_from_cursor(
+                        cursor, rows, schema=schema
+                    )
+                batch = _rows_to_record_batch(rows, schema)
+                if output_format == "pandas":
+                    yield batch.to_pandas(
+                        types_mapper=_ARROW_TO_PANDAS_NULLABLE_TYPE.get
+                    )
+                else:
+                    yield batch
+        finally:
+            try:
+                cursor.close()
+            except psycop.Error as e:
+                # E.g., the transaction was aborted by an error in the query.
+                _LOG.debug("Closing the cursor failed: %s", e)
+
+
 # #############################################################################
 # Insert
 # #############################################################################
@@ -635,13 +1300,153 @@ def csv_to_series(csv_as_txt: str, sep: str = ",") -> pd.Series:
     return srs
 
 
+# Size of the blocks sent to the server by `COPY`.
+_COPY_BUFFER_SIZE = 1024**2
+
+
+class _CsvChunkReader:
+    """
+    File-like object serializing a dataframe to CSV one chunk of rows at a
+    time, as it is read by `COPY`.
+
+    Missing values are written as `\\N`, so that they are distinguished from
+    empty strings.
+    """
+
+    def __init__(self, df: pd.DataFrame, chunk_size: int) -> None:
+        self._df = df
+        self._chunk_size = chunk_size
+        # Index of the first row not serialized yet.
+        self._start = 0
+        # CSV of the current chunk and position of the first byte not read.
+        self._buffer = b""
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if self._offset == len(self._buffer):
+            if self._start >= len(self._df):
+                return b""
+            chunk = self._df.iloc[self._start : self._start + self._chunk_size]
+            self._start += self._chunk_size
+            csv = chunk.to_csv(index=False, header=False, na_rep=r"\N")
+            self._buffer = csv.encode("utf-8")
+            self._offset = 0
+        if size < 0:
+            size = len(self._buffer) - self._offset
+        # Return at most the rest of the chunk, since `COPY` reads until it
+        # gets no data.
+        data = self._buffer[self._offset : self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+def bulk_insert_df(
+    connection: DbConnection,
+    df: pd.DataFrame,
+    table_name: str,
+    *,
+    on_conflict: Optional[str] = None,
+    unique_columns: Optional[List[str]] = None,
+    chunk_size: int = 100_000,
+) -> int:
+    """
+    Insert a dataframe into a table with `COPY`.
+
+    The dataframe is serialized to CSV `chunk_size` rows at a time while it's
+    sent, so that the CSV of the entire dataframe is never in memory.
+
+    To handle the rows violating the unique constraint on `unique_columns`, the
+    data is copied to a temporary staging table and then inserted with a
+    single `INSERT ... SELECT ... ON CONFLICT`.
+
+    :param connection: connection to the DB
+    :param df: data to insert; the index is not inserted
+    :param table_name: name of the table for insertion
+    :param on_conflict: what to do with the rows violating the constraint:
+        - `None`: fail, like for a plain insert
+        - "do_nothing": skip them, like
+          `execute_insert_on_conflict_do_nothing_query()`
+        - "update": update the existing rows with the values of the new ones;
+          if multiple rows of `df` have the same key, the last one is used
+    :param unique_columns: columns of the unique constraint, required when
+        `on_conflict` is not `None`
+    :param chunk_size: number of rows serialized at a time
+    :return: number of rows inserted or updated
+    """
+    hdbg.dassert_isinstance(df, pd.DataFrame)
+    hdbg.dassert_in(on_conflict, (None, "do_nothing", "update"))
+    hdbg.dassert_lte(1, chunk_size)
+    columns = ",".join(df.columns)
+    copy_options = r"(FORMAT csv, NULL '\N')"
+    with connection.cursor() as cursor:
+        if on_conflict is None:
+            hdbg.dassert_is(unique_columns, None)
+            query = f"COPY {table_name}({columns}) FROM STDIN {copy_options}"
+            _LOG.debug("query=%s", query)
+            reader = _CsvChunkReader(df, chunk_size)
+            cursor.copy_expert(query, reader, size=_COPY_BUFFER_SIZE)
+            num_rows = cursor.rowcount
+        else:
+            hdbg.dassert_lte(1, len(unique_columns))
+            hdbg.dassert_is_subset(unique_columns, df.columns)
+            if on_conflict == "do_nothing":
+                action = "DO NOTHING"
+            else:
+                # A row can't be updated twice by the same query.
+                df = df.drop_duplicates(unique_columns, keep="last")
+                update_columns = [
+                    col for col in df.columns if col not in unique_columns
+                ]
+                hdbg.dassert_lte(1, len(update_columns))
+                action = "DO UPDATE SET " + ",".join(
+                    f"{col} = EXCLUDED.{col}" for col in update_columns
+                )
+            # Create a staging table with only the columns to insert, so that
+            # the constraints and defaults of the other columns don't apply.
+            staging_table_name = f"tmp_staging_{uuid.uuid4().hex}"
+            # In a transaction the table is dropped when it ends, including
+            # when it's rolled back after an error.
+            on_commit = "" if connection.autocommit else " ON COMMIT DROP"
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging_table_name}{on_commit} AS "
+                f"SELECT {columns} FROM {table_name} WITH NO DATA"
+            )
+            try:
+                query = (
+                    f"COPY {staging_table_name}({columns}) FROM STDIN "
+                    f"{copy_options}"
+                )
+                reader = _CsvChunkReader(df, chunk_size)
+                cursor.copy_expert(query, reader, size=_COPY_BUFFER_SIZE)
+                unique_columns_str = ",".join(unique_columns)
+                query = (
+                    f"INSERT INTO {table_name}({columns}) "
+                    f"SELECT {columns} FROM {staging_table_name} "
+                    f"ON CONFLICT ({unique_columns_str}) {action}"
+                )
+                _LOG.debug("query=%s", query)
+                cursor.execute(query)
+                num_rows = cursor.rowcount
+            finally:
+                if connection.autocommit:
+                    cursor.execute(f"DROP TABLE IF EXISTS {staging_table_name}")
+    if not connection.autocommit:
+        connection.commit()
+    _LOG.debug("Inserted %s rows into %s", num_rows, table_name)
+    return num_rows
+
+
 def copy_rows_with_copy_from(
     connection: DbConnection, df: pd.DataFrame, table_name: str
 ) -> None:
     """
-    Copy dataframe contents into DB directly from buffer.
+    Copy dataframe contents into DB with `COPY`.
 
-    This function works much faster for large dataframes (>10000 rows).
+    This function works much faster for large dataframes (>10000 rows). See
+    `bulk_insert_df()` for the options to handle duplicates.
 
     :param connection: DB connection
     :param df: data to insert
@@ -649,15 +1454,8 @@ def copy_rows_with_copy_from(
     """
     # The target table needs to exist.
     hdbg.dassert_in(table_name, get_table_names(connection))
-    # Read the data.
-    buffer = io.StringIO()
-    df.to_csv(buffer, index=False, header=False)
-    buffer.seek(0)
     # Copy the data to the DB.
-    cur = connection.cursor()
-    cur.copy_from(buffer, table_name, sep=",")
-    # TODO(gp): CmampTask413, is this still needed because the autocommit.
-    connection.commit()
+    bulk_insert_df(connection, df, table_name)
 
 
 # TODO(gp): -> table_name, df
@@ -727,7 +1525,7 @@ def execute_insert_query(
     hdbg.dassert_isinstance(df, pd.DataFrame)
     hdbg.dassert_in(table_name, get_table_names(connection))
     _LOG.debug("df=\n%s", hpandas.df_to_str(df, use_tabulate=False))
-    # Ensure the DataFrame has compatible types with 
+    # Ensure the DataFrame has compatible types with
     # downstream consumers (e.g., database).
     df = df.applymap(lambda x: float(x) if isinstance(x, np.float64) else x)
     # Transform dataframe into list of tuples.
@@ -872,7 +1670,7 @@ def get_num_rows(connection: DbConnection, table_name: str) -> int:
 
 
 def is_row_with_value_present(
-    connection: DbConnection,
+    connection: Union[DbConnection, DbConnectionPool],
     table_name: str,
     field_name: str,
     target_value: str,
@@ -886,19 +1684,22 @@ def is_row_with_value_present(
     E.g., this can be used with polling to wait for the target value
     "hello_world.txt" in the "filename" field of the table "table_name" to appear
 
+    :param connection: connection to the DB or pool to check out a connection
+        from for each poll
     :return:
         - success if the value is present
         - result: None
     """
     _LOG.debug(hprint.to_str("connection table_name field_name target_value"))
-    # Print the state of the DB, if needed.
-    if show_db_state:
-        query = f"SELECT * FROM {table_name} ORDER BY filename"
-        df = execute_query_to_df(connection, query)
-        _LOG.debug("df=\n%s", hpandas.df_to_str(df, use_tabulate=False))
-    # Check if the required row is available.
-    query = f"SELECT {field_name} FROM {table_name} WHERE {field_name}='{target_value}'"
-    df = execute_query_to_df(connection, query)
+    with _use_connection(connection) as connection_:
+        # Print the state of the DB, if needed.
+        if show_db_state:
+            query = f"SELECT * FROM {table_name} ORDER BY filename"
+            df = execute_query_to_df(connection_, query)
+            _LOG.debug("df=\n%s", hpandas.df_to_str(df, use_tabulate=False))
+        # Check if the required row is available.
+        query = f"SELECT {field_name} FROM {table_name} WHERE {field_name}='{target_value}'"
+        df = execute_query_to_df(connection_, query)
     _LOG.debug("df=\n%s", hpandas.df_to_str(df, use_tabulate=False))
     # Package results.
     success = df.shape[0] > 0
@@ -909,7 +1710,7 @@ def is_row_with_value_present(
 # TODO(gp): Add unit test.
 async def wait_for_change_in_number_of_rows(
     get_wall_clock_time: hdateti.GetWallClockTime,
-    db_connection: DbConnection,
+    db_connection: Union[DbConnection, DbConnectionPool],
     table_name: str,
     poll_kwargs: Dict[str, Any],
     *,
@@ -918,17 +1719,24 @@ async def wait_for_change_in_number_of_rows(
     """
     Wait until the number of rows in a table changes.
 
+    The queries block the event loop while they run: use
+    `wait_for_change_in_number_of_rows_with_listener()` to wait for
+    notifications instead of polling.
+
     :param get_wall_clock_time: a function to get current time
-    :param db_connection: connection to the target DB
+    :param db_connection: connection to the target DB or pool to check out a
+        connection from for each poll
     :param table_name: name of the table to poll
     :param poll_kwargs: a dictionary with the kwargs for `poll()`
     :param tag: name of the caller function
     :return: number of new rows found
     """
-    num_rows = get_num_rows(db_connection, table_name)
+    with _use_connection(db_connection) as connection:
+        num_rows = get_num_rows(connection, table_name)
 
     def _is_number_of_rows_changed() -> hasynci.PollOutput:
-        new_num_rows = get_num_rows(db_connection, table_name)
+        with _use_connection(db_connection) as connection:
+            new_num_rows = get_num_rows(connection, table_name)
         _LOG.debug("new_num_rows=%s num_rows=%s", new_num_rows, num_rows)
         success = new_num_rows != num_rows
         diff_num_rows = new_num_rows - num_rows
@@ -948,3 +1756,311 @@ async def wait_for_change_in_number_of_rows(
     _ = num_iters
     diff_num_rows = cast(int, diff_num_rows)
     return diff_num_rows
+
+
+# #############################################################################
+# Async access
+# #############################################################################
+
+
+class AsyncDbConnectionPool:
+    """
+    Access a DB from coroutines without blocking the event loop.
+
+    The blocking `psycopg2` calls run in a dedicated thread pool with a thread
+    for each connection of the underlying `DbConnectionPool`, so that the
+    event loop keeps running the other coroutines while a query runs.
+
+    E.g.,
+    ```
+    async with await hsql.connect_async(connection_info) as pool:
+        df = await pool.execute_query_to_df(query)
+    ```
+    """
+
+    def __init__(self, pool: DbConnectionPool) -> None:
+        """
+        Constructor.
+
+        :param pool: pool of the connections to use
+        """
+        hdbg.dassert_isinstance(pool, DbConnectionPool)
+        self.pool = pool
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=pool.max_num_connections, thread_name_prefix="hsql"
+        )
+
+    async def __aenter__(self) -> "AsyncDbConnectionPool":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def run(
+        self, func: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        """
+        Run `func(connection, *args, **kwargs)` on a pooled connection in a
+        thread.
+        """
+
+        def _run() -> Any:
+            with self.pool.connection() as connection:
+                return func(connection, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        ret = await loop.run_in_executor(self._executor, _run)
+        return ret
+
+    async def execute_query_to_df(
+        self, query: str, **kwargs: Any
+    ) -> pd.DataFrame:
+        """
+        Same as `execute_query_to_df()`.
+        """
+        df = await self.run(execute_query_to_df, query, **kwargs)
+        return df
+
+    async def execute_query(self, query: str) -> List[tuple]:
+        """
+        Same as `execute_query()`.
+        """
+        result = await self.run(execute_query, query)
+        return result
+
+    async def get_num_rows(self, table_name: str) -> int:
+        """
+        Same as `get_num_rows()`.
+        """
+        num_rows = await self.run(get_num_rows, table_name)
+        return num_rows
+
+    async def bulk_insert_df(
+        self, df: pd.DataFrame, table_name: str, **kwargs: Any
+    ) -> int:
+        """
+        Same as `bulk_insert_df()`.
+        """
+        num_rows = await self.run(bulk_insert_df, df, table_name, **kwargs)
+        return num_rows
+
+    async def close(self) -> None:
+        """
+        Wait for the running queries and close the connections.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self._executor.shutdown, wait=True)
+        )
+        self.pool.close()
+
+
+async def connect_async(
+    connection_info: DbConnectionInfo, **pool_kwargs: Any
+) -> AsyncDbConnectionPool:
+    """
+    Create an `AsyncDbConnectionPool` and open its first connection.
+
+    :param connection_info: connection parameters
+    :param pool_kwargs: params of `DbConnectionPool`
+    :return: pool with a connection open, so that the connection errors are
+        raised here
+    """
+    pool = AsyncDbConnectionPool(DbConnectionPool(connection_info, **pool_kwargs))
+    try:
+        await pool.run(lambda connection: None)
+    except BaseException:
+        await pool.close()
+        raise
+    return pool
+
+
+def notify(connection: DbConnection, channel: str, payload: str = "") -> None:
+    """
+    Send a notification to the listeners of a channel.
+
+    :param connection: connection to the DB
+    :param channel: name of the channel
+    :param payload: message to send
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+    if not connection.autocommit:
+        connection.commit()
+
+
+def create_insert_notify_trigger(
+    connection: DbConnection, table_name: str, channel: str
+) -> None:
+    """
+    Notify the listeners of `channel` each time rows are inserted in a table.
+
+    The payload of the notification is the name of the table. The trigger is
+    replaced if it already exists.
+
+    :param connection: connection to the DB
+    :param table_name: name of the table
+    :param channel: name of the channel
+    """
+    trigger_name = f"{table_name}_notify_insert"
+    query = f"""
+        CREATE OR REPLACE FUNCTION {trigger_name}() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{channel}', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS {trigger_name} ON {table_name};
+        CREATE TRIGGER {trigger_name}
+            AFTER INSERT ON {table_name}
+            FOR EACH STATEMENT EXECUTE FUNCTION {trigger_name}();
+    """
+    _LOG.debug("query=%s", query)
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+    if not connection.autocommit:
+        connection.commit()
+
+
+class DbNotificationListener:
+    """
+    Receive the notifications sent with `NOTIFY` on some channels.
+
+    A dedicated connection is watched by the event loop, so that waiting for a
+    notification doesn't block the event loop nor a thread.
+
+    E.g.,
+    ```
+    async with hsql.DbNotificationListener(connection_info, ["channel"]) as listener:
+        notification = await listener.get_notification(timeout_in_secs=60)
+        _LOG.info("payload=%s", notification.payload)
+    ```
+    """
+
+    def __init__(
+        self, connection_info: DbConnectionInfo, channels: List[str]
+    ) -> None:
+        """
+        Constructor.
+
+        :param connection_info: connection parameters
+        :param channels: names of the channels to listen to
+        """
+        hdbg.dassert_isinstance(connection_info, DbConnectionInfo)
+        hdbg.dassert_lte(1, len(channels))
+        self._connection_info = connection_info
+        self._channels = channels
+        self._connection: Optional[DbConnection] = None
+        # Notifications received, or the error that stopped the listener.
+        self._queue: Optional[asyncio.Queue] = None
+
+    async def __aenter__(self) -> "DbNotificationListener":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.close()
+
+    def __aiter__(self) -> "DbNotificationListener":
+        return self
+
+    async def __anext__(self) -> psycop.extensions.Notify:
+        notification = await self.get_notification()
+        return notification
+
+    async def start(self) -> None:
+        """
+        Connect and start listening to the channels.
+        """
+        hdbg.dassert_is(self._connection, None, "The listener is already started")
+        loop = asyncio.get_running_loop()
+        # Connecting and subscribing are blocking, so they run in a thread.
+        self._connection = await loop.run_in_executor(None, self._connect)
+        self._queue = asyncio.Queue()
+        loop.add_reader(self._connection.fileno(), self._on_readable)
+
+    async def get_notification(
+        self, *, timeout_in_secs: Optional[float] = None
+    ) -> psycop.extensions.Notify:
+        """
+        Wait for the next notification.
+
+        :param timeout_in_secs: max time to wait, `None` to wait forever
+        :return: notification with `channel`, `payload`, and the `pid` of the
+            sender
+        :raises: TimeoutError in case of timeout
+        """
+        hdbg.dassert_is_not(self._queue, None, "The listener is not started")
+        item = await asyncio.wait_for(self._queue.get(), timeout_in_secs)
+        if isinstance(item, BaseException):
+            # Keep reporting the error to the next callers.
+            self._queue.put_nowait(item)
+            raise item
+        return item
+
+    def close(self) -> None:
+        if self._connection is None:
+            return
+        if not self._connection.closed:
+            asyncio.get_running_loop().remove_reader(self._connection.fileno())
+            self._connection.close()
+
+    def _connect(self) -> DbConnection:
+        connection = get_connection(*self._connection_info, autocommit=True)
+        with connection.cursor() as cursor:
+            for channel in self._channels:
+                _LOG.debug("Listening to channel=%s", channel)
+                cursor.execute(
+                    psql.SQL("LISTEN {};").format(psql.Identifier(channel))
+                )
+        return connection
+
+    def _on_readable(self) -> None:
+        try:
+            self._connection.poll()
+        except psycop.Error as e:
+            _LOG.error("Stop listening after error: %s", e)
+            asyncio.get_running_loop().remove_reader(self._connection.fileno())
+            self._queue.put_nowait(e)
+            return
+        while self._connection.notifies:
+            notification = self._connection.notifies.pop(0)
+            _LOG.debug("notification=%s", notification)
+            self._queue.put_nowait(notification)
+
+
+async def wait_for_change_in_number_of_rows_with_listener(
+    pool: AsyncDbConnectionPool,
+    listener: DbNotificationListener,
+    table_name: str,
+    *,
+    timeout_in_secs: Optional[float] = None,
+) -> int:
+    """
+    Wait until the number of rows in a table changes, counting the rows only
+    when a notification is received.
+
+    Unlike `wait_for_change_in_number_of_rows()`, the table is not polled and
+    the event loop is never blocked.
+
+    :param pool: pool to count the rows
+    :param listener: started listener receiving a notification when rows are
+        inserted, e.g., through `create_insert_notify_trigger()`
+    :param table_name: name of the table
+    :param timeout_in_secs: max time to wait, `None` to wait forever
+    :return: number of new rows found
+    :raises: TimeoutError in case of timeout
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout_in_secs is None else loop.time() + timeout_in_secs
+    # The listener is started before counting, so no insertion is missed.
+    num_rows = await pool.get_num_rows(table_name)
+    while True:
+        remaining_time_in_secs = None
+        if deadline is not None:
+            remaining_time_in_secs = max(deadline - loop.time(), 0)
+        await listener.get_notification(timeout_in_secs=remaining_time_in_secs)
+        new_num_rows = await pool.get_num_rows(table_name)
+        _LOG.debug("new_num_rows=%s num_rows=%s", new_num_rows, num_rows)
+        if new_num_rows != num_rows:
+            return new_num_rows - num_rows
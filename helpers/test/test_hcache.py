@@ -1,6 +1,10 @@
+import cProfile
 import logging
+import os
+import pstats
 import tempfile
 import time
+import unittest.mock as umock
 from typing import Any, Callable, Generator, Tuple
 
 import numpy as np
@@ -8,6 +12,7 @@ import pandas as pd
 import pytest
 
 import helpers.hcache as hcache
+import helpers.hcache_store as hcacstor
 import helpers.hdbg as hdbg
 import helpers.hio as hio
 import helpers.hprint as hprint
@@ -932,5 +937,411 @@ class TestCacheEnableCheckOnlyIfPresent1(_ResetGlobalCacheHelper):
         self._execute_and_check_state(f, cf, 2, 2, exp_cf_state=cache_from)
 
 
+# #############################################################################
+
+
+def _get_df_function() -> Callable:
+    """
+    Return a function building a dataframe with `num_rows` rows.
+    """
+
+    def func(num_rows: int) -> pd.DataFrame:
+        func.executed = True  # type: ignore[attr-defined]
+        df = pd.DataFrame(
+            {
+                "a": np.arange(num_rows, dtype=np.float64),
+                "b": np.arange(num_rows, dtype=np.int64),
+            }
+        )
+        return df
+
+    func.executed = False  # type: ignore[attr-defined]
+    return func
+
+
+class TestObjMemCache1(_ResetGlobalCacheHelper):
+    """
+    Test the object memory cache.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setup_teardown_test2(self) -> Generator:
+        self._max_num_bytes = hcache._OBJ_CACHE_MAX_NUM_BYTES
+        yield
+        hcache.set_mem_cache_max_num_bytes(self._max_num_bytes)
+
+    def test_deep_copy1(self) -> None:
+        """
+        By default a hit returns a copy of the cached value.
+        """
+        f = _get_df_function()
+        cf = hcache._Cached(f, tag=self.cache_tag, use_disk_cache=False)
+        df1 = cf(10)
+        df2 = cf(10)
+        self.assertEqual(cf.get_last_cache_accessed(), "mem")
+        # Modifying the returned value doesn't change the cached value.
+        df2.loc[0, "a"] = -1.0
+        df3 = cf(10)
+        self.assertEqual(df3.loc[0, "a"], 0.0)
+        self.assertFalse(np.shares_memory(df1["a"].values, df3["a"].values))
+
+    def test_zero_copy1(self) -> None:
+        """
+        With `zero_copy=True` a hit returns the cached data without copying it.
+        """
+        f = _get_df_function()
+        cf = hcache._Cached(
+            f, tag=self.cache_tag, use_disk_cache=False, zero_copy=True
+        )
+        df1 = cf(10)
+        df2 = cf(10)
+        self.assertEqual(cf.get_last_cache_accessed(), "mem")
+        # Check.
+        self.assertTrue(np.shares_memory(df1["a"].values, df2["a"].values))
+        # Adding a column doesn't change the cached value.
+        df2["c"] = 1
+        self.assertEqual(cf(10).columns.tolist(), ["a", "b"])
+        # Modifying the returned value in place doesn't change the cached value:
+        # either the data is read-only or pandas copies it on write.
+        try:
+            df2.iloc[0, 0] = -1.0
+        except ValueError as e:
+            self.assertIn("read-only", str(e))
+        self.assertEqual(cf(10).iloc[0, 0], 0.0)
+        self.assertFalse(df1["a"].values.flags.writeable)
+
+    def test_eviction1(self) -> None:
+        """
+        The least recently used values are evicted when the cache is full.
+        """
+        f = _get_df_function()
+        cf = hcache._Cached(f, tag=self.cache_tag, use_disk_cache=False)
+        num_bytes = hcache._get_obj_num_bytes(f(1000))
+        hcache.set_mem_cache_max_num_bytes(int(2.5 * num_bytes))
+        # Fill the cache.
+        for num_rows in (1000, 1001, 1002):
+            cf(num_rows)
+        # Check.
+        self.assertLessEqual(
+            hcache.get_mem_cache_num_bytes(), int(2.5 * num_bytes)
+        )
+        _reset_add_function(f)
+        cf(1002)
+        self.assertEqual(cf.get_last_cache_accessed(), "mem")
+        # The first value was evicted.
+        cf(1000)
+        self.assertEqual(cf.get_last_cache_accessed(), "no_cache")
+
+    def test_tmpfs_cache1(self) -> None:
+        """
+        The tmpfs cache is used when the value is not in the object cache.
+        """
+        f = _get_df_function()
+        cf = hcache._Cached(
+            f, tag=self.cache_tag, use_disk_cache=False, use_tmpfs_cache=True
+        )
+        cf(10)
+        # Remove the value only from the object cache.
+        hcache._clear_obj_cache(self.cache_tag)
+        _reset_add_function(f)
+        df = cf(10)
+        # Check.
+        self.assertFalse(f.executed)  # type: ignore[attr-defined]
+        self.assertEqual(cf.get_last_cache_accessed(), "mem")
+        self.assertEqual(df.shape, (10, 2))
+
+
+@pytest.mark.superslow("~1 min.")
+class TestObjMemCacheBenchmark1(_ResetGlobalCacheHelper):
+    """
+    Compare the latency of a memory cache hit for a 1 GB dataframe.
+    """
+
+    def test1(self) -> None:
+        # 1 GB dataframe with 2 columns of 8 bytes.
+        num_rows = 1024**3 // 16
+        f = _get_df_function()
+        txt = []
+        for use_tmpfs_cache, zero_copy in [
+            (True, False),
+            (False, False),
+            (False, True),
+        ]:
+            cf = hcache._Cached(
+                f,
+                tag=self.cache_tag,
+                use_disk_cache=False,
+                use_tmpfs_cache=use_tmpfs_cache,
+                zero_copy=zero_copy,
+            )
+            cf(num_rows)
+            if use_tmpfs_cache:
+                # Measure the hits on the tmpfs cache, as before the object
+                # cache was introduced.
+                hcache._clear_obj_cache(self.cache_tag)
+            perf_start = time.perf_counter()
+            _ = cf(num_rows)
+            elapsed_time = time.perf_counter() - perf_start
+            self.assertEqual(cf.get_last_cache_accessed(), "mem")
+            txt.append(
+                f"use_tmpfs_cache={use_tmpfs_cache} zero_copy={zero_copy}: "
+                f"hit_time_in_secs={elapsed_time:.4f}"
+            )
+            hcache.clear_global_cache("mem", tag=self.cache_tag)
+        _LOG.info("\n%s", "\n".join(txt))
+
+
+class TestCacheHitOverhead1(_ResetGlobalCacheHelper):
+    """
+    Profile a cache hit to check that the arguments are processed only once.
+    """
+
+    def test_mem_cache1(self) -> None:
+        self._helper(use_mem_cache=True, use_disk_cache=True)
+
+    def test_disk_cache1(self) -> None:
+        self._helper(use_mem_cache=False, use_disk_cache=True)
+
+    def _helper(self, **kwargs: Any) -> None:
+        def func(df: pd.DataFrame) -> float:
+            return float(df["a"].sum())
+
+        cf = hcache._Cached(func, tag=self.cache_tag, **kwargs)
+        for num_rows in (10, 1_000_000):
+            df = pd.DataFrame({"a": np.arange(num_rows, dtype=np.float64)})
+            cf(df)
+            # Profile a cache hit.
+            profiler = cProfile.Profile()
+            profiler.enable()
+            cf(df)
+            profiler.disable()
+            self.assertNotEqual(cf.get_last_cache_accessed(), "no_cache")
+            # Count the calls hashing or printing the arguments.
+            stats = pstats.Stats(profiler).stats  # type: ignore[attr-defined]
+            num_hash_calls = 0
+            num_repr_calls = 0
+            for (file_name, _, func_name), stat in stats.items():
+                num_calls = stat[1]
+                if func_name == "_get_args_id":
+                    num_hash_calls += num_calls
+                if file_name.endswith("pandas/core/frame.py") and func_name in (
+                    "__repr__",
+                    "to_string",
+                ):
+                    num_repr_calls += num_calls
+            # Check.
+            _LOG.debug(
+                "num_rows=%s num_hash_calls=%s num_repr_calls=%s",
+                num_rows,
+                num_hash_calls,
+                num_repr_calls,
+            )
+            self.assertEqual(num_hash_calls, 1)
+            self.assertEqual(num_repr_calls, 0)
+
+
+class TestBlobStoreCache1(_ResetGlobalCacheHelper):
+    """
+    Test using a blob store as disk cache.
+    """
+
+    def test1(self) -> None:
+        """
+        Values are loaded from the blob store and deduplicated across functions.
+        """
+        store_path = os.path.join(self.get_scratch_space(), "blob_store")
+
+        def f1(num_rows: int) -> pd.DataFrame:
+            return pd.DataFrame({"a": range(num_rows)})
+
+        def f2(num_rows: int) -> pd.DataFrame:
+            return pd.DataFrame({"a": range(num_rows)})
+
+        cf1 = hcache._Cached(
+            f1,
+            tag=self.cache_tag,
+            use_mem_cache=False,
+            blob_store_path=store_path,
+        )
+        cf2 = hcache._Cached(
+            f2,
+            tag=self.cache_tag,
+            use_mem_cache=False,
+            blob_store_path=store_path,
+        )
+        # Execute the functions.
+        df1 = cf1(10)
+        self.assertEqual(cf1.get_last_cache_accessed(), "no_cache")
+        df2 = cf1(10)
+        self.assertEqual(cf1.get_last_cache_accessed(), "disk")
+        self.assert_equal(str(df1), str(df2))
+        cf2(10)
+        cf1._blob_store.flush_access_stats()
+        # Check.
+        blob_store = hcacstor.BlobStore(store_path)
+        entries = blob_store.get_entries()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries["digest"].nunique(), 1)
+        self.assertEqual(entries["num_hits"].sum(), 1)
+        # Changing the function code invalidates the stored values.
+        cf1._func_code_digest = "changed"
+        cf1(10)
+        self.assertEqual(cf1.get_last_cache_accessed(), "no_cache")
+
+    def test2(self) -> None:
+        """
+        The blob store is garbage collected to respect the size budget.
+        """
+        store_path = os.path.join(self.get_scratch_space(), "blob_store")
+
+        def f(num_rows: int) -> pd.DataFrame:
+            return pd.DataFrame({"a": range(num_rows)})
+
+        cf = hcache._Cached(
+            f,
+            tag=self.cache_tag,
+            use_mem_cache=False,
+            blob_store_path=store_path,
+            blob_store_max_num_bytes=0,
+        )
+        # Run.
+        with umock.patch.object(hcacstor, "_NUM_DUMPS_BETWEEN_GCS", 2):
+            cf(10)
+            cf(20)
+        # Check.
+        blob_store = hcacstor.BlobStore(store_path)
+        self.assertEqual(len(blob_store.get_entries()), 0)
+
+
+class TestTypeSerializers1(_ResetGlobalCacheHelper):
+    """
+    Test storing the values in the disk cache with the type serializers.
+    """
+
+    def test_array1(self) -> None:
+        """
+        A numpy array is loaded memory-mapped from the disk cache.
+        """
+        txt = []
+        for use_type_serializers in (True, False):
+
+            def f(num_rows: int) -> np.ndarray:
+                return np.arange(num_rows, dtype=np.float64)
+
+            cf = hcache._Cached(
+                f,
+                tag=self.cache_tag,
+                use_mem_cache=False,
+                use_type_serializers=use_type_serializers,
+            )
+            cf(10)
+            arr = cf(10)
+            self.assertEqual(cf.get_last_cache_accessed(), "disk")
+            np.testing.assert_array_equal(arr, np.arange(10, dtype=np.float64))
+            txt.append(f"{use_type_serializers}: {type(arr).__name__}")
+            hcache.clear_global_cache("disk", tag=self.cache_tag)
+        # Check.
+        self.assert_equal("\n".join(txt), "True: memmap\nFalse: ndarray")
+
+    def test_dataframe1(self) -> None:
+        """
+        A dataframe is stored as Arrow IPC and loaded from the disk and tmpfs
+        caches.
+        """
+        f = _get_df_function()
+        for use_tmpfs_cache in (True, False):
+            cf = hcache._Cached(
+                f,
+                tag=self.cache_tag,
+                use_tmpfs_cache=use_tmpfs_cache,
+                use_type_serializers=True,
+            )
+            df1 = cf(10)
+            hcache._clear_obj_cache(self.cache_tag)
+            df2 = cf(10)
+            # Check.
+            expected = "mem" if use_tmpfs_cache else "disk"
+            self.assertEqual(cf.get_last_cache_accessed(), expected)
+            pd.testing.assert_frame_equal(df2, df1)
+            hcache.clear_global_cache("all", tag=self.cache_tag)
+
+    def test_dataframe2(self) -> None:
+        """
+        A dataframe loaded from the disk cache can be modified.
+        """
+        f = _get_df_function()
+        cf = hcache._Cached(
+            f, tag=self.cache_tag, use_mem_cache=False, use_type_serializers=True
+        )
+        df1 = cf(10)
+        df2 = cf(10)
+        self.assertEqual(cf.get_last_cache_accessed(), "disk")
+        # Run.
+        df2.iloc[0, 0] = -1
+        # Check.
+        self.assertEqual(df2.iloc[0, 0], -1)
+        # The cached value is not modified.
+        df3 = cf(10)
+        pd.testing.assert_frame_equal(df3, df1)
+
+    def test_default1(self) -> None:
+        """
+        The type serializers are used only on request, while the values they
+        stored can be loaded regardless.
+        """
+
+        def f(num_rows: int) -> np.ndarray:
+            return np.arange(num_rows, dtype=np.float64)
+
+        cf = hcache._Cached(f, tag=self.cache_tag, use_mem_cache=False)
+        cf(10)
+        arr = cf(10)
+        self.assertEqual(type(arr).__name__, "ndarray")
+        hcache.clear_global_cache("disk", tag=self.cache_tag)
+        # Store the value with the type serializers and load it without.
+        cf_serializers = hcache._Cached(
+            f, tag=self.cache_tag, use_mem_cache=False, use_type_serializers=True
+        )
+        cf_serializers(10)
+        arr = cf(10)
+        # Check.
+        self.assertEqual(cf.get_last_cache_accessed(), "disk")
+        self.assertEqual(type(arr).__name__, "memmap")
+
+
+@pytest.mark.superslow("~1 min.")
+class TestTypeSerializersBenchmark1(_ResetGlobalCacheHelper):
+    """
+    Compare the latency of a disk cache hit for a 1 GB dataframe.
+    """
+
+    def test1(self) -> None:
+        # 1 GB dataframe with 2 columns of 8 bytes.
+        num_rows = 1024**3 // 16
+        f = _get_df_function()
+        txt = []
+        for use_type_serializers in (False, True):
+            cf = hcache._Cached(
+                f,
+                tag=self.cache_tag,
+                use_mem_cache=False,
+                use_type_serializers=use_type_serializers,
+            )
+            perf_start = time.perf_counter()
+            cf(num_rows)
+            store_time = time.perf_counter() - perf_start
+            perf_start = time.perf_counter()
+            _ = cf(num_rows)
+            hit_time = time.perf_counter() - perf_start
+            self.assertEqual(cf.get_last_cache_accessed(), "disk")
+            txt.append(
+                f"use_type_serializers={use_type_serializers}: "
+                f"store_time_in_secs={store_time:.4f} "
+                f"hit_time_in_secs={hit_time:.4f}"
+            )
+            hcache.clear_global_cache("disk", tag=self.cache_tag)
+        _LOG.info("\n%s", "\n".join(txt))
+
+
 # TODO(gp): Add a test for verbose mode in __call__
 # TODO(gp): get_function_cache_info
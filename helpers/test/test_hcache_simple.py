@@ -1,13 +1,22 @@
+import asyncio
+import collections
+import concurrent.futures
+import glob
 import json
 import logging
+import multiprocessing
 import os
 import pickle
-from typing import Any, Dict
+import threading
+import time
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import pytest
 
 import helpers.hcache_simple as hcacsimp
+import helpers.htimer as htimer
 import helpers.hunit_test as hunitest
 
 _LOG = logging.getLogger(__name__)
@@ -37,6 +46,99 @@ def _cached_pickle_function(x: int) -> int:
     return res
 
 
+@hcacsimp.simple_cache(cache_type="sqlite", write_through=True)
+def _cached_sqlite_function(x: int) -> int:
+    """
+    Return the cube of the input and cache it using SQLite.
+
+    :param x: input integer to be cubed
+    :return: cubed value (x**3)
+    """
+    res = x**3
+    return res
+
+
+@hcacsimp.simple_cache(cache_type="json")
+def _bounded_function(x: int) -> int:
+    """
+    Return x minus 1 and update the call count.
+
+    :param x: The input integer
+    :return: value (x - 1)
+    """
+    _bounded_function.call_count += 1
+    res = x - 1
+    return res
+
+
+# Initialize the call counter for the bounded function.
+_bounded_function.call_count = 0
+
+
+@hcacsimp.simple_cache(cache_type="json", write_through=True, concurrent=True)
+def _concurrent_function(x: int) -> int:
+    """
+    Return x plus 1, caching it in a disk cache shared by processes.
+
+    :param x: The input integer
+    :return: value (x + 1)
+    """
+    res = x + 1
+    return res
+
+
+@hcacsimp.simple_cache(cache_type="json", concurrent=True)
+def _concurrent_bounded_function(x: int) -> int:
+    """
+    Return x plus 2, caching it in a disk cache shared by processes.
+
+    :param x: The input integer
+    :return: value (x + 2)
+    """
+    res = x + 2
+    return res
+
+
+def _hammer_concurrent_function(worker_idx: int) -> None:
+    """
+    Call `_concurrent_function()` on keys shared with other workers.
+
+    :param worker_idx: index of the worker
+    """
+    # Each worker computes its own keys and the keys shared by all the workers.
+    for x in range(20):
+        _concurrent_function(worker_idx * 1000 + x)
+        _concurrent_function(x)
+
+
+@hcacsimp.async_simple_cache(
+    cache_type="json", write_through=True, max_concurrency=2
+)
+async def _async_cached_function(x: int) -> int:
+    """
+    Return x times 3 after a delay and track the calls in progress.
+
+    :param x: The input integer
+    :return: value (x * 3)
+    """
+    _async_cached_function.call_count += 1
+    _async_cached_function.num_in_progress += 1
+    _async_cached_function.max_num_in_progress = max(
+        _async_cached_function.max_num_in_progress,
+        _async_cached_function.num_in_progress,
+    )
+    await asyncio.sleep(0.05)
+    _async_cached_function.num_in_progress -= 1
+    res = x * 3
+    return res
+
+
+# Initialize the counters for the async function.
+_async_cached_function.call_count = 0
+_async_cached_function.num_in_progress = 0
+_async_cached_function.max_num_in_progress = 0
+
+
 @hcacsimp.simple_cache(cache_type="json")
 def _multi_arg_func(a: int, b: int) -> int:
     """
@@ -80,6 +182,39 @@ def _kwarg_func(a: int, b: int = 0) -> int:
     return res
 
 
+@hcacsimp.simple_cache(cache_type="json", use_digest=True)
+def _digest_function(x: List[int]) -> int:
+    """
+    Return the sum of a list, caching it with a digest of the key.
+
+    :param x: list of integers
+    :return: sum of the list
+    """
+    res = sum(x)
+    return res
+
+
+def _parity_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """
+    Build a cache key from the parity of the first argument.
+    """
+    _ = kwargs
+    key = str(args[0] % 2)
+    return key
+
+
+@hcacsimp.simple_cache(cache_type="json", key_func=_parity_key)
+def _custom_key_function(x: int) -> int:
+    """
+    Return the parity of the input, caching it by parity.
+
+    :param x: The input integer
+    :return: x modulo 2
+    """
+    res = x % 2
+    return res
+
+
 @hcacsimp.simple_cache(cache_type="json")
 def _dummy_cached_function(x: int) -> int:
     """
@@ -134,9 +269,16 @@ class BaseCacheTest(hunitest.TestCase):
         for func_name in [
             "_cached_function",
             "_cached_pickle_function",
+            "_cached_sqlite_function",
+            "_bounded_function",
+            "_concurrent_function",
+            "_concurrent_bounded_function",
+            "_async_cached_function",
             "_multi_arg_func",
             "_refreshable_function",
             "_kwarg_func",
+            "_digest_function",
+            "_custom_key_function",
             "_dummy_cached_function",
         ]:
             try:
@@ -150,11 +292,34 @@ class BaseCacheTest(hunitest.TestCase):
         hcacsimp.set_cache_property(
             "system", "_cached_pickle_function", "type", "pickle"
         )
+        hcacsimp.set_cache_property(
+            "system", "_cached_sqlite_function", "type", "sqlite"
+        )
+        hcacsimp.set_cache_property("system", "_bounded_function", "type", "json")
+        hcacsimp.set_cache_property(
+            "system", "_concurrent_function", "type", "json"
+        )
+        hcacsimp.set_cache_property(
+            "system", "_concurrent_function", "concurrent", True
+        )
+        hcacsimp.set_cache_property(
+            "system", "_concurrent_bounded_function", "type", "json"
+        )
+        hcacsimp.set_cache_property(
+            "system", "_concurrent_bounded_function", "concurrent", True
+        )
+        hcacsimp.set_cache_property(
+            "system", "_async_cached_function", "type", "json"
+        )
         hcacsimp.set_cache_property("system", "_multi_arg_func", "type", "json")
         hcacsimp.set_cache_property(
             "system", "_refreshable_function", "type", "json"
         )
         hcacsimp.set_cache_property("system", "_kwarg_func", "type", "json")
+        hcacsimp.set_cache_property("system", "_digest_function", "type", "json")
+        hcacsimp.set_cache_property(
+            "system", "_custom_key_function", "type", "json"
+        )
         hcacsimp.set_cache_property(
             "system", "_dummy_cached_function", "type", "json"
         )
@@ -166,24 +331,45 @@ class BaseCacheTest(hunitest.TestCase):
             - Remove cache files created on disk.
             - Remove the system cache property file.
         """
+        # Close the SQLite disk caches before removing their files.
+        hcacsimp.close_sqlite_connections()
         # List of expected cache file names.
         for fname in [
             # Disk cache file for _cached_function (JSON format).
             "cache._cached_function.json",
             # Disk cache file for _cached_pickle_function (pickle format).
             "cache._cached_pickle_function.pkl",
+            # Disk cache files for _cached_sqlite_function (SQLite format).
+            "cache._cached_sqlite_function.db",
+            "cache._cached_sqlite_function.db-wal",
+            "cache._cached_sqlite_function.db-shm",
+            # Disk cache file for _bounded_function.
+            "cache._bounded_function.json",
+            # Disk cache file for _concurrent_function.
+            "cache._concurrent_function.json",
+            # Disk cache file for _concurrent_bounded_function.
+            "cache._concurrent_bounded_function.json",
+            # Disk cache file for _async_cached_function.
+            "cache._async_cached_function.json",
             # Disk cache file for _multi_arg_func.
             "cache._multi_arg_func.json",
             # Disk cache file for _refreshable_function.
             "cache._refreshable_function.json",
             # Disk cache file for _kwarg_func.
             "cache._kwarg_func.json",
+            # Disk cache file for _digest_function.
+            "cache._digest_function.json",
+            # Disk cache file for _custom_key_function.
+            "cache._custom_key_function.json",
             # Disk cache file for _dummy_cached_function.
             "cache._dummy_cached_function.json",
         ]:
             # Check if the cache file exists on disk.
             if os.path.exists(fname):
                 os.remove(fname)
+        # Remove the lock files of the disk caches.
+        for fname in glob.glob("cache.*.lock"):
+            os.remove(fname)
         # Remove the system cache property file if it exists.
         system_file = hcacsimp.get_cache_property_file("system")
         if os.path.exists(system_file):
@@ -506,8 +692,91 @@ class Test__kwarg_func(BaseCacheTest):
         # Call with different keyword argument values.
         res1: int = _kwarg_func(5, b=3)
         res2: int = _kwarg_func(5, b=10)
-        # Both calls should return the same result as only positional arguments are used for caching.
-        self.assertEqual(res1, res2)
+        # The keyword arguments are part of the cache key.
+        self.assertEqual(res1, 2)
+        self.assertEqual(res2, -5)
+        cache: Dict[str, Any] = hcacsimp.get_cache("_kwarg_func")
+        self.assertIn("(5,) {'b': 3}", cache)
+        self.assertIn("(5,) {'b': 10}", cache)
+
+
+# #############################################################################
+# Test_get_cache_key
+# #############################################################################
+
+
+class Test_get_cache_key(hunitest.TestCase):
+
+    def test1(self) -> None:
+        """
+        Verify the key for scalar positional and keyword arguments.
+        """
+        key = hcacsimp.get_cache_key((1, "a"), {"c": 3.0, "b": None})
+        self.assert_equal(key, "(1, 'a') {'b': None, 'c': 3.0}")
+
+    def test2(self) -> None:
+        """
+        Verify that a DataFrame is represented by a digest of its content.
+        """
+        df1 = pd.DataFrame({"a": range(10000), "b": 1.0})
+        df2 = df1.copy()
+        df3 = df1.copy()
+        df3.iloc[-1, 0] = -1
+        key1 = hcacsimp.get_cache_key((df1,), {})
+        key2 = hcacsimp.get_cache_key((df2,), {})
+        key3 = hcacsimp.get_cache_key((df3,), {})
+        # Check output.
+        self.assertRegex(key1, r"^\(<DataFrame:[0-9a-f]{32}>,\)$")
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+
+    def test3(self) -> None:
+        """
+        Verify that a numpy array is represented by a digest of its content.
+        """
+        arr = np.arange(10)
+        key1 = hcacsimp.get_cache_key((), {"x": arr})
+        key2 = hcacsimp.get_cache_key((), {"x": arr.astype(float)})
+        # Check output.
+        self.assertRegex(key1, r"^\(\) {'x': <ndarray:[0-9a-f]{32}>}$")
+        self.assertNotEqual(key1, key2)
+
+    def test4(self) -> None:
+        """
+        Verify the key for a namedtuple argument.
+        """
+        Point = collections.namedtuple("Point", ["x", "y"])
+        key = hcacsimp.get_cache_key((Point(1, np.arange(3)),), {})
+        # Check output.
+        self.assertRegex(key, r"^\(Point\(x=1, y=<ndarray:[0-9a-f]{32}>\),\)$")
+
+
+# #############################################################################
+# Test_simple_cache_key_func
+# #############################################################################
+
+
+class Test_simple_cache_key_func(BaseCacheTest):
+
+    def test1(self) -> None:
+        """
+        Verify that `use_digest` stores a digest of the key.
+        """
+        res: int = _digest_function(list(range(1000)))
+        self.assertEqual(res, 499500)
+        cache: Dict[str, Any] = hcacsimp.get_cache("_digest_function")
+        self.assertEqual(len(cache), 1)
+        key = list(cache.keys())[0]
+        self.assertRegex(key, r"^[0-9a-f]{32}$")
+
+    def test2(self) -> None:
+        """
+        Verify that a custom key function is used.
+        """
+        _custom_key_function(3)
+        _custom_key_function(5)
+        cache: Dict[str, Any] = hcacsimp.get_cache("_custom_key_function")
+        self.assertEqual(dict(cache), {"1": 1})
 
 
 # #############################################################################
@@ -596,3 +865,384 @@ class Test__refreshable_function(BaseCacheTest):
             2,
             "Function should be re-called when force_refresh is enabled.",
         )
+
+
+# #############################################################################
+# Test__cached_sqlite_function
+# #############################################################################
+
+
+class Test__cached_sqlite_function(BaseCacheTest):
+
+    def test1(self) -> None:
+        """
+        Verify that a write-through miss is stored in the SQLite disk cache.
+        """
+        # Call the function to cube the input.
+        res: int = _cached_sqlite_function(3)
+        self.assertEqual(res, 27)
+        # Check the disk cache.
+        self.assertTrue(os.path.exists("cache._cached_sqlite_function.db"))
+        disk_cache = hcacsimp.get_disk_cache("_cached_sqlite_function")
+        self.assertEqual(disk_cache, {"(3,)": 27})
+        disk_funcs = hcacsimp.get_cache_func_names("disk")
+        self.assertIn("_cached_sqlite_function", disk_funcs)
+
+    def test2(self) -> None:
+        """
+        Verify that an entry is looked up from disk after a memory reset.
+        """
+        hcacsimp.enable_cache_perf("_cached_sqlite_function")
+        _cached_sqlite_function(2)
+        _cached_sqlite_function(4)
+        # Reset the memory cache.
+        hcacsimp.reset_mem_cache("_cached_sqlite_function")
+        # The entry is read from disk without loading the entire disk cache.
+        res: int = _cached_sqlite_function(2)
+        self.assertEqual(res, 8)
+        mem_cache = hcacsimp.get_mem_cache("_cached_sqlite_function")
+        self.assertEqual(mem_cache, {"(2,)": 8})
+        stats: str = hcacsimp.get_cache_perf_stats("_cached_sqlite_function")
+        self.assertIn("hits=1", stats)
+        self.assertIn("misses=2", stats)
+
+    def test3(self) -> None:
+        """
+        Verify flushing, stats, and compaction of the SQLite disk cache.
+        """
+        for x in range(5):
+            _cached_sqlite_function(x)
+        hcacsimp.flush_cache_to_disk("_cached_sqlite_function")
+        hcacsimp.compact_disk_cache("_cached_sqlite_function")
+        stats_df = hcacsimp.cache_stats_to_str("_cached_sqlite_function")
+        self.assertEqual(stats_df.loc["_cached_sqlite_function", "memory"], 5)
+        self.assertEqual(stats_df.loc["_cached_sqlite_function", "disk"], 5)
+
+
+# #############################################################################
+# Test__bounded_function
+# #############################################################################
+
+
+class Test__bounded_function(BaseCacheTest):
+
+    def test1(self) -> None:
+        """
+        Verify that `max_entries` evicts the least recently used entries.
+        """
+        hcacsimp.enable_cache_perf("_bounded_function")
+        hcacsimp.set_cache_property("user", "_bounded_function", "max_entries", 2)
+        _bounded_function(1)
+        _bounded_function(2)
+        # Use the first entry so that the second one is the least recently used.
+        _bounded_function(1)
+        _bounded_function(3)
+        # Check the memory cache.
+        mem_cache = hcacsimp.get_mem_cache("_bounded_function")
+        self.assertEqual(list(mem_cache.keys()), ["(1,)", "(3,)"])
+        stats: str = hcacsimp.get_cache_perf_stats("_bounded_function")
+        self.assertIn("hits=1", stats)
+        self.assertIn("misses=3", stats)
+        self.assertIn("evictions=1", stats)
+        # The evicted entry is recomputed.
+        _bounded_function.call_count = 0
+        _bounded_function(2)
+        self.assertEqual(_bounded_function.call_count, 1)
+
+    def test2(self) -> None:
+        """
+        Verify that `max_bytes` bounds the size of the memory cache.
+        """
+        _bounded_function(1)
+        num_bytes = hcacsimp.get_mem_cache_num_bytes("_bounded_function")
+        self.assertGreater(num_bytes, 0)
+        # Allow only two entries of the same size.
+        hcacsimp.set_cache_property(
+            "user", "_bounded_function", "max_bytes", 2 * num_bytes
+        )
+        for x in range(2, 6):
+            _bounded_function(x)
+        mem_cache = hcacsimp.get_mem_cache("_bounded_function")
+        self.assertEqual(list(mem_cache.keys()), ["(4,)", "(5,)"])
+        self.assertEqual(
+            hcacsimp.get_mem_cache_num_bytes("_bounded_function"),
+            2 * num_bytes,
+        )
+
+    def test3(self) -> None:
+        """
+        Verify that `ttl_seconds` expires the entries.
+        """
+        hcacsimp.set_cache_property(
+            "user", "_bounded_function", "ttl_seconds", 0.1
+        )
+        _bounded_function.call_count = 0
+        _bounded_function(1)
+        _bounded_function(1)
+        self.assertEqual(_bounded_function.call_count, 1)
+        # Wait for the entry to expire.
+        time.sleep(0.2)
+        _bounded_function(1)
+        self.assertEqual(_bounded_function.call_count, 2)
+
+    def test4(self) -> None:
+        """
+        Verify that the stats report the size, the hit rate, and the evictions.
+        """
+        hcacsimp.enable_cache_perf("_bounded_function")
+        hcacsimp.set_cache_property("user", "_bounded_function", "max_entries", 1)
+        _bounded_function(1)
+        _bounded_function(1)
+        _bounded_function(2)
+        stats_df = hcacsimp.cache_stats_to_str("_bounded_function")
+        stats = stats_df.loc["_bounded_function"]
+        self.assertEqual(stats["memory"], 1)
+        self.assertGreater(stats["memory_bytes"], 0)
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+        self.assertEqual(stats["evictions"], 1)
+
+    def test5(self) -> None:
+        """
+        Verify that an evicted entry is read back from the disk cache.
+        """
+        hcacsimp.set_cache_property("user", "_bounded_function", "max_entries", 2)
+        _bounded_function(1)
+        _bounded_function(2)
+        hcacsimp.flush_cache_to_disk("_bounded_function")
+        _bounded_function(3)
+        mem_cache = hcacsimp.get_mem_cache("_bounded_function")
+        self.assertNotIn("(1,)", mem_cache)
+        # The evicted entry is not recomputed.
+        _bounded_function.call_count = 0
+        res = _bounded_function(1)
+        self.assertEqual(res, 0)
+        self.assertEqual(_bounded_function.call_count, 0)
+        mem_cache = hcacsimp.get_mem_cache("_bounded_function")
+        self.assertEqual(list(mem_cache.keys()), ["(3,)", "(1,)"])
+
+    def test6(self) -> None:
+        """
+        Verify that the size of an entry includes the size of its content.
+        """
+        df = pd.DataFrame({"a": range(10000), "b": "x"})
+        num_bytes = hcacsimp._get_entry_num_bytes("key", {"df": [df]})
+        self.assertGreater(
+            num_bytes, df.memory_usage(index=True, deep=True).sum()
+        )
+
+    def test7(self) -> None:
+        """
+        Verify that an expired entry is not read back from the disk cache.
+        """
+        hcacsimp.set_cache_property(
+            "user", "_bounded_function", "ttl_seconds", 0.1
+        )
+        _bounded_function.call_count = 0
+        _bounded_function(1)
+        hcacsimp.flush_cache_to_disk("_bounded_function")
+        # Wait for the entry to expire.
+        time.sleep(0.2)
+        _bounded_function(1)
+        self.assertEqual(_bounded_function.call_count, 2)
+        # The recomputed entry is cached.
+        _bounded_function(1)
+        self.assertEqual(_bounded_function.call_count, 2)
+
+
+# #############################################################################
+# Test__concurrent_function
+# #############################################################################
+
+
+class Test__concurrent_function(BaseCacheTest):
+
+    def test1(self) -> None:
+        """
+        Verify that threads sharing the cache don't lose entries.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(_hammer_concurrent_function, range(8)))
+        # Check the disk cache.
+        disk_cache = hcacsimp.get_disk_cache("_concurrent_function")
+        self.assertEqual(len(disk_cache), 8 * 20)
+
+    def test2(self) -> None:
+        """
+        Verify that processes sharing the disk cache don't lose entries.
+        """
+        num_workers = 8
+        mp_context = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=mp_context
+        ) as executor:
+            list(executor.map(_hammer_concurrent_function, range(num_workers)))
+        # Check the disk cache.
+        disk_cache = hcacsimp.get_disk_cache("_concurrent_function")
+        expected = {
+            str((worker_idx * 1000 + x,)): worker_idx * 1000 + x + 1
+            for worker_idx in range(num_workers)
+            for x in range(20)
+        }
+        self.assertEqual(disk_cache, expected)
+
+    def test3(self) -> None:
+        """
+        Verify that the entries not flushed yet are bounded by `max_entries`.
+        """
+        func_name = "_concurrent_bounded_function"
+        hcacsimp.set_cache_property("user", func_name, "max_entries", 2)
+        for x in range(5):
+            _concurrent_bounded_function(x)
+        # Check.
+        self.assertLessEqual(len(hcacsimp._CACHE_DELTA.get(func_name, {})), 2)
+        hcacsimp.flush_cache_to_disk(func_name)
+        disk_cache = hcacsimp.get_disk_cache(func_name)
+        self.assertEqual(disk_cache, {str((x,)): x + 2 for x in range(5)})
+
+
+# #############################################################################
+# Test__async_cached_function
+# #############################################################################
+
+
+class Test__async_cached_function(BaseCacheTest):
+
+    def set_up_test(self) -> None:
+        super().set_up_test()
+        _async_cached_function.call_count = 0
+        _async_cached_function.num_in_progress = 0
+        _async_cached_function.max_num_in_progress = 0
+
+    def test1(self) -> None:
+        """
+        Verify that concurrent calls with the same key call the function once.
+        """
+        hcacsimp.enable_cache_perf("_async_cached_function")
+
+        async def _workload() -> List[int]:
+            coroutines = [_async_cached_function(2) for _ in range(10)]
+            res = await asyncio.gather(*coroutines)
+            return res
+
+        res = asyncio.run(_workload())
+        # Check output.
+        self.assertEqual(res, [6] * 10)
+        self.assertEqual(_async_cached_function.call_count, 1)
+        stats: str = hcacsimp.get_cache_perf_stats("_async_cached_function")
+        self.assertIn("hits=9", stats)
+        self.assertIn("misses=1", stats)
+        # The value is written to the disk cache.
+        disk_cache = hcacsimp.get_disk_cache("_async_cached_function")
+        self.assertEqual(disk_cache, {"(2,)": 6})
+
+    def test2(self) -> None:
+        """
+        Verify that the calls in progress are bounded by `max_concurrency`.
+        """
+
+        async def _workload() -> List[int]:
+            coroutines = [_async_cached_function(x) for x in range(6)]
+            res = await asyncio.gather(*coroutines)
+            return res
+
+        res = asyncio.run(_workload())
+        # Check output.
+        self.assertEqual(res, [0, 3, 6, 9, 12, 15])
+        self.assertEqual(_async_cached_function.call_count, 6)
+        self.assertEqual(_async_cached_function.max_num_in_progress, 2)
+        # A new call is served from the cache.
+        res = asyncio.run(_async_cached_function(5))
+        self.assertEqual(res, 15)
+        self.assertEqual(_async_cached_function.call_count, 6)
+
+    def test3(self) -> None:
+        """
+        Verify that a lookup waiting for the cache lock doesn't block the loop.
+        """
+        asyncio.run(_async_cached_function(2))
+        lock = hcacsimp._get_cache_lock("_async_cached_function")
+        is_locked = threading.Event()
+
+        def _hold_lock() -> None:
+            # Simulate a thread flushing the cache to disk.
+            with lock:
+                is_locked.set()
+                time.sleep(0.3)
+
+        async def _workload() -> Tuple[int, int]:
+            task = asyncio.create_task(_async_cached_function(2))
+            num_ticks = 0
+            while not task.done():
+                await asyncio.sleep(0.01)
+                num_ticks += 1
+            return task.result(), num_ticks
+
+        thread = threading.Thread(target=_hold_lock)
+        thread.start()
+        is_locked.wait()
+        res, num_ticks = asyncio.run(_workload())
+        thread.join()
+        # Check output.
+        self.assertEqual(res, 6)
+        self.assertEqual(_async_cached_function.call_count, 1)
+        # The event loop kept running while the lookup was waiting.
+        self.assertGreater(num_ticks, 10)
+
+
+# #############################################################################
+# Test_disk_cache_benchmark
+# #############################################################################
+
+
+class Test_disk_cache_benchmark(BaseCacheTest):
+    """
+    Compare the cost of a write-through miss for the different disk caches.
+    """
+
+    def _benchmark(self, cache_type: str, num_keys: int) -> float:
+        """
+        Return the average time of a write-through miss on a disk cache that
+        already contains `num_keys` entries.
+        """
+        func_name = f"_benchmark_{cache_type}"
+
+        def _intrinsic(x: int) -> int:
+            return x + 1
+
+        _intrinsic.__name__ = func_name
+        func = hcacsimp.simple_cache(cache_type=cache_type, write_through=True)(
+            _intrinsic
+        )
+        # Populate the disk cache.
+        data = {str((x,)): x + 1 for x in range(num_keys)}
+        hcacsimp._save_cache_dict_to_disk(func_name, data)
+        hcacsimp.reset_mem_cache(func_name)
+        # Measure the misses.
+        num_misses = 10
+        timer = htimer.Timer()
+        for x in range(num_keys, num_keys + num_misses):
+            func(x)
+        elapsed = timer.get_elapsed() / num_misses
+        # Clean up.
+        hcacsimp.reset_mem_cache(func_name)
+        hcacsimp.close_sqlite_connections()
+        for file_name in glob.glob(f"cache.{func_name}.*"):
+            os.remove(file_name)
+        return elapsed
+
+    @pytest.mark.superslow("~2 min.")
+    def test1(self) -> None:
+        """
+        Report the time of a write-through miss for 10k, 100k, 1M keys.
+        """
+        results = []
+        for num_keys in [10**4, 10**5, 10**6]:
+            for cache_type in ["json", "pickle", "sqlite"]:
+                elapsed = self._benchmark(cache_type, num_keys)
+                results.append((num_keys, cache_type, elapsed))
+        df = pd.DataFrame(results, columns=["num_keys", "cache_type", "secs"])
+        df = df.pivot(index="num_keys", columns="cache_type", values="secs")
+        _LOG.info("Time per write-through miss:\n%s", df)
+        # The cost of a miss for SQLite doesn't depend on the cache size.
+        self.assertLess(df.loc[10**6, "sqlite"], df.loc[10**6, "json"])
+        self.assertLess(df.loc[10**6, "sqlite"], df.loc[10**6, "pickle"])
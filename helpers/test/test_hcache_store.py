@@ -0,0 +1,270 @@
+import abc
+import logging
+import os
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import helpers.hcache_store as hcacstor
+import helpers.hmoto as hmoto
+import helpers.hserver as hserver
+import helpers.hunit_test as hunitest
+
+_LOG = logging.getLogger(__name__)
+
+
+def _get_df(num_rows: int) -> pd.DataFrame:
+    df = pd.DataFrame({"a": range(num_rows), "b": [1.0] * num_rows})
+    return df
+
+
+# #############################################################################
+# TestDumpObj1
+# #############################################################################
+
+
+class TestDumpObj1(hunitest.TestCase):
+    """
+    Test storing objects with the type serializers.
+    """
+
+    def helper(self, obj: Any, expected_serializer_name: str) -> Any:
+        file_name = os.path.join(self.get_scratch_space(), "obj.data")
+        serializer_name = hcacstor.dump_obj(obj, file_name)
+        self.assertEqual(serializer_name, expected_serializer_name)
+        obj_out = hcacstor.load_obj(file_name, serializer_name)
+        return obj_out
+
+    def test_dataframe1(self) -> None:
+        df = _get_df(10)
+        df.index = pd.date_range("2020-01-01", periods=10, tz="UTC", name="ts")
+        df["c"] = "x"
+        df_out = self.helper(df, "arrow")
+        pd.testing.assert_frame_equal(df_out, df)
+        # The dataframe can be modified.
+        df_out.iloc[0, 0] = -1
+
+    def test_series1(self) -> None:
+        srs = _get_df(10)["b"].rename("name")
+        srs_out = self.helper(srs, "arrow")
+        pd.testing.assert_series_equal(srs_out, srs)
+
+    def test_array1(self) -> None:
+        arr = np.arange(10.0).reshape(2, 5)
+        arr_out = self.helper(arr, "npy")
+        np.testing.assert_array_equal(arr_out, arr)
+        # The array is memory-mapped, but it can still be modified.
+        self.assertIsInstance(arr_out, np.memmap)
+        arr_out[0, 0] = -1.0
+
+    def test_pickle1(self) -> None:
+        """
+        Objects that can't be stored unchanged by Arrow are pickled.
+        """
+        objs = [
+            # Object column that is not a string.
+            pd.DataFrame({"a": [[1], [2, 3]]}),
+            # Duplicated columns.
+            pd.DataFrame([[1, 2]], columns=["a", "a"]),
+            np.array([1, "a"], dtype=object),
+            {"a": 1},
+        ]
+        for obj in objs:
+            obj_out = self.helper(obj, "pickle")
+            self.assert_equal(str(obj_out), str(obj))
+        # Without fallback, nothing is stored.
+        file_name = os.path.join(self.get_scratch_space(), "obj.data")
+        self.assertIsNone(hcacstor.dump_obj({}, file_name, use_pickle=False))
+
+
+# Note that we can't derive this class from `hunitest.TestCase` otherwise the
+# unit test framework will try to run the tests in this class.
+class _BlobStoreTestCaseMixin(abc.ABC):
+    """
+    Test a `BlobStore` independently of where it's stored.
+    """
+
+    @abc.abstractmethod
+    def get_blob_store(self) -> hcacstor.BlobStore:
+        """
+        Build the `BlobStore` to test.
+        """
+        raise NotImplementedError
+
+    def helper_dump_and_load(self) -> None:
+        """
+        Store values and load them back.
+        """
+        blob_store = self.get_blob_store()
+        self.assertFalse(blob_store.has_item("func1", "args1"))
+        blob_store.dump_item("func1", "args1", _get_df(10), version="v1")
+        # Check.
+        self.assertTrue(blob_store.has_item("func1", "args1", version="v1"))
+        # An entry stored for a different version of the function is not valid.
+        self.assertFalse(blob_store.has_item("func1", "args1", version="v2"))
+        df = blob_store.load_item("func1", "args1")
+        self.assert_equal(str(df), str(_get_df(10)))
+
+    def helper_dedup(self) -> None:
+        """
+        Identical values are stored only once.
+        """
+        blob_store = self.get_blob_store()
+        digest1 = blob_store.dump_item("func1", "args1", _get_df(10))
+        digest2 = blob_store.dump_item("func2", "args2", _get_df(10))
+        digest3 = blob_store.dump_item("func2", "args3", _get_df(20))
+        # Check.
+        self.assertEqual(digest1, digest2)
+        self.assertNotEqual(digest1, digest3)
+        entries = blob_store.get_entries()
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries["digest"].nunique(), 2)
+        self.assertEqual(
+            blob_store.get_num_bytes(),
+            entries.drop_duplicates("digest")["num_bytes"].sum(),
+        )
+
+
+# #############################################################################
+# TestBlobStore1
+# #############################################################################
+
+
+class TestBlobStore1(_BlobStoreTestCaseMixin, hunitest.TestCase):
+    """
+    Test a `BlobStore` on the local disk.
+    """
+
+    def get_blob_store(self) -> hcacstor.BlobStore:
+        store_path = os.path.join(self.get_scratch_space(), "blob_store")
+        blob_store = hcacstor.BlobStore(store_path)
+        return blob_store
+
+    def test_dump_and_load1(self) -> None:
+        self.helper_dump_and_load()
+
+    def test_dedup1(self) -> None:
+        self.helper_dedup()
+
+    def test_get_stats1(self) -> None:
+        """
+        Report size, hits, and last access per function.
+        """
+        blob_store = self.get_blob_store()
+        blob_store.dump_item("func1", "args1", _get_df(10))
+        blob_store.dump_item("func1", "args2", _get_df(10))
+        blob_store.dump_item("func2", "args1", _get_df(20))
+        for _ in range(3):
+            blob_store.load_item("func1", "args1")
+        blob_store.load_item("func2", "args1")
+        # Check.
+        stats = blob_store.get_stats()
+        num_bytes = blob_store.get_entries().groupby("func_id")["num_bytes"].max()
+        self.assertEqual(stats.index.tolist(), ["func2", "func1"])
+        self.assertEqual(stats["num_entries"].tolist(), [1, 2])
+        self.assertEqual(stats["num_hits"].tolist(), [1, 3])
+        # The duplicated value is accounted only once.
+        self.assertEqual(stats.loc["func1", "num_bytes"], num_bytes["func1"])
+        self.assertEqual(
+            str(stats["last_access_time"].dtype), "datetime64[ns, UTC]"
+        )
+        txt = hcacstor.stats_to_str(stats)
+        self.assertIn("num_funcs=2\nnum_entries=3", txt)
+
+    def test_access_stats1(self) -> None:
+        """
+        Write the access stats of an entry at most once per interval.
+        """
+        store_path = os.path.join(self.get_scratch_space(), "blob_store")
+        blob_store = hcacstor.BlobStore(
+            store_path, access_stats_interval_in_secs=3600
+        )
+        blob_store.dump_item("func1", "args1", _get_df(10))
+        # Another store reads the index without the hits in memory.
+        blob_store2 = hcacstor.BlobStore(store_path)
+        # Run.
+        for _ in range(3):
+            blob_store.load_item("func1", "args1")
+        # Check.
+        self.assertEqual(blob_store2.get_entries()["num_hits"].tolist(), [0])
+        # Run.
+        blob_store.flush_access_stats()
+        # Check.
+        self.assertEqual(blob_store2.get_entries()["num_hits"].tolist(), [3])
+        # The stats are written on a hit once they are stale.
+        blob_store3 = hcacstor.BlobStore(
+            store_path, access_stats_interval_in_secs=0
+        )
+        blob_store3.load_item("func1", "args1")
+        self.assertEqual(blob_store2.get_entries()["num_hits"].tolist(), [4])
+
+    def test_garbage_collect1(self) -> None:
+        """
+        Evict the least recently used entries to fit the size budget.
+        """
+        blob_store = self.get_blob_store()
+        for num_rows in (1000, 1001, 1002):
+            blob_store.dump_item("func1", f"args{num_rows}", _get_df(num_rows))
+            time.sleep(0.01)
+        # Use the oldest entry, so that the second one is the least recently
+        # used.
+        blob_store.load_item("func1", "args1000")
+        num_bytes = blob_store.get_entries()["num_bytes"].max()
+        # Run.
+        num_deleted = blob_store.garbage_collect(
+            int(2.5 * num_bytes), grace_period_in_secs=0
+        )
+        # Check.
+        self.assertEqual(num_deleted, (1, 1))
+        self.assertEqual(
+            blob_store.get_entries()["args_id"].tolist(),
+            ["args1000", "args1002"],
+        )
+        self.assertLessEqual(blob_store.get_num_bytes(), 2.5 * num_bytes)
+        self.assertFalse(blob_store.has_item("func1", "args1001"))
+
+    def test_garbage_collect2(self) -> None:
+        """
+        Unreferenced blobs within the grace period are not deleted.
+        """
+        blob_store = self.get_blob_store()
+        blob_store.dump_item("func1", "args1", _get_df(10))
+        # Run.
+        num_deleted = blob_store.garbage_collect(0)
+        # Check.
+        self.assertEqual(num_deleted, (1, 0))
+        self.assertGreater(blob_store.get_num_bytes(), 0)
+        self.assertFalse(blob_store.has_item("func1", "args1"))
+
+
+# #############################################################################
+# TestBlobStoreS31
+# #############################################################################
+
+
+@pytest.mark.requires_ck_infra
+@pytest.mark.requires_aws
+@pytest.mark.skipif(
+    not hserver.is_CK_S3_available(),
+    reason="Run only if CK S3 is available",
+)
+class TestBlobStoreS31(_BlobStoreTestCaseMixin, hmoto.S3Mock_TestCase):
+    """
+    Test a `BlobStore` on S3.
+    """
+
+    def get_blob_store(self) -> hcacstor.BlobStore:
+        store_path = f"s3://{self.bucket_name}/blob_store"
+        blob_store = hcacstor.BlobStore(
+            store_path, aws_profile=self.mock_aws_profile
+        )
+        return blob_store
+
+    def test_dump_and_load1(self) -> None:
+        self.helper_dump_and_load()
+
+    def test_dedup1(self) -> None:
+        self.helper_dedup()
@@ -1,9 +1,14 @@
 import logging
 import os
+from typing import Any, Iterator, List, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 import helpers.hcsv as hcsv
+import helpers.hio as hio
+import helpers.hpandas as hpandas
 import helpers.hunit_test as hunitest
 
 _LOG = logging.getLogger(__name__)
@@ -64,3 +69,350 @@ class Test_to_typed_csv(hunitest.TestCase):
         hcsv.to_typed_csv(df, test_csv_path)
         self.assertTrue(os.path.exists(test_csv_types_path))
         os.remove(test_csv_types_path)
+
+
+def _get_df(num_rows: int) -> pd.DataFrame:
+    df = pd.DataFrame(
+        {
+            "year": [2021 + i % 2 for i in range(num_rows)],
+            "id": range(num_rows),
+            "price": [i / 4 for i in range(num_rows)],
+            "name": [f"name{i % 3}" for i in range(num_rows)],
+        }
+    )
+    return df
+
+
+class Test_convert_csv_to_pq(hunitest.TestCase):
+    """
+    Check that a CSV file is converted in blocks into a PQ file.
+    """
+
+    def test1(self) -> None:
+        """
+        Convert a CSV file with a header in multiple blocks.
+        """
+        dir_name = self.get_scratch_space()
+        csv_path = os.path.join(dir_name, "test.csv")
+        df = _get_df(1000)
+        df.to_csv(csv_path, index=False)
+        pq_path = os.path.join(dir_name, "test.pq")
+        # Run.
+        hcsv.convert_csv_to_pq(csv_path, pq_path, block_size_in_bytes=4096)
+        # Check.
+        self.assertGreater(pq.ParquetFile(pq_path).num_row_groups, 1)
+        actual = pd.read_parquet(pq_path)
+        pd.testing.assert_frame_equal(actual, df, check_dtype=False)
+
+    def test2(self) -> None:
+        """
+        Convert a header-less CSV file using a normalizer and a fixed type.
+        """
+        dir_name = self.get_scratch_space()
+        csv_path = os.path.join(dir_name, "test.csv.gz")
+        df = _get_df(1000)
+        # The first block has no NaNs, so the column would be inferred as int.
+        df["id"] = df["id"].astype(float)
+        df.loc[900, "id"] = None
+        df.to_csv(csv_path, index=False, header=False)
+        pq_path = os.path.join(dir_name, "test.pq")
+
+        def _normalizer(df: pd.DataFrame) -> pd.DataFrame:
+            df.columns = ["year", "id", "price", "name"]
+            return df
+
+        # Run.
+        hcsv.convert_csv_to_pq(
+            csv_path,
+            pq_path,
+            normalizer=_normalizer,
+            header=None,
+            column_types={"f1": pa.float64()},
+            block_size_in_bytes=4096,
+        )
+        # Check.
+        actual = pd.read_parquet(pq_path)
+        pd.testing.assert_frame_equal(actual, df, check_dtype=False)
+
+    def test3(self) -> None:
+        """
+        Convert a CSV file into a Hive-partitioned dataset.
+        """
+        dir_name = self.get_scratch_space()
+        csv_path = os.path.join(dir_name, "test.csv")
+        df = _get_df(100)
+        df.to_csv(csv_path, index=False)
+        pq_dir = os.path.join(dir_name, "test_pq")
+        # Run.
+        hcsv.convert_csv_to_pq(csv_path, pq_dir, partition_columns=["year"])
+        # Check.
+        self.assertEqual(sorted(os.listdir(pq_dir)), ["year=2021", "year=2022"])
+        self.assertEqual(
+            os.listdir(os.path.join(pq_dir, "year=2021")), ["test.0.parquet"]
+        )
+        actual = pd.read_parquet(pq_dir).sort_values("id", ignore_index=True)
+        self.assertEqual(len(actual), 100)
+        self.assertEqual(actual["price"].tolist(), df["price"].tolist())
+
+
+class Test_convert_csv_dir_to_pq_dir(hunitest.TestCase):
+    """
+    Check that the CSV files in a dir are converted in parallel.
+    """
+
+    def test1(self) -> None:
+        """
+        Convert each CSV file into a PQ file.
+        """
+        csv_dir, df = self._write_csv_files()
+        pq_dir = os.path.join(self.get_scratch_space(), "pq")
+        # Run.
+        hcsv.convert_csv_dir_to_pq_dir(csv_dir, pq_dir, header=0, num_threads=2)
+        # Check that `pq_dir` contains only the outputs.
+        self.assertEqual(
+            sorted(os.listdir(pq_dir)), ["test0.pq", "test1.pq", "test2.pq"]
+        )
+        actual = pd.read_parquet(os.path.join(pq_dir, "test1.pq"))
+        pd.testing.assert_frame_equal(actual, df, check_dtype=False)
+
+    def test2(self) -> None:
+        """
+        Convert all the CSV files into a single Hive-partitioned dataset.
+        """
+        csv_dir, df = self._write_csv_files()
+        pq_dir = os.path.join(self.get_scratch_space(), "pq")
+        # Run.
+        hcsv.convert_csv_dir_to_pq_dir(
+            csv_dir,
+            pq_dir,
+            header=0,
+            partition_columns=["year"],
+            num_threads=2,
+        )
+        # Check.
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(pq_dir, "year=2022"))),
+            ["test0.0.parquet", "test1.0.parquet", "test2.0.parquet"],
+        )
+        actual = pd.read_parquet(pq_dir)
+        self.assertEqual(len(actual), 3 * len(df))
+
+    def test3(self) -> None:
+        """
+        Convert CSV files whose names differ only after a dot into a
+        Hive-partitioned dataset.
+        """
+        csv_dir, df = self._write_csv_files(file_name_template="test.{}.csv")
+        pq_dir = os.path.join(self.get_scratch_space(), "pq")
+        # Run.
+        hcsv.convert_csv_dir_to_pq_dir(
+            csv_dir,
+            pq_dir,
+            header=0,
+            partition_columns=["year"],
+        )
+        # Check.
+        self.assertEqual(sorted(os.listdir(pq_dir)), ["year=2021", "year=2022"])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(pq_dir, "year=2022"))),
+            ["test.0.0.parquet", "test.1.0.parquet", "test.2.0.parquet"],
+        )
+        actual = pd.read_parquet(pq_dir)
+        self.assertEqual(len(actual), 3 * len(df))
+
+    def _write_csv_files(
+        self, *, file_name_template: str = "test{}.csv"
+    ) -> Tuple[str, pd.DataFrame]:
+        csv_dir = os.path.join(self.get_scratch_space(), "csv")
+        hio.create_dir(csv_dir, incremental=False)
+        df = _get_df(100)
+        for i in range(3):
+            file_name = file_name_template.format(i)
+            df.to_csv(os.path.join(csv_dir, file_name), index=False)
+        return csv_dir, df
+
+
+class _RowIndexTestCase(hunitest.TestCase):
+    def write_csv_file(self, num_rows: int) -> Tuple[str, pd.DataFrame]:
+        csv_path = os.path.join(self.get_scratch_space(), "test.csv")
+        df = _get_df(num_rows)
+        df.to_csv(csv_path, index=False)
+        return csv_path, df
+
+
+class Test_build_row_index(_RowIndexTestCase):
+    """
+    Check that the index of the row offsets of a CSV file is built and loaded.
+    """
+
+    def test1(self) -> None:
+        csv_path, _ = self.write_csv_file(10)
+        # Run.
+        row_index = hcsv.build_row_index(csv_path, step=4, key_col_name="id")
+        # Check.
+        actual = hpandas.df_to_str(row_index, num_rows=None)
+        expected = r"""
+           row  offset  key_min  key_max
+        0    1      19        0        3
+        1    5      89        4        7
+        2    9     159        8        9
+        """
+        self.assert_equal(actual, expected, dedent=True, fuzzy_match=True)
+        # Check that the offsets point to the rows.
+        with open(csv_path) as f:
+            f.seek(row_index["offset"].iloc[1])
+            self.assertEqual(f.readline(), "2021,4,1.0,name1\n")
+        # Check.
+        row_index = hcsv.load_row_index(csv_path)
+        self.assertEqual(row_index.attrs["step"], 4)
+        self.assertEqual(len(row_index), 3)
+
+    def test2(self) -> None:
+        """
+        A stale index is ignored.
+        """
+        csv_path, df = self.write_csv_file(10)
+        hcsv.build_row_index(csv_path)
+        df.to_csv(csv_path, index=False, mode="a", header=False)
+        # Check.
+        self.assertIsNone(hcsv.load_row_index(csv_path))
+
+
+class Test_read_csv_range(_RowIndexTestCase):
+    """
+    Check that reading a range of rows with an index is the same as without.
+    """
+
+    def test1(self) -> None:
+        csv_path, _ = self.write_csv_file(100)
+        ranges = [(1, 2), (1, 100), (5, 17), (13, 14), (90, 101), (95, 120)]
+        expected = [hcsv._read_csv_range(csv_path, *range_) for range_ in ranges]
+        for step in (1, 7, 200):
+            hcsv.build_row_index(csv_path, step=step)
+            for range_, expected_df in zip(ranges, expected):
+                actual = hcsv._read_csv_range(csv_path, *range_)
+                pd.testing.assert_frame_equal(actual, expected_df)
+
+
+class Test_find_first_matching_row(_RowIndexTestCase):
+    """
+    Check that finding a row by value with an index is the same as without.
+    """
+
+    def test_sorted1(self) -> None:
+        """
+        Binary search a sorted column.
+        """
+        csv_path, _ = self.write_csv_file(100)
+        self._helper(csv_path, "id", [0, 5, 50, 99, 100, -1])
+
+    def test_unsorted1(self) -> None:
+        """
+        Search an unsorted column, skipping the chunks without the value.
+        """
+        csv_path, _ = self.write_csv_file(100)
+        self._helper(csv_path, "name", ["name0", "name2", "name3"])
+
+    def _helper(self, csv_path: str, col_name: str, vals: List[Any]) -> None:
+        starts = [1, 2, 10, 51]
+        expected = [
+            hcsv.find_first_matching_row(csv_path, col_name, val, start=start)
+            for val in vals
+            for start in starts
+        ]
+        hcsv.build_row_index(csv_path, step=7, key_col_name=col_name)
+        actual = [
+            hcsv.find_first_matching_row(csv_path, col_name, val, start=start)
+            for val in vals
+            for start in starts
+        ]
+        self.assertEqual(actual, expected)
+
+
+def _key_by_name(df: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    return iter(df.groupby("name"))
+
+
+class Test_csv_mapreduce(hunitest.TestCase):
+    """
+    Check that the rows of a CSV file are split by key in order.
+    """
+
+    def test_serial1(self) -> None:
+        self._helper(num_threads="serial", output_format="csv", chunk_size=100)
+
+    def test_parallel1(self) -> None:
+        out_dir = self._helper(num_threads=2, output_format="csv")
+        # Check that only the outputs are written.
+        self.assertEqual(
+            sorted(os.listdir(out_dir)),
+            ["name0.csv", "name1.csv", "name2.csv"],
+        )
+
+    def test_quoted_newline1(self) -> None:
+        """
+        Read serially values with newlines.
+        """
+        self._helper(
+            num_threads="serial",
+            output_format="parquet",
+            chunk_size=100,
+            use_newlines=True,
+        )
+
+    def test_quoted_newline2(self) -> None:
+        """
+        Report an error when reading in parallel values with newlines.
+        """
+        with self.assertRaises(ValueError) as cm:
+            self._helper(
+                num_threads=2, output_format="parquet", use_newlines=True
+            )
+        self.assertIn("quoted value with a newline", str(cm.exception))
+
+    def test_parquet1(self) -> None:
+        """
+        Write Parquet outputs, reopening them since only one can be open.
+        """
+        out_dir = self._helper(
+            num_threads=2, output_format="parquet", max_num_open_files=1
+        )
+        # Check.
+        self.assertGreater(len(os.listdir(os.path.join(out_dir, "name0"))), 1)
+
+    def _helper(self, *, use_newlines: bool = False, **kwargs: Any) -> str:
+        """
+        :param use_newlines: add a column with quoted values containing
+            newlines
+        """
+        dir_name = self.get_scratch_space()
+        csv_path = os.path.join(dir_name, "test.csv")
+        df = _get_df(1000)
+        if use_newlines:
+            df["comment"] = [f"line1\nline2 {i}" for i in range(len(df))]
+        df.to_csv(csv_path, index=False)
+        out_dir = os.path.join(dir_name, "out")
+        # Run.
+        hcsv._csv_mapreduce(
+            csv_path,
+            out_dir,
+            _key_by_name,
+            None,
+            chunk_size_in_bytes=2048,
+            max_buffer_num_bytes=1024,
+            **kwargs,
+        )
+        # Check.
+        for name, expected in df.groupby("name"):
+            if kwargs["output_format"] == "csv":
+                actual = pd.read_csv(
+                    os.path.join(out_dir, f"{name}.csv"),
+                    header=None,
+                    names=df.columns,
+                )
+            else:
+                actual = pd.read_parquet(os.path.join(out_dir, name))
+            pd.testing.assert_frame_equal(
+                actual, expected.reset_index(drop=True), check_dtype=False
+            )
+        return out_dir
@@ -2,6 +2,7 @@ import datetime
 import logging
 import os
 import random
+import threading
 from typing import Any, List, Optional, Tuple
 
 import pandas as pd
@@ -1028,6 +1029,479 @@ class TestToPartitionedDataset(hunitest.TestCase):
 # #############################################################################
 
 
+# #############################################################################
+# TestPartitionedParquetWriter1
+# #############################################################################
+
+
+class TestPartitionedParquetWriter1(hunitest.TestCase):
+
+    def write_in_chunks(
+        self, df: pd.DataFrame, dst_dir: str, **kwargs: Any
+    ) -> None:
+        """
+        Write `df` with a writer appending it in chunks.
+        """
+        with hparque.PartitionedParquetWriter(
+            dst_dir, ["idx"], **kwargs
+        ) as writer:
+            for start, end in [(0, 100), (100, 250), (250, len(df))]:
+                writer.append(df.iloc[start:end])
+
+    def test_write_and_read1(self) -> None:
+        """
+        Write a single file per partition with row groups of the given size.
+        """
+        df = _get_df_example1()
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        # Run.
+        self.write_in_chunks(df, dst_dir, row_group_size=30)
+        # Check.
+        dir_signature = hunitest.get_dir_signature(
+            dst_dir, include_file_content=False, remove_dir_name=True
+        )
+        exp = r"""
+        # Dir structure
+        .
+        idx=0
+        idx=0/data.parquet
+        idx=1
+        idx=1/data.parquet
+        idx=2
+        idx=2/data.parquet
+        idx=3
+        idx=3/data.parquet
+        idx=4
+        idx=4/data.parquet"""
+        self.assert_equal(dir_signature, exp, fuzzy_match=True, purify_text=True)
+        (file_name,) = os.listdir(os.path.join(dst_dir, "idx=0"))
+        metadata = parquet.ParquetFile(
+            os.path.join(dst_dir, "idx=0", file_name)
+        ).metadata
+        num_rows = [
+            metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)
+        ]
+        self.assertEqual(num_rows, [30, 30, 19])
+        df2 = hparque.from_parquet(dst_dir)
+        _compare_dfs(self, df, df2[df.columns])
+
+    def test_write_and_read2(self) -> None:
+        """
+        Start a new file in a partition when its file was closed to respect the
+        max number of open files.
+        """
+        df = _get_df_example1()
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        # Run.
+        self.write_in_chunks(
+            df, dst_dir, max_buffer_num_bytes=0, max_num_open_files=1
+        )
+        # Check.
+        file_names = sorted(os.listdir(os.path.join(dst_dir, "idx=1")))
+        self.assertEqual(len(file_names), 2)
+        self.assertRegex(file_names[0], r"^[0-9a-f]{32}-0.parquet$")
+        df2 = hparque.from_parquet(dst_dir)
+        _compare_dfs(self, df, df2[df.columns])
+
+    def test_concurrent_read1(self) -> None:
+        """
+        Read a dataset while a writer has files open.
+        """
+        df = _get_df_example1()
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        self.write_in_chunks(df.iloc[:100], dst_dir)
+        # Run.
+        with hparque.PartitionedParquetWriter(
+            dst_dir, ["idx"], row_group_size=10
+        ) as writer:
+            writer.append(df.iloc[100:])
+            # Only the closed files are read.
+            df2 = hparque.from_parquet(dst_dir)
+            _compare_dfs(self, df.iloc[:100], df2[df.columns])
+        # Check.
+        df2 = hparque.from_parquet(dst_dir)
+        _compare_dfs(self, df, df2[df.columns])
+
+    def test_abort1(self) -> None:
+        """
+        Discard the rows and the open files when the block raises.
+        """
+        df = _get_df_example1()
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        self.write_in_chunks(df.iloc[:100], dst_dir)
+        # Run.
+        with self.assertRaises(ValueError):
+            with hparque.PartitionedParquetWriter(
+                dst_dir,
+                ["idx"],
+                row_group_size=10,
+                max_buffer_num_bytes=0,
+                max_num_open_files=1,
+            ) as writer:
+                writer.append(df.iloc[100:])
+                raise ValueError("Failure")
+        # Check.
+        file_names = sorted(os.listdir(os.path.join(dst_dir, "idx=0")))
+        self.assertEqual(len(file_names), 1)
+        df2 = hparque.from_parquet(dst_dir)
+        _compare_dfs(self, df.iloc[:100], df2[df.columns])
+
+
+# #############################################################################
+# TestCompactPartitionedParquet1
+# #############################################################################
+
+
+class TestCompactPartitionedParquet1(hunitest.TestCase):
+
+    def test_compact1(self) -> None:
+        """
+        Merge the files of each partition removing the duplicated rows.
+        """
+        df = _get_df_example1()
+        df.index.name = "timestamp"
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        # Write the same data twice in multiple files.
+        for _ in range(2):
+            with hparque.PartitionedParquetWriter(
+                dst_dir, ["idx"], max_buffer_num_bytes=0, max_num_open_files=1
+            ) as writer:
+                writer.append(df.iloc[::-1])
+        self.assertEqual(len(os.listdir(os.path.join(dst_dir, "idx=0"))), 2)
+        # Run.
+        num_merged = hparque.compact_partitioned_parquet(
+            dst_dir, drop_duplicates=True, duplicate_columns=["timestamp"]
+        )
+        # Check.
+        self.assertEqual(num_merged, 5)
+        self.assertEqual(
+            os.listdir(os.path.join(dst_dir, "idx=0")), ["data.parquet"]
+        )
+        # The rows are sorted by index.
+        df2 = hparque.from_parquet(dst_dir)
+        _compare_dfs(self, df, df2[df.columns])
+        # The dataset is already compacted.
+        num_merged = hparque.compact_partitioned_parquet(dst_dir)
+        self.assertEqual(num_merged, 0)
+
+    def test_compact2(self) -> None:
+        """
+        Keep the duplicated row with the max value of the control column.
+        """
+        df = pd.DataFrame(
+            {
+                "asset": ["A", "A", "A", "B"],
+                "timestamp": [1, 1, 2, 1],
+                "volume": [10, 30, 20, 5],
+                "knowledge_timestamp": [4, 3, 2, 1],
+            }
+        )
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        for idx in range(len(df)):
+            hparque.to_partitioned_parquet(df.iloc[[idx]], ["asset"], dst_dir)
+        # Run.
+        hparque.compact_partitioned_parquet(
+            dst_dir,
+            drop_duplicates=True,
+            duplicate_columns=["timestamp"],
+            control_column="volume",
+            num_threads=2,
+        )
+        # Check.
+        df2 = hparque.from_parquet(dst_dir)
+        # The order of the files in a partition is arbitrary.
+        df2 = df2.sort_values(["asset", "timestamp"], ignore_index=True)
+        act = hpandas.df_to_str(df2)
+        exp = r"""
+           timestamp  volume  knowledge_timestamp asset
+        0          1      30                    3     A
+        1          2      20                    2     A
+        2          1       5                    1     B"""
+        self.assert_equal(act, exp, fuzzy_match=True)
+
+    def test_compact3(self) -> None:
+        """
+        Merge new files into the file of a compacted partition.
+        """
+        df = pd.DataFrame({"asset": ["A", "A"], "volume": [10, 30]})
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        hparque.to_partitioned_parquet(df.iloc[[0]], ["asset"], dst_dir)
+        hparque.compact_partitioned_parquet(dst_dir)
+        hparque.to_partitioned_parquet(df.iloc[[1]], ["asset"], dst_dir)
+        root_file_names = sorted(os.listdir(dst_dir))
+        # Run.
+        num_merged = hparque.compact_partitioned_parquet(dst_dir)
+        # Check.
+        self.assertEqual(num_merged, 1)
+        self.assertEqual(
+            os.listdir(os.path.join(dst_dir, "asset=A")), ["data.parquet"]
+        )
+        df2 = hparque.from_parquet(dst_dir)
+        self.assertEqual(sorted(df2["volume"].tolist()), [10, 30])
+        # No log is added to the dataset.
+        self.assertEqual(sorted(os.listdir(dst_dir)), root_file_names)
+
+
+# #############################################################################
+
+
+# #############################################################################
+# TestParquetCatalog1
+# #############################################################################
+
+
+class TestParquetCatalog1(hunitest.TestCase):
+
+    @staticmethod
+    def get_test_data() -> pd.DataFrame:
+        df = pd.DataFrame(
+            {
+                "asset": ["A"] * 3 + ["B"] * 3,
+                "year": [2021, 2021, 2022] * 2,
+                "val": range(6),
+            },
+            index=pd.date_range(
+                "2021-12-30", periods=6, freq="D", tz="UTC", name="timestamp"
+            ),
+        )
+        return df
+
+    def write_dataset(self) -> str:
+        """
+        Write a partitioned dataset with a catalog.
+        """
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        df = self.get_test_data()
+        hparque.to_partitioned_parquet(df, ["asset", "year"], dst_dir)
+        hparque.build_parquet_catalog(dst_dir)
+        return dst_dir
+
+    def get_catalog_paths(self, dst_dir: str) -> List[str]:
+        catalog = hparque.load_parquet_catalog(dst_dir)
+        paths = [
+            hunitest.purify_parquet_file_names(path)
+            for path in catalog["path"].to_pylist()
+        ]
+        return paths
+
+    def test_build1(self) -> None:
+        """
+        Record the files with their partition values and statistics.
+        """
+        dst_dir = self.write_dataset()
+        # Run.
+        catalog = hparque.load_parquet_catalog(dst_dir)
+        # Check.
+        df = catalog.to_pandas()
+        df["path"] = df["path"].apply(hunitest.purify_parquet_file_names)
+        df = df[["path", "num_rows", "asset", "year", "min.val", "max.val"]]
+        act = hpandas.df_to_str(df)
+        exp = r"""
+                                  path  num_rows asset  year  min.val  max.val
+        0  asset=A/year=2021/data.parquet         2     A  2021        0        1
+        1  asset=A/year=2022/data.parquet         1     A  2022        2        2
+        2  asset=B/year=2021/data.parquet         2     B  2021        3        4
+        3  asset=B/year=2022/data.parquet         1     B  2022        5        5"""
+        self.assert_equal(act, exp, fuzzy_match=True)
+        self.assertIn("min.timestamp", catalog.column_names)
+        # The catalog is ignored by the readers by default.
+        df2 = hparque.from_parquet(dst_dir)
+        self.assertEqual(len(df2), 6)
+
+    def test_prune1(self) -> None:
+        """
+        Prune files using partition values and statistics.
+        """
+        dst_dir = self.write_dataset()
+        catalog = hparque.load_parquet_catalog(dst_dir)
+        # Run.
+        filters = [("asset", "=", "A"), ("val", ">=", 2)]
+        paths = hparque.prune_parquet_catalog(catalog, filters)
+        # Check.
+        paths = [hunitest.purify_parquet_file_names(path) for path in paths]
+        self.assertEqual(paths, ["asset=A/year=2022/data.parquet"])
+        # Run.
+        timestamp = pd.Timestamp("2021-12-31", tz="UTC")
+        filters = [[("year", "in", [2022])], [("timestamp", "<", timestamp)]]
+        paths = hparque.prune_parquet_catalog(catalog, filters)
+        # Check.
+        paths = [hunitest.purify_parquet_file_names(path) for path in paths]
+        exp = [
+            "asset=A/year=2021/data.parquet",
+            "asset=A/year=2022/data.parquet",
+            "asset=B/year=2022/data.parquet",
+        ]
+        self.assertEqual(paths, exp)
+
+    def test_from_parquet1(self) -> None:
+        """
+        Read only the files selected by the catalog.
+        """
+        dst_dir = self.write_dataset()
+        # Remove a file that is pruned by the filters: since it's not opened,
+        # the read doesn't fail.
+        catalog = hparque.load_parquet_catalog(dst_dir)
+        os.remove(os.path.join(dst_dir, catalog["path"][1].as_py()))
+        # Run.
+        df = hparque.from_parquet(
+            dst_dir, filters=[("asset", "=", "B")], use_catalog=True
+        )
+        # Check.
+        self.assertEqual(df["val"].tolist(), [3, 4, 5])
+        # No file can contain rows satisfying the filters.
+        df = hparque.from_parquet(
+            dst_dir, filters=[("val", "=", 100)], use_catalog=True
+        )
+        self.assertEqual(df.columns.tolist(), ["val", "asset", "year"])
+        self.assertEqual(len(df), 0)
+
+    def test_update1(self) -> None:
+        """
+        Keep the catalog up to date when writing and compacting the dataset.
+        """
+        dst_dir = self.write_dataset()
+        df = self.get_test_data()
+        with hparque.PartitionedParquetWriter(
+            dst_dir, ["asset", "year"]
+        ) as writer:
+            writer.append(df)
+        self.assertEqual(len(self.get_catalog_paths(dst_dir)), 8)
+        # Run.
+        hparque.list_and_merge_pq_files(dst_dir)
+        # Check.
+        exp = [
+            "asset=A/year=2021/data.parquet",
+            "asset=A/year=2022/data.parquet",
+            "asset=B/year=2021/data.parquet",
+            "asset=B/year=2022/data.parquet",
+        ]
+        self.assertEqual(self.get_catalog_paths(dst_dir), exp)
+        df2 = hparque.from_parquet(dst_dir, use_catalog=True)
+        self.assertEqual(df2["val"].tolist(), list(range(6)))
+        # Report the partitions from the catalog.
+        df3 = hparque.collate_parquet_tile_metadata(dst_dir, use_catalog=True)
+        self.assertEqual(df3.index.names, ["asset", "year"])
+
+    def test_uncataloged_file1(self) -> None:
+        """
+        Read and compact the files that are not in the catalog by default.
+        """
+        dst_dir = self.write_dataset()
+        df = self.get_test_data()
+        # Write a file without updating the catalog.
+        file_name = os.path.join(dst_dir, "asset=C", "year=2022", "data.parquet")
+        hparque.to_parquet(df.iloc[:2].drop(columns=["asset", "year"]), file_name)
+        # Run.
+        df2 = hparque.from_parquet(dst_dir)
+        # Check.
+        self.assertEqual(len(df2), 8)
+        # The reader using the catalog skips the file.
+        df3 = hparque.from_parquet(dst_dir, use_catalog=True)
+        self.assertEqual(len(df3), 6)
+        # Run.
+        hparque.list_and_merge_pq_files(dst_dir, file_name="merged.parquet")
+        # Check.
+        paths = self.get_catalog_paths(dst_dir)
+        self.assertIn("asset=C/year=2022/merged.parquet", paths)
+        df4 = hparque.from_parquet(dst_dir, use_catalog=True)
+        self.assertEqual(len(df4), 8)
+
+
+# #############################################################################
+
+
+# #############################################################################
+# TestIterParquetBatches1
+# #############################################################################
+
+
+class TestIterParquetBatches1(hunitest.TestCase):
+
+    def write_dataset(self) -> str:
+        """
+        Write a dataset with 2 assets and 100 rows partitioned by asset.
+        """
+        dst_dir = os.path.join(self.get_scratch_space(), "data.parquet")
+        df = pd.DataFrame(
+            {"asset": ["A", "B"] * 50, "val": range(100)},
+            index=pd.date_range(
+                "2022-01-01", periods=100, freq="h", tz="UTC", name="timestamp"
+            ),
+        )
+        hparque.to_partitioned_parquet(df, ["asset"], dst_dir)
+        return dst_dir
+
+    def test_batch_size1(self) -> None:
+        """
+        Return batches of exactly `batch_size` rows, except the last one.
+        """
+        dst_dir = self.write_dataset()
+        # Run.
+        batches = list(hparque.iter_parquet_batches(dst_dir, batch_size=30))
+        # Check.
+        self.assertEqual([len(batch) for batch in batches], [30, 30, 30, 10])
+        df = pd.concat(batches)
+        self.assertEqual(df.index.name, "timestamp")
+        self.assertEqual(str(df.index.dtype), "datetime64[ns, UTC]")
+        self.assertEqual(sorted(df["val"].tolist()), list(range(100)))
+
+    def test_filters1(self) -> None:
+        """
+        Filter on a partition column and on a data column.
+        """
+        dst_dir = self.write_dataset()
+        filters = [("asset", "=", "B"), ("val", ">=", 90)]
+        # Run.
+        batches = list(
+            hparque.iter_parquet_batches(
+                dst_dir, columns=["val"], filters=filters, batch_size=3
+            )
+        )
+        # Check.
+        self.assertEqual([len(batch) for batch in batches], [3, 2])
+        df = pd.concat(batches)
+        self.assertEqual(df.columns.tolist(), ["val"])
+        self.assertEqual(df["val"].tolist(), [91, 93, 95, 97, 99])
+
+    def test_arrow1(self) -> None:
+        """
+        Return Arrow record batches without prefetching.
+        """
+        dst_dir = self.write_dataset()
+        # Run.
+        batches = list(
+            hparque.iter_parquet_batches(
+                dst_dir,
+                columns=["val"],
+                batch_size=40,
+                output_format="arrow",
+                num_prefetched_batches=0,
+            )
+        )
+        # Check.
+        self.assertEqual([batch.num_rows for batch in batches], [40, 40, 20])
+        self.assertEqual(batches[0].schema.names, ["val", "timestamp"])
+
+    def test_stop_early1(self) -> None:
+        """
+        Stop the prefetching thread when the consumer stops early.
+        """
+        dst_dir = self.write_dataset()
+        num_threads = threading.active_count()
+        iterator = hparque.iter_parquet_batches(
+            dst_dir, batch_size=5, num_prefetched_batches=2
+        )
+        # Run.
+        batch = next(iterator)
+        iterator.close()
+        # Check.
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(threading.active_count(), num_threads)
+
+
+# #############################################################################
+
+
 # #############################################################################
 # TestListAndMergePqFiles
 # #############################################################################
@@ -1,5 +1,7 @@
+import concurrent.futures
 import logging
 import os
+import unittest.mock as umock
 from typing import Generator, Tuple
 
 import pytest
@@ -340,6 +342,145 @@ class TestDu1(hmoto.S3Mock_TestCase):
         self.assert_equal(size, expected_size)
 
 
+# #############################################################################
+# TestS3ClientCache1
+# #############################################################################
+
+
+class TestS3ClientCache1(hunitest.TestCase):
+    """
+    Test caching the S3 clients without accessing S3.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        patcher = umock.patch.dict(
+            os.environ,
+            {
+                "MOCK_AWS_ACCESS_KEY_ID": "mock_key_id",
+                "MOCK_AWS_SECRET_ACCESS_KEY": "mock_secret_access_key",
+                "MOCK_AWS_DEFAULT_REGION": "us-east-1",
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        hs3.clear_s3_client_cache()
+        self.addCleanup(hs3.clear_s3_client_cache)
+        # Restore the default settings.
+        self.addCleanup(hs3.configure_s3_clients)
+
+    def test_reuse1(self) -> None:
+        """
+        Return the same clients to all the threads.
+        """
+        aws_profile = "__mock__"
+        # Run.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            s3fs_clients = list(
+                executor.map(lambda _: hs3.get_s3fs(aws_profile), range(4))
+            )
+            pyarrow_clients = list(
+                executor.map(
+                    lambda _: hs3.get_pyarrow_s3fs(aws_profile), range(4)
+                )
+            )
+        # Check.
+        self.assertEqual(len(set(map(id, s3fs_clients))), 1)
+        self.assertEqual(len(set(map(id, pyarrow_clients))), 1)
+        self.assertIs(hs3.get_s3fs(aws_profile), s3fs_clients[0])
+        self.assertEqual(pyarrow_clients[0].region, "us-east-1")
+
+    def test_fork1(self) -> None:
+        """
+        Don't reuse the clients of the parent process in a forked one.
+        """
+        aws_profile = "__mock__"
+        s3fs_ = hs3.get_s3fs(aws_profile)
+        # Run.
+        with umock.patch.object(os, "getpid", return_value=os.getpid() + 1):
+            s3fs_child = hs3.get_s3fs(aws_profile)
+            s3fs_child2 = hs3.get_s3fs(aws_profile)
+        # Check.
+        self.assertIsNot(s3fs_child, s3fs_)
+        self.assertIs(s3fs_child2, s3fs_child)
+
+    def test_configure1(self) -> None:
+        """
+        Create the clients with the configured settings.
+        """
+        aws_profile = "__mock__"
+        s3fs_ = hs3.get_s3fs(aws_profile)
+        # Run.
+        hs3.configure_s3_clients(
+            max_pool_connections=32,
+            max_attempts=3,
+            retry_mode="adaptive",
+            listings_expiry_time_in_secs=60,
+        )
+        s3fs_configured = hs3.get_s3fs(aws_profile)
+        # Check.
+        self.assertIsNot(s3fs_configured, s3fs_)
+        self.assertEqual(
+            s3fs_configured.config_kwargs,
+            {
+                "max_pool_connections": 32,
+                "retries": {"max_attempts": 3, "mode": "adaptive"},
+            },
+        )
+        self.assertEqual(s3fs_configured.dircache.listings_expiry_time, 60)
+
+    def test_credentials1(self) -> None:
+        """
+        Create new clients when the credentials change.
+        """
+        aws_profile = "__mock__"
+        hs3.get_aws_credentials.cache_clear()
+        self.addCleanup(hs3.get_aws_credentials.cache_clear)
+        s3fs_ = hs3.get_s3fs(aws_profile)
+        pyarrow_s3fs = hs3.get_pyarrow_s3fs(aws_profile)
+        # Run.
+        with umock.patch.dict(
+            os.environ, {"MOCK_AWS_SESSION_TOKEN": "mock_session_token"}
+        ):
+            hs3.get_aws_credentials.cache_clear()
+            s3fs_renewed = hs3.get_s3fs(aws_profile)
+            pyarrow_s3fs_renewed = hs3.get_pyarrow_s3fs(aws_profile)
+            s3fs_renewed2 = hs3.get_s3fs(aws_profile)
+        # Check.
+        self.assertIsNot(s3fs_renewed, s3fs_)
+        self.assertEqual(s3fs_renewed.token, "mock_session_token")
+        self.assertIsNot(pyarrow_s3fs_renewed, pyarrow_s3fs)
+        self.assertIs(s3fs_renewed2, s3fs_renewed)
+
+
+# #############################################################################
+# TestS3ClientCache2
+# #############################################################################
+
+
+@pytest.mark.requires_ck_infra
+@pytest.mark.requires_aws
+@pytest.mark.skipif(
+    not hserver.is_CK_S3_available(),
+    reason="Run only if CK S3 is available",
+)
+class TestS3ClientCache2(hmoto.S3Mock_TestCase):
+
+    def test_listings_cache1(self) -> None:
+        """
+        Share the listings cached by a client across the callers.
+        """
+        dir_path = f"s3://{self.bucket_name}/dir"
+        s3fs_ = hs3.get_s3fs(self.mock_aws_profile)
+        with s3fs_.open(f"{dir_path}/file1.txt", "w") as f:
+            f.write("line_mock")
+        # Run.
+        paths = hs3.get_s3fs(self.mock_aws_profile).ls(dir_path)
+        # Check.
+        self.assertEqual(paths, [f"{self.bucket_name}/dir/file1.txt"])
+        self.assertIn(f"{self.bucket_name}/dir", s3fs_.dircache)
+
+
 # #############################################################################
 # TestGenerateAwsFiles
 # #############################################################################
@@ -1,6 +1,29 @@
+import asyncio
+import datetime
+import decimal
+import logging
+import os
+import threading
+import time
+import unittest.mock as umock
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.pool
+import pyarrow as pa
+import pytest
+
+import helpers.hasyncio as hasynci
+import helpers.hs3 as hs3
 import helpers.hsql as hsql
+import helpers.hsql_implementation as hsqlimpl
+import helpers.hsql_test as hsqltest
 import helpers.hunit_test as hunitest
 
+_LOG = logging.getLogger(__name__)
+
 
 class TestCreateInOperator(hunitest.TestCase):
     def test_create_in_operator1(self) -> None:
@@ -22,3 +45,747 @@ class TestCreateInOperator(hunitest.TestCase):
         actual = hsql.create_in_operator(values, column)
         expected = "exchange_id IN ('ftx')"
         self.assertEqual(actual, expected)
+
+
+class _FakeConnection:
+    """
+    Stand-in for a `psycopg2` connection that doesn't need a DB.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.kwargs = kwargs
+        self.autocommit = False
+        self.closed = 0
+        # Make the queries fail as if the server went away.
+        self.is_broken = False
+        self.queries: List[str] = []
+        # Results of the queries.
+        self.description: List[psycopg2.extensions.Column] = []
+        self.rows: List[tuple] = []
+        self.cursor_kwargs: List[Dict[str, Any]] = []
+        self.copied_data: List[str] = []
+        # Time taken by each query.
+        self.query_time_in_secs = 0.0
+        # Notifications received with `poll()`, signaled through a pipe.
+        self.notifies: List[psycopg2.extensions.Notify] = []
+        self._pending_notifies: List[psycopg2.extensions.Notify] = []
+        self._pipe = os.pipe()
+
+    def cursor(self, **kwargs: Any) -> "_FakeCursor":
+        self.cursor_kwargs.append(kwargs)
+        return _FakeCursor(self)
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if not self.closed:
+            for fd in self._pipe:
+                os.close(fd)
+        self.closed = 1
+
+    def fileno(self) -> int:
+        return self._pipe[0]
+
+    def poll(self) -> None:
+        os.read(self._pipe[0], 1024)
+        self.notifies.extend(self._pending_notifies)
+        self._pending_notifies = []
+
+    def send_notification(self, channel: str, payload: str) -> None:
+        """
+        Simulate a notification sent by the server.
+        """
+        notification = psycopg2.extensions.Notify(1, channel, payload)
+        self._pending_notifies.append(notification)
+        os.write(self._pipe[1], b"x")
+
+
+class _FakeCursor:
+
+    def __init__(self, connection: _FakeConnection) -> None:
+        self.connection = connection
+        self.description = connection.description
+        self.itersize = 2000
+        self.is_closed = False
+        self.rowcount = -1
+        self._rows = list(connection.rows)
+
+    def __enter__(self) -> "_FakeCursor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def execute(self, query: str, vars: Any = None) -> None:
+        _ = vars
+        if self.connection.is_broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        time.sleep(self.connection.query_time_in_secs)
+        self.connection.queries.append(query)
+        self._rows = list(self.connection.rows)
+
+    def fetchall(self) -> List[tuple]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def copy_expert(self, query: str, file: Any, size: int) -> None:
+        self.execute(query)
+        # Read the data like `psycopg2`, until no data is returned.
+        data = b""
+        while True:
+            block = file.read(size)
+            if not block:
+                break
+            data += block
+        self.connection.copied_data.append(data.decode("utf-8"))
+        self.rowcount = data.count(b"\n")
+
+    def fetchmany(self, size: int) -> List[tuple]:
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self) -> None:
+        self.is_closed = True
+
+
+# #############################################################################
+# TestDbConnectionPool1
+# #############################################################################
+
+
+class TestDbConnectionPool1(hunitest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        patcher = umock.patch.object(
+            psycopg2, "connect", side_effect=_FakeConnection
+        )
+        self.mock_connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection_info = hsql.DbConnectionInfo(
+            host="localhost", dbname="db", port=5432, user="u", password="p"
+        )
+
+    def get_pool(self, **kwargs: Any) -> hsql.DbConnectionPool:
+        pool = hsql.DbConnectionPool(self.connection_info, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuse1(self) -> None:
+        """
+        Reuse the connection returned to the pool.
+        """
+        pool = self.get_pool()
+        # Run.
+        with pool.connection() as connection1:
+            pass
+        with pool.connection() as connection2:
+            pass
+        # Check.
+        self.assertIs(connection1, connection2)
+        self.assertTrue(connection1.autocommit)
+        self.assertEqual(connection1.kwargs["dbname"], "db")
+        stats = pool.metrics.get_stats()
+        self.assertEqual(stats["num_checkouts"], 2)
+        self.assertEqual(stats["num_opened_connections"], 1)
+        self.assertIn("p95_wait_time_in_secs", stats.index)
+
+    def test_max_num_connections1(self) -> None:
+        """
+        Wait for a connection when all of them are in use.
+        """
+        pool = self.get_pool(max_num_connections=1, timeout_in_secs=0.5)
+        connection = pool.get_connection()
+        # No connection is available before the timeout.
+        with self.assertRaises(psycopg2.pool.PoolError):
+            pool.get_connection()
+        # Run.
+        # A connection returned by another thread is handed out.
+        timer = threading.Timer(0.05, pool.put_connection, args=(connection,))
+        timer.start()
+        connection2 = pool.get_connection()
+        timer.join()
+        # Check.
+        self.assertIs(connection2, connection)
+        self.assertEqual(self.mock_connect.call_count, 1)
+        stats = pool.metrics.get_stats()
+        self.assertEqual(stats["num_timeouts"], 1)
+        self.assertGreater(stats["max_wait_time_in_secs"], 0)
+
+    def test_liveness1(self) -> None:
+        """
+        Replace a broken idle connection.
+        """
+        pool = self.get_pool(check_after_idle_in_secs=0)
+        with pool.connection() as connection1:
+            pass
+        connection1.is_broken = True
+        # Run.
+        with pool.connection() as connection2:
+            pass
+        # Check.
+        self.assertIsNot(connection2, connection1)
+        self.assertTrue(connection1.closed)
+        self.assertEqual(connection2.queries, [])
+        stats = pool.metrics.get_stats()
+        self.assertEqual(stats["num_liveness_checks"], 1)
+        self.assertEqual(stats["num_discarded_connections"], 1)
+
+    def test_error1(self) -> None:
+        """
+        Close a connection failing while in use, instead of reusing it.
+        """
+        pool = self.get_pool()
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection() as connection1:
+                connection1.is_broken = True
+                connection1.cursor().execute("SELECT 1")
+        # Run.
+        with pool.connection() as connection2:
+            connection2.cursor().execute("SELECT 1")
+        # Check.
+        self.assertTrue(connection1.closed)
+        self.assertEqual(connection2.queries, ["SELECT 1"])
+
+    def test_shared_pool1(self) -> None:
+        """
+        Share the pool across the callers with the same connection info.
+        """
+        self.addCleanup(hsql.close_connection_pools)
+        pool1 = hsql.get_connection_pool(self.connection_info)
+        pool2 = hsql.get_connection_pool(self.connection_info)
+        pool3 = hsql.get_connection_pool(
+            self.connection_info, max_num_connections=2
+        )
+        # Check.
+        self.assertIs(pool1, pool2)
+        self.assertIsNot(pool1, pool3)
+        # A closed pool is replaced.
+        hsql.close_connection_pools()
+        self.assertTrue(pool1.is_closed)
+        self.assertIsNot(hsql.get_connection_pool(self.connection_info), pool1)
+
+
+# #############################################################################
+# TestGetConnectionInfoFromAwsSecret1
+# #############################################################################
+
+
+class TestGetConnectionInfoFromAwsSecret1(hunitest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        hsqlimpl._SECRET_CACHE.clear()
+        self.addCleanup(hsqlimpl._SECRET_CACHE.clear)
+
+    @umock.patch("helpers.hsecrets.get_secret")
+    def test_ttl1(self, mock_get_secret: umock.Mock) -> None:
+        """
+        Fetch the credentials again only once they expired.
+        """
+        mock_get_secret.return_value = {
+            "host": "host",
+            "port": 5432,
+            "username": "u",
+            "password": "p",
+        }
+        region = hs3.AWS_EUROPE_REGION_1
+        # Run.
+        for _ in range(2):
+            connection_info = hsql.get_connection_info_from_aws_secret(
+                region, stage="test", credentials_ttl_in_secs=1
+            )
+        # Check.
+        self.assertEqual(mock_get_secret.call_count, 1)
+        self.assertEqual(connection_info.dbname, "test.im_data_db")
+        self.assertEqual(connection_info.user, "u")
+        # The credentials are fetched again once expired.
+        time.sleep(1)
+        hsql.get_connection_info_from_aws_secret(
+            region, stage="test", credentials_ttl_in_secs=1
+        )
+        self.assertEqual(mock_get_secret.call_count, 2)
+
+
+# #############################################################################
+# TestExecuteQueryToDfChunks1
+# #############################################################################
+
+
+class TestExecuteQueryToDfChunks1(hunitest.TestCase):
+
+    @staticmethod
+    def get_connection() -> _FakeConnection:
+        """
+        Build a connection returning 5 rows of int, numeric, timestamptz,
+        text, and JSON columns.
+        """
+        connection = _FakeConnection()
+        connection.autocommit = True
+        columns = [
+            ("id", 20),
+            ("price", 1700),
+            ("timestamp", 1184),
+            ("currency_pair", 25),
+            ("data", 3802),
+        ]
+        connection.description = [
+            psycopg2.extensions.Column(name=name, type_code=type_code)
+            for name, type_code in columns
+        ]
+        tz = datetime.timezone(datetime.timedelta(hours=1))
+        connection.rows = [
+            (
+                i if i != 3 else None,
+                decimal.Decimal(f"{i}.5"),
+                datetime.datetime(2024, 1, 1, i, tzinfo=tz),
+                "BTC_USDT",
+                {"a": i},
+            )
+            for i in range(5)
+        ]
+        return connection
+
+    def test_pandas1(self) -> None:
+        """
+        Return dataframes with the same types, regardless of the nulls.
+        """
+        connection = self.get_connection()
+        # Run.
+        dfs = list(
+            hsql.execute_query_to_df_chunks(
+                connection, "SELECT * FROM ccxt_ohlcv", chunk_size=2
+            )
+        )
+        # Check.
+        self.assertEqual([len(df) for df in dfs], [2, 2, 1])
+        for df in dfs:
+            self.assert_equal(str(df.dtypes), str(dfs[0].dtypes))
+        df = pd.concat(dfs, ignore_index=True)
+        self.assertEqual(str(df["id"].dtype), "Int64")
+        self.assertEqual(df["id"].isna().tolist(), [False] * 3 + [True, False])
+        self.assertEqual(df["price"].tolist(), [0.5, 1.5, 2.5, 3.5, 4.5])
+        self.assertEqual(str(df["timestamp"].dtype), "datetime64[ns, UTC]")
+        self.assertEqual(
+            df["timestamp"].iloc[0], pd.Timestamp("2023-12-31 23:00", tz="UTC")
+        )
+        self.assertEqual(df["data"].iloc[4], {"a": 4})
+        # A server-side cursor is used.
+        self.assertEqual(connection.cursor_kwargs[0]["withhold"], True)
+        self.assertTrue(connection.cursor_kwargs[0]["name"].startswith("stream_"))
+
+    def test_pandas2(self) -> None:
+        """
+        Infer the type of a column from the first chunk with a non-null value.
+        """
+        connection = self.get_connection()
+        connection.rows = [
+            row[:4] + (None if i < 2 else row[4],)
+            for i, row in enumerate(connection.rows)
+        ]
+        # Run.
+        dfs = list(
+            hsql.execute_query_to_df_chunks(
+                connection, "SELECT * FROM ccxt_ohlcv", chunk_size=2
+            )
+        )
+        # Check.
+        self.assertEqual([len(df) for df in dfs], [2, 2, 1])
+        df = pd.concat(dfs, ignore_index=True)
+        self.assertEqual(
+            df["data"].tolist(), [None, None, {"a": 2}, {"a": 3}, {"a": 4}]
+        )
+
+    def test_arrow1(self) -> None:
+        """
+        Return record batches with the passed schema.
+        """
+        connection = self.get_connection()
+        connection.description = connection.description[:2]
+        connection.rows = [row[:2] for row in connection.rows]
+        schema = pa.schema([("id", pa.int32()), ("price", pa.float32())])
+        # Run.
+        batches = list(
+            hsql.execute_query_to_df_chunks(
+                connection,
+                "SELECT id, price FROM ccxt_ohlcv",
+                chunk_size=3,
+                output_format="arrow",
+                schema=schema,
+            )
+        )
+        # Check.
+        self.assertEqual([batch.num_rows for batch in batches], [3, 2])
+        self.assertEqual(batches[1].schema, schema)
+        self.assertEqual(batches[1]["price"].to_pylist(), [3.5, 4.5])
+
+
+# #############################################################################
+# TestBulkInsertDf1
+# #############################################################################
+
+
+class TestBulkInsertDf1(hunitest.TestCase):
+
+    @staticmethod
+    def get_test_data() -> pd.DataFrame:
+        df = pd.DataFrame(
+            {
+                "id": [1, 2, 2],
+                "name": ["a,b", None, ""],
+                "price": [1.5, np.nan, 3.0],
+            }
+        )
+        return df
+
+    def test_copy1(self) -> None:
+        """
+        Copy the rows in chunks, distinguishing missing values and empty
+        strings.
+        """
+        connection = _FakeConnection()
+        connection.autocommit = True
+        df = self.get_test_data()
+        # Run.
+        num_rows = hsql.bulk_insert_df(connection, df, "table1", chunk_size=2)
+        # Check.
+        self.assertEqual(num_rows, 3)
+        self.assertEqual(
+            connection.queries,
+            ["COPY table1(id,name,price) FROM STDIN (FORMAT csv, NULL '\\N')"],
+        )
+        exp = r"""
+        1,"a,b",1.5
+        2,\N,\N
+        2,,3.0
+        """
+        self.assert_equal(connection.copied_data[0], exp, dedent=True)
+
+    def test_update1(self) -> None:
+        """
+        Upsert through a staging table, keeping the last duplicated row.
+        """
+        connection = _FakeConnection()
+        connection.autocommit = True
+        df = self.get_test_data()
+        # Run.
+        hsql.bulk_insert_df(
+            connection,
+            df,
+            "table1",
+            on_conflict="update",
+            unique_columns=["id"],
+        )
+        # Check.
+        staging_table_name = connection.queries[0].split()[3]
+        queries = "\n".join(connection.queries).replace(
+            staging_table_name, "staging"
+        )
+        exp = r"""
+        CREATE TEMP TABLE staging AS SELECT id,name,price FROM table1 WITH NO DATA
+        COPY staging(id,name,price) FROM STDIN (FORMAT csv, NULL '\N')
+        INSERT INTO table1(id,name,price) SELECT id,name,price FROM staging ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name,price = EXCLUDED.price
+        DROP TABLE IF EXISTS staging
+        """
+        self.assert_equal(queries, exp, dedent=True)
+        self.assertEqual(connection.copied_data[0], '1,"a,b",1.5\n2,,3.0\n')
+
+
+# #############################################################################
+# TestAsyncDbConnectionPool1
+# #############################################################################
+
+
+class TestAsyncDbConnectionPool1(hunitest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.connections: List[_FakeConnection] = []
+        self.query_time_in_secs = 0.0
+
+        def _connect(**kwargs: Any) -> _FakeConnection:
+            connection = _FakeConnection(**kwargs)
+            connection.query_time_in_secs = self.query_time_in_secs
+            self.connections.append(connection)
+            return connection
+
+        patcher = umock.patch.object(psycopg2, "connect", side_effect=_connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection_info = hsql.DbConnectionInfo(
+            host="localhost", dbname="db", port=5432, user="u", password="p"
+        )
+
+    def test_execute_query1(self) -> None:
+        """
+        Run the queries in threads, without blocking the event loop.
+        """
+        events = []
+
+        async def _execute_query(
+            pool: hsql.AsyncDbConnectionPool, query: str
+        ) -> None:
+            await pool.execute_query(query)
+            events.append(query)
+
+        async def _tick() -> None:
+            await asyncio.sleep(0.05)
+            events.append("tick")
+
+        async def _run() -> None:
+            async with await hsql.connect_async(
+                self.connection_info, max_num_connections=2
+            ) as pool:
+                await asyncio.gather(
+                    _execute_query(pool, "SELECT 1"),
+                    _execute_query(pool, "SELECT 2"),
+                    _tick(),
+                )
+
+        self.query_time_in_secs = 0.2
+        # Run.
+        hasynci.run(_run(), event_loop=None)
+        # Check.
+        self.assertEqual(events[0], "tick")
+        self.assertEqual(sorted(events[1:]), ["SELECT 1", "SELECT 2"])
+        self.assertEqual(len(self.connections), 2)
+        self.assertTrue(all(conn.closed for conn in self.connections))
+
+    def test_listener1(self) -> None:
+        """
+        Receive the notifications and time out without notifications.
+        """
+
+        async def _run() -> List[str]:
+            async with hsql.DbNotificationListener(
+                self.connection_info, ["channel1"]
+            ) as listener:
+                connection = self.connections[0]
+                asyncio.get_running_loop().call_later(
+                    0.01, connection.send_notification, "channel1", "table1"
+                )
+                notification = await listener.get_notification(timeout_in_secs=5)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await listener.get_notification(timeout_in_secs=0.01)
+            return [notification.channel, notification.payload]
+
+        # Run.
+        act = hasynci.run(_run(), event_loop=None)
+        # Check.
+        self.assertEqual(act, ["channel1", "table1"])
+        self.assertEqual(len(self.connections[0].queries), 1)
+        self.assertTrue(self.connections[0].closed)
+
+    def test_wait_for_change_in_number_of_rows1(self) -> None:
+        """
+        Count the rows only when a notification is received.
+        """
+
+        async def _insert_rows(connection: _FakeConnection) -> None:
+            listener_connection = self.connections[1]
+            await asyncio.sleep(0.01)
+            # A notification without new rows.
+            listener_connection.send_notification("channel1", "table1")
+            await asyncio.sleep(0.01)
+            connection.rows = [(13,)]
+            listener_connection.send_notification("channel1", "table1")
+
+        async def _run() -> int:
+            async with await hsql.connect_async(
+                self.connection_info, max_num_connections=1
+            ) as pool, hsql.DbNotificationListener(
+                self.connection_info, ["channel1"]
+            ) as listener:
+                connection = self.connections[0]
+                connection.rows = [(10,)]
+                num_rows, _ = await asyncio.gather(
+                    hsql.wait_for_change_in_number_of_rows_with_listener(
+                        pool, listener, "table1", timeout_in_secs=5
+                    ),
+                    _insert_rows(connection),
+                )
+            return num_rows
+
+        # Run.
+        num_rows = hasynci.run(_run(), event_loop=None)
+        # Check.
+        self.assertEqual(num_rows, 3)
+        self.assertEqual(
+            self.connections[0].queries,
+            ["SELECT COUNT(*) FROM table1"] * 3,
+        )
+
+
+# #############################################################################
+# TestHsqlDb1
+# #############################################################################
+
+
+class TestHsqlDb1(hsqltest.TestImOmsDbHelper):
+    """
+    Test the bulk insertion and the streaming of query results against a DB.
+    """
+
+    _TABLE_NAME = "hsql_test_table"
+
+    @classmethod
+    def get_id(cls) -> int:
+        return hash(cls.__name__) % 10000
+
+    def setUp(self) -> None:
+        super().setUp()
+        hsql.remove_table(self.connection, self._TABLE_NAME)
+        query = f"""
+            CREATE TABLE {self._TABLE_NAME}(
+                id BIGINT PRIMARY KEY,
+                name TEXT,
+                price DOUBLE PRECISION
+            )"""
+        hsql.execute_query(self.connection, query)
+        self.addCleanup(hsql.remove_table, self.connection, self._TABLE_NAME)
+
+    def test_bulk_insert_df1(self) -> None:
+        """
+        Insert, skip, and update rows with `COPY`.
+        """
+        df1 = pd.DataFrame(
+            {"id": [1, 2], "name": ["a", None], "price": [1.0, 2.0]}
+        )
+        df2 = pd.DataFrame(
+            {"id": [2, 3], "name": ["b", "c"], "price": [np.nan, 3.0]}
+        )
+        # Run.
+        num_rows1 = hsql.bulk_insert_df(self.connection, df1, self._TABLE_NAME)
+        num_rows2 = hsql.bulk_insert_df(
+            self.connection,
+            df2,
+            self._TABLE_NAME,
+            on_conflict="do_nothing",
+            unique_columns=["id"],
+        )
+        num_rows3 = hsql.bulk_insert_df(
+            self.connection,
+            df2,
+            self._TABLE_NAME,
+            on_conflict="update",
+            unique_columns=["id"],
+        )
+        # Check.
+        self.assertEqual([num_rows1, num_rows2, num_rows3], [2, 1, 2])
+        query = f"SELECT * FROM {self._TABLE_NAME} ORDER BY id"
+        df = hsql.execute_query_to_df(self.connection, query)
+        self.assertEqual(df["name"].tolist(), ["a", "b", "c"])
+        self.assertEqual(df["price"].isna().tolist(), [False, True, False])
+
+    def test_execute_query_to_df_chunks1(self) -> None:
+        """
+        Stream the results of a query in chunks through a pool.
+        """
+        df = pd.DataFrame(
+            {"id": range(5), "name": "a", "price": [1.0, None, 3.0, 4.0, 5.0]}
+        )
+        hsql.bulk_insert_df(self.connection, df, self._TABLE_NAME)
+        connection_info = hsql.db_connection_to_tuple(self.connection)
+        # Run.
+        with hsql.DbConnectionPool(connection_info) as pool:
+            query = f"SELECT * FROM {self._TABLE_NAME} ORDER BY id"
+            dfs = list(hsql.execute_query_to_df_chunks(pool, query, chunk_size=2))
+            stats = pool.metrics.get_stats()
+        # Check.
+        self.assertEqual([len(df) for df in dfs], [2, 2, 1])
+        df_out = pd.concat(dfs, ignore_index=True)
+        self.assertEqual(df_out["id"].tolist(), list(range(5)))
+        self.assertEqual(str(df_out["id"].dtype), "Int64")
+        self.assertEqual(stats["num_checkouts"], 1)
+        self.assertGreaterEqual(stats["num_queries"], 1)
+
+    def test_listener1(self) -> None:
+        """
+        Wait for the rows inserted in a table with a trigger notification.
+        """
+        hsql.create_insert_notify_trigger(
+            self.connection, self._TABLE_NAME, "hsql_test_channel"
+        )
+        connection_info = hsql.db_connection_to_tuple(self.connection)
+        df = pd.DataFrame({"id": [1, 2], "name": "a", "price": 1.0})
+
+        async def _insert_rows(pool: hsql.AsyncDbConnectionPool) -> None:
+            # Insert after the rows are counted for the first time.
+            await asyncio.sleep(1)
+            await pool.bulk_insert_df(df, self._TABLE_NAME)
+
+        async def _run() -> int:
+            async with await hsql.connect_async(
+                connection_info
+            ) as pool, hsql.DbNotificationListener(
+                connection_info, ["hsql_test_channel"]
+            ) as listener:
+                num_rows, _ = await asyncio.gather(
+                    hsql.wait_for_change_in_number_of_rows_with_listener(
+                        pool, listener, self._TABLE_NAME, timeout_in_secs=10
+                    ),
+                    _insert_rows(pool),
+                )
+            return num_rows
+
+        # Run.
+        num_rows = hasynci.run(_run(), event_loop=None)
+        # Check.
+        self.assertEqual(num_rows, 2)
+
+    @pytest.mark.superslow("~1 min.")
+    def test_benchmark1(self) -> None:
+        """
+        Compare the rows / sec of inserting 1M rows with `execute_values` and
+        with `COPY`.
+        """
+        num_rows = 1_000_000
+        df = pd.DataFrame(
+            {
+                "id": np.arange(num_rows),
+                "name": "BTC_USDT",
+                "price": np.random.default_rng(seed=0).random(num_rows),
+            }
+        )
+        table_name = self._TABLE_NAME
+        funcs = {
+            "execute_values": lambda: hsql.execute_insert_query(
+                self.connection, df, table_name
+            ),
+            "copy": lambda: hsql.bulk_insert_df(self.connection, df, table_name),
+            "copy_on_conflict_do_nothing": lambda: hsql.bulk_insert_df(
+                self.connection,
+                df,
+                table_name,
+                on_conflict="do_nothing",
+                unique_columns=["id"],
+            ),
+        }
+        txt = []
+        for tag, func in funcs.items():
+            hsql.execute_query(self.connection, f"TRUNCATE {table_name}")
+            perf_start = time.perf_counter()
+            func()
+            elapsed_time = time.perf_counter() - perf_start
+            self.assertEqual(
+                hsql.get_num_rows(self.connection, table_name), num_rows
+            )
+            txt.append(f"{tag}: rows_per_sec={num_rows / elapsed_time:.0f}")
+        _LOG.info("\n%s", "\n".join(txt))
+
+    @classmethod
+    def _get_compose_file(cls) -> str:
+        return f"tmp.docker-compose.{cls._get_service_name()}.yml"
+
+    @classmethod
+    def _get_service_name(cls) -> str:
+        return f"helpers_postgres{cls.get_id()}"
+
+    @classmethod
+    def _get_db_env_path(cls) -> str:
+        return f"tmp.{cls._get_service_name()}.env"
+
+    @classmethod
+    def _get_postgres_db(cls) -> str:
+        return "helpers_postgres_db_local"
@@ -1,8 +1,12 @@
+import collections
 import logging
 import os
+import sys
 import time
 from typing import Any, List, Optional, Union
 
+import numpy as np
+import pandas as pd
 import pytest
 
 import helpers.hjoblib as hjoblib
@@ -255,7 +259,7 @@ def get_workload3(
     """
     workload: hjoblib.Workload = get_workload1(randomize=True)
     # Modify the workflow in place.
-    (workload_func, func_name, tasks) = workload
+    workload_func, func_name, tasks = workload
     _ = workload_func, func_name
     task = ((-1, 7), {"hello2": "world2", "good2": "bye2"})
     tasks.append(task)
@@ -405,6 +409,728 @@ val1=4, val2=8, incremental=True, num_attempts=1, kwargs={'hello4': 'world8', 'g
             )
 
 
+# #############################################################################
+# Test_parallel_execute4
+# #############################################################################
+
+
+# Number of calls of `flaky_workload_function()` for each value of `val1`.
+_NUM_CALLS = collections.Counter()
+
+
+def flaky_workload_function(
+    val1: int,
+    num_failures: int,
+    sleep_in_secs: float,
+    #
+    **kwargs: Any,
+) -> str:
+    """
+    Execute a test workload that fails the first `num_failures` times.
+    """
+    _ = kwargs.pop("incremental"), kwargs.pop("num_attempts")
+    _NUM_CALLS[val1] += 1
+    time.sleep(sleep_in_secs)
+    if _NUM_CALLS[val1] <= num_failures:
+        raise ValueError(f"Failure {_NUM_CALLS[val1]} for val1={val1}")
+    res = f"val1={val1}"
+    return res
+
+
+def memory_workload_function(
+    num_bytes: int,
+    #
+    **kwargs: Any,
+) -> int:
+    """
+    Execute a test workload allocating `num_bytes` bytes.
+    """
+    _ = kwargs.pop("incremental"), kwargs.pop("num_attempts")
+    arr = np.ones(num_bytes, dtype=np.uint8)
+    res = int(arr.sum())
+    return res
+
+
+def retrying_workload_function(
+    val1: int,
+    num_failures: int,
+    sleep_in_secs: float,
+    #
+    **kwargs: Any,
+) -> str:
+    """
+    Execute `flaky_workload_function()` retrying it `num_attempts` times.
+    """
+    num_attempts = kwargs["num_attempts"]
+    for attempt in range(1, num_attempts + 1):
+        try:
+            res = flaky_workload_function(
+                val1, num_failures, sleep_in_secs, **kwargs
+            )
+            break
+        except ValueError:
+            if attempt == num_attempts:
+                raise
+    return res
+
+
+def get_workload4(num_failures: int, sleep_in_secs: float) -> hjoblib.Workload:
+    """
+    Return a workload for `flaky_workload_function()` with 3 tasks.
+    """
+    tasks = [((i, num_failures, sleep_in_secs), {}) for i in range(3)]
+    workload: hjoblib.Workload = (
+        flaky_workload_function,
+        "flaky_workload_function",
+        tasks,
+    )
+    return workload
+
+
+class Test_parallel_execute4(hunitest.TestCase):
+    """
+    Execute workloads with retries, timeouts, and checkpoints.
+    """
+
+    def set_up_test(self) -> None:
+        _NUM_CALLS.clear()
+
+    @pytest.fixture(autouse=True)
+    def setup_teardown_test(self):
+        self.set_up_test()
+        yield
+
+    def test_retry1(self) -> None:
+        """
+        Verify that failing tasks are retried until they succeed.
+        """
+        workload = get_workload4(num_failures=2, sleep_in_secs=0.0)
+        res = self._run(workload, "serial", num_attempts=3)
+        # Check.
+        self.assertEqual(res, ["val1=0", "val1=1", "val1=2"])
+        self.assertEqual(dict(_NUM_CALLS), {0: 3, 1: 3, 2: 3})
+
+    def test_retry2(self) -> None:
+        """
+        Verify that a task failing more than `num_attempts` times fails.
+        """
+        workload = get_workload4(num_failures=2, sleep_in_secs=0.0)
+        with self.assertRaises(ValueError) as cm:
+            self._run(workload, 2, num_attempts=2, backend="asyncio_threading")
+        self.assertIn("Failure 2", str(cm.exception))
+
+    def test_retry3(self) -> None:
+        """
+        Verify that a function retrying internally is attempted `num_attempts`
+        times in total.
+        """
+        workload = get_workload4(num_failures=2, sleep_in_secs=0.0)
+        workload = (
+            retrying_workload_function,
+            "retrying_workload_function",
+            workload[2],
+        )
+        res = self._run(workload, "serial", num_attempts=3)
+        # Check.
+        self.assertEqual(res, ["val1=0", "val1=1", "val1=2"])
+        self.assertEqual(dict(_NUM_CALLS), {0: 3, 1: 3, 2: 3})
+
+    def test_timeout1(self) -> None:
+        """
+        Verify that a task running longer than the timeout fails.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=1.0)
+        res = self._run(
+            workload, "serial", abort_on_error=False, timeout_in_secs=0.1
+        )
+        # Check.
+        self.assertEqual(res, ["Task didn't complete in 0.1 secs"] * 3)
+
+    def test_timeout2(self) -> None:
+        """
+        Verify that timed out attempts are killed before retrying them with
+        the `threading` backend.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=10.0)
+        start_time = time.time()
+        res = self._run(
+            workload,
+            2,
+            abort_on_error=False,
+            num_attempts=2,
+            backend="threading",
+            timeout_in_secs=0.5,
+        )
+        # Check.
+        self.assertEqual(res, ["Task didn't complete in 0.5 secs"] * 3)
+        self.assertLess(time.time() - start_time, 10.0)
+
+    def test_timeout3(self) -> None:
+        """
+        Verify that retrying a timed out task running in a thread is rejected.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=0.0)
+        with self.assertRaises(AssertionError) as cm:
+            self._run(workload, "serial", num_attempts=2, timeout_in_secs=0.1)
+        self.assertIn("Retrying timed out tasks", str(cm.exception))
+
+    def test_checkpoint1(self) -> None:
+        """
+        Verify that re-running a workload skips the completed tasks.
+        """
+        checkpoint_dir = os.path.join(self.get_scratch_space(), "checkpoint")
+        # The second task fails.
+        workload = get_workload4(num_failures=0, sleep_in_secs=0.0)
+        workload[2][1] = ((-1, 1, 0.0), {})
+        res = self._run(
+            workload,
+            "serial",
+            abort_on_error=False,
+            checkpoint_dir=checkpoint_dir,
+        )
+        self.assertEqual(res, ["val1=0", "Failure 1 for val1=-1", "val1=2"])
+        self.assertEqual(dict(_NUM_CALLS), {0: 1, -1: 1, 2: 1})
+        # Re-run the workload: only the failed task is executed.
+        res = self._run(
+            workload,
+            2,
+            backend="asyncio_threading",
+            checkpoint_dir=checkpoint_dir,
+        )
+        self.assertEqual(res, ["val1=0", "val1=-1", "val1=2"])
+        self.assertEqual(dict(_NUM_CALLS), {0: 1, -1: 2, 2: 1})
+
+    def test_task_stats1(self) -> None:
+        """
+        Verify that the resource usage of each task is saved.
+        """
+        workload = get_workload4(num_failures=1, sleep_in_secs=0.0)
+        workload[2][1] = ((-1, 2, 0.0), {})
+        self._run(
+            workload,
+            2,
+            abort_on_error=False,
+            num_attempts=2,
+            backend="asyncio_threading",
+            save_task_stats=True,
+        )
+        # Check.
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        task_stats_file = hjoblib.get_task_stats_file_name(log_file)
+        df = hjoblib.load_task_stats(task_stats_file)
+        df = df.sort_values("task_idx")
+        self.assertEqual(df["task_idx"].tolist(), [0, 1, 2])
+        self.assertEqual(df["num_attempts"].tolist(), [2, 2, 2])
+        self.assertEqual(df["error"].notnull().tolist(), [False, True, False])
+        self.assertEqual(df["error"].iloc[1], "Failure 2 for val1=-1")
+        self.assertTrue((df["end_time"] >= df["start_time"]).all())
+        # The peak memory is not reported with the thread backends.
+        self.assertTrue(df["peak_rss_in_bytes"].isnull().all())
+        self.assertTrue((df["pid"] == os.getpid()).all())
+
+    @pytest.mark.skipif(
+        sys.platform != "linux", reason="The peak memory is reset only on Linux"
+    )
+    def test_task_stats2(self) -> None:
+        """
+        Verify that a task doesn't report the peak memory of a previous task.
+        """
+        num_bytes = 200 * 1024**2
+        tasks = [((num_bytes,), {}), ((1024,), {})]
+        workload = (memory_workload_function, "memory_workload_function", tasks)
+        self._run(workload, "serial", save_task_stats=True)
+        # Check.
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        task_stats_file = hjoblib.get_task_stats_file_name(log_file)
+        df = hjoblib.load_task_stats(task_stats_file)
+        peak_rss = df.sort_values("task_idx")["peak_rss_in_bytes"].tolist()
+        self.assertGreater(peak_rss[0], num_bytes)
+        self.assertLess(peak_rss[1], peak_rss[0] - num_bytes / 2)
+
+    def test_task_stats3(self) -> None:
+        """
+        Verify that the task stats are not saved by default.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=0.0)
+        self._run(workload, "serial")
+        # Check.
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        self.assertTrue(os.path.exists(log_file))
+        task_stats_file = hjoblib.get_task_stats_file_name(log_file)
+        self.assertFalse(os.path.exists(task_stats_file))
+
+    def _run(
+        self,
+        workload: hjoblib.Workload,
+        num_threads: Union[str, int],
+        *,
+        abort_on_error: bool = True,
+        num_attempts: int = 1,
+        backend: str = "",
+        **kwargs: Any,
+    ) -> List[Any]:
+        dry_run = False
+        incremental = True
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        res = hjoblib.parallel_execute(
+            workload,
+            dry_run,
+            num_threads,
+            incremental,
+            abort_on_error,
+            num_attempts,
+            log_file,
+            backend=backend,
+            **kwargs,
+        )
+        return res
+
+
+# #############################################################################
+# Test_task_stats_to_str1
+# #############################################################################
+
+
+class Test_task_stats_to_str1(hunitest.TestCase):
+    def test1(self) -> None:
+        """
+        Verify the summary of the task stats with a straggler and a memory
+        outlier.
+        """
+        rows = []
+        for task_idx, (elapsed_time, peak_rss) in enumerate(
+            [(1.0, 100), (1.0, 100), (1.0, 500), (4.0, 100)]
+        ):
+            rows.append(
+                {
+                    "task_idx": task_idx,
+                    "pid": 1,
+                    "thread_id": task_idx % 2,
+                    "start_time": 0.0,
+                    "end_time": elapsed_time,
+                    "elapsed_time_in_secs": elapsed_time,
+                    "cpu_time_in_secs": elapsed_time,
+                    "peak_rss_in_bytes": peak_rss,
+                    "num_attempts": 1,
+                    "error": None,
+                }
+            )
+        df = pd.DataFrame(rows)
+        # Run.
+        act = hjoblib.task_stats_to_str(df, top_k=2)
+        # Check.
+        exp = r"""
+        num_tasks=4 num_errors=0 num_workers=2
+        wall_time_in_secs=4.000 tot_task_time_in_secs=7.000 parallel_efficiency=0.88
+        cpu_time_in_secs=7.000 max_peak_rss_in_bytes=500
+        ################################################################################
+        Slowest 2 tasks
+        ################################################################################
+         task_idx  elapsed_time_in_secs  cpu_time_in_secs  peak_rss_in_bytes  num_attempts  pid
+                3                   4.0               4.0                100             1    1
+                0                   1.0               1.0                100             1    1
+        ################################################################################
+        Stragglers (elapsed time > 2.0 x 1.000)
+        ################################################################################
+         task_idx  elapsed_time_in_secs  cpu_time_in_secs  peak_rss_in_bytes  num_attempts  pid
+                3                   4.0               4.0                100             1    1
+        ################################################################################
+        Memory outliers (peak rss > 2.0 x 100)
+        ################################################################################
+         task_idx  elapsed_time_in_secs  cpu_time_in_secs  peak_rss_in_bytes  num_attempts  pid
+                2                   1.0               1.0                500             1    1
+        """
+        self.assert_equal(act, exp, fuzzy_match=True)
+
+
+# #############################################################################
+# Test_split_list_in_tasks1
+# #############################################################################
+
+
+class Test_split_list_in_tasks1(hunitest.TestCase):
+    def test1(self) -> None:
+        """
+        Split a list in tasks with similar total cost.
+        """
+        list_in = ["a", "b", "c", "d", "e"]
+        costs = [1, 1, 1, 1, 4]
+        # Run.
+        act = hjoblib.split_list_in_tasks(list_in, 3, costs=costs)
+        # Check.
+        exp = [["e"], ["a", "c"], ["b", "d"]]
+        self.assertEqual(act, exp)
+
+    def test2(self) -> None:
+        """
+        Split a skewed list in more tasks than threads.
+        """
+        list_in = list(range(10))
+        costs = [100] + [1] * 9
+        # Run.
+        act = hjoblib.split_list_in_tasks(
+            list_in, 2, costs=costs, num_tasks_per_thread=2
+        )
+        # Check.
+        exp = [[0], [1, 4, 7], [2, 5, 8], [3, 6, 9]]
+        self.assertEqual(act, exp)
+
+    def test3(self) -> None:
+        """
+        Split a list in more tasks than threads without costs.
+        """
+        list_in = list(range(10))
+        # Run.
+        act = hjoblib.split_list_in_tasks(list_in, 2, num_tasks_per_thread=3)
+        # Check.
+        exp = [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+        self.assertEqual(act, exp)
+
+
+# #############################################################################
+# Test_get_task_id1
+# #############################################################################
+
+
+class _Params:
+    """
+    Object with the default `repr()`, which contains its memory address.
+    """
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+
+class Test_get_task_id1(hunitest.TestCase):
+    def test1(self) -> None:
+        """
+        Tasks differing only inside a dataframe have different ids.
+        """
+        df1 = pd.DataFrame({"a": range(1000), "b": 1.0})
+        df2 = df1.copy()
+        df2.loc[500, "b"] = 2.0
+        # Run.
+        task_id1 = hjoblib.get_task_id("func", ((df1,), {}))
+        task_id2 = hjoblib.get_task_id("func", ((df2,), {}))
+        task_id3 = hjoblib.get_task_id("func", ((df1.copy(),), {}))
+        # Check.
+        self.assertNotEqual(task_id1, task_id2)
+        self.assertEqual(task_id1, task_id3)
+
+    def test2(self) -> None:
+        """
+        Objects with the same content have the same id, regardless of their
+        memory address.
+        """
+        # Run.
+        task_id1 = hjoblib.get_task_id("func", ((_Params(1),), {"x": 1}))
+        task_id2 = hjoblib.get_task_id("func", ((_Params(1),), {"x": 1}))
+        task_id3 = hjoblib.get_task_id("func", ((_Params(2),), {"x": 1}))
+        # Check.
+        self.assertEqual(task_id1, task_id2)
+        self.assertNotEqual(task_id1, task_id3)
+
+
+# #############################################################################
+# Test_get_task_costs1
+# #############################################################################
+
+
+class Test_get_task_costs1(hunitest.TestCase):
+    def test1(self) -> None:
+        """
+        Learn the cost of the tasks from a previous run and sort the workload.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=0.0)
+        # Make the last task the slowest one.
+        workload[2][2] = ((2, 0, 0.2), {})
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        hjoblib.parallel_execute(
+            workload,
+            False,
+            "serial",
+            True,
+            True,
+            1,
+            log_file,
+            save_task_stats=True,
+        )
+        # Add a new task.
+        workload[2].append(((3, 0, 0.0), {}))
+        # Run.
+        task_stats_file = hjoblib.get_task_stats_file_name(log_file)
+        costs = hjoblib.get_task_costs(workload, [task_stats_file])
+        # Check.
+        self.assertEqual(len(costs), 4)
+        self.assertGreaterEqual(costs[2], 0.2)
+        self.assertLess(max(costs[:2]), 0.2)
+        # The new task has the median cost.
+        self.assertEqual(costs[3], sorted(costs[:3])[1])
+        # Check the sorted workload.
+        workload = hjoblib.sort_workload_by_cost(workload, costs)
+        self.assertEqual(workload[2][0], ((2, 0, 0.2), {}))
+
+
+# #############################################################################
+# Test_iter_parallel_execute1
+# #############################################################################
+
+
+class Test_iter_parallel_execute1(hunitest.TestCase):
+    """
+    Iterate over the results of a workload as the tasks complete.
+    """
+
+    def set_up_test(self) -> None:
+        _NUM_CALLS.clear()
+
+    @pytest.fixture(autouse=True)
+    def setup_teardown_test(self):
+        self.set_up_test()
+        yield
+
+    def test_serial1(self) -> None:
+        self._run_test("serial", "")
+
+    def test_asyncio_threading1(self) -> None:
+        self._run_test(3, "asyncio_threading")
+
+    def test_loky1(self) -> None:
+        self._run_test(2, "loky")
+
+    def test_early_stop1(self) -> None:
+        """
+        Verify that stopping the iteration doesn't execute the other tasks.
+        """
+        workload = get_workload4(num_failures=0, sleep_in_secs=0.1)
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        iter_ = hjoblib.iter_parallel_execute(
+            workload,
+            1,
+            True,
+            True,
+            1,
+            log_file,
+            backend="asyncio_threading",
+            max_num_in_flight=1,
+        )
+        task_idx, res = next(iter_)
+        iter_.close()
+        # Check.
+        self.assertEqual((task_idx, res), (0, "val1=0"))
+        self.assertLessEqual(sum(_NUM_CALLS.values()), 2)
+
+    def test_ordered1(self) -> None:
+        """
+        Verify that the results are yielded in order, without submitting tasks
+        while a slow task holds back the results of the next ones.
+        """
+        # The first task is slower than the others.
+        tasks = [((i, 0, 0.5 if i == 0 else 0.0), {}) for i in range(5)]
+        workload = (flaky_workload_function, "flaky_workload_function", tasks)
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        iter_ = hjoblib.iter_parallel_execute(
+            workload,
+            3,
+            True,
+            True,
+            1,
+            log_file,
+            backend="asyncio_threading",
+            max_num_in_flight=2,
+            ordered=True,
+        )
+        task_idx, res = next(iter_)
+        # Only the first 2 tasks are executed before the first one completes.
+        self.assertEqual((task_idx, res), (0, "val1=0"))
+        self.assertEqual(dict(_NUM_CALLS), {0: 1, 1: 1})
+        # Check.
+        res = list(iter_)
+        self.assertEqual([task_idx for task_idx, _ in res], [1, 2, 3, 4])
+
+    def _run_test(self, num_threads: Union[str, int], backend: str) -> None:
+        workload = get_workload1(randomize=True)
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        res = list(
+            hjoblib.iter_parallel_execute(
+                workload,
+                num_threads,
+                True,
+                True,
+                1,
+                log_file,
+                backend=backend,
+                max_num_in_flight=2,
+            )
+        )
+        # Check that each task is returned once with its result.
+        self.assertEqual(sorted(task_idx for task_idx, _ in res), list(range(5)))
+        tasks = workload[2]
+        for task_idx, res_tmp in res:
+            self.assertIn(f"val1={tasks[task_idx][0][0]},", res_tmp)
+        act = _outcome_to_string([res_tmp for _, res_tmp in res])
+        self.assert_equal(act, Test_parallel_execute1.EXPECTED_RETURN)
+
+
+# #############################################################################
+# Test_to_shared_memory1
+# #############################################################################
+
+
+def get_df(num_rows: int, *, seed: int = 0) -> pd.DataFrame:
+    """
+    Return a dataframe with numeric and string columns.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "a": rng.random(num_rows),
+            "b": np.arange(num_rows),
+            "c": [str(i % 7) for i in range(num_rows)],
+        }
+    )
+    return df
+
+
+def df_workload_function(
+    df: pd.DataFrame,
+    factor: float,
+    #
+    **kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Execute a test workload transforming a dataframe.
+    """
+    _ = kwargs.pop("incremental"), kwargs.pop("num_attempts")
+    df = df.copy()
+    df["a"] *= factor
+    return df
+
+
+def get_df_workload(num_tasks: int, num_rows: int) -> hjoblib.Workload:
+    """
+    Return a workload for `df_workload_function()`.
+    """
+    tasks = [
+        ((get_df(num_rows, seed=i),), {"factor": float(i)})
+        for i in range(num_tasks)
+    ]
+    workload: hjoblib.Workload = (
+        df_workload_function,
+        "df_workload_function",
+        tasks,
+    )
+    return workload
+
+
+class Test_to_shared_memory1(hunitest.TestCase):
+    def test1(self) -> None:
+        """
+        Round-trip a large dataframe through shared memory.
+        """
+        df = get_df(100_000)
+        # Run.
+        handle = hjoblib.to_shared_memory(df)
+        # Check.
+        self.assertIsInstance(handle, hjoblib._SharedMemoryHandle)
+        self.assertTrue(os.path.exists(handle.file_name))
+        df_out = hjoblib.from_shared_memory(handle)
+        self.assertFalse(os.path.exists(handle.file_name))
+        pd.testing.assert_frame_equal(df_out, df)
+        # The loaded dataframe can be modified.
+        df_out["a"] = 0.0
+        self.assertEqual(df_out["a"].sum(), 0.0)
+
+    def test2(self) -> None:
+        """
+        Small objects are not stored in shared memory.
+        """
+        df = get_df(10)
+        # Run.
+        act = hjoblib.to_shared_memory(df)
+        # Check.
+        self.assertIs(act, df)
+        self.assertIs(hjoblib.from_shared_memory(act), df)
+
+
+class Test_parallel_execute_shared_memory1(hunitest.TestCase):
+    """
+    Execute a dataframe workload transferring data through shared memory.
+    """
+
+    def test_loky1(self) -> None:
+        self._run_test(2, "loky")
+
+    def test_asyncio_multiprocessing1(self) -> None:
+        self._run_test(2, "asyncio_multiprocessing", use_iter=True)
+
+    def test_asyncio_multiprocessing2(self) -> None:
+        self._run_test(2, "asyncio_multiprocessing")
+
+    def test_threading1(self) -> None:
+        # The `threading` backend uses `processify`.
+        self._run_test(2, "threading")
+
+    def _run_test(
+        self, num_threads: int, backend: str, *, use_iter: bool = False
+    ) -> None:
+        workload = get_df_workload(num_tasks=3, num_rows=100_000)
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        args = (workload, num_threads, True, True, 1, log_file)
+        kwargs = {"backend": backend, "use_shared_memory": True}
+        if use_iter:
+            res = dict(hjoblib.iter_parallel_execute(*args, **kwargs))
+            res = [res[task_idx] for task_idx in range(len(res))]
+        else:
+            res = hjoblib.parallel_execute(workload, False, *args[1:], **kwargs)
+        # Check.
+        for task_idx, task in enumerate(workload[2]):
+            exp = df_workload_function(
+                *task[0], incremental=True, num_attempts=1, **task[1]
+            )
+            pd.testing.assert_frame_equal(res[task_idx], exp)
+
+
+@pytest.mark.superslow("~1 min.")
+class Test_parallel_execute_shared_memory_benchmark1(hunitest.TestCase):
+    """
+    Compare the throughput of transferring dataframes with and without shared
+    memory.
+    """
+
+    def test1(self) -> None:
+        num_tasks = 8
+        num_rows = 5_000_000
+        workload = get_df_workload(num_tasks, num_rows)
+        num_bytes = sum(
+            task[0][0].memory_usage(deep=True).sum() for task in workload[2]
+        )
+        log_file = os.path.join(self.get_scratch_space(), "log.txt")
+        txt = []
+        for use_shared_memory in (False, True):
+            start_time = time.time()
+            hjoblib.parallel_execute(
+                workload,
+                False,
+                4,
+                True,
+                True,
+                1,
+                log_file,
+                backend="loky",
+                use_shared_memory=use_shared_memory,
+            )
+            elapsed_time = time.time() - start_time
+            # Each dataframe is transferred to the worker and back.
+            throughput = 2 * num_bytes / elapsed_time / 1024**2
+            txt.append(
+                f"use_shared_memory={use_shared_memory}: "
+                f"elapsed_time_in_secs={elapsed_time:.2f} "
+                f"throughput_in_MB_per_sec={throughput:.1f}"
+            )
+        _LOG.info("\n%s", "\n".join(txt))
+
+
 # #############################################################################
 
 